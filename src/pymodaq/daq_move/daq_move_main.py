@@ -2,6 +2,9 @@
 from qtpy import QtGui, QtWidgets
 from qtpy.QtCore import QObject, Slot, QThread, Signal, QLocale, Qt
 import sys
+import datetime
+from collections import OrderedDict
+import numpy as np
 from pymodaq.daq_move.daq_move_gui import Ui_Form
 
 from pymodaq.daq_move.utility_classes import params as daq_move_params
@@ -17,7 +20,7 @@ from pymodaq.daq_utils.parameter import pymodaq_ptypes
 
 from pymodaq.daq_utils.daq_utils import ThreadCommand
 from easydict import EasyDict as edict
-from pymodaq.daq_utils.tcp_server_client import TCPClient
+from pymodaq.daq_utils.tcp_server_client import TCPClient, PROTOCOL_VERSION, LEGACY_PROTOCOL
 from pymodaq.daq_utils import daq_utils as utils
 from pymodaq.daq_utils.exceptions import ActuatorError
 from pymodaq.daq_utils import config as config_mod
@@ -79,6 +82,11 @@ class DAQ_Move(Ui_Form, QObject):
     update_settings_signal = Signal(edict)
     status_signal = Signal(str)
     bounds_signal = Signal(bool)
+    trajectory_loaded_signal = Signal(str, bool)
+    move_readback_signal = Signal(str, float, float)
+    # position read while moving or when the move is done, with the time stamp (s) of its reading in the actuator
+    # thread (or of its reception if the plugin does not send it), used to interpolate positions in fly scans
+    # emitted once the trajectory (or a chunk of it) has been sent to the controller, the bool telling if it stores it
     params = daq_move_params
 
     def __init__(self, parent, title="pymodaq Move", init=False):
@@ -129,6 +137,7 @@ class DAQ_Move(Ui_Form, QObject):
         self.current_position = 0
         self.target_position = 0
         self.wait_position_flag = True
+        self.supports_trajectory = False  # True if the initialized plugin can store a list of positions
 
         self.ui.Current_position_sb.setValue(self.current_position)
         self.set_enabled_move_buttons(enable=False)
@@ -398,7 +407,10 @@ class DAQ_Move(Ui_Form, QObject):
 
             tcpclient = TCPClient(self.settings.child('main_settings', 'tcpip', 'ip_address').value(),
                                   self.settings.child('main_settings', 'tcpip', 'port').value(),
-                                  self.settings.child(('move_settings')), client_type="ACTUATOR")
+                                  self.settings.child(('move_settings')), client_type="ACTUATOR",
+                                  protocol_version=PROTOCOL_VERSION if
+                                  self.settings.child('main_settings', 'tcpip', 'binary_protocol').value()
+                                  else LEGACY_PROTOCOL)
             tcpclient.moveToThread(self.tcpclient_thread)
             self.tcpclient_thread.tcpclient = tcpclient
             tcpclient.cmd_signal.connect(self.process_tcpip_cmds)
@@ -469,6 +481,12 @@ class DAQ_Move(Ui_Form, QObject):
                 self.parent.close()
 
     @Slot()
+    def emit_readback(self, attributes):
+        """Emit the move_readback_signal from the attributes of a 'check_position' or 'move_done' status: the position
+        and the time stamp of its reading if the stage sent it"""
+        time_stamp = attributes[1] if len(attributes) > 1 else datetime.datetime.now().timestamp()
+        self.move_readback_signal.emit(self.title, attributes[0], time_stamp)
+
     def raise_timeout(self):
         """
             Update status with "Timeout occured" statement.
@@ -580,6 +598,7 @@ class DAQ_Move(Ui_Form, QObject):
                 * In case of **'close'** command, close the launched stage thread
                 * In case of **'check_position'** command, set the Current_position value from status attributes
                 * In case of **'move_done'** command, set the Current_position value, make profile of move_done and send the move done signal with status attributes
+                * In case of **'trajectory_loaded'** command, display whether the controller stores the trajectory or not and send the trajectory loaded signal
                 * In case of **'Move_Not_Done'** command, set the current position value from the status attributes, make profile of Not_Move_Done and send the Thread Command "Move_abs"
                 * In case of **'update_settings'** command, create child "Move Settings" from  status attributes (if possible)
 
@@ -609,6 +628,7 @@ class DAQ_Move(Ui_Form, QObject):
             self.update_status("Stage initialized: {:} info: {:}".format(status.attributes[0]['initialized'],
                                                                          status.attributes[0]['info']),
                                wait_time=self.wait_time)
+            self.supports_trajectory = status.attributes[0].get('supports_trajectory', False)
             if status.attributes[0]['initialized']:
                 self.controller = status.attributes[0]['controller']
                 self.set_enabled_move_buttons(enable=True)
@@ -639,6 +659,7 @@ class DAQ_Move(Ui_Form, QObject):
         elif status.command == "check_position":
             self.ui.Current_position_sb.setValue(status.attributes[0])
             self.move_moving_signal.emit(self.title, status.attributes[0])
+            self.emit_readback(status.attributes)
             self.current_position = status.attributes[0]
             if self.settings.child('main_settings', 'tcpip', 'tcp_connected').value() and self.send_to_tcpip:
                 self.command_tcpip.emit(ThreadCommand('position_is', status.attributes))
@@ -649,9 +670,15 @@ class DAQ_Move(Ui_Form, QObject):
             self.move_done_bool = True
             self.ui.Move_Done_LED.set_as_true()
             self.move_done_signal.emit(self.title, status.attributes[0])
+            self.emit_readback(status.attributes)
             if self.settings.child('main_settings', 'tcpip', 'tcp_connected').value() and self.send_to_tcpip:
                 self.command_tcpip.emit(ThreadCommand('move_done', status.attributes))
 
+        elif status.command == "trajectory_loaded":
+            self.update_status(f"Trajectory loaded in the controller: {status.attributes[0]}",
+                               wait_time=self.wait_time)
+            self.trajectory_loaded_signal.emit(self.title, status.attributes[0])
+
         elif status.command == "Move_Not_Done":
             self.ui.Current_position_sb.setValue(status.attributes[0])
             self.current_position = status.attributes[0]
@@ -773,6 +800,8 @@ class DAQ_Move_stage(QObject):
         self.hardware_adress = None
         self.axis_address = None
         self.motion_stoped = False
+        self.trajectory = OrderedDict()  # index of the first position: positions of the last loaded chunks
+        self.trajectory_loaded = False
 
     def close(self):
         """
@@ -789,7 +818,7 @@ class DAQ_Move_stage(QObject):
 
         """
         pos = self.hardware.get_actuator_value()
-        self.status_sig.emit(ThreadCommand('check_position', [pos]))
+        self.status_sig.emit(ThreadCommand('check_position', [pos, datetime.datetime.now().timestamp()]))
 
     def ini_stage(self, params_state=None, controller=None):
         """
@@ -828,6 +857,7 @@ class DAQ_Move_stage(QObject):
                 status.info = infos[0]
                 status.initialized = infos[1]
             status.controller = self.hardware.controller
+            status.supports_trajectory = self.hardware.supports_trajectory
             self.hardware.Move_Done_signal.connect(self.Move_Done)
 
             # status.initialized=True
@@ -882,6 +912,84 @@ class DAQ_Move_stage(QObject):
         pos = self.hardware.move_rel(rel_position)
         self.hardware.poll_moving()
 
+    def load_trajectory(self, positions, ind_start=0):
+        """
+            Upload a chunk of absolute positions into the hardware if it supports it (see DAQ_Move_base.load_trajectory)
+
+            The positions of the last two chunks are kept so that move_trajectory_step falls back on move_Abs if the
+            hardware does not support trajectories or if they could not be loaded. Emit a "trajectory_loaded" Thread
+            Command.
+
+            =============== ========= ==============================================================================
+            **Parameters**  **Type**   **Description**
+
+            *positions*     ndarray    The list of absolute positions
+            *ind_start*     int        The index of the first position within the trajectory, 0 starting a new one
+            =============== ========= ==============================================================================
+        """
+        positions = np.array(positions, dtype=float)
+        if ind_start == 0:
+            self.trajectory = OrderedDict()
+        self.trajectory[ind_start] = positions
+        while len(self.trajectory) > 2:
+            self.trajectory.popitem(last=False)
+        self.trajectory_loaded = False
+        if self.hardware.supports_trajectory:
+            try:
+                self.hardware.load_trajectory(positions, ind_start)
+                self.trajectory_loaded = True
+            except Exception as e:
+                self.logger.exception(f'Trajectory could not be loaded: {str(e)}')
+        self.status_sig.emit(ThreadCommand('trajectory_loaded', [self.trajectory_loaded]))
+
+    def move_trajectory_step(self, index, polling=True):
+        """
+            Make the hardware move to the point of the loaded trajectory at the given index.
+
+            =============== ========= ===========================================
+            **Parameters**  **Type**   **Description**
+
+            *index*          int       The index of the point in the trajectory
+            =============== ========= ===========================================
+
+            See Also
+            --------
+            load_trajectory, move_Abs
+        """
+        position = self.get_trajectory_position(index)
+        if not self.trajectory_loaded:
+            self.move_Abs(position, polling)
+            return
+        self.target_position = position
+        self.hardware.move_is_done = False
+        self.hardware.target_position = position
+        self.hardware.ispolling = polling
+        self.hardware.move_trajectory_step(int(index))
+        self.hardware.poll_moving()
+
+    def set_velocity(self, velocity):
+        """
+            Set the velocity of the next moves of the hardware if it supports it (see DAQ_Move_base.set_velocity)
+
+            =============== ========= ==================================================================
+            **Parameters**  **Type**   **Description**
+
+            *velocity*      float      The velocity in actuator's units/s, None for the default one
+            =============== ========= ==================================================================
+        """
+        try:
+            self.hardware.set_velocity(velocity)
+        except NotImplementedError:
+            self.status_sig.emit(ThreadCommand("Update_Status", ['The velocity of this actuator cannot be set',
+                                                                 'log']))
+
+    def get_trajectory_position(self, index):
+        """Get the position of the loaded trajectory at the given index (within its last two loaded chunks)"""
+        for ind_start, positions in self.trajectory.items():
+            if ind_start <= index < ind_start + len(positions):
+                return float(positions[index - ind_start])
+        raise IndexError(f'The position of index {index} is not within the loaded trajectory')
+
     @Slot(float)
     def Move_Stoped(self, pos):
         """
@@ -916,7 +1024,7 @@ class DAQ_Move_stage(QObject):
 
         # check if position reached within epsilon=> not necessary this is done within the hardware code see polling for instance
         self.current_position = pos
-        self.status_sig.emit(ThreadCommand(command="move_done", attributes=[pos]))
+        self.status_sig.emit(ThreadCommand(command="move_done", attributes=[pos, datetime.datetime.now().timestamp()]))
         # if self.motion_stoped:
         #    self.status_sig.emit(ThreadCommand(command="move_done",attributes=[pos]))
         # else:
@@ -933,6 +1041,8 @@ class DAQ_Move_stage(QObject):
                 * In case of **'close'** command, unitinalise the stage closing hardware and emitting the corresponding status signal
                 * In case of **'move_Abs'** command, call the move_Abs method with position from command attributes
                 * In case of **'move_Rel'** command, call the move_Rel method with the relative position from the command attributes.
+                * In case of **'load_trajectory'** command, call the load_trajectory method with the positions from the command attributes.
+                * In case of **'move_trajectory_step'** command, call the move_trajectory_step method with the index from the command attributes.
                 * In case of **'move_Home'** command, call the move_Home method
                 * In case of **'check_position'** command, get the current position from the check_position method
                 * In case of **'Stop_motion'** command, stop any motion via the stop_Motion method
@@ -964,6 +1074,15 @@ class DAQ_Move_stage(QObject):
             elif command.command == "move_Rel":
                 self.move_Rel(*command.attributes)
 
+            elif command.command == "load_trajectory":
+                self.load_trajectory(*command.attributes)
+
+            elif command.command == "move_trajectory_step":
+                self.move_trajectory_step(*command.attributes)
+
+            elif command.command == "set_velocity":
+                self.set_velocity(*command.attributes)
+
             elif command.command == "move_Home":
                 self.move_Home()
 
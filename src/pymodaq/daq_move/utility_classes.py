@@ -8,10 +8,11 @@ from pymodaq.daq_utils.parameter import ioxml
 from pyqtgraph.parametertree import Parameter
 from pymodaq.daq_utils.daq_utils import ThreadCommand, getLineInfo
 from pymodaq.daq_utils.config import Config
-from pymodaq.daq_utils.tcp_server_client import TCPServer, tcp_parameters
+from pymodaq.daq_utils.tcp_server_client import TCPServer, tcp_parameters, Socket
 from pymodaq.daq_utils.messenger import deprecation_msg
 import numpy as np
 from time import perf_counter
+import datetime
 
 logger = utils.set_logger(utils.get_module_name(__file__))
 config = Config()
@@ -96,6 +97,9 @@ params = [
              {'title': 'IP address:', 'name': 'ip_address', 'type': 'str',
               'value': config('network', 'tcp-server', 'ip')},
              {'title': 'Port:', 'name': 'port', 'type': 'int', 'value': config('network', 'tcp-server', 'port')},
+             {'title': 'Binary protocol:', 'name': 'binary_protocol', 'type': 'bool', 'value': False,
+              'tip': 'Use the binary protocol (message IDs, pipelining), the server should support it otherwise the'
+                     ' connection is delayed by the handshake timeout'},
          ]},
     ]},
     {'title': 'Actuator Settings:', 'name': 'move_settings', 'type': 'group'}
@@ -162,10 +166,14 @@ class DAQ_Move_base(QObject):
 
     :ivar target_position: (float) stores the target position the controller should reach within epsilon
 
+    :ivar supports_trajectory: class level attribute (bool). Defines if the controller can store a list of positions
+                               and step through it (see load_trajectory and move_trajectory_step)
+
     """
 
     Move_Done_signal = Signal(float)
     is_multiaxes = False
+    supports_trajectory = False
     stage_names = [] #deprecated
     axes_names = []
     params = []
@@ -305,6 +313,44 @@ class DAQ_Move_base(QObject):
         else:
             raise NotImplementedError
 
+    def load_trajectory(self, positions, ind_start=0):
+        """Upload a list of absolute positions into the controller (buffer, PVT trajectory...)
+
+        To be subclassed by plugins setting the supports_trajectory class attribute to True. Long trajectories are
+        uploaded by chunks while they are stepped through: a chunk is loaded once the steps of the previous one have
+        begun, so the positions before the previous chunk can be discarded
+
+        Parameters
+        ----------
+        positions: (ndarray) 1D array of the absolute positions (in the actuator units) the controller will step
+                   through
+        ind_start: (int) index within the trajectory of the first of the positions, 0 starting a new trajectory
+        """
+        raise NotImplementedError
+
+    def set_velocity(self, velocity):
+        """Set the velocity of the next moves, for instance to fly along the lines of a scan at the detectors frame rate
+
+        To be subclassed by plugins whose controller can set it
+
+        Parameters
+        ----------
+        velocity: (float) velocity in actuator units/s, None to restore the default velocity of the controller
+        """
+        raise NotImplementedError
+
+    def move_trajectory_step(self, index):
+        """Trigger the move to the point of the loaded trajectory at the given index
+
+        To be subclassed by plugins setting the supports_trajectory class attribute to True. The target_position has
+        already been set by the parent, completion is then reported as for move_abs (polling or calling move_done)
+
+        Parameters
+        ----------
+        index: (int) the index of the point within the positions given to load_trajectory
+        """
+        raise NotImplementedError
+
     def emit_status(self, status):
         """
             | Emit the statut signal from the given status parameter.
@@ -395,7 +441,9 @@ class DAQ_Move_base(QObject):
                 logger.info(f'Move has been stopped')
 
             self.current_position = self.get_actuator_value()
-            self.emit_status(ThreadCommand('check_position', [self.current_position]))
+            # time stamped when read (and not when received by the UI) for the interpolation of fly scans positions
+            self.emit_status(ThreadCommand('check_position', [self.current_position,
+                                                              datetime.datetime.now().timestamp()]))
             logger.debug(f'Current position: {self.current_position}')
 
             if perf_counter() - self.start_time >= self.settings.child('timeout').value():
@@ -521,7 +569,8 @@ class DAQ_Move_TCP_server(DAQ_Move_base, TCPServer):
     command_server = Signal(list)
 
     message_list = ["Quit", "Status", "Done", "Server Closed", "Info", "Infos", "Info_xml", "move_abs",
-                    'move_home', 'move_rel', 'get_actuator_value', 'stop_motion', 'position_is', 'move_done']
+                    'move_home', 'move_rel', 'get_actuator_value', 'stop_motion', 'position_is', 'move_done',
+                    'set_info']
     socket_types = ["ACTUATOR"]
     params = comon_parameters_fun() + tcp_parameters
 
@@ -556,7 +605,12 @@ class DAQ_Move_TCP_server(DAQ_Move_base, TCPServer):
                 pos = sock.get_scalar()
                 pos = self.get_position_with_scaling(pos)
                 self.current_position = pos
-                self.emit_status(ThreadCommand('move_done', [pos]))
+                if self.message_header is not None and self.message_request is None:
+                    # binary protocol: this doesn't answer any move request of this server (see read_client_socket)
+                    # so it cannot be the end of the requested move, only the position is updated
+                    self.emit_status(ThreadCommand('get_actuator_value', [pos]))
+                else:
+                    self.emit_status(ThreadCommand('move_done', [pos]))
             else:
                 self.send_command(sock, command)
 
@@ -564,15 +618,13 @@ class DAQ_Move_TCP_server(DAQ_Move_base, TCPServer):
 
         if param.name() in putils.iter_children(self.settings.child(('settings_client')), []):
             actuator_socket = [client['socket'] for client in self.connected_clients if client['type'] == 'ACTUATOR'][0]
-            actuator_socket.send_string('set_info')
             path = putils.get_param_path(param)[2:]
             # get the path of this param as a list starting at parent 'infos'
 
-            actuator_socket.send_list(path)
-
-            # send value
+            # send path then value
             data = ioxml.parameter_to_xml_string(param)
-            actuator_socket.send_string(data)
+            self.queue_command(actuator_socket, 'set_info',
+                               Socket.list_to_buffers(path) + Socket.string_to_buffers(data))
 
     def ini_stage(self, controller=None):
         """
@@ -625,8 +677,7 @@ class DAQ_Move_TCP_server(DAQ_Move_base, TCPServer):
 
         sock = self.find_socket_within_connected_clients(self.client_type)
         if sock is not None:  # if client self.client_type is connected then send it the command
-            sock.send_string('move_abs')
-            sock.send_scalar(position)
+            self.send_command(sock, 'move_abs', Socket.scalar_to_buffers(position))
 
     def move_Rel(self, position):
         position = self.check_bound(self.current_position + position) - self.current_position
@@ -635,8 +686,7 @@ class DAQ_Move_TCP_server(DAQ_Move_base, TCPServer):
         position = self.set_position_relative_with_scaling(position)
         sock = self.find_socket_within_connected_clients(self.client_type)
         if sock is not None:  # if client self.client_type is connected then send it the command
-            sock.send_string('move_rel')
-            sock.send_scalar(position)
+            self.send_command(sock, 'move_rel', Socket.scalar_to_buffers(position))
 
     def move_Home(self):
         """
@@ -648,7 +698,7 @@ class DAQ_Move_TCP_server(DAQ_Move_base, TCPServer):
         """
         sock = self.find_socket_within_connected_clients(self.client_type)
         if sock is not None:  # if client self.client_type is connected then send it the command
-            sock.send_string('move_home')
+            self.send_command(sock, 'move_home')
 
     def get_actuator_value(self):
         """
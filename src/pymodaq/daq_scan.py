@@ -7,10 +7,13 @@ Contains all objects related to the DAQ_Scan module, to do automated scans, savi
 """
 
 import sys
-from collections import OrderedDict
+from collections import OrderedDict, deque
 import numpy as np
 from pathlib import Path
 import os
+from time import perf_counter
+import copy
+import datetime
 
 import pymodaq.daq_utils.gui_utils.dock
 import pymodaq.daq_utils.gui_utils.file_io
@@ -23,13 +26,16 @@ import pymodaq.daq_utils.parameter.ioxml
 
 from pyqtgraph.parametertree import Parameter, ParameterTree
 from qtpy import QtWidgets, QtCore, QtGui
-from qtpy.QtCore import QObject, Slot, QThread, Signal, QDateTime, QDate, QTime
+from qtpy.QtCore import QObject, Slot, QThread, Signal, QDateTime, QDate, QTime, Qt
 from pymodaq.daq_utils import exceptions
 from pymodaq.daq_utils.plotting.data_viewers.viewer2D import Viewer2D
 from pymodaq.daq_utils.plotting.data_viewers.viewer1D import Viewer1D
 from pymodaq.daq_utils.plotting.data_viewers.viewer1Dbasic import Viewer1DBasic
 from pymodaq.daq_utils.plotting.navigator import Navigator
-from pymodaq.daq_utils.scanner import Scanner, adaptive, adaptive_losses
+from pymodaq.daq_utils.plotting.utils.plot_utils import GrowingArray
+from pymodaq.daq_utils.scanner import Scanner, adaptive, adaptive_losses, is_fly_scan_possible, iter_scan_lines, \
+    get_fly_positions, LazyScan
+from pymodaq.daq_utils.adaptive_engine import AdaptiveEngine, get_learner, get_learner_dimension, get_adaptive_state
 from pymodaq.daq_utils.managers.batchscan_manager import BatchScanner
 from pymodaq.daq_utils.managers.modules_manager import ModulesManager
 from pymodaq.daq_utils.gui_utils.widgets import QLED
@@ -59,11 +65,29 @@ class DAQ_Scan(QObject):
              'value': 0,
              'tip': 'Wait time in ms between move and grab processes'},
             {'title': 'Timeout (ms)', 'name': 'timeout', 'type': 'int', 'value': 10000},
+            {'title': 'Pipelined:', 'name': 'pipelined', 'type': 'bool', 'value': False,
+             'tip': 'Start the move to the next step while the data of the current one are saved and plotted'
+                    ' (not used for adaptive scans)'},
+            {'title': 'Fly scan:', 'name': 'fly_scan', 'type': 'bool', 'value': False,
+             'tip': 'Move continuously along each line of the scan while the detectors grab continuously, each frame'
+                    ' being saved with the actuators positions interpolated at its acquisition time'
+                    ' (Scan1D Linear and Scan2D Linear or Back&Forth only)'},
+            {'title': 'Fly frame rate (Hz):', 'name': 'fly_frame_rate', 'type': 'float', 'value': 0., 'min': 0.,
+             'tip': 'Frame rate of the detectors during fly scans: the actuators velocity is set so that they move by'
+                    ' one scan step per frame along each line (0 to keep their velocity)'},
         ]},
         {'title': 'Scan options', 'name': 'scan_options', 'type': 'group', 'children': [
             {'title': 'Naverage:', 'name': 'scan_average', 'type': 'int', 'value': 1, 'min': 1},
             {'title': 'Plot from:', 'name': 'plot_from', 'type': 'list'},
-            {'title': 'Sort 1D scan data:', 'name': 'sort_scan1D', 'type': 'bool', 'value': False},]},
+            {'title': 'Sort 1D scan data:', 'name': 'sort_scan1D', 'type': 'bool', 'value': False},
+            {'title': 'Adaptive batch:', 'name': 'adaptive_batch', 'type': 'int', 'value': 4, 'min': 1,
+             'tip': 'Number of points asked at once to the adaptive algorithm, probed in the order minimizing the'
+                    ' travel of the actuators'},
+            {'title': 'Refresh time (ms):', 'name': 'refresh_time', 'type': 'float', 'value': 50., 'min': 0.,
+             'tip': 'Minimum time between two redraws of the live scan plots'},
+            {'title': 'Checkpoint period:', 'name': 'checkpoint_period', 'type': 'int', 'value': 10, 'min': 0,
+             'tip': 'Number of steps between two checkpoints saved in the scan group, allowing to resume an'
+                    ' interrupted scan (File/Resume scan). 0 to save a checkpoint only when the acquisition stops'},]},
     ]
 
     def __init__(self, dockarea=None, dashboard=None, show_popup=True):
@@ -100,9 +124,18 @@ class DAQ_Scan(QObject):
         self.scan_data_1D_to_save = []
         self.plot_1D_ini = False
         self.plot_2D_ini = False
+        self.live_1D_options = dict(display_as_sequence=False, isadaptive=False)
+        self.live_2D_mode = 'map'  # 'map' for 2D scans, 'spread' for spread 2D data or 'stack' for stacked 1D data
+        self.live_2D_sequence = False  # True if the stacked 1D data are displayed as a function of the scan index
+        self.live_graphs_to_refresh = set([])
+        self.live_refresh_time = 0.
+        self.live_refresh_timer = QtCore.QTimer()
+        self.live_refresh_timer.setSingleShot(True)
+        self.live_refresh_timer.timeout.connect(self.refresh_live_graphs)
 
         self.scan_thread = None
-        self.modules_manager = ModulesManager(self.dashboard.detector_modules, self.dashboard.actuators_modules)
+        self.modules_manager = ModulesManager(self.dashboard.detector_modules, self.dashboard.actuators_modules,
+                                              timeout=config['scan']['timeflow']['timeout'])
 
         self.h5saver = H5Saver()
         self.h5saver.settings.child(('do_save')).hide()
@@ -223,6 +256,9 @@ class DAQ_Scan(QObject):
         save_action.triggered.connect(self.save_file)
         show_action = self.file_menu.addAction('Show file content')
         show_action.triggered.connect(self.show_file_content)
+        self.file_menu.addSeparator()
+        resume_action = self.file_menu.addAction('Resume scan')
+        resume_action.triggered.connect(lambda: self.resume_scan())
 
         self.settings_menu = menubar.addMenu('Settings')
         action_navigator = self.settings_menu.addAction('Show Navigator')
@@ -578,6 +614,12 @@ class DAQ_Scan(QObject):
             self.ui.tabWidget.setCurrentIndex(self.ui.tabWidget.addTab(self.ui.tab_navigator, 'Navigator'))
             self.set_scan()  # to load current scans into the navigator
 
+    @property
+    def isfly(self):
+        """bool: True if the current scan is acquired as a fly scan (see DAQ_Scan_Acquisition.fly_acquisition)"""
+        return self.settings.child('time_flow', 'fly_scan').value() and \
+            is_fly_scan_possible(self.scanner.scan_parameters.scan_type, self.scanner.scan_parameters.scan_subtype)
+
     ################
     #  LOADING SAVING
 
@@ -590,7 +632,9 @@ class DAQ_Scan(QObject):
         """
         try:
             scan_type = self.scanner.scan_parameters.scan_type
-            isadaptive = self.scanner.scan_parameters.scan_subtype == 'Adaptive'
+            isadaptive = self.scanner.scan_parameters.scan_subtype == 'Adaptive' or self.isfly
+            scan_subtype = 'Fly' if self.isfly else self.scanner.scan_parameters.scan_subtype
+            self.refresh_live_graphs()  # draw the last data before saving the live plots
             self.ui.scan2D_graph.show_roi_target(False)
 
             self.h5saver.current_scan_group.attrs['scan_done'] = True
@@ -633,7 +677,7 @@ class DAQ_Scan(QObject):
                         channel_group = self.h5saver.add_CH_group(live_group, title=channel)
                         self.h5saver.add_data_live_scan(channel_group, datas['Scan_Data_{:03d}'.format(ind_channel)],
                                                         scan_type='scan1D',
-                                                        scan_subtype=self.scanner.scan_parameters.scan_subtype)
+                                                        scan_subtype=scan_subtype)
 
                 else:
                     averaged_datas = OrderedDict([])
@@ -656,7 +700,7 @@ class DAQ_Scan(QObject):
                         self.h5saver.add_data_live_scan(channel_group,
                                                         averaged_datas['Scan_Data_{:03d}'.format(ind_channel)],
                                                         scan_type='scan1D',
-                                                        scan_subtype=self.scanner.scan_parameters.scan_subtype)
+                                                        scan_subtype=scan_subtype)
 
                 if self.settings.child('scan_options', 'scan_average').value() > 1:
                     string = pymodaq.daq_utils.gui_utils.utils.widget_to_png_to_bytes(self.ui.average1D_graph.parent)
@@ -664,7 +708,7 @@ class DAQ_Scan(QObject):
                     string = pymodaq.daq_utils.gui_utils.utils.widget_to_png_to_bytes(self.ui.scan1D_graph.parent)
                 live_group.attrs['pixmap1D'] = string
 
-            elif self.scan_data_2D != []:  #if live data is saved as 1D not needed to save as 2D
+            elif len(self.scan_data_2D) != 0:  #if live data is saved as 1D not needed to save as 2D
 
                 if len(self.modules_manager.actuators) == 1:
                     scan_type = 'scan1D'
@@ -691,7 +735,7 @@ class DAQ_Scan(QObject):
                             self.h5saver.add_data_live_scan(channel_group,
                                                             datas['Scan_Data_{:03d}'.format(ind_channel)],
                                                             scan_type=scan_type,
-                                                            scan_subtype=self.scanner.scan_parameters.scan_subtype)
+                                                            scan_subtype=scan_subtype)
 
                     else:
                         averaged_datas = OrderedDict([])
@@ -712,7 +756,7 @@ class DAQ_Scan(QObject):
                             channel_group = self.h5saver.add_CH_group(live_group, title=channel)
                             self.h5saver.add_data_live_scan(channel_group, averaged_datas[
                                 'Scan_Data_{:03d}'.format(ind_channel)],
-                                scan_type=scan_type, scan_subtype=self.scanner.scan_parameters.scan_subtype)
+                                scan_type=scan_type, scan_subtype=scan_subtype)
 
                 else:
                     channel_group = self.h5saver.add_CH_group(live_group, title='Scan_Data_000')
@@ -720,7 +764,7 @@ class DAQ_Scan(QObject):
                                                                         x_axis=self.scan_data_2D[:, 0],
                                                                         y_axis=self.scan_data_2D[:, 1]),
                                                     scan_type=scan_type,
-                                                    scan_subtype=self.scanner.scan_parameters.scan_subtype)
+                                                    scan_subtype=scan_subtype)
 
                 if self.settings.child('scan_options', 'scan_average').value() > 1:
                     string = pymodaq.daq_utils.gui_utils.utils.widget_to_png_to_bytes(self.ui.average2D_graph.parent)
@@ -905,6 +949,9 @@ class DAQ_Scan(QObject):
                 if param.name() == 'scan_average':
                     self.show_average_dock(param.value() > 1)
 
+                elif param.name() == 'timeout':
+                    self.modules_manager.timeout = param.value()  # for each grab and move of the scan
+
             elif change == 'parent':
                 pass
 
@@ -1006,9 +1053,9 @@ class DAQ_Scan(QObject):
                               (scan_type == 'Tabular' and not self.scanner.scan_parameters.Naxes == 1)
 
         tabular2D = scan_type == 'Tabular' and self.scanner.scan_parameters.Naxes == 2
-        isadaptive = self.scanner.scan_parameters.scan_subtype == 'Adaptive'
-        if 'curvilinear' in datas:
-            self.curvilinear_values.append(datas['curvilinear'])
+        isadaptive = self.scanner.scan_parameters.scan_subtype == 'Adaptive' or self.isfly  # spread data
+        if datas.get('curvilinear', None) is not None:  # Tabular adaptive scans
+            self.curvilinear_values.append(np.squeeze(datas['curvilinear']))
 
         if self.bkg_container is None:
             det_name = self.settings.child('scan_options', 'plot_from').value()
@@ -1068,6 +1115,9 @@ class DAQ_Scan(QObject):
         """
             Update the 1D graphic window in the Graphic Interface with the given datas.
 
+            The datas are stored in preallocated (or growing, see GrowingArray) arrays and the graph is redrawn at most
+            once every refresh time (see request_live_refresh and show_1D_graph).
+
             Depending of scan type :
                 * *'Linear back to start'* scan :
                     * Calibrate axis positions between graph and scan
@@ -1091,24 +1141,22 @@ class DAQ_Scan(QObject):
             # self.scan_y_axis = np.array([])
             if not self.plot_1D_ini:  # init the datas
                 self.plot_1D_ini = True
+                self.live_1D_options = dict(display_as_sequence=display_as_sequence, isadaptive=isadaptive)
                 self.ui.scan1D_subgraph.show(display_as_sequence)
                 if isadaptive:
-                    self.scan_data_1D = np.expand_dims(np.array([datas[key]['data'] for key in datas]), 0)
+                    self.scan_data_1D_buffer = GrowingArray((len(datas),))
+                    self.scan_data_1D = self.scan_data_1D_buffer.data
                 else:
                     if not display_as_sequence:
+                        # computed by chunks so that lazy scans never build their whole positions array
+                        self.scan_x_axis = np.array(self.scanner.scan_parameters.get_axis_positions(0))
                         if self.scanner.scan_parameters.scan_subtype == 'Linear back to start':
-                            self.scan_x_axis = np.array(self.scanner.scan_parameters.positions[0::2, 0])
-                        else:
-                            self.scan_x_axis = np.array(self.scanner.scan_parameters.positions[:, 0])
+                            self.scan_x_axis = self.scan_x_axis[0::2]
 
                     else:
-                        self.scan_x_axis = np.linspace(0, len(self.scanner.scan_parameters.positions) - 1,
-                                                       len(self.scanner.scan_parameters.positions))
-                        self.ui.scan1D_subgraph.show_data(
-                            [positions for positions in self.scanner.scan_parameters.positions.T])
-                        self.ui.scan1D_subgraph.update_labels(self.scanner.actuators)
-                        self.ui.scan1D_subgraph.set_axis_label(axis_settings=dict(orientation='bottom',
-                                                                                  label='Scan index', units=''))
+                        # the positions subgraph is drawn from the acquired positions by show_1D_graph
+                        Nsteps = self.scanner.scan_parameters.Nsteps
+                        self.scan_x_axis = np.linspace(0, Nsteps - 1, Nsteps)
 
                     self.scan_data_1D = np.zeros((self.scanner.scan_parameters.Nsteps, len(datas))) * np.nan
                     if self.settings.child('scan_options', 'scan_average').value() > 1:
@@ -1119,31 +1167,14 @@ class DAQ_Scan(QObject):
                                                                                                  'plot_from').value(),
                                                                        units=''))
 
-            if display_as_sequence:
-                self.ui.scan1D_subgraph.show_data(
-                    [positions for positions in np.array(self.scan_positions).T])
-                self.ui.scan1D_subgraph.update_labels(self.scanner.actuators)
-                self.ui.scan1D_subgraph.set_axis_label(axis_settings=dict(orientation='bottom',
-                                                                          label='Scan index', units=''))
-
             # to test random mode:
             # self.scan_data_1D[self.ind_scan, :] =np.random.rand((1))* np.array([np.exp(-(self.scan_x_axis[self.ind_scan]-50)**2/20**2),np.exp(-(self.scan_x_axis[self.ind_scan]-50)**6/10**6)]) # np.array(list(datas.values()))
             # self.scan_data_1D[self.ind_scan, :] =  np.array(list(datas.values()))
 
             if isadaptive:
-                if self.ind_scan != 0:
-
-                    self.scan_data_1D = np.vstack((self.scan_data_1D, np.array([
-                        self.get_data_live_bkg(datas, key, bkg) for key in datas])))
-
-                if not display_as_sequence:
-                    self.scan_x_axis = np.array(self.scan_positions)
-                else:
-                    if isadaptive:
-                        self.scan_x_axis = np.array(self.curvilinear_values)
-                    else:
-                        self.scan_x_axis = np.linspace(0, len(self.scan_positions) - 1,
-                                                       len(self.scan_positions))
+                self.scan_data_1D_buffer.append(np.array([np.squeeze(self.get_data_live_bkg(datas, key, bkg))
+                                                          for key in datas]))
+                self.scan_data_1D = self.scan_data_1D_buffer.data
             else:
                 if self.scanner.scan_parameters.scan_subtype == 'Linear back to start':
                     if not utils.odd_even(self.ind_scan):
@@ -1166,6 +1197,31 @@ class DAQ_Scan(QObject):
                             (self.ind_average * self.scan_data_1D_average[self.ind_scan, :] + self.scan_data_1D[
                                 self.ind_scan, :]) / (self.ind_average + 1)
 
+            self.request_live_refresh('1D')
+
+        except Exception as e:
+            logger.exception(str(e))
+
+    def show_1D_graph(self):
+        """Draw the 1D live scan data stored by update_1D_graph"""
+        try:
+            display_as_sequence = self.live_1D_options['display_as_sequence']
+            isadaptive = self.live_1D_options['isadaptive']
+            if display_as_sequence:
+                self.ui.scan1D_subgraph.show_data(
+                    [positions for positions in self.scan_positions.data.T])
+                self.ui.scan1D_subgraph.update_labels(self.scanner.actuators)
+                self.ui.scan1D_subgraph.set_axis_label(axis_settings=dict(orientation='bottom',
+                                                                          label='Scan index', units=''))
+            if isadaptive:
+                if not display_as_sequence:
+                    self.scan_x_axis = self.scan_positions.data
+                else:
+                    if len(self.curvilinear_values) != 0:  # Tabular adaptive scans
+                        self.scan_x_axis = self.curvilinear_values.data
+                    else:
+                        self.scan_x_axis = np.arange(len(self.scan_positions), dtype=float)
+
             data_to_plot = list(self.scan_data_1D.T)
             if self.settings.child('scan_options', 'sort_scan1D').value():
                 x_axis_to_plot, indices = np.unique(self.scan_x_axis, return_index=True)
@@ -1179,7 +1235,7 @@ class DAQ_Scan(QObject):
                                     units=self.modules_manager.actuators[0].settings.child('move_settings',
                                                                                            'units').value())
             else:
-                if isadaptive:
+                if len(self.curvilinear_values) != 0:
                     x_axis = utils.Axis(data=x_axis_to_plot, label='Curvilinear value', units='')
                 else:
                     x_axis = utils.Axis(data=x_axis_to_plot, label='Scan index', units='')
@@ -1212,6 +1268,9 @@ class DAQ_Scan(QObject):
         """
             Update the 2D graphic window in the Graphic Interface with the given datas (if not none).
 
+            The datas are stored in preallocated (or growing, see GrowingArray) arrays and the graph is redrawn at most
+            once every refresh time (see request_live_refresh and show_2D_graph).
+
             Depending on scan type :
                 * *2D scan* :
                     * Calibrate the axis positions between graphic and scan
@@ -1243,16 +1302,14 @@ class DAQ_Scan(QObject):
                     self.plot_2D_ini = True
                     self.ui.scan2D_graph.show_roi_target(not isadaptive)
                     if isadaptive:
-                        self.scan_x_axis2D = np.array(self.scan_positions)[:, 0]
-                        self.scan_y_axis = np.array(self.scan_positions)[:, 1]
-                        key = list(datas.keys())[0]
-                        if bkg is not None:
-                            self.scan_data_2D = \
-                                np.hstack((self.scan_positions[-1], datas[key]['data'] - bkg[key]['data']))
-                        else:
-                            self.scan_data_2D = \
-                                np.hstack((self.scan_positions[-1], datas[key]['data']))
+                        self.live_2D_mode = 'spread'
+                        self.scan_x_axis2D = np.array(self.scan_positions.data[:, 0])
+                        self.scan_y_axis = np.array(self.scan_positions.data[:, 1])
+                        # rows of (x, y, value) points of the spread data
+                        self.scan_data_2D_buffer = GrowingArray((3,))
+                        self.scan_data_2D = self.scan_data_2D_buffer.data
                     else:
+                        self.live_2D_mode = 'map'
 
                         self.scan_x_axis2D = self.scanner.scan_parameters.axes_unique[0]
                         self.scan_y_axis = self.scanner.scan_parameters.axes_unique[1]
@@ -1286,8 +1343,7 @@ class DAQ_Scan(QObject):
                                                      for ind in range(min((3, len(datas))))]
 
                 if not isadaptive:
-                    ind_pos_axis_1 = self.scanner.scan_parameters.axes_indexes[self.ind_scan, 0]
-                    ind_pos_axis_2 = self.scanner.scan_parameters.axes_indexes[self.ind_scan, 1]
+                    ind_pos_axis_1, ind_pos_axis_2 = self.scanner.scan_parameters.get_step(self.ind_scan)[1][:2]
                     self.ui.scan2D_graph.move_scale_roi_target(pos=(ind_pos_axis_1, ind_pos_axis_2))
                     for ind_plot in range(min((3, len(datas)))):
                         keys = list(datas.keys())
@@ -1300,43 +1356,32 @@ class DAQ_Scan(QObject):
                                 (self.ind_average * self.scan_data_2D_average[ind_plot][
                                     ind_pos_axis_2, ind_pos_axis_1] + datas[
                                     keys[ind_plot]]['data']) / (self.ind_average + 1)
-                    self.ui.scan2D_graph.show_data(utils.DataFromPlugins(dim='Data2D', data=self.scan_data_2D))
-
-                    if self.settings.child('scan_options', 'scan_average').value() > 1:
-                        self.ui.average2D_graph.setImage(*self.scan_data_2D_average)
 
                 else:
-                    if self.ind_scan != 0:
-                        key = list(datas.keys())[0]
-
-                        self.scan_data_2D = np.vstack((self.scan_data_2D,
-                                                       np.hstack((self.scan_positions[-1],
-                                                                  self.get_data_live_bkg(datas, key, bkg)))))
-
-                    if len(self.scan_data_2D) > 3:  # at least 3 point to make a triangulation image
-                        self.ui.scan2D_graph.setImage(data_spread=self.scan_data_2D)
+                    key = list(datas.keys())[0]
+                    self.scan_data_2D_buffer.append(np.hstack((self.scan_positions[-1][:2],
+                                                               np.squeeze(self.get_data_live_bkg(datas, key, bkg)))))
+                    self.scan_data_2D = self.scan_data_2D_buffer.data
 
             else:  # scan 1D with concatenation of vectors making a 2D image
                 if not self.plot_2D_ini:  # init the data
                     self.plot_2D_ini = True
+                    self.live_2D_mode = 'stack'
+                    self.live_2D_sequence = display_as_sequence
                     if display_as_sequence:
+                        # the positions subgraph is drawn from the acquired positions by show_2D_graph
                         self.ui.scan2D_subgraph.show(True)
-                        self.ui.scan2D_subgraph.show_data(
-                            [positions for positions in self.scanner.scan_parameters.positions.T])
-                        self.ui.scan2D_subgraph.update_labels(self.scanner.actuators)
 
                     data = datas[list(datas.keys())[0]]
                     Ny = len(data[list(data.keys())[0]])
 
                     self.scan_y_axis = np.array([])
 
-                    Nx = len(self.scanner.scan_parameters.positions)
+                    Nx = self.scanner.scan_parameters.Nsteps
                     if not display_as_sequence:
-
+                        self.scan_x_axis2D = np.array(self.scanner.scan_parameters.get_axis_positions(0))
                         if self.scanner.scan_parameters.scan_subtype == 'Linear back to start':
-                            self.scan_x_axis2D = np.array(self.scanner.scan_parameters.positions[0::2, 0])
-                        else:
-                            self.scan_x_axis2D = np.array(self.scanner.scan_parameters.positions[:, 0])
+                            self.scan_x_axis2D = self.scan_x_axis2D[0::2]
 
                         x_axis = utils.Axis(data=self.scan_x_axis2D,
                                             label=self.modules_manager.actuators[0].title,
@@ -1396,7 +1441,7 @@ class DAQ_Scan(QObject):
 
                 else:
                     if not display_as_sequence:
-                        ind_pos_axis = self.scanner.scan_parameters.axes_indexes[self.ind_scan, 0]
+                        ind_pos_axis = self.scanner.scan_parameters.get_step(self.ind_scan)[1][0]
                     else:
                         ind_pos_axis = self.ind_scan
 
@@ -1411,26 +1456,71 @@ class DAQ_Scan(QObject):
                                     'data']) \
                                 / (self.ind_average + 1)
 
+            self.request_live_refresh('2D')
+
+        except Exception as e:
+            logger.exception(str(e))
+
+    def show_2D_graph(self):
+        """Draw the 2D live scan data stored by update_2D_graph"""
+        try:
+            if self.live_2D_mode == 'map':
+                self.ui.scan2D_graph.show_data(utils.DataFromPlugins(dim='Data2D', data=self.scan_data_2D))
+            elif self.live_2D_mode == 'spread':
+                if len(self.scan_data_2D) > 3:  # at least 3 point to make a triangulation image
+                    self.ui.scan2D_graph.setImage(data_spread=self.scan_data_2D)
+            else:
                 self.ui.scan2D_graph.setImage(*self.scan_data_2D)
-                if self.settings.child('scan_options', 'scan_average').value() > 1:
-                    self.ui.average2D_graph.setImage(*self.scan_data_2D_average)
+                if self.live_2D_sequence:
+                    self.ui.scan2D_subgraph.show_data([positions for positions in self.scan_positions.data.T])
+                    self.ui.scan2D_subgraph.update_labels(self.scanner.actuators)
+            if self.live_2D_mode != 'spread' and self.settings.child('scan_options', 'scan_average').value() > 1:
+                self.ui.average2D_graph.setImage(*self.scan_data_2D_average)
 
         except Exception as e:
             logger.exception(str(e))
 
+    def request_live_refresh(self, graph):
+        """Redraw a live graph, at most once every refresh time, the last data being drawn when it is elapsed
+
+        Parameters
+        ----------
+        graph: (str) either '1D' or '2D'
+        """
+        self.live_graphs_to_refresh.add(graph)
+        if not self.live_refresh_timer.isActive():
+            refresh_time = self.settings.child('scan_options', 'refresh_time').value()
+            elapsed = (perf_counter() - self.live_refresh_time) * 1000
+            if elapsed >= refresh_time:
+                self.refresh_live_graphs()
+            else:
+                self.live_refresh_timer.start(int(refresh_time - elapsed))
+
+    def refresh_live_graphs(self):
+        """Draw the live graphs whose data have been updated since their last drawing"""
+        self.live_refresh_timer.stop()
+        self.live_refresh_time = perf_counter()
+        graphs, self.live_graphs_to_refresh = self.live_graphs_to_refresh, set([])
+        if '1D' in graphs:
+            self.show_1D_graph()
+        if '2D' in graphs:
+            self.show_2D_graph()
+
     #################
     #  SCAN FLOW
 
-    def set_scan(self, scan=None):
+    def set_scan(self, scan=None, resume=False):
         """
         Sets the current scan given the selected settings. Makes some checks, increments the h5 file scans.
-        In case the dialog is cancelled, return False and aborts the scan
+        In case the dialog is cancelled, return False and aborts the scan. If resume is True, the current scan group
+        is kept (see resume_scan)
         """
         try:
             # set the filename and path
-            res = self.create_new_file(False)
-            if not res:
-                return
+            if not resume:
+                res = self.create_new_file(False)
+                if not res:
+                    return
 
             # reinit these objects
             self.scan_data_1D = []
@@ -1439,7 +1529,7 @@ class DAQ_Scan(QObject):
             self.scan_data_2D_average = []
 
             scan_params = self.scanner.set_scan()
-            if scan_params.scan_info.positions is None:
+            if scan_params.scan_info.lazy_scan is None and scan_params.scan_info.positions is None:
                 messagebox(text=f"An error occurred when establishing the scan steps. Actual settings "
                                 f"gives approximately {int(scan_params.Nsteps)} steps."
                                 f" Please check the steps number "
@@ -1452,9 +1542,9 @@ class DAQ_Scan(QObject):
 
             if self.scanner.scan_parameters.scan_subtype == 'Adaptive':
                 if len(self.modules_manager.get_selected_probed_data('0D')) == 0:
-                    messagebox(text="In adaptive mode, you have to pick a 0D signal from which the algorithm will"
-                                    " determine the next positions to scan, see 'probe_data' in the modules selector"
-                                    " panel")
+                    messagebox(text="In adaptive mode, you have to pick at least one 0D signal from which the"
+                                    " algorithm will determine the next positions to scan, see 'probe_data' in the"
+                                    " modules selector panel")
                     return
 
             self.ui.N_scan_steps_sb.setValue(self.scanner.scan_parameters.Nsteps)
@@ -1511,11 +1601,17 @@ class DAQ_Scan(QObject):
         res = self.show_file_attributes('dataset')
         return res
 
-    def start_scan(self):
+    def start_scan(self, resume=False):
         """
             Start an acquisition calling the set_scan function.
             Emit the command_DAQ signal "start_acquisition".
 
+            =============== ============== =======================================================================
+            **Parameters**    **Type**      **Description**
+            resume            bool          if True, resume the acquisition of the current scan group from its
+                                            checkpoint (see resume_scan)
+            =============== ============== =======================================================================
+
             See Also
             --------
             set_scan
@@ -1525,10 +1621,16 @@ class DAQ_Scan(QObject):
         self.plot_2D_ini = False
         self.plot_1D_ini = False
         self.bkg_container = None
-        self.scan_positions = []
-        self.curvilinear_values = []
-        res = self.set_scan()
+        self.modules_manager.timeout = self.settings.child('time_flow', 'timeout').value()
+        res = self.set_scan(resume=resume)
         if res:
+            # start with at most a chunk of rows, the arrays growing with the acquisition so that long (lazy) scans
+            # are not allocated for all their steps at once
+            Npoints = self.scanner.scan_parameters.Nsteps * self.settings.child('scan_options',
+                                                                                'scan_average').value()
+            capacity = min(max(Npoints, 16), LazyScan.chunk_size)
+            self.scan_positions = GrowingArray((self.scanner.scan_parameters.Naxes,), capacity=capacity)
+            self.curvilinear_values = GrowingArray(capacity=capacity)
 
             # deactivate module controls usiong remote_control
             if hasattr(self.dashboard, 'remote_manager'):
@@ -1583,7 +1685,8 @@ class DAQ_Scan(QObject):
             self.scan_thread = QThread()
 
             scan_acquisition = DAQ_Scan_Acquisition(self.settings, self.scanner.settings, self.h5saver.settings,
-                                                    self.modules_manager, self.scanner.scan_parameters)
+                                                    self.modules_manager, self.scanner.scan_parameters,
+                                                    resume=resume)
             if config['scan']['scan_in_thread']:
                 scan_acquisition.moveToThread(self.scan_thread)
             self.command_DAQ_signal[list].connect(scan_acquisition.queue_command)
@@ -1603,6 +1706,65 @@ class DAQ_Scan(QObject):
             self.ui.status_message.setText('Running acquisition')
             logger.info('Running acquisition')
 
+    def resume_scan(self, file_path=None):
+        """Resume the last scan of a h5 file from its last checkpoint (see DAQ_Scan_Acquisition.save_checkpoint)
+
+        The file is reopened to append data into it, the modules used by the scan are selected, the DAQ_Scan and
+        scanner settings are restored from the checkpoint then the acquisition restarts from the step following the
+        checkpoint writing into the existing data arrays.
+
+        Parameters
+        ----------
+        file_path: (Path or str) the h5 file holding the scan to resume. If None, a file dialog is opened
+        """
+        try:
+            if file_path is None:
+                file_path = pymodaq.daq_utils.gui_utils.file_io.select_file(
+                    self.h5saver.settings.child(('base_path')).value(), save=False, ext='h5')
+                if file_path == '':
+                    return
+            self.h5saver.current_scan_group = None  # so that the last scan group of the file is the current one
+            self.h5saver.init_file(update_h5=False, addhoc_file_path=file_path)
+            scan_group = self.h5saver.current_scan_group
+            checkpoint = None if scan_group is None else self.h5saver.get_checkpoint(scan_group)
+            if checkpoint is None or checkpoint['completed']:
+                messagebox(text='The last scan of this file has no checkpoint from which it could be resumed')
+                return
+            scan_name = self.h5saver.get_node_name(scan_group)
+            self.h5saver.current_scan_name = scan_name
+            self.h5saver.settings.child(('current_scan_name')).setValue(scan_name)
+
+            # select the modules used by the scan, in the order of their groups
+            module_names = OrderedDict(Move=[], Detector=[])
+            for node_name in sorted(self.h5saver.get_children(scan_group)):
+                for group_type in module_names:
+                    if node_name.startswith(group_type):
+                        module_names[group_type].append(
+                            self.h5saver.get_attr(self.h5saver.get_node(scan_group, node_name), 'name'))
+            self.modules_manager.selected_actuators_name = module_names['Move']
+            self.modules_manager.selected_detectors_name = module_names['Detector']
+            if set(self.modules_manager.selected_actuators_name) != set(module_names['Move']) or \
+                    set(self.modules_manager.selected_detectors_name) != set(module_names['Detector']):
+                messagebox(text=f"The modules used by {scan_name} ({', '.join(module_names['Move'])},"
+                                f" {', '.join(module_names['Detector'])}) are not all present in the dashboard")
+                return
+
+            self.settings.restoreState(Parameter.create(
+                name='settings', type='group',
+                children=pymodaq.daq_utils.parameter.ioxml.XML_string_to_parameter(
+                    checkpoint['daq_scan_settings'])).saveState(), addChildren=False, removeChildren=False)
+            self.scanner.restore_settings(
+                pymodaq.daq_utils.parameter.ioxml.XML_string_to_parameter(checkpoint['scanner_settings']))
+
+            self.h5saver.set_attr(scan_group, 'scan_done', False)
+            self.update_status(f"Resuming {scan_name} after step {checkpoint['ind_scan']} (average"
+                               f" {checkpoint['ind_average']}) checkpointed on {checkpoint['time']}",
+                               log_type='log')
+            self.start_scan(resume=True)
+
+        except Exception as e:
+            logger.exception(str(e))
+
     def set_ini_positions(self):
         """
             Send the command_DAQ signal with "set_ini_positions" list item as an attribute.
@@ -1654,16 +1816,22 @@ class DAQ_Scan_Acquisition(QObject):
     scan_data_tmp = Signal(OrderedDict)
     status_sig = Signal(list)
 
-    def __init__(self, settings=None, scan_settings=None, h5saver=None, modules_manager=None, scan_parameters=None):
+    def __init__(self, settings=None, scan_settings=None, h5saver=None, modules_manager=None, scan_parameters=None,
+                 resume=False):
 
         """
             DAQ_Scan_Acquisition deal with the acquisition part of daq_scan, that is transferring commands to modules,
             getting back data, saviong and letting know th UI about the scan status
 
+            If resume is True, the acquisition of the current scan group restarts from the step following its last
+            checkpoint (see save_checkpoint) and the data are written into its existing arrays
+
         """
         
         super().__init__()
 
+        self.resume = resume
+        self.Ncheckpoints = 0
         self.stop_scan_flag = False
         self.settings = settings
         self.scan_settings = scan_settings
@@ -1672,6 +1840,9 @@ class DAQ_Scan_Acquisition(QObject):
         self.ind_scan = 0
         self.scan_parameters = scan_parameters
         self.isadaptive = self.scan_parameters.scan_subtype == 'Adaptive'
+        self.isfly = self.settings.child('time_flow', 'fly_scan').value() and \
+            is_fly_scan_possible(self.scan_parameters.scan_type, self.scan_parameters.scan_subtype)
+        self.isspread = self.isadaptive or self.isfly  # data are saved step by step in enlargeable arrays
         self.curvilinear_array = None
         self.modules_manager = modules_manager
         self.modules_manager.timeout_signal.connect(self.timeout)
@@ -1692,6 +1863,12 @@ class DAQ_Scan_Acquisition(QObject):
         self.scan_read_datas = []
         self.move_done_flag = False
         self.det_done_flag = False
+        self.move_done_positions = OrderedDict()
+        self.step_timings = []  # list of (move, grab, save, total) durations in s for each step
+        self.trajectory_chunks = deque(maxlen=2)  # indexes of the first step of the chunks stored by the actuators
+        self.fly_recording = False
+        self.fly_frames = OrderedDict()  # frames grabbed along the current line of a fly scan for each detector
+        self.fly_readbacks = OrderedDict()  # timestamped positions read along the current line for each actuator
 
         self.det_done_datas = OrderedDict()
 
@@ -1756,15 +1933,15 @@ class DAQ_Scan_Acquisition(QObject):
         """
         try:
             if self.scan_parameters.scan_subtype != 'Adaptive':
-                self.modules_manager.move_actuators(list(self.scan_parameters.positions[0]))
+                self.modules_manager.move_actuators(list(self.scan_parameters.get_step(0)[0]))
 
         except Exception as e:
             logger.exception(str(e))
 
-    def init_data(self):
+    def init_data(self, det_done_datas):
         self.channel_arrays = OrderedDict([])
         for ind_det, det_name in enumerate(self.modules_manager.get_names(self.modules_manager.detectors)):
-            datas = self.modules_manager.det_done_datas[det_name]
+            datas = det_done_datas[det_name]
             det_group = self.h5_det_groups[ind_det]
             self.channel_arrays[det_name] = OrderedDict([])
             data_types = ['data0D', 'data1D']
@@ -1805,12 +1982,37 @@ class DAQ_Scan_Acquisition(QObject):
                                                 self.h5saver.add_data(channel_group,
                                                                       data_tmp,
                                                                       scan_type=self.scan_parameters.scan_type,
-                                                                      scan_subtype=self.scan_parameters.scan_subtype,
+                                                                      scan_subtype='Fly' if self.isfly else
+                                                                      self.scan_parameters.scan_subtype,
                                                                       scan_shape=self.scan_shape, init=True,
                                                                       add_scan_dim=True,
-                                                                      enlargeable=self.isadaptive)
+                                                                      enlargeable=self.isspread)
+                                else:  # resumed scan: the data are written into the existing arrays
+                                    self.channel_arrays[det_name][data_type] = self.get_channel_arrays(det_group,
+                                                                                                       data_type)
             pass
 
+    def get_channel_arrays(self, det_group, data_type):
+        """Get the data arrays of the channels of a data group already present in the file (resumed scan)
+
+        Parameters
+        ----------
+        det_group: (GROUP) the detector group
+        data_type: (str) one of 'data0D', 'data1D', 'data2D' or 'dataND'
+
+        Returns
+        -------
+        OrderedDict: the 'Data' array of each channel with the channel name (the title of its group) as key
+        """
+        channel_arrays = OrderedDict([])
+        data_group = self.h5saver.get_node(det_group, utils.capitalize(data_type))
+        for name in sorted(self.h5saver.get_children(data_group)):
+            channel_group = self.h5saver.get_node(data_group, name)
+            channel_arrays['parent'] = channel_group
+            channel_arrays[self.h5saver.get_attr(channel_group, 'TITLE')] = self.h5saver.get_node(channel_group,
+                                                                                                   'Data')
+        return channel_arrays
+
     def start_acquisition(self):
         try:
 
@@ -1826,26 +2028,21 @@ class DAQ_Scan_Acquisition(QObject):
 
             if scan_type == 'Scan1D' or scan_type == 'Scan2D':
                 """creates the X_axis and Y_axis valid only for 1D or 2D scans """
-                if self.isadaptive:
+                if self.isspread:
                     self.scan_x_axis = np.array([0.0, ])
                     self.scan_x_axis_unique = np.array([0.0, ])
                 else:
-                    self.scan_x_axis = self.scan_parameters.positions[:, 0]
+                    self.scan_x_axis = self.scan_parameters.get_axis_positions(0)
                     self.scan_x_axis_unique = self.scan_parameters.axes_unique[0]
 
-                if not self.h5saver.is_node_in_group(self.h5saver.current_scan_group, 'scan_x_axis'):
-                    x_axis_meta = dict(
-                        units=self.modules_manager.actuators[0].settings.child('move_settings', 'units').value(),
-                        label=self.modules_manager.get_names(self.modules_manager.actuators)[0],
-                        nav_index=0)
-
-                    self.navigation_axes.append(self.h5saver.add_navigation_axis(self.scan_x_axis,
-                                                                                 self.h5saver.current_scan_group,
-                                                                                 axis='x_axis',
-                                                                                 metadata=x_axis_meta,
-                                                                                 enlargeable=self.isadaptive))
+                x_axis_meta = dict(
+                    units=self.modules_manager.actuators[0].settings.child('move_settings', 'units').value(),
+                    label=self.modules_manager.get_names(self.modules_manager.actuators)[0],
+                    nav_index=0)
+                self.navigation_axes.append(self.get_set_navigation_axis(self.scan_x_axis, 'x_axis', x_axis_meta,
+                                                                         enlargeable=self.isspread))
 
-                if not self.isadaptive:
+                if not self.isspread:
                     if self.scan_parameters.scan_subtype == 'Linear back to start':
                         self.scan_shape = [len(self.scan_x_axis)]
                     else:
@@ -1854,190 +2051,528 @@ class DAQ_Scan_Acquisition(QObject):
                     self.scan_shape = [0]
 
                 if scan_type == 'Scan2D':  # "means scan 2D"
-                    if self.isadaptive:
+                    if self.isspread:
                         self.scan_y_axis = np.array([0.0, ])
                         self.scan_y_axis_unique = np.array([0.0, ])
                     else:
-                        self.scan_y_axis = self.scan_parameters.positions[:, 1]
+                        self.scan_y_axis = self.scan_parameters.get_axis_positions(1)
                         self.scan_y_axis_unique = self.scan_parameters.axes_unique[1]
 
-                    if not self.h5saver.is_node_in_group(self.h5saver.current_scan_group, 'scan_y_axis'):
-                        y_axis_meta = dict(
-                            units=self.modules_manager.actuators[1].settings.child('move_settings', 'units').value(),
-                            label=self.modules_manager.get_names(self.modules_manager.actuators)[1],
-                            nav_index=1)
-                        self.navigation_axes.append(self.h5saver.add_navigation_axis(self.scan_y_axis,
-                                                                                     self.h5saver.current_scan_group,
-                                                                                     axis='y_axis',
-                                                                                     metadata=y_axis_meta,
-                                                                                     enlargeable=self.isadaptive))
-                    if not self.isadaptive:
+                    y_axis_meta = dict(
+                        units=self.modules_manager.actuators[1].settings.child('move_settings', 'units').value(),
+                        label=self.modules_manager.get_names(self.modules_manager.actuators)[1],
+                        nav_index=1)
+                    self.navigation_axes.append(self.get_set_navigation_axis(self.scan_y_axis, 'y_axis', y_axis_meta,
+                                                                             enlargeable=self.isspread))
+                    if not self.isspread:
                         self.scan_shape.append(len(self.scan_y_axis_unique))
                     else:
                         self.scan_shape.append(0)
 
             elif scan_type == 'Sequential':
                 """Creates axes labelled by the index within the sequence"""
-                self.scan_shape = [len(ax) for ax in self.scan_parameters.axes_unique]
+                if not self.isadaptive:
+                    self.scan_shape = [len(ax) for ax in self.scan_parameters.axes_unique]
+                    nav_axes = self.scan_parameters.axes_unique
+                else:
+                    self.scan_shape = [0, Naxes]
+                    nav_axes = [np.array([0.0, ]) for ind in range(Naxes)]
                 for ind in range(Naxes):
-                    if not self.h5saver.is_node_in_group(self.h5saver.current_scan_group,
-                                                         'scan_{:02d}_axis'.format(ind)):
-                        axis_meta = dict(
-                            units=self.modules_manager.actuators[ind].settings.child('move_settings', 'units').value(),
-                            label=self.modules_manager.get_names(self.modules_manager.actuators)[ind],
-                            nav_index=ind)
-                        self.navigation_axes.append(
-                            self.h5saver.add_navigation_axis(self.scan_parameters.axes_unique[ind],
-                                                             self.h5saver.current_scan_group,
-                                                             axis=f'{ind:02d}_axis', metadata=axis_meta))
+                    axis_meta = dict(
+                        units=self.modules_manager.actuators[ind].settings.child('move_settings', 'units').value(),
+                        label=self.modules_manager.get_names(self.modules_manager.actuators)[ind],
+                        nav_index=ind)
+                    self.navigation_axes.append(self.get_set_navigation_axis(nav_axes[ind], f'{ind:02d}_axis',
+                                                                             axis_meta, enlargeable=self.isadaptive))
 
             elif scan_type == 'Tabular':
                 """Creates axes labelled by the index within the sequence"""
                 if not self.isadaptive:
                     self.scan_shape = [self.scan_parameters.Nsteps, ]
-                    nav_axes = [self.scan_parameters.positions[:, ind] for ind in range(Naxes)]
+                    # tabular scans are never lazy: these are views on the positions given by the user
+                    nav_axes = [self.scan_parameters.get_axis_positions(ind) for ind in range(Naxes)]
                 else:
                     self.scan_shape = [0, Naxes]
                     nav_axes = [np.array([0.0, ]) for ind in range(Naxes)]
 
                 for ind in range(Naxes):
-                    if not self.h5saver.is_node_in_group(self.h5saver.current_scan_group,
-                                                         'scan_{:02d}_axis'.format(ind)):
-                        axis_meta = dict(
-                            units=self.modules_manager.actuators[ind].settings.child('move_settings', 'units').value(),
-                            label=self.modules_manager.get_names(self.modules_manager.actuators)[ind],
-                            nav_index=ind)
-                        self.navigation_axes.append(self.h5saver.add_navigation_axis(nav_axes[ind],
-                                                                                     self.h5saver.current_scan_group,
-                                                                                     axis=f'{ind:02d}_axis',
-                                                                                     metadata=axis_meta,
-                                                                                     enlargeable=self.isadaptive))
+                    axis_meta = dict(
+                        units=self.modules_manager.actuators[ind].settings.child('move_settings', 'units').value(),
+                        label=self.modules_manager.get_names(self.modules_manager.actuators)[ind],
+                        nav_index=ind)
+                    self.navigation_axes.append(self.get_set_navigation_axis(nav_axes[ind], f'{ind:02d}_axis',
+                                                                             axis_meta, enlargeable=self.isadaptive))
 
                 if self.isadaptive:
-                    if not self.h5saver.is_node_in_group(self.h5saver.current_scan_group, 'Curvilinear_axis'):
-                        axis_meta = dict(units='',
-                                         label='Curvilinear coordinate',
-                                         nav_index=-1)
-                        self.curvilinear_array = self.h5saver.add_navigation_axis(np.array([0.0, ]),
-                                                                                  self.h5saver.current_scan_group,
-                                                                                  axis='curvilinear_axis',
-                                                                                  metadata=axis_meta,
-                                                                                  enlargeable=self.isadaptive)
+                    axis_meta = dict(units='',
+                                     label='Curvilinear coordinate',
+                                     nav_index=-1)
+                    self.curvilinear_array = self.get_set_navigation_axis(np.array([0.0, ]), 'curvilinear_axis',
+                                                                          axis_meta, enlargeable=self.isadaptive)
 
             if self.Naverage > 1:
                 self.scan_shape.append(self.Naverage)
 
-            if self.isadaptive:
-                """
-                adaptive_losses = dict(
-                loss1D=['default', 'curvature', 'uniform'],
-                loss2D=['default', 'resolution', 'uniform', 'triangle'])
-                """
-                if self.scan_parameters.scan_type == 'Scan1D' or self.scan_parameters.scan_type == 'Tabular':
-                    if self.scan_parameters.adaptive_loss == 'curvature':
-                        loss = adaptive.learner.learner1D.curvature_loss_function()
-                    elif self.scan_parameters.adaptive_loss == 'uniform':
-                        loss = adaptive.learner.learner1D.uniform_loss
-                    else:
-                        loss = adaptive.learner.learner1D.default_loss
-                    if self.scan_parameters.scan_type == 'Scan1D':
-                        bounds = [self.scan_parameters.starts[0], self.scan_parameters.stops[0]]
-                    else:
-                        length = 0.
-                        for vec in self.scan_parameters.vectors:
-                            length += vec.norm()
-                        bounds = [0., length]
-
-                    learner = adaptive.learner.learner1D.Learner1D(None, bounds=bounds,
-                                                                   loss_per_interval=loss)
-
-                elif self.scan_parameters.scan_type == 'Scan2D':
-                    if self.scan_parameters.adaptive_loss == 'resolution':
-                        loss = adaptive.learner.learner2D.resolution_loss_function(
-                            min_distance=self.scan_parameters.steps[0] / 100,
-                            max_distance=self.scan_parameters.steps[1] / 100)
-                    elif self.scan_parameters.adaptive_loss == 'uniform':
-                        loss = adaptive.learner.learner2D.uniform_loss
-                    elif self.scan_parameters.adaptive_loss == 'triangle':
-                        loss = adaptive.learner.learner2D.triangle_loss
-                    else:
-                        loss = adaptive.learner.learner2D.default_loss
+            ind_start, ind_average_start = 0, 0
+            if self.resume:
+                ind_start, ind_average_start = self.get_resume_index(
+                    self.h5saver.get_checkpoint(self.h5saver.current_scan_group))
 
-                    learner = adaptive.learner.learner2D.Learner2D(None,
-                                                                   bounds=[b for b in zip(self.scan_parameters.starts,
-                                                                                          self.scan_parameters.stops)],
-                                                                   loss_per_triangle=loss)
+            engine = None
+            if self.isadaptive:
+                engine = AdaptiveEngine(get_learner(self.scan_parameters),
+                                        batch_size=self.settings.child('scan_options', 'adaptive_batch').value(),
+                                        velocities=self.scan_parameters.velocities if scan_type != 'Tabular' else
+                                        None)
+                self.init_adaptive_state(get_learner_dimension(self.scan_parameters),
+                                         len(self.modules_manager.get_selected_probed_data('0D')))
+                if self.resume:  # the learner is given back the points already probed
+                    state = get_adaptive_state(self.h5saver, self.h5saver.current_scan_group)
+                    if state is not None:
+                        engine.tell_many(*state)
+
+            if self.resume:
+                self.status_sig.emit(["Update_Status", f"Acquisition has resumed at step {ind_start} (average"
+                                                       f" {ind_average_start})", 'log'])
+            else:
+                self.status_sig.emit(["Update_Status", "Acquisition has started", 'log'])
 
+            self.timeout_scan_flag = False
+            self.step_timings = []
+            try:
+                if self.isfly:
+                    self.fly_acquisition()
                 else:
-                    logger.warning('Adaptive for more than 2 axis is not currently done (sequential adaptive)')
-                    return
+                    self.step_acquisition(engine, ind_start, ind_average_start)
 
-            self.status_sig.emit(["Update_Status", "Acquisition has started", 'log'])
+                if self.modules_manager.move_pending:  # scan stopped while the next move was running
+                    self.modules_manager.wait_move_done()
+            finally:
+                self.h5saver.stop_writer()  # the queued data are written even if the acquisition failed
+            self.h5saver.flush()
+            self.modules_manager.connect_actuators(False)
+            self.modules_manager.connect_detectors(False)
 
-            self.timeout_scan_flag = False
-            for ind_average in range(self.Naverage):
+            self.status_sig.emit(["Update_Status", "Acquisition has finished", 'log'])
+            self.log_step_timings()
+            self.status_sig.emit(["Scan_done"])
+
+        except Exception as e:
+            logger.exception(str(e))
+            # self.status_sig.emit(["Update_Status", getLineInfo() + str(e), 'log'])
+
+    def get_set_navigation_axis(self, data, axis, metadata, enlargeable=False):
+        """Get the navigation axis array of the current scan group, creating it if not already present
+
+        Parameters
+        ----------
+        data: (ndarray) the navigation axis values, saved if the array is created
+        axis: (str) the name of the axis (see H5Saver.add_navigation_axis)
+        metadata: (dict) the metadata of the axis, saved if the array is created
+        enlargeable: (bool) if True the axis is an enlargeable array (spread scans)
+
+        Returns
+        -------
+        CARRAY or EARRAY
+        """
+        name = utils.capitalize(f"{self.h5saver.settings.child(('save_type')).value()}_{axis}")
+        if self.h5saver.is_node_in_group(self.h5saver.current_scan_group, name):  # for instance on resumed scans
+            return self.h5saver.get_node(self.h5saver.current_scan_group, name)
+        return self.h5saver.add_navigation_axis(data, self.h5saver.current_scan_group, axis=axis, metadata=metadata,
+                                                enlargeable=enlargeable)
+
+    def get_resume_index(self, checkpoint):
+        """Get the step (and average) index following a checkpoint, from which a resumed scan restarts
+
+        Parameters
+        ----------
+        checkpoint: (dict) as returned by H5Saver.get_checkpoint
+
+        Returns
+        -------
+        tuple of int: (ind_scan, ind_average)
+        """
+        if checkpoint is None:
+            return 0, 0
+        ind_scan, ind_average = checkpoint['ind_scan'] + 1, checkpoint['ind_average']
+        if not self.isadaptive and ind_scan >= self.scan_parameters.Nsteps:
+            ind_scan, ind_average = 0, ind_average + 1
+        return ind_scan, ind_average
+
+    def save_checkpoint(self, ind_scan, ind_average, completed=False):
+        """Store in the scan group the last completed step so that the scan could be resumed from it if interrupted
+
+        The scanner and DAQ_Scan settings are stored with the first checkpoint. The settings of the modules are the
+        ones saved in the Move and Detector groups. Fly scans are not checkpointed as their steps are the frames
+        grabbed along the lines.
+
+        Parameters
+        ----------
+        ind_scan: (int) index of the last completed step
+        ind_average: (int) average index of the last completed step
+        completed: (bool) True if all the steps of the scan have been acquired
+        """
+        if self.isfly:
+            return
+        settings = dict([])
+        if self.Ncheckpoints == 0:
+            settings = dict(
+                scanner_settings=pymodaq.daq_utils.parameter.ioxml.parameter_to_xml_string(self.scan_settings),
+                daq_scan_settings=pymodaq.daq_utils.parameter.ioxml.parameter_to_xml_string(self.settings))
+        self.h5saver.set_checkpoint(self.h5saver.current_scan_group, ind_scan, ind_average, completed=completed,
+                                    settings=settings)
+        self.Ncheckpoints += 1
+
+    def init_adaptive_state(self, Ndim, Nvalues):
+        """Create the enlargeable arrays of the scan group storing the points and values told to the adaptive learner
+        so that its state can be restored (see adaptive_engine.get_adaptive_state)
+
+        Parameters
+        ----------
+        Ndim: (int) number of coordinates of the learner points
+        Nvalues: (int) number of values told for each point (one per selected 0D channel)
+        """
+        self.adaptive_arrays = []
+        for name, Nitems, meta in [('adaptive_points', Ndim, dict([])),
+                                   ('adaptive_values', Nvalues,
+                                    dict(channels=self.modules_manager.get_selected_probed_data('0D')))]:
+            if self.h5saver.is_node_in_group(self.h5saver.current_scan_group, utils.capitalize(name)):
+                self.adaptive_arrays.append(self.h5saver.get_node(self.h5saver.current_scan_group,
+                                                                  utils.capitalize(name)))
+            else:
+                self.adaptive_arrays.append(self.h5saver.add_array(
+                    self.h5saver.current_scan_group, name, 'adaptive_state', data_shape=(Nitems,),
+                    data_dimension='0D' if Nitems == 1 else '1D', array_type=float, enlargeable=True,
+                    metadata=meta))
+
+    def get_adaptive_positions(self, point):
+        """Get the positions of the actuators from a point asked by the adaptive learner
+
+        Parameters
+        ----------
+        point: (float or tuple) coordinates of the point (the curvilinear coordinate for Tabular scans)
+
+        Returns
+        -------
+        list of float: the positions of the actuators
+        """
+        if self.scan_parameters.scan_type == 'Tabular':  # translate curvilinear position to real coordinates
+            self.curvilinear = point
+            length = 0.
+            for v in self.scan_parameters.vectors:
+                length += v.norm()
+                if length >= self.curvilinear:
+                    vec = v
+                    frac_curvilinear = (self.curvilinear - (length - v.norm())) / v.norm()
+                    break
+
+            position = (vec.vectorize() * frac_curvilinear).translate_to(vec.p1()).p2()
+            return [position.x(), position.y()]
+        return list(np.atleast_1d(point))
+
+    def get_adaptive_values(self):
+        """Get the value(s) to tell the adaptive learner: the ones of the selected 0D channels
+
+        Returns
+        -------
+        float or ndarray: the value of the channel if only one is selected, otherwise the array of their values
+        """
+        values = []
+        for det_channel in self.modules_manager.get_selected_probed_data('0D'):
+            det, channel = det_channel.split('/')
+            values.append(float(np.squeeze(self.modules_manager.det_done_datas[det]['data0D'][channel]['data'])))
+        if len(values) == 1:
+            return values[0]
+        return np.array(values)
+
+    def step_acquisition(self, engine=None, ind_start=0, ind_average_start=0):
+        """Acquire the scan step by step: move the actuators, grab the detectors and save the data for each step
+
+        For adaptive scans, the points are asked by batches to the engine. The next batch is prefetched (and the
+        learner updated) in the engine worker while the last point of the current batch is probed.
+
+        A checkpoint is saved every 'checkpoint_period' steps and when the acquisition stops (see save_checkpoint).
+
+        Parameters
+        ----------
+        engine: (AdaptiveEngine) the engine asked for the next positions in case of adaptive scans
+        ind_start: (int) index of the first step to acquire (for resumed scans)
+        ind_average_start: (int) average index of the first step to acquire (for resumed scans)
+        """
+        pipelined = self.settings.child('time_flow', 'pipelined').value() and not self.isadaptive
+        # actuators able to store the scan positions step through them without receiving them one by one
+        use_trajectory = not self.isadaptive and self.modules_manager.supports_trajectory
+        self.trajectory_chunks.clear()
+        if use_trajectory:
+            use_trajectory = self.load_trajectory_chunks(ind_start)
+            if use_trajectory:
+                self.status_sig.emit(["Update_Status", "Scan positions loaded into the actuators", 'log'])
+        batch = []  # points of the current adaptive batch remaining to be probed
+        point = None
+        checkpoint_period = self.settings.child('scan_options', 'checkpoint_period').value()
+        last_step = None  # (ind_scan, ind_average) of the last completed step
+        Nsteps_done = 0
+        completed = False
+        try:
+            for ind_average in range(ind_average_start, self.Naverage):
                 self.ind_average = ind_average
-                self.ind_scan = -1
+                self.ind_scan = (ind_start if ind_average == ind_average_start else 0) - 1
+                if not self.isadaptive:
+                    steps = self.scan_parameters.iter_steps(self.ind_scan + 1)
                 while True:
                     self.ind_scan += 1
                     if not self.isadaptive:
-                        if self.ind_scan >= len(self.scan_parameters.positions):
+                        if self.ind_scan >= self.scan_parameters.Nsteps:
                             break
-                        positions = self.scan_parameters.positions[self.ind_scan]  # get positions
+                        positions = next(steps)[0]  # get positions
                     else:
-                        positions = learner.ask(1)[0][-1]  # next point to probe
-                        if self.scan_parameters.scan_type == 'Tabular':  # translate normalized curvilinear position to real coordinates
-                            self.curvilinear = positions
-                            length = 0.
-                            for v in self.scan_parameters.vectors:
-                                length += v.norm()
-                                if length >= self.curvilinear:
-                                    vec = v
-                                    frac_curvilinear = (self.curvilinear - (length - v.norm())) / v.norm()
-                                    break
-
-                            position = (vec.vectorize() * frac_curvilinear).translate_to(vec.p1()).p2()
-                            positions = [position.x(), position.y()]
+                        if len(batch) == 0:
+                            batch.extend(engine.ask(point))
+                            if len(batch) == 0:  # nothing left to probe
+                                break
+                        point = batch.pop(0)  # next point to probe
+                        if len(batch) == 0:  # the next batch is computed while probing the last point of this one
+                            engine.prefetch(point)
+                        positions = self.get_adaptive_positions(point)
 
                     self.status_sig.emit(["Update_scan_index", [self.ind_scan, ind_average]])
 
                     if self.stop_scan_flag or self.timeout_scan_flag:
                         break
 
-                    #move motors of modules and wait for move completion
-                    positions = self.modules_manager.order_positions(self.modules_manager.move_actuators(positions))
+                    tstart = perf_counter()
+                    #move motors of modules and wait for move completion (the move may have been started at the
+                    # previous step in pipelined mode)
+                    if self.modules_manager.move_pending:
+                        move_done_positions = self.modules_manager.wait_move_done()
+                    else:
+                        use_trajectory = use_trajectory and self.load_trajectory_chunks(self.ind_scan)
+                        if use_trajectory:
+                            move_done_positions = self.modules_manager.move_trajectory_step(self.ind_scan)
+                        else:
+                            move_done_positions = self.modules_manager.move_actuators(positions)
+                    self.move_done_positions = move_done_positions.copy()
+                    positions = self.modules_manager.order_positions(self.move_done_positions)
+                    tmove = perf_counter()
 
                     QThread.msleep(self.settings.child('time_flow', 'wait_time_between').value())
 
                     #grab datas and wait for grab completion
-                    self.det_done(self.modules_manager.grab_datas(positions=positions), positions)
+                    det_done_datas = self.modules_manager.grab_datas(positions=positions)
+                    tgrab = perf_counter()
+
+                    if pipelined and not (self.stop_scan_flag or self.timeout_scan_flag):
+                        next_index = self.get_next_index()
+                        if next_index is not None:
+                            use_trajectory = use_trajectory and self.load_trajectory_chunks(next_index)
+                            if use_trajectory:
+                                self.modules_manager.move_trajectory_step(next_index, wait=False)
+                            else:
+                                self.modules_manager.move_actuators(self.scan_parameters.get_step(next_index)[0],
+                                                                    wait=False)
+
+                    # save and send datas to the UI
+                    self.det_done(det_done_datas, positions)
+                    tsave = perf_counter()
+                    self.step_timings.append((tmove - tstart, tgrab - tmove, tsave - tgrab, tsave - tstart))
 
                     if self.isadaptive:
-                        det_channel = self.modules_manager.get_selected_probed_data()
-                        det, channel = det_channel[0].split('/')
                         if self.scan_parameters.scan_type == 'Tabular':
-                            self.curvilinear_array.append(np.array([self.curvilinear]))
-                            new_positions = self.curvilinear
-                        elif self.scan_parameters.scan_type == 'Scan1D':
-                            new_positions = positions[0]
-                        else:
-                            new_positions = positions[:]
-
-                        learner.tell(new_positions, self.modules_manager.det_done_datas[det]['data0D'][channel]['data'])
+                            self.h5saver.write_data(self.curvilinear_array, np.array([self.curvilinear]))
+                        # the asked point is told (not the reached positions) as it is pending in the learner
+                        values = self.get_adaptive_values()
+                        engine.tell(point, values)
+                        self.h5saver.write_data(self.adaptive_arrays[0], np.atleast_1d(point))
+                        self.h5saver.write_data(self.adaptive_arrays[1], np.atleast_1d(values))
+
+                    last_step = (self.ind_scan, ind_average)
+                    Nsteps_done += 1
+                    if checkpoint_period > 0 and Nsteps_done % checkpoint_period == 0:
+                        self.save_checkpoint(*last_step)
 
                     # daq_scan wait time
                     QThread.msleep(self.settings.child('time_flow', 'wait_time').value())
+            completed = not (self.stop_scan_flag or self.timeout_scan_flag)
+        finally:
+            if engine is not None:
+                engine.close()
+            if last_step is not None:  # the scan can be resumed if it has been stopped or has failed
+                self.save_checkpoint(*last_step, completed=completed)
+
+    def fly_acquisition(self):
+        """Acquire the scan line by line moving continuously along each line while the detectors grab continuously
+
+        Before each line, the actuators are moved to its first position, then the detectors are started in continuous
+        mode and the actuators are moved to the last position of the line. Each grabbed frame is given the positions
+        of the actuators interpolated at its acquisition time from the timestamped readbacks of their positions
+        (emitted while polling the move) and is saved as a step of a spread scan. Lines made of a single position are
+        acquired step by step.
+
+        If a frame rate is given, the velocity of the actuators along a line is set to one scan step per frame (and
+        restored before moving to the next line), the wait for the end of the line lasting its expected duration
+        on top of the usual timeout.
+
+        The lines are computed chunk by chunk so that the positions of lazy scans are never materialized.
+        """
+        self.connect_fly_signals()
+        self.ind_scan = -1
+        try:
+            for ind_average in range(self.Naverage):
+                self.ind_average = ind_average
+                for ind_start, ind_stop, line_start, line_stop in iter_scan_lines(self.scan_parameters.get_steps,
+                                                                                  self.scan_parameters.Nsteps):
+                    if self.stop_scan_flag or self.timeout_scan_flag:
+                        break
+                    start_positions = self.modules_manager.move_actuators(line_start)
+                    self.fly_frames = OrderedDict([(name, []) for name in self.modules_manager.get_names(
+                        self.modules_manager.detectors)])
+                    tstart = datetime.datetime.now().timestamp()  # the actuators are at rest at the line start
+                    self.fly_readbacks = OrderedDict([(name, [(tstart, start_positions[name])])
+                                                      for name in start_positions])
+                    if ind_start == ind_stop:  # nothing to fly along
+                        det_done_datas = self.modules_manager.grab_datas(
+                            positions=self.modules_manager.order_positions(start_positions))
+                        for name in det_done_datas:
+                            self.fly_frames[name].append(det_done_datas[name])
+                    else:
+                        velocities, timeout = self.get_fly_velocities(line_start, line_stop, ind_stop - ind_start)
+                        self.modules_manager.set_actuators_velocity(velocities)
+                        self.fly_recording = True
+                        self.modules_manager.start_continuous_grab()
+                        self.modules_manager.move_actuators(line_stop, timeout=timeout)
+                        self.modules_manager.stop_continuous_grab()
+                        self.fly_recording = False
+                        self.modules_manager.set_actuators_velocity(OrderedDict([(name, None)
+                                                                                 for name in velocities]))
+                    self.save_fly_line()
+        finally:
+            self.fly_recording = False
+            self.connect_fly_signals(False)
+
+    def get_fly_velocities(self, start_positions, stop_positions, Nsteps):
+        """Get the velocities of the actuators moving along a line of a fly scan and the timeout of this move
 
-            self.h5saver.h5_file.flush()
-            self.modules_manager.connect_actuators(False)
-            self.modules_manager.connect_detectors(False)
+        Parameters
+        ----------
+        start_positions: (ndarray) positions of the actuators at the start of the line
+        stop_positions: (ndarray) positions of the actuators at the end of the line
+        Nsteps: (int) number of scan steps along the line
+
+        Returns
+        -------
+        velocities: (OrderedDict) velocity of each moving actuator (in its units/s), empty if no frame rate is set
+        timeout: (int) timeout in ms of the move along the line, None for the usual one
+        """
+        frame_rate = self.settings.child('time_flow', 'fly_frame_rate').value()
+        if frame_rate <= 0:
+            return OrderedDict(), None
+        act_names = self.modules_manager.get_names(self.modules_manager.actuators)
+        steps = np.abs(np.asarray(stop_positions) - np.asarray(start_positions)) / Nsteps
+        velocities = OrderedDict([(name, float(step * frame_rate)) for name, step in zip(act_names, steps) if step > 0])
+        return velocities, self.modules_manager.timeout + int(1000 * Nsteps / frame_rate)
+
+    def connect_fly_signals(self, connect=True):
+        """Connect (or disconnect) the actuators position readbacks and the detectors grabbed frames to the slots
+        recording them during a fly scan. The readbacks and frames are timestamped in the actuators and detectors
+        threads, the slots being executed directly in the emitting thread so that they are recorded before the end
+        of the line is processed"""
+        for act in self.modules_manager.actuators:
+            if connect:
+                act.move_readback_signal.connect(self.fly_readback, Qt.DirectConnection)
+            else:
+                act.move_readback_signal.disconnect(self.fly_readback)
+        for det in self.modules_manager.detectors:
+            if connect:
+                det.grab_done_signal.connect(self.fly_frame, Qt.DirectConnection)
+            else:
+                det.grab_done_signal.disconnect(self.fly_frame)
 
-            self.status_sig.emit(["Update_Status", "Acquisition has finished", 'log'])
-            self.status_sig.emit(["Scan_done"])
+    def fly_readback(self, name, position, time_stamp):
+        if self.fly_recording:
+            self.fly_readbacks[name].append((time_stamp, position))
 
-        except Exception as e:
-            logger.exception(str(e))
-            # self.status_sig.emit(["Update_Status", getLineInfo() + str(e), 'log'])
+    def fly_frame(self, data):
+        if self.fly_recording:
+            # frames are stored until the end of the line while the detector may reuse its buffers
+            self.fly_frames[data['name']].append(copy.deepcopy(data))
+
+    def save_fly_line(self):
+        """Save the frames grabbed along a line of a fly scan with their interpolated positions
+
+        The nth frames of all detectors are saved as a single step, at the acquisition time of the first detector
+        frame (detectors should be synchronized)
+        """
+        det_names = list(self.fly_frames.keys())
+        Nframes = min([len(self.fly_frames[name]) for name in det_names])
+        if Nframes == 0:
+            return
+        times = np.array([self.fly_frames[det_names[0]][ind]['acq_time_s'] for ind in range(Nframes)])
+        act_names = self.modules_manager.get_names(self.modules_manager.actuators)
+        positions = np.concatenate([get_fly_positions(times, *zip(*sorted(self.fly_readbacks[name])))
+                                    for name in act_names], axis=1)
+        for ind_frame in range(Nframes):
+            if self.stop_scan_flag:
+                break
+            self.ind_scan += 1
+            self.status_sig.emit(["Update_scan_index", [self.ind_scan, self.ind_average]])
+            self.move_done_positions = OrderedDict(zip(act_names, positions[ind_frame]))
+            self.det_done(OrderedDict([(name, self.fly_frames[name][ind_frame]) for name in det_names]),
+                          list(positions[ind_frame]))
+
+    def load_trajectory_chunks(self, index):
+        """Make sure the actuators store the chunk of the scan positions containing the step of the given index and
+        the following chunk, uploading them if needed
+
+        The positions are computed and sent by chunks of LazyScan.chunk_size steps while the scan goes on, so that the
+        positions of long (lazy) scans are never materialized nor uploaded at once. As the actuators, only the last two
+        loaded chunks are kept in trajectory_chunks
+
+        Parameters
+        ----------
+        index: (int) index of the step about to be moved to
+
+        Returns
+        -------
+        bool: False if the actuators could not load a chunk, the scan should then go on with absolute moves
+        """
+        chunk_size = LazyScan.chunk_size
+        ind_chunk = index - index % chunk_size
+        for ind_start in (ind_chunk, ind_chunk + chunk_size):
+            if ind_start >= self.scan_parameters.Nsteps or ind_start in self.trajectory_chunks:
+                continue
+            if ind_start == 0:
+                self.trajectory_chunks.clear()
+            positions = self.scan_parameters.get_steps(ind_start, ind_start + chunk_size)[0]
+            if not self.modules_manager.load_trajectory(positions, ind_start):
+                self.status_sig.emit(["Update_Status", "The actuators could not load the scan positions, moving "
+                                                       "them step by step", 'log'])
+                return False
+            self.trajectory_chunks.append(ind_start)
+        return True
+
+    def get_next_index(self):
+        """Get the index of the step following the current one (ind_scan, ind_average)
+
+        Returns
+        -------
+        int or None if the current step is the last one of the scan
+        """
+        if self.ind_scan + 1 < self.scan_parameters.Nsteps:
+            return self.ind_scan + 1
+        elif self.ind_average + 1 < self.Naverage:
+            return 0
+        return None
+
+    def log_step_timings(self):
+        """Log the mean time spent per step waiting for the actuators, the detectors and saving the data
+
+        In pipelined mode the move time is only the part of the move that has not been overlapped with the saving
+        of the previous step
+        """
+        if len(self.step_timings) != 0:
+            move, grab, save, total = 1000 * np.mean(np.array(self.step_timings), axis=0)
+            self.status_sig.emit(["Update_Status", f"Mean step timing: move {move:.1f} ms, grab {grab:.1f} ms, "
+                                                   f"save {save:.1f} ms, total {total:.1f} ms", 'log'])
 
     def wait_for_det_done(self):
         self.timeout_scan_flag = False
@@ -2061,14 +2596,15 @@ class DAQ_Scan_Acquisition(QObject):
             self.scan_read_datas = det_done_datas[
                 self.settings.child('scan_options', 'plot_from').value()].copy()
 
-            if self.ind_scan == 0 and self.ind_average == 0:  # first occurence=> initialize the channels
-                self.init_data()
+            if len(self.channel_arrays) == 0:  # first occurence=> initialize (or get) the channels
+                with self.h5saver.h5_lock:
+                    self.init_data(det_done_datas)
 
-            if not self.isadaptive:
+            if not self.isspread:
                 if self.scan_parameters.scan_type == 'Tabular':
                     indexes = np.array([self.ind_scan])
                 else:
-                    indexes = self.scan_parameters.axes_indexes[self.ind_scan]
+                    indexes = self.scan_parameters.get_step(self.ind_scan)[1]
 
                 if self.Naverage > 1:
                     indexes = list(indexes)
@@ -2076,9 +2612,9 @@ class DAQ_Scan_Acquisition(QObject):
 
                 indexes = tuple(indexes)
 
-            if self.isadaptive:
+            if self.isspread:
                 for ind_ax, nav_axis in enumerate(self.navigation_axes):
-                    nav_axis.append(np.array(positions[ind_ax]))
+                    self.h5saver.write_data(nav_axis, np.array(positions[ind_ax]))
 
             for ind_det, det_name in enumerate(self.modules_manager.get_names(self.modules_manager.detectors)):
                 datas = det_done_datas[det_name]
@@ -2094,19 +2630,20 @@ class DAQ_Scan_Acquisition(QObject):
                                 for ind_channel, channel in enumerate(datas[data_type]):
                                     if not (self.h5saver.settings.child(
                                             'save_raw_only').value() and datas[data_type][channel]['source'] != 'raw'):
-                                        if not self.isadaptive:
-                                            self.channel_arrays[
-                                                det_name][data_type][channel].__setitem__(
-                                                indexes, value=det_done_datas[det_name][data_type][channel]['data'])
+                                        if not self.isspread:
+                                            self.h5saver.write_data(
+                                                self.channel_arrays[det_name][data_type][channel],
+                                                det_done_datas[det_name][data_type][channel]['data'], indexes)
                                         else:
                                             data = det_done_datas[det_name][data_type][channel]['data']
                                             if isinstance(data, float) or isinstance(data, int):
                                                 data = np.array([data])
-                                            self.channel_arrays[det_name][data_type][channel].append(data)
+                                            self.h5saver.write_data(self.channel_arrays[det_name][data_type][channel],
+                                                                    data)
 
             self.det_done_flag = True
 
-            self.scan_data_tmp.emit(OrderedDict(positions=self.modules_manager.move_done_positions,
+            self.scan_data_tmp.emit(OrderedDict(positions=self.move_done_positions,
                                                 datas=self.scan_read_datas,
                                                 curvilinear=self.curvilinear))
         except Exception as e:
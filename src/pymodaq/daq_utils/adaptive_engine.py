@@ -0,0 +1,236 @@
+# Standard imports
+from concurrent.futures import ThreadPoolExecutor
+
+# 3rd party imports
+import numpy as np
+
+# project imports
+from pymodaq.daq_utils.daq_utils import set_logger, get_module_name
+from pymodaq.daq_utils.scanner import adaptive, optimize_scan_order, ScannerException
+
+logger = set_logger(get_module_name(__file__))
+
+
+def get_learner(scan_parameters):
+    """Create the adaptive learner corresponding to an adaptive scan
+
+    Scan1D, Tabular (curvilinear coordinate) and one axis Sequential scans use a Learner1D, Scan2D a Learner2D and
+    Sequential scans a LearnerND whose bounds are the starts and stops of each axis.
+
+    Parameters
+    ----------
+    scan_parameters: (ScanParameters) parameters of an adaptive scan
+
+    Returns
+    -------
+    adaptive.learner: the learner whose loss is set from scan_parameters.adaptive_loss
+    """
+    if adaptive is None:
+        raise ScannerException('The adaptive module is not present, no adaptive scan possible')
+    scan_type = scan_parameters.scan_type
+    loss_name = scan_parameters.adaptive_loss
+
+    if get_learner_dimension(scan_parameters) == 1:
+        if loss_name == 'curvature':
+            loss = adaptive.learner.learner1D.curvature_loss_function()
+        elif loss_name == 'uniform':
+            loss = adaptive.learner.learner1D.uniform_loss
+        else:
+            loss = adaptive.learner.learner1D.default_loss
+        if scan_type == 'Tabular':
+            bounds = [0., sum([vec.norm() for vec in scan_parameters.vectors])]
+        else:
+            bounds = [scan_parameters.starts[0], scan_parameters.stops[0]]
+        return adaptive.learner.learner1D.Learner1D(None, bounds=bounds, loss_per_interval=loss)
+
+    elif scan_type == 'Scan2D':
+        if loss_name == 'resolution':
+            loss = adaptive.learner.learner2D.resolution_loss_function(
+                min_distance=scan_parameters.steps[0] / 100,
+                max_distance=scan_parameters.steps[1] / 100)
+        elif loss_name == 'uniform':
+            loss = adaptive.learner.learner2D.uniform_loss
+        elif loss_name == 'triangle':
+            loss = adaptive.learner.learner2D.triangle_loss
+        else:
+            loss = adaptive.learner.learner2D.default_loss
+        return adaptive.learner.learner2D.Learner2D(
+            None, bounds=[b for b in zip(scan_parameters.starts, scan_parameters.stops)], loss_per_triangle=loss)
+
+    elif scan_type == 'Sequential':
+        if loss_name == 'curvature':
+            loss = adaptive.learner.learnerND.curvature_loss_function()
+        elif loss_name == 'uniform':
+            loss = adaptive.learner.learnerND.uniform_loss
+        else:
+            loss = adaptive.learner.learnerND.default_loss
+        return adaptive.learner.learnerND.LearnerND(
+            None, bounds=[b for b in zip(scan_parameters.starts, scan_parameters.stops)], loss_per_simplex=loss)
+
+    else:
+        raise ScannerException(f'No adaptive learner for the scan type: {scan_type}')
+
+
+def get_learner_dimension(scan_parameters):
+    """int: the number of coordinates of the points of the learner of an adaptive scan (see get_learner)"""
+    if scan_parameters.scan_type == 'Tabular':
+        return 1  # curvilinear coordinate along the tabular segments
+    return scan_parameters.Naxes
+
+
+def get_adaptive_state(h5saver, scan_group):
+    """Read the points and values told to the learner of an adaptive scan saved in a scan group
+
+    Parameters
+    ----------
+    h5saver: (H5Saver) the object holding the hdf5 file
+    scan_group: (GROUP) the scan group of an adaptive scan
+
+    Returns
+    -------
+    tuple of ndarray: points of shape (Npts, Ndim) and values of shape (Npts, Nvalues) to be passed to
+                      AdaptiveEngine.tell_many, or None if the scan group holds no learner state
+    """
+    if not (h5saver.is_node_in_group(scan_group, 'Adaptive_points') and
+            h5saver.is_node_in_group(scan_group, 'Adaptive_values')):
+        return None
+    points = h5saver.get_node(scan_group, 'Adaptive_points').read()
+    values = h5saver.get_node(scan_group, 'Adaptive_values').read()
+    Npts = min(len(points), len(values))  # in case the scan has been interrupted between two writes
+    return points[:Npts].reshape((Npts, -1)), values[:Npts].reshape((Npts, -1))
+
+
+def order_points_by_travel(points, start=None, velocities=None):
+    """Get an order of the points minimizing the travel time of the actuators when starting from a given position
+
+    Parameters
+    ----------
+    points: (ndarray) points of shape (Npts, Naxes) or (Npts,)
+    start: (ndarray or None) position of shape (Naxes,) from which the actuators start. If None, the path starts
+           from the first point
+    velocities: (sequence like) velocity of each axis (see optimize_scan_order)
+
+    Returns
+    -------
+    ndarray of int: the indexes of the points in the optimized order
+    """
+    points = np.asarray(points, dtype=float)
+    if len(points.shape) == 1:
+        points = np.expand_dims(points, 1)
+    if start is None:
+        return optimize_scan_order(points, velocities)
+    start = np.asarray(start, dtype=float).reshape((1, points.shape[1]))
+    if points.shape[0] < 3:  # too few points for optimize_scan_order: nearest neighbour (Chebyshev distance) first
+        velocities = np.ones(points.shape[1]) if velocities is None else np.asarray(velocities, dtype=float)
+        return np.argsort(np.max(np.abs(points - start) / velocities, axis=1), kind='stable')
+    route = optimize_scan_order(np.concatenate((start, points)), velocities)
+    # the route starts from the start position, the other indexes are shifted by one
+    return route[1:] - 1
+
+
+class AdaptiveEngine:
+    """Drive an adaptive learner asking it for batches of points and telling it the measured values in a worker
+
+    Every call to the learner is executed, in order, by a single worker thread so that the learner computation (loss
+    update and choice of the next points) overlaps with the motion of the actuators and the acquisition of the
+    detectors. The points of a batch are ordered to minimize the travel time from the current position. As the asked
+    points are pending in the learner until their value is told, the next batch may be prefetched while the last
+    point of the current batch is measured.
+
+    The values told to the learner may be scalars or arrays (one value per selected channel) as adaptive learners
+    accept vector valued functions.
+
+    Parameters
+    ----------
+    learner: (adaptive.learner) the learner (see get_learner)
+    batch_size: (int) number of points asked to the learner at once
+    velocities: (sequence like) velocity of each axis used to order the points of a batch (see order_points_by_travel)
+    """
+
+    def __init__(self, learner, batch_size=1, velocities=None):
+        self.learner = learner
+        self.batch_size = max(1, batch_size)
+        self.velocities = velocities
+        self.points = []  # points told to the learner (its state)
+        self.values = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='AdaptiveEngine')
+        self._next_batch = None  # future of the prefetched batch
+
+    def prefetch(self, position=None):
+        """Ask the learner for the next batch of points in the worker, without waiting for it
+
+        Parameters
+        ----------
+        position: (ndarray or None) current position of the actuators in the learner coordinates
+        """
+        if self._next_batch is None:
+            self._next_batch = self._executor.submit(self._ask, position)
+
+    def ask(self, position=None):
+        """Get the next batch of points (the prefetched one if any), ordered from the current position
+
+        Parameters
+        ----------
+        position: (ndarray or None) current position of the actuators in the learner coordinates
+
+        Returns
+        -------
+        list: the points to probe in the learner coordinates (float for 1D learners, tuple otherwise). Empty if the
+              learner has nothing left to probe
+        """
+        self.prefetch(position)
+        batch = self._next_batch.result()
+        self._next_batch = None
+        return batch
+
+    def _ask(self, position):
+        points = self.learner.ask(self.batch_size)[0]
+        if len(points) > 1:
+            order = order_points_by_travel(points, position, self.velocities)
+            points = [points[ind] for ind in order]
+        return list(points)
+
+    def tell(self, point, value):
+        """Tell the learner the value measured at a point, the learner being updated in the worker"""
+        self.points.append(point)
+        self.values.append(value)
+        self._executor.submit(self.learner.tell, point, value).add_done_callback(self._log_error)
+
+    def tell_many(self, points, values):
+        """Tell the learner several values at once, for instance to restore its state (see get_state)"""
+        points = [tuple(point) if np.size(point) > 1 else np.squeeze(point).item() for point in points]
+        values = [np.squeeze(value) if np.size(value) > 1 else np.squeeze(value).item() for value in values]
+        self.points.extend(points)
+        self.values.extend(values)
+        self._executor.submit(self.learner.tell_many, points, values).add_done_callback(self._log_error)
+
+    @staticmethod
+    def _log_error(future):
+        if future.exception() is not None:
+            logger.error(f'The adaptive learner could not be updated: {str(future.exception())}')
+
+    def loss(self):
+        """float: the current loss of the learner (once all the told values have been processed)"""
+        return self._executor.submit(self.learner.loss).result()
+
+    def wait(self):
+        """Block until all the learner updates have been processed"""
+        self._executor.submit(lambda: None).result()
+
+    def get_state(self):
+        """Get the points and values told to the learner
+
+        Returns
+        -------
+        tuple of ndarray: points of shape (Npts, Ndim) and values of shape (Npts, Nvalues)
+        """
+        Npts = len(self.points)
+        return np.array(self.points, dtype=float).reshape((Npts, -1)), \
+            np.array(self.values, dtype=float).reshape((Npts, -1))
+
+    def close(self):
+        """Process the pending learner updates and stop the worker"""
+        if self._next_batch is not None:
+            self._next_batch.cancel()
+            self._next_batch = None
+        self._executor.shutdown(wait=True)
@@ -7,22 +7,18 @@ import numpy as np
 
 
 def random_step(start, stop, step):
-    tmp = start
-    out = np.array([tmp])
+    """Get positions from start to stop (included if reached) with random steps between 0.5 and 1.5 times step"""
     sign = stop - start
     if step == 0:
         raise ValueError('step must be strictly positive or negative')
-    if step > 0 and sign > 0:
-        while tmp <= stop:
-            tmp = tmp + (np.random.random() + 0.5) * step
-            out = np.append(out, tmp)
-    elif step < 0 and sign < 0:
-        while tmp >= stop:
-            tmp = tmp + (np.random.random() + 0.5) * step
-            out = np.append(out, tmp)
-    else:
+    if not ((step > 0 and sign > 0) or (step < 0 and sign < 0)):
         raise ValueError(f'the step value {step} is not of the same sign as stop - start : {sign}')
-    return out[0:-1]
+    Nsteps = int(sign / (0.5 * step)) + 1  # the steps are at least half of step: enough of them to go past stop
+    out = start + np.concatenate(([0.], np.cumsum((np.random.random(Nsteps) + 0.5) * step)))
+    if step > 0:
+        return out[out <= stop]
+    else:
+        return out[out >= stop]
 
 
 def linspace_this_vect(x, y=None, Npts=None):
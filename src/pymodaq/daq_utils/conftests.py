@@ -3,5 +3,7 @@ qtbotskip = False
 
 main_modules_skip = True
 
+benchmark_skip = True  # benchmarks only report timings, set to False and run pytest with -s to see them
+
 
 
@@ -17,7 +17,6 @@ import time
 from logging.handlers import TimedRotatingFileHandler
 from packaging import version as version_mod
 from pathlib import Path
-import pkgutil
 import traceback
 import warnings
 import numbers
@@ -789,6 +788,26 @@ def ensure_ndarray(data):
     return data
 
 
+def read_only_view(data):
+    """
+    Get a read-only view of a numpy array, sharing its memory (no copy of the data)
+
+    Used to pass acquired data downstream (viewers, savers, extensions) without copying them while making sure none of
+    these stages modifies them in place: a stage needing to modify the data should work on a new array (copy-on-write)
+    Parameters
+    ----------
+    data: (ndarray or scalar)
+
+    Returns
+    -------
+    ndarray or scalar: the read-only view if data is a ndarray, data itself otherwise
+    """
+    if isinstance(data, np.ndarray):
+        data = data.view()
+        data.flags.writeable = False
+    return data
+
+
 def setLocale():
     """
     defines the Locale to use to convert numbers to strings representation using language/country conventions
@@ -943,29 +962,18 @@ def get_extensions():
     """
     Get pymodaq extensions as a list
 
+    The extensions are listed from the cached plugin registry, their module is imported on first access
+
     Returns
     -------
     list: list of disct containting the name and module of the found extension
-    """
-    extension_import = []
-    entry_points = metadata.entry_points()
-    if 'pymodaq.extensions' in entry_points:
-        discovered_extension = entry_points['pymodaq.extensions']
-
-        for pkg in discovered_extension:
-            try:
-                module = importlib.import_module(pkg.value)
-                if hasattr(module, 'NICE_NAME'):
-                    name = module.NICE_NAME
-                else:
-                    name = pkg.value
-                extension = {'name': name, 'module': module}
-                extension_import.append(extension)
 
-            except Exception as e:  # pragma: no cover
-                logger.warning(f'Impossible to import the {pkg.value} extension: {str(e)}')
-
-    return extension_import
+    See Also
+    --------
+    pymodaq.daq_utils.plugin_registry.PluginRegistry
+    """
+    from pymodaq.daq_utils.plugin_registry import get_registry
+    return get_registry().get_extensions()
 
 def find_dict_if_matched_key_val(dict_tmp, key, value):
     """
@@ -1016,92 +1024,41 @@ def get_models(model_name=None):
     """
     Get PID Models as a list to instantiate Control Actuators per degree of liberty in the model
 
+    The models are listed from the cached plugin registry, their module and class are imported on first access
+
     Returns
     -------
     list: list of disct containting the name and python module of the found models
+
+    See Also
+    --------
+    pymodaq.daq_utils.plugin_registry.PluginRegistry
     """
-    from pymodaq.pid.utils import PIDModelGeneric
-    models_import = []
-    entry_points = metadata.entry_points()
-    if 'pymodaq.pid_models' in entry_points:
-        discovered_models = entry_points['pymodaq.pid_models']
-        for pkg in discovered_models:
-            try:
-                module = importlib.import_module(pkg.value)
-                module_name = pkg.value
-
-                for mod in pkgutil.iter_modules([str(Path(module.__file__).parent.joinpath('models'))]):
-                    try:
-                        model_module = importlib.import_module(f'{module_name}.models.{mod.name}', module)
-                        classes = inspect.getmembers(model_module, inspect.isclass)
-                        for name, klass in classes:
-                            if klass.__base__ is PIDModelGeneric:
-                                models_import.append({'name': mod.name, 'module': model_module, 'class': klass})
-                                break
-
-                    except Exception as e:  # pragma: no cover
-                        logger.warning(str(e))
-
-            except Exception as e:  # pragma: no cover
-                logger.warning(f'Impossible to import the {pkg.value} extension: {str(e)}')
-
-    if model_name is None:
-        return models_import
-    else:
-        return find_dict_in_list_from_key_val(models_import, 'name', model_name)
+    from pymodaq.daq_utils.plugin_registry import get_registry
+    return get_registry().get_models(model_name)
+
 
-def get_plugins(plugin_type='daq_0Dviewer'):  # pragma: no cover
+def get_plugins(plugin_type='daq_0Dviewer'):
     """
     Get plugins names as a list
+
+    The plugins are listed from the cached plugin registry without being imported: the module of a plugin is
+    imported only once its 'module' key is accessed (that is when the plugin is selected)
+
     Parameters
     ----------
     plugin_type: (str) plugin type either 'daq_0Dviewer', 'daq_1Dviewer', 'daq_2Dviewer', 'daq_NDviewer' or 'daq_move'
-    module: (module) parent module of the plugins
 
     Returns
     -------
+    list: list of dict with keys name and module (the parent package of the plugin module)
 
+    See Also
+    --------
+    pymodaq.daq_utils.plugin_registry.PluginRegistry
     """
-    plugins_import = []
-    discovered_plugins = metadata.entry_points()['pymodaq.plugins']
-
-    for module in discovered_plugins:
-        try:
-            if plugin_type == 'daq_move':
-                submodule = importlib.import_module(f'{module.value}.daq_move_plugins', module.value)
-            else:
-                submodule = importlib.import_module(f'{module.value}.daq_viewer_plugins.plugins_{plugin_type[4:6]}',
-                                                    module.value)
-            plugin_list = [{'name': mod[len(plugin_type) + 1:],
-                            'module': submodule} for mod in [mod[1] for
-                                                             mod in pkgutil.iter_modules([submodule.path.parent])]
-                           if plugin_type in mod]
-            # check if modules are importable
-
-            for mod in plugin_list:
-                try:
-                    if plugin_type == 'daq_move':
-                        importlib.import_module(f'{submodule.__package__}.daq_move_{mod["name"]}')
-                    else:
-                        importlib.import_module(f'{submodule.__package__}.daq_{plugin_type[4:6]}viewer_{mod["name"]}')
-                    plugins_import.append(mod)
-                except Exception as e:  # pragma: no cover
-                    pass
-        except Exception as e:  # pragma: no cover
-            pass
-
-    #add utility plugin for PID
-    if plugin_type == 'daq_move':
-        try:
-            submodule = importlib.import_module('pymodaq.pid')
-
-            plugins_import.append({'name': 'PID', 'module': submodule})
-
-        except Exception:  # pragma: no cover
-            pass
-
-    plugins_import = elt_as_first_element_dicts(plugins_import, match_word='Mock', key='name')
-    return plugins_import
+    from pymodaq.daq_utils.plugin_registry import get_registry
+    return get_registry().get_plugins(plugin_type)
 
 
 def check_vals_in_iterable(iterable1, iterable2):
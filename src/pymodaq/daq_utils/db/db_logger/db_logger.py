@@ -1,15 +1,20 @@
+import io
 import logging
 import datetime
+import time
+import threading
+
+import numpy as np
 
 from pymodaq.daq_utils.config import Config
 from qtpy import QtCore
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, insert, inspect, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy_utils import database_exists, create_database
 from pymodaq.daq_utils.db.db_logger.db_logger_models import Base, Data0D, Data1D, Data2D, LogInfo, Detector, Configuration
 from pymodaq.daq_utils import daq_utils as utils
-from pymodaq.daq_utils.gui_utils import dashboard_submodules_params
+from pymodaq.daq_utils.gui_utils.utils import dashboard_submodules_params
 from pymodaq.daq_utils.messenger import messagebox
 from pymodaq.daq_utils.abstract.logger import AbstractLogger
 from pyqtgraph.parametertree import Parameter, ParameterTree
@@ -31,30 +36,69 @@ class DBLogHandler(logging.StreamHandler):
         self.dblogger.add_log(msg)
 
 
+def encode_array(array):
+    """Encode an array as bytes in the npy format"""
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(array), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def decode_array(value):
+    """Decode an array encoded by encode_array"""
+    return np.load(io.BytesIO(value), allow_pickle=False)
+
+
 class DbLogger:
+    """Log the data of detectors into a database
+
+    The data are inserted using Core bulk inserts (executemany), one per table and per flush. In buffered mode the
+    rows are accumulated in memory and flushed once flush_size rows are pending or flush_period seconds have elapsed
+    since the last flush (by a timer if no other sample is added meanwhile), otherwise each sample is flushed right
+    away. Rows that could not be inserted are kept and inserted by the next flush, up to max_pending rows: the samples
+    added beyond are dropped (with a logged warning) until a flush succeeds.
+
+    Parameters
+    ----------
+    database_name: (str) the name of the postgresql database
+    ip_address: (str) the address of the database server
+    port: (int) the port of the database server
+    save2D: (bool) if True the 2D data are logged
+    url: (str or None) the database url to use instead of the postgresql one (for instance sqlite:///path/to/file)
+    buffered: (bool) if True, the rows are flushed by time and count, otherwise for each sample
+    flush_period: (float) the maximum time in seconds between flushes in buffered mode
+    flush_size: (int) the number of pending rows triggering a flush in buffered mode
+    max_pending: (int) the maximum number of rows kept in memory while the insertions fail
+    binary: (bool) if True, the 1D and 2D data are saved as npy bytes (value_npy column) instead of float arrays
+    """
     user = config('network', 'logging', 'user', 'username')
     user_pwd = config('network', 'logging', 'user', 'pwd')
 
     def __init__(self, database_name, ip_address=config('network', 'logging', 'sql', 'ip'),
-                 port=config('network', 'logging', 'sql', 'port'), save2D=False):
-        """
-
-        Parameters
-        ----------
-        models_base
-        ip_address
-        port
-        database_name
-        """
+                 port=config('network', 'logging', 'sql', 'port'), save2D=False, url=None, buffered=False,
+                 flush_period=1., flush_size=1000, max_pending=100000, binary=False):
 
         self.ip_address = ip_address
         self.port = port
         self.database_name = database_name
+        self.url = url
 
         self.engine = None
         self.Session = None
         self._save2D = save2D
 
+        self._buffered = buffered
+        self.flush_period = flush_period
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self._binary = binary
+        self._detectors_id = dict([])
+        self._rows = {Data0D: [], Data1D: [], Data2D: []}
+        self._Nrows = 0
+        self._Ndropped = 0
+        self._last_flush = time.perf_counter()
+        self._flush_timer = None
+        self._lock = threading.RLock()  # the timer flushes from its own thread
+
     @property
     def save2D(self):
         return self._save2D
@@ -63,6 +107,28 @@ class DbLogger:
     def save2D(self, value):
         self._save2D = value
 
+    @property
+    def buffered(self):
+        return self._buffered
+
+    @buffered.setter
+    def buffered(self, value):
+        self._buffered = value
+        self.flush()  # also restarts the flush period
+
+    @property
+    def binary(self):
+        return self._binary
+
+    @binary.setter
+    def binary(self, value):
+        self._binary = value
+
+    @property
+    def Npending(self):
+        """int: the number of rows waiting to be flushed"""
+        return self._Nrows
+
     @contextmanager
     def session_scope(self):
         """Provide a transactional scope around a series of operations."""
@@ -76,13 +142,17 @@ class DbLogger:
         finally:
             session.close()
 
+    def get_url(self):
+        if self.url is not None:
+            return self.url
+        return f"postgresql://{self.user}:{self.user_pwd}@{self.ip_address}:{self.port}/{self.database_name}"
+
     def connect_db(self):
-        url = f"postgresql://{self.user}:{self.user_pwd}@{self.ip_address}:"\
-              f"{self.port}/{self.database_name}"
+        url = self.get_url()
         logger.debug(f'Connecting database using: {url}')
+        self._detectors_id = dict([])
         try:
-            self.engine = create_engine(f"postgresql://{self.user}:{self.user_pwd}@{self.ip_address}:"
-                                        f"{self.port}/{self.database_name}")
+            self.engine = create_engine(url)
         except ModuleNotFoundError as e:
             messagebox('warning', 'ModuleError',
                        f'The postgresql backend *psycopg2* has not been installed.\n'
@@ -104,13 +174,33 @@ class DbLogger:
         return True
 
     def close(self):
+        if not self.flush():
+            logger.error(f'{self.Npending} rows could not be saved into the database')
+        self.cancel_flush_timer()
         if self.engine is not None:
             self.engine.dispose()
+        self._detectors_id = dict([])
 
     def create_table(self):
         # create tables if not existing
         if self.engine is not None:
             Base.metadata.create_all(self.engine)
+            self.add_missing_columns()
+
+    def add_missing_columns(self):
+        """Add to the existing tables the columns added to the models after their creation (for instance value_npy
+        to tables created before the binary mode), create_all only creating the missing tables"""
+        inspector = inspect(self.engine)
+        preparer = self.engine.dialect.identifier_preparer
+        with self.engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                existing_columns = [column['name'] for column in inspector.get_columns(table.name)]
+                for column in table.columns:
+                    if column.name not in existing_columns:
+                        column_type = column.type.compile(dialect=self.engine.dialect)
+                        connection.execute(text(f'ALTER TABLE {preparer.format_table(table)} '
+                                                f'ADD COLUMN {preparer.format_column(column)} {column_type}'))
+                        logger.info(f'Column {column.name} added to the table {table.name}')
 
     def get_detectors(self, session):
         """Returns the list of detectors name
@@ -149,36 +239,115 @@ class DbLogger:
         with self.session_scope() as session:
             session.add(LogInfo(log))
 
+    def get_detector_id(self, detector_name):
+        """Get the id of a detector, cached after the first query
+
+        Returns
+        -------
+        int or None: None if the detector could not be queried nor added
+        """
+        if detector_name not in self._detectors_id:
+            with self.session_scope() as session:
+                detector = session.query(Detector).filter_by(name=detector_name).first()  # detector names are unique
+                if detector is None:
+                    # security detector adding in case it hasn't been done previously (and properly)
+                    detector = Detector(name=detector_name, settings_xml='')
+                    session.add(detector)
+                    session.flush()
+                self._detectors_id[detector_name] = detector.id
+        return self._detectors_id.get(detector_name, None)
+
+    def encode_value(self, data, dim):
+        """Get the value columns of a row from the data of a channel
+
+        All the rows of a table get the same keys whatever the binary mode, as required by a bulk insert
+        """
+        if dim == 'data0D':
+            return dict(value=float(np.squeeze(data)))
+        elif self.binary:
+            return dict(value=None, value_npy=encode_array(data))
+        else:
+            return dict(value=np.asarray(data).tolist(), value_npy=None)
+
     def add_datas(self, datas):
-        with self.session_scope() as session:
-            time_stamp = datas['acq_time_s']
-            detector_name = datas['name']
-            if session.query(Detector).filter_by(name=detector_name).count() == 0:
-                # security detector adding in case it hasn't been done previously (and properly)
-                self.add_detectors(session, dict(name=detector_name))
-
-            det_id = session.query(Detector).filter_by(name=detector_name).one().id  # detector names should/are unique
-
-            if 'data0D' in datas:
-                for channel in datas['data0D']:
-                    session.add(Data0D(timestamp=time_stamp, detector_id=det_id,
-                                       channel=f"{datas['data0D'][channel]['name']}:{channel}",
-                                       value=datas['data0D'][channel]['data']))
-
-            if 'data1D' in datas:
-                for channel in datas['data1D']:
-                    session.add(Data1D(timestamp=time_stamp, detector_id=det_id,
-                                       channel=f"{datas['data1D'][channel]['name']}:{channel}",
-                                       value=datas['data1D'][channel]['data'].tolist()))
-
-            if 'data2D' in datas and self.save2D:
-                for channel in datas['data2D']:
-                    session.add(Data2D(timestamp=time_stamp, detector_id=det_id,
-                                       channel=f"{datas['data2D'][channel]['name']}:{channel}",
-                                       value=datas['data2D'][channel]['data'].tolist()))
+        """Add the rows of a sample of a detector, flushed depending on the buffered mode (see flush)
 
+        Parameters
+        ----------
+        datas: (dict) with keys name (the detector name), acq_time_s and data0D, data1D, data2D (dicts of channels)
+        """
+        det_id = self.get_detector_id(datas['name'])
+        if det_id is None:
+            return
+        time_stamp = datas['acq_time_s']
+
+        with self._lock:
+            if self._Nrows >= self.max_pending:
+                if self._Ndropped == 0:
+                    logger.warning(f'{self._Nrows} rows are already waiting to be inserted, the next samples are '
+                                   f'dropped until the database is available')
+                self._Ndropped += 1
+                return
+            for dim, model in zip(['data0D', 'data1D', 'data2D'], [Data0D, Data1D, Data2D]):
+                if dim in datas and (dim != 'data2D' or self.save2D):
+                    for channel in datas[dim]:
+                        row = dict(timestamp=time_stamp, detector_id=det_id,
+                                   channel=f"{datas[dim][channel]['name']}:{channel}")
+                        row.update(self.encode_value(datas[dim][channel]['data'], dim))
+                        self._rows[model].append(row)
+                        self._Nrows += 1
             # not yet dataND as db should not know where to save these datas
 
+            if not self.buffered or self._Nrows >= self.flush_size or \
+                    time.perf_counter() - self._last_flush >= self.flush_period:
+                self.flush()
+            elif self._flush_timer is None:
+                self.start_flush_timer()
+
+    def start_flush_timer(self):
+        """Flush the pending rows at the end of the flush period even if no other sample is added meanwhile"""
+        delay = max(0., self.flush_period - (time.perf_counter() - self._last_flush))
+        self._flush_timer = threading.Timer(delay, self.flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def cancel_flush_timer(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    def flush(self):
+        """Insert the pending rows with one bulk insert per table, within a single transaction
+
+        If the insertion fails, the rows are kept to be inserted by the next flush (retried after the flush period in
+        buffered mode)
+
+        Returns
+        -------
+        bool: True if there is no row left to insert
+        """
+        with self._lock:
+            self.cancel_flush_timer()
+            self._last_flush = time.perf_counter()
+            if self._Nrows == 0 or self.engine is None:
+                return self._Nrows == 0
+            try:
+                with self.engine.begin() as connection:
+                    for model, rows in self._rows.items():
+                        if len(rows) != 0:
+                            connection.execute(insert(model.__table__), rows)
+            except Exception as e:
+                logger.error(f'{self._Nrows} rows could not be inserted, they are kept for the next flush: {str(e)}')
+                if self.buffered:
+                    self.start_flush_timer()
+                return False
+            self._rows = {model: [] for model in self._rows}
+            self._Nrows = 0
+            if self._Ndropped != 0:
+                logger.warning(f'{self._Ndropped} samples have been dropped while the database was not available')
+                self._Ndropped = 0
+            return True
+
 
 class DbLoggerGUI(DbLogger, QtCore.QObject):
     params = [
@@ -191,6 +360,14 @@ class DbLoggerGUI(DbLogger, QtCore.QObject):
             'value': config('network', 'logging', 'sql', 'port')},
         {'title': 'Connect:', 'name': 'connect_db', 'type': 'bool_push', 'value': False},
         {'title': 'Connected:', 'name': 'connected_db', 'type': 'led', 'value': False},
+        {'title': 'Buffered:', 'name': 'buffered', 'type': 'bool', 'value': False,
+         'tip': 'Accumulate the data in memory and insert them in bulk by time or number of rows'},
+        {'title': 'Flush period (s):', 'name': 'flush_period', 'type': 'float', 'value': 1., 'min': 0.},
+        {'title': 'Flush size (rows):', 'name': 'flush_size', 'type': 'int', 'value': 1000, 'min': 1},
+        {'title': 'Max pending (rows):', 'name': 'max_pending', 'type': 'int', 'value': 100000, 'min': 1,
+         'tip': 'Maximum number of rows kept in memory while the database is not available'},
+        {'title': 'Binary arrays:', 'name': 'binary', 'type': 'bool', 'value': False,
+         'tip': 'Save the 1D and 2D data as npy bytes instead of arrays of floats'},
     ] + dashboard_submodules_params
 
     def __init__(self, database_name):
@@ -244,6 +421,21 @@ class DbLoggerGUI(DbLogger, QtCore.QObject):
                 elif param.name() == 'save_2D':
                     self.save2D = param.value()
 
+                elif param.name() == 'buffered':
+                    self.buffered = param.value()
+
+                elif param.name() == 'flush_period':
+                    self.flush_period = param.value()
+
+                elif param.name() == 'flush_size':
+                    self.flush_size = param.value()
+
+                elif param.name() == 'max_pending':
+                    self.max_pending = param.value()
+
+                elif param.name() == 'binary':
+                    self.binary = param.value()
+
             elif change == 'parent':
                 pass
 
@@ -282,10 +474,10 @@ class DataBaseLogger(AbstractLogger):
             self.settings.child(('N_saved')).value() + 1)
 
     def stop_logger(self):
-        pass
+        self.dblogger.flush()
 
     def close(self):
-        pass
+        self.dblogger.close()
 
 
 if __name__ == '__main__':
@@ -1,7 +1,7 @@
 import datetime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, LargeBinary, JSON
 from sqlalchemy.dialects.postgresql import ARRAY as Array
 Base = declarative_base()
 
@@ -58,7 +58,8 @@ class Data1D(Base):
     timestamp = Column(Integer, nullable=False, index=True)
     detector_id = Column(Integer, ForeignKey('detectors.id'), index=True)
     channel = Column(String(128))
-    value = Column(Array(Float, dimensions=1))
+    value = Column(Array(Float, dimensions=1).with_variant(JSON(), 'sqlite'))
+    value_npy = Column(LargeBinary)  # the array encoded in the npy format (binary mode of the DbLogger)
 
     def __repr__(self):
         return f"<Data1D(channel='{self.channel}', timestamp='{self.timestamp}', value='{self.value}')>"
@@ -71,7 +72,8 @@ class Data2D(Base):
     timestamp = Column(Integer, nullable=False, index=True)
     detector_id = Column(Integer, ForeignKey('detectors.id'), index=True)
     channel = Column(String(128))
-    value = Column(Array(Float, dimensions=2))
+    value = Column(Array(Float, dimensions=2).with_variant(JSON(), 'sqlite'))
+    value_npy = Column(LargeBinary)  # the array encoded in the npy format (binary mode of the DbLogger)
 
     def __repr__(self):
         return f"<Data2D(channel='{self.channel}', timestamp='{self.timestamp}', value='{self.value}')>"
@@ -45,6 +45,69 @@ except Exception as e:                              # pragma: no cover
 if not (is_tables or is_h5py or is_h5pyd):
     logger.exception('No valid hdf5 backend has been installed, please install either pytables or h5py')
 
+is_hdf5plugin = True
+# registers the blosc/lz4/zstd filters for h5py
+try:
+    import hdf5plugin
+except Exception:                                   # pragma: no cover
+    is_hdf5plugin = False
+
+CHUNK_BYTES = 2 ** 20  # default target size of a chunk in bytes
+EXPECTED_ROWS = 1000  # default expected number of rows of enlargeable arrays
+blosc_compressors = ['blosclz', 'lz4', 'lz4hc', 'zlib', 'zstd']
+
+
+def compression_libraries(backend='tables'):
+    """Get the compression libraries usable with a given backend
+
+    zlib and gzip are compatible, they are both always present (see H5Backend.define_compression). The fast blosc
+    compressors are given as 'blosc:compressor' (for h5py, they need the hdf5plugin package)
+    """
+    libraries = ['zlib', 'gzip']
+    if backend == 'tables':
+        if is_tables:
+            libraries.extend([lib for lib in tables.filters.all_complibs if lib != 'zlib' and
+                              tables.which_lib_version(lib.split(':')[0]) is not None])
+    else:
+        libraries.append('lzf')
+        if is_hdf5plugin:
+            libraries.extend([f'blosc:{comp}' for comp in blosc_compressors])
+    return libraries
+
+
+def get_chunk_shape(shape, itemsize, Nnav=0, chunk_bytes=CHUNK_BYTES):
+    """Plan the chunk shape of an array so that a chunk is about chunk_bytes large
+
+    The data dimensions (the last ones) are kept whole as long as one data element fits into a chunk, otherwise the
+    largest of them are halved until it does. The remaining room is then filled along the navigation dimensions (the
+    Nnav first ones, that is the scan dimensions or the enlargeable one), starting from the last one, that is the one
+    varying the fastest while scanning.
+
+    Parameters
+    ----------
+    shape: (iterable of int) the array shape (for an enlargeable array, its first element is the expected number of
+           rows)
+    itemsize: (int) the number of bytes of an element of the array
+    Nnav: (int) the number of navigation dimensions
+    chunk_bytes: (int) target size of a chunk in bytes
+
+    Returns
+    -------
+    tuple of int: the chunk shape
+    """
+    shape = [max(1, int(dim)) for dim in shape]
+    chunk = shape[Nnav:]
+    while int(np.prod(chunk)) * itemsize > chunk_bytes and max(chunk) > 1:
+        ind = int(np.argmax(chunk))
+        chunk[ind] = (chunk[ind] + 1) // 2
+
+    room = max(1, chunk_bytes // (int(np.prod(chunk)) * itemsize))
+    nav_chunk = []
+    for dim in reversed(shape[:Nnav]):
+        nav_chunk.insert(0, min(dim, room))
+        room = max(1, room // dim)
+    return tuple(nav_chunk + chunk)
+
 #As I understand, the Node object should never be instanciated
 class Node(object):
     def __init__(self, node, backend):
@@ -264,6 +327,20 @@ class EARRAY(CARRAY):
             self.array.resize(self.array.len() + 1, axis=0)
             self.array[-1] = data
 
+    def append_rows(self, data):
+        """Append several rows at once, the first dimension of data being the number of rows to append"""
+        nrows = data.shape[0]
+        if self.backend == 'tables':
+            self.array.append(data)
+        else:
+            length = self.array.len()
+            self.array.resize(length + nrows, axis=0)
+            self.array[length:] = data
+
+        sh = list(self.attrs['shape'])
+        sh[0] += nrows
+        self.attrs['shape'] = tuple(sh)
+
 
 class VLARRAY(EARRAY):
     def __init__(self, array, backend):
@@ -412,6 +489,8 @@ class H5Backend:
         self.backend = backend
         self.file_path = None
         self.compression = None
+        self.chunk_bytes = CHUNK_BYTES
+        self.invalidate_index()
         if backend == 'tables':
             if is_tables:
                 self.h5module = tables
@@ -436,6 +515,39 @@ class H5Backend:
     def h5file(self, file):
         self.file_path = file.filename
         self._h5file = file
+        self.invalidate_index()
+
+    def invalidate_index(self):
+        """Clear the in-memory index of the file nodes
+
+        The index maps node paths to Node objects, group paths to their children and (parent path, title) to child
+        groups so that repeated lookups (get_node, get_children, get_group_by_title) do not read the file again. It
+        is kept coherent by the methods of this object creating nodes and has to be invalidated if the file is
+        modified by other means.
+        """
+        self._nodes_index = dict([])
+        self._children_index = dict([])
+        self._titles_index = dict([])
+
+    def _get_path(self, node):
+        """Get the path of a backend node object (or of a path string)"""
+        if isinstance(node, str):
+            return node
+        if self.backend == 'tables':
+            return node._v_pathname
+        else:
+            return node.name
+
+    def _index_node(self, node):
+        """Add a newly created Node to the index (and to the children of its parent if already indexed)"""
+        path = node.path
+        self._nodes_index[path] = node
+        parent_path, name = path.rsplit('/', 1)
+        parent_path = parent_path if parent_path != '' else '/'
+        if parent_path in self._children_index:
+            self._children_index[parent_path][name] = node
+            if isinstance(node, GROUP) and parent_path in self._titles_index:
+                self._titles_index[parent_path].setdefault(node.attrs['TITLE'], node)
 
     def isopen(self):
         if self._h5file is None:
@@ -450,6 +562,7 @@ class H5Backend:
     def close_file(self):
         """Flush data and close the h5file
         """
+        self.invalidate_index()
         try:
             if self._h5file is not None:
                 self.flush()
@@ -460,6 +573,7 @@ class H5Backend:
 
     def open_file(self, fullpathname, mode='r', title='PyMoDAQ file', **kwargs):
         self.file_path = fullpathname
+        self.invalidate_index()
         if self.backend == 'tables':
             self._h5file = self.h5module.open_file(str(fullpathname), mode=mode, title=title, **kwargs)
             if mode == 'w':
@@ -507,7 +621,9 @@ class H5Backend:
         Parameters
         ----------
         compression: (str) either gzip and zlib are supported here as they are compatible
-                        but zlib is used by pytables while gzip is used by h5py
+                        but zlib is used by pytables while gzip is used by h5py. The faster blosc compressors
+                        (as 'blosc:lz4', 'blosc:zstd'...) and lzf (h5py only) are also supported, see
+                        compression_libraries
         compression_opts (int) : 0 to 9  0: None, 9: maximum compression
         """
         #
@@ -518,7 +634,16 @@ class H5Backend:
         else:
             if compression == 'zlib':
                 compression = 'gzip'
-            self.compression = dict(compression=compression, compression_opts=compression_opts)
+            if compression.startswith('blosc'):
+                if not is_hdf5plugin:
+                    raise ImportError('the hdf5plugin module is needed to use blosc compressors with h5py')
+                cname = compression.split(':')[1] if ':' in compression else 'blosclz'
+                self.compression = dict(hdf5plugin.Blosc(cname=cname, clevel=compression_opts,
+                                                         shuffle=hdf5plugin.Blosc.SHUFFLE))
+            elif compression == 'lzf':
+                self.compression = dict(compression=compression)
+            else:
+                self.compression = dict(compression=compression, compression_opts=compression_opts)
 
     def get_set_group(self, where, name, title=''):
         """Retrieve or create (if absent) a node group
@@ -540,13 +665,16 @@ class H5Backend:
         if isinstance(where, Node):
             where = where.node
 
-        if name not in list(self.get_children(where)):
+        if name not in self._get_children(where):
             if self.backend == 'tables':
                 group = self._h5file.create_group(where, name, title)
             else:
                 group = self.get_node(where).node.create_group(name)
                 group.attrs['TITLE'] = title
                 group.attrs['CLASS'] = 'GROUP'
+            group = GROUP(group, self.backend)
+            self._index_node(group)
+            return group
 
         else:
             group = self.get_node(where, name)
@@ -556,13 +684,14 @@ class H5Backend:
         if isinstance(where, Node):
             where = where.node
 
-        node = self.get_node(where).node
-        for child_name in self.get_children(node):
-            child = node[child_name]
-            if 'TITLE' in self.get_attr(child):
-                if self.get_attr(child, 'TITLE') == title and self.get_attr(child, 'CLASS') == 'GROUP':
-                    return GROUP(child, self.backend)
-        return None
+        path = self._get_path(where)
+        if path not in self._titles_index:
+            titles = dict([])
+            for child in self._get_children(where).values():
+                if isinstance(child, GROUP) and 'TITLE' in child.attrs.attrs_name:
+                    titles.setdefault(child.attrs['TITLE'], child)
+            self._titles_index[path] = titles
+        return self._titles_index[path].get(title, None)
 
     def is_node_in_group(self, where, name):
         """
@@ -582,7 +711,7 @@ class H5Backend:
         if isinstance(where, Node):
             where = where.node
 
-        return name.lower() in [name.lower() for name in self.get_children(where)]
+        return name.lower() in [name.lower() for name in self._get_children(where)]
 
     def get_node(self, where, name=None) -> Node:
         """This method returns a node object (for sure?) that"""
@@ -590,6 +719,17 @@ class H5Backend:
         if isinstance(where, Node):
             where = where.node
 
+        path = self._get_path(where)
+        if name is not None:
+            path = f"{path.rstrip('/')}/{name}"
+        if path in self._nodes_index:
+            return self._nodes_index[path]
+        node = self._get_node(where, name)
+        self._nodes_index[path] = node
+        return node
+
+    def _get_node(self, where, name=None) -> Node:
+
         #Then we get back to a node object but backend-dependent
         if self.backend == 'tables':
             node = self._h5file.get_node(where, name)
@@ -678,7 +818,14 @@ class H5Backend:
         --------
         children_name, Node, CARRAY, EARRAY, VLARRAY or StringARRAY
         """
+        return dict(self._get_children(where))
+
+    def _get_children(self, where):
+        """Get the indexed dict of the children of where (not to be modified), see get_children"""
         where = self.get_node(where)  # return a node object in case where is a string
+        path = where.path
+        if path in self._children_index:
+            return self._children_index[path]
         if isinstance(where, Node):
             where = where.node
 
@@ -701,6 +848,7 @@ class H5Backend:
                 else:
                     _cls = GROUP
                 children[child_name] = _cls(child, self.backend)
+        self._children_index[path] = children
         return children
 
     def walk_nodes(self, where):
@@ -735,22 +883,42 @@ class H5Backend:
         else:
             return array[:]
 
-    def create_carray(self, where, name, obj=None, title=''):
+    def create_carray(self, where, name, obj=None, title='', Nnav=0):
+        """create a chunked array initialized with obj
+
+        Parameters
+        ----------
+        where: (str) group location in the file where to create the array node
+        name: (str) name of the array
+        obj: (ndarray) the array data
+        title: (str) node title attribute (written in capitals)
+        Nnav: (int) number of leading navigation (scan) dimensions of obj, used to plan the chunk shape
+
+        See Also
+        --------
+        get_chunk_shape
+        """
         if isinstance(where, Node):
             where = where.node
         if obj is None:
             raise ValueError('Data to be saved as carray cannot be None')
         dtype = obj.dtype
+        chunk_shape = None
+        if obj.ndim > 0 and obj.size > 0:
+            chunk_shape = get_chunk_shape(obj.shape, dtype.itemsize, Nnav, self.chunk_bytes)
         if self.backend == 'tables':
             array = CARRAY(self._h5file.create_carray(where, name, obj=obj,
                                                       title=title,
-                                                      filters=self.compression), self.backend)
+                                                      filters=self.compression, chunkshape=chunk_shape),
+                           self.backend)
         else:
             if self.compression is not None:
-                array = CARRAY(self.get_node(where).node.create_dataset(name, data=obj, **self.compression),
+                array = CARRAY(self.get_node(where).node.create_dataset(name, data=obj, chunks=chunk_shape,
+                                                                        **self.compression),
                                self.backend)
             else:
-                array = CARRAY(self.get_node(where).node.create_dataset(name, data=obj), self.backend)
+                array = CARRAY(self.get_node(where).node.create_dataset(name, data=obj, chunks=chunk_shape),
+                               self.backend)
             array.array.attrs['TITLE'] = title
             array.array.attrs[
                 'CLASS'] = 'CARRAY'  # direct writing using h5py to be compatible with pytable automatic class writing as binary
@@ -758,24 +926,32 @@ class H5Backend:
         array.attrs['dtype'] = dtype.name
         array.attrs['subdtype'] = ''
         array.attrs['backend'] = self.backend
+        self._index_node(array)
         return array
 
-    def create_earray(self, where, name, dtype, data_shape=None, title=''):
+    def create_earray(self, where, name, dtype, data_shape=None, title='', expected_rows=None):
         """create enlargeable arrays from data with a given shape and of a given type. The array is enlargeable along
         the first dimension
+
+        The chunk shape is planned from the data shape and the expected number of rows (EXPECTED_ROWS if None) so
+        that a chunk holds many rows, see get_chunk_shape
         """
         if isinstance(where, Node):
             where = where.node
         dtype = np.dtype(dtype)
+        if expected_rows is None:
+            expected_rows = EXPECTED_ROWS
         shape = [0]
         if data_shape is not None:
             shape.extend(list(data_shape))
         shape = tuple(shape)
+        chunk_shape = get_chunk_shape((expected_rows,) + shape[1:], dtype.itemsize, 1, self.chunk_bytes)
 
         if self.backend == 'tables':
             atom = self.h5module.Atom.from_dtype(dtype)
             array = EARRAY(self._h5file.create_earray(where, name, atom, shape=shape, title=title,
-                                                      filters=self.compression), self.backend)
+                                                      filters=self.compression, expectedrows=expected_rows,
+                                                      chunkshape=chunk_shape), self.backend)
         else:
             maxshape = [None]
             if data_shape is not None:
@@ -784,10 +960,11 @@ class H5Backend:
             if self.compression is not None:
                 array = EARRAY(
                     self.get_node(where).node.create_dataset(name, shape=shape, dtype=dtype, maxshape=maxshape,
-                                                             **self.compression), self.backend)
+                                                             chunks=chunk_shape, **self.compression), self.backend)
             else:
                 array = EARRAY(
-                    self.get_node(where).node.create_dataset(name, shape=shape, dtype=dtype, maxshape=maxshape),
+                    self.get_node(where).node.create_dataset(name, shape=shape, dtype=dtype, maxshape=maxshape,
+                                                             chunks=chunk_shape),
                     self.backend)
             array.array.attrs['TITLE'] = title
             array.array.attrs[
@@ -797,6 +974,7 @@ class H5Backend:
         array.attrs['dtype'] = dtype.name
         array.attrs['subdtype'] = ''
         array.attrs['backend'] = self.backend
+        self._index_node(array)
         return array
 
     def create_vlarray(self, where, name, dtype, title=''):
@@ -859,6 +1037,7 @@ class H5Backend:
         array.attrs['dtype'] = dtype.name
         array.attrs['subdtype'] = subdtype
         array.attrs['backend'] = self.backend
+        self._index_node(array)
         return array
 
     def add_group(self, group_name, group_type, where, title='', metadata=dict([])):
@@ -7,6 +7,7 @@ import logging
 import copy
 from pathlib import Path
 import importlib
+import threading
 
 # 3rd party imports
 from qtpy import QtGui, QtCore, QtWidgets
@@ -26,7 +27,8 @@ from pymodaq.daq_utils.gui_utils.dock import DockArea
 from pymodaq.daq_utils.gui_utils.utils import dashboard_submodules_params
 from pymodaq.daq_utils.plotting.data_viewers.viewerND import ViewerND
 from pymodaq.daq_utils.abstract.logger import AbstractLogger
-from pymodaq.daq_utils.h5backend import H5Backend, backends_available, Node
+from pymodaq.daq_utils.h5backend import H5Backend, backends_available, Node, compression_libraries
+from pymodaq.daq_utils.h5writer import H5Writer
 from pymodaq.daq_utils.h5exporters import ExporterFactory
 from pymodaq.daq_utils.h5utils import get_h5_data_from_node
 from pymodaq.daq_utils.exceptions import InvalidSave, InvalidGroupDataType, InvalidDataDimension, \
@@ -46,7 +48,7 @@ version = '0.0.1'
 save_types = ['scan', 'detector', 'logger', 'custom']
 group_types = ['raw_datas', 'scan', 'detector', 'move', 'data', 'ch', '', 'external_h5']
 group_data_types = ['data0D', 'data1D', 'data2D', 'dataND']
-data_types = ['data', 'axis', 'live_scan', 'navigation_axis', 'external_h5', 'strings', 'bkg']
+data_types = ['data', 'axis', 'live_scan', 'navigation_axis', 'external_h5', 'strings', 'bkg', 'adaptive_state']
 data_dimensions = ['0D', '1D', '2D', 'ND']
 scan_types = ['']
 scan_types.extend(stypes)
@@ -144,6 +146,25 @@ class H5SaverBase(H5Backend):
                    'limits': ['zlib', 'gzip']},
                   {'title': 'Compression level:', 'name': 'h5comp_level', 'type': 'int',
                    'value': config('data_saving', 'h5file', 'compression_level'), 'min': 0, 'max': 9},
+                  {'title': 'Chunk size (kB):', 'name': 'chunk_size', 'type': 'int',
+                   'value': config('data_saving', 'h5file', 'chunk_size'), 'min': 1,
+                   'tip': 'Target size of the chunks in which arrays are stored (and compressed)'},
+              ]},
+              {'title': 'Asynchronous writing:', 'name': 'writer', 'type': 'group', 'expanded': False, 'children': [
+                  {'title': 'Write in background:', 'name': 'async_write', 'type': 'bool',
+                   'value': config('data_saving', 'h5writer', 'async_write'),
+                   'tip': 'Data are written to disk by a background thread so that the acquisition does not wait for'
+                          ' it'},
+                  {'title': 'Queue size:', 'name': 'queue_size', 'type': 'int',
+                   'value': config('data_saving', 'h5writer', 'queue_size'), 'min': 1},
+                  {'title': 'Flush period (ms):', 'name': 'flush_period', 'type': 'int',
+                   'value': config('data_saving', 'h5writer', 'flush_period'), 'min': 0},
+                  {'title': 'Flush size:', 'name': 'flush_size', 'type': 'int',
+                   'value': config('data_saving', 'h5writer', 'flush_size'), 'min': 1,
+                   'tip': 'Maximum number of writes between two flushes of the file'},
+                  {'title': 'Queue depth:', 'name': 'queue_depth', 'type': 'int', 'value': 0, 'readonly': True},
+                  {'title': 'N blocked:', 'name': 'Nblocked', 'type': 'int', 'value': 0, 'readonly': True,
+                   'tip': 'Number of times the acquisition had to wait for the queue to have some room'},
               ]},
               ]
 
@@ -173,9 +194,14 @@ class H5SaverBase(H5Backend):
         self.current_scan_name = None
         self.raw_group = None
 
+        self.h5_lock = threading.RLock()  # to be held when accessing the file while the writer is running
+        self.writer = None
+
         self.settings = Parameter.create(title='Saving settings', name='save_settings', type='group',
                                          children=self.params)
         self.settings.child(('save_type')).setValue(save_type)
+        self.settings.child('compression_options', 'h5comp_library').setLimits(compression_libraries(backend))
+        self.chunk_bytes = self.settings.child('compression_options', 'chunk_size').value() * 1024
 
         # self.settings.child('saving_options', 'save_independent').show(save_type == 'scan')
         # self.settings.child('saving_options', 'do_save').show(not save_type == 'scan')
@@ -188,6 +214,66 @@ class H5SaverBase(H5Backend):
     def h5_file(self):
         return self._h5file
 
+    def start_writer(self):
+        """Start the background thread writing the data passed to `write_data`"""
+        if self.writer is None:
+            self.writer = H5Writer(self.h5_lock, lambda: H5Backend.flush(self),
+                                   queue_size=self.settings.child('writer', 'queue_size').value(),
+                                   flush_period=self.settings.child('writer', 'flush_period').value(),
+                                   flush_size=self.settings.child('writer', 'flush_size').value())
+        self.writer.start()
+
+    def stop_writer(self):
+        """Write all the queued data, flush the file and stop the background writer"""
+        if self.writer is not None:
+            try:
+                self.writer.stop()
+            finally:
+                self.update_writer_status()
+                self.writer = None
+
+    def update_writer_status(self):
+        """Display the queue depth and backpressure of the writer, done when flushing and not on each write that may
+        be called from an acquisition thread"""
+        self.settings.child('writer', 'queue_depth').setValue(self.writer.depth)
+        self.settings.child('writer', 'Nblocked').setValue(self.writer.Nblocked)
+
+    def write_data(self, array, data, index=None):
+        """Write data into an array, either directly or by the background writer if asynchronous writing is on
+
+        Parameters
+        ----------
+        array: (CARRAY or EARRAY) the array to write into
+        data: (ndarray or scalar) the data to write
+        index: (tuple or None) where to write data in a CARRAY, None to append it to an EARRAY
+
+        See Also
+        --------
+        H5Writer
+        """
+        if self.settings.child('writer', 'async_write').value():
+            if self.writer is None:
+                self.start_writer()
+            self.writer.put(array, data, index)
+        elif index is None:
+            array.append(data)
+        else:
+            array[index] = data
+
+    def flush(self):
+        """Flush the file once all the data queued to the background writer (if any) have been written"""
+        if self.writer is not None:
+            self.writer.join()
+            self.update_writer_status()
+        with self.h5_lock:
+            super().flush()
+
+    def close_file(self):
+        try:
+            self.stop_writer()
+        finally:
+            super().close_file()
+
     def init_file(self, update_h5=False, custom_naming=False, addhoc_file_path=None, metadata=dict([]),
                   raw_group_name='Raw_datas'):
         """Initializes a new h5 file.
@@ -497,6 +583,44 @@ class H5SaverBase(H5Backend):
         except Exception as e:
             logger.exception(str(e))
 
+    def set_checkpoint(self, scan_group, ind_scan, ind_average, completed=False, settings=dict([])):
+        """Store in the attributes of a scan group the last completed step so that the scan can be resumed
+
+        All the data queued to the background writer are written before the checkpoint so that every step up to the
+        checkpoint is in the file.
+
+        Parameters
+        ----------
+        scan_group: (GROUP) the scan group
+        ind_scan: (int) index of the last completed step
+        ind_average: (int) average index of the last completed step
+        completed: (bool) True if all the steps of the scan have been acquired
+        settings: (dict) XML strings of the settings needed to restore the scan, each saved as a
+                  checkpoint_<key> attribute. Only needed once as they don't change during a scan
+        """
+        self.flush()
+        with self.h5_lock:
+            for key in settings:
+                self.set_attr(scan_group, f'checkpoint_{key}', settings[key])
+            self.set_attr(scan_group, 'checkpoint_ind_scan', ind_scan)
+            self.set_attr(scan_group, 'checkpoint_ind_average', ind_average)
+            self.set_attr(scan_group, 'checkpoint_completed', completed)
+            self.set_attr(scan_group, 'checkpoint_time', datetime.datetime.now().isoformat())
+        self.flush()
+
+    def get_checkpoint(self, scan_group):
+        """Get the checkpoint stored in a scan group (see set_checkpoint)
+
+        Returns
+        -------
+        dict or None: with keys ind_scan, ind_average, completed, time and the keys of the saved settings. None if
+                      no checkpoint has been stored
+        """
+        attrs = self.get_attr(scan_group)
+        if 'checkpoint_ind_scan' not in attrs:
+            return None
+        return dict([(key[len('checkpoint_'):], attrs[key]) for key in attrs if key.startswith('checkpoint_')])
+
     def load_file(self, base_path=None, file_path=None):
         """Opens a file dialog to select a h5file saved on disk to be used
 
@@ -559,7 +683,8 @@ class H5SaverBase(H5Backend):
         return self.logger_array
 
     def add_log(self, msg):
-        self.logger_array.append(msg)
+        with self.h5_lock:
+            self.logger_array.append(msg)
 
     def add_data_group(self, where, group_data_type, title='', settings_as_xml='', metadata=dict([])):
         """Creates a group node at given location in the tree
@@ -591,7 +716,8 @@ class H5SaverBase(H5Backend):
         group = self.add_group(group_data_type, '', where, title, metadata)
         return group
 
-    def add_navigation_axis(self, data, parent_group, axis='x_axis', enlargeable=False, title='', metadata=dict([])):
+    def add_navigation_axis(self, data, parent_group, axis='x_axis', enlargeable=False, title='', metadata=dict([]),
+                            expected_rows=None):
         """
         Create carray or earray for navigation axis within a scan
         Parameters
@@ -600,6 +726,7 @@ class H5SaverBase(H5Backend):
         parent_group: (str or node) parent node where to save new data
         axis: (str) either x_axis, y_axis, z_axis or time_axis. 'x_axis', 'y_axis', 'z_axis', 'time_axis' are axes containing scalar values (floats or ints). 'time_axis' can be interpreted as the posix timestamp corresponding to a datetime object, see datetime.timestamp()
         enlargeable: (bool) if True the created array is a earray type if False the created array is a carray type
+        expected_rows: (int or None) expected final length of an enlargeable axis, used to plan its chunk shape
         """
 
         if axis not in ['x_axis', 'y_axis', 'z_axis', 'time_axis']:
@@ -609,11 +736,11 @@ class H5SaverBase(H5Backend):
         array = self.add_array(parent_group, f"{self.settings.child(('save_type')).value()}_{axis}", 'navigation_axis',
                                data_shape=data.shape,
                                data_dimension='1D', array_to_save=data, enlargeable=enlargeable, title=title,
-                               metadata=metadata)
+                               metadata=metadata, expected_rows=expected_rows)
         return array
 
     def add_data_live_scan(self, channel_group, data_dict, scan_type='scan1D', title='', scan_subtype=''):
-        isadaptive = scan_subtype == 'Adaptive'
+        isadaptive = scan_subtype in ['Adaptive', 'Fly']  # spread data
         if not isadaptive:
             shape, dimension, size = utils.get_data_dimension(data_dict['data'], scan_type=scan_type,
                                                               remove_scan_dimension=True)
@@ -649,7 +776,7 @@ class H5SaverBase(H5Backend):
 
     def add_data(self, channel_group, data_dict, scan_type='scan1D', scan_subtype='',
                  scan_shape=[], title='', enlargeable=False,
-                 init=False, add_scan_dim=False, metadata=dict([])):
+                 init=False, add_scan_dim=False, metadata=dict([]), expected_rows=None):
         """save data within the hdf5 file together with axes data (if any) and metadata, node name will be 'Data'
 
         Parameters
@@ -667,6 +794,7 @@ class H5SaverBase(H5Backend):
         add_scan_dim: (bool) if True, the scan axes dimension (scan_shape iterable) is prepended to the array shape on the hdf5
                       In that case, the array is usually initialized as zero and further populated
         metadata: (dict) dictionnary whose keys will be saved as the array attributes
+        expected_rows: (int or None) expected number of rows of an enlargeable array, used to plan its chunk shape
 
 
         Returns
@@ -710,7 +838,8 @@ class H5SaverBase(H5Backend):
                                     title=title, data_shape=shape, enlargeable=enlargeable, data_dimension=dimension,
                                     scan_type=scan_type, scan_subtype=scan_subtype, scan_shape=scan_shape,
                                     array_to_save=array_to_save,
-                                    init=init, add_scan_dim=add_scan_dim, metadata=tmp_data_dict)
+                                    init=init, add_scan_dim=add_scan_dim, metadata=tmp_data_dict,
+                                    expected_rows=expected_rows)
 
         self.flush()
         return data_array
@@ -718,14 +847,14 @@ class H5SaverBase(H5Backend):
     def add_array(self, where, name, data_type, data_shape=None, data_dimension=None, scan_type='', scan_subtype='',
                   scan_shape=[],
                   title='', array_to_save=None, array_type=None, enlargeable=False, metadata=dict([]),
-                  init=False, add_scan_dim=False):
+                  init=False, add_scan_dim=False, expected_rows=None):
         """save data arrays on the hdf5 file together with metadata
         Parameters
         ----------
         where: (hdf5 node) node where to save the array
         name: (str) name of the array in the hdf5 file
-        data_type: (str) one of ['data', 'axis', 'live_scan', 'navigation_axis', 'external_h5', 'strings', 'bkg'], mandatory
-            so that the h5Browsr interpret correctly the array (see add_data)
+        data_type: (str) one of ['data', 'axis', 'live_scan', 'navigation_axis', 'external_h5', 'strings', 'bkg',
+            'adaptive_state'], mandatory so that the h5Browsr interpret correctly the array (see add_data)
         data_shape: (iterable) the shape of the array to save, mandatory if array_to_save is None
         data_dimension: (str) one of ['0D', '1D', '2D', 'ND']
         scan_type: (str) either '', 'scan1D' or 'scan2D'
@@ -740,6 +869,8 @@ class H5SaverBase(H5Backend):
                      to zero. Else, the 'data' key of data_dict is saved as is
         add_scan_dim: if True, the scan axes dimension (scan_shape iterable) is prepended to the array shape on the hdf5
                       In that case, the array is usually initialized as zero and further populated
+        expected_rows: (int or None) for enlargeable arrays, the expected number of rows (for instance the number of
+                       scan steps). Used together with the data shape to plan the chunk shape, see get_chunk_shape
 
         Returns
         -------
@@ -767,15 +898,17 @@ class H5SaverBase(H5Backend):
             if data_shape == (1,):
                 data_shape = None
             array = self.create_earray(where, utils.capitalize(name), dtype=np.dtype(array_type),
-                                       data_shape=data_shape, title=title)
+                                       data_shape=data_shape, title=title, expected_rows=expected_rows)
         else:
+            Nnav = 0
             if add_scan_dim:  # means it is an array initialization to zero
                 shape = list(scan_shape[:])
                 shape.extend(data_shape)
+                Nnav = len(scan_shape)
                 if init or array_to_save is None:
                     array_to_save = np.zeros(shape, dtype=np.dtype(array_type))
 
-            array = self.create_carray(where, utils.capitalize(name), obj=array_to_save, title=title)
+            array = self.create_carray(where, utils.capitalize(name), obj=array_to_save, title=title, Nnav=Nnav)
         self.set_attr(array, 'type', data_type)
         self.set_attr(array, 'data_dimension', data_dimension)
         self.set_attr(array, 'scan_type', scan_type)
@@ -898,6 +1031,9 @@ class H5SaverBase(H5Backend):
                         logger.warning(f"The base path couldn't be set, please check your options: {str(e)}")
                         self.update_status("The base path couldn't be set, please check your options")
 
+                elif param.name() == 'chunk_size':
+                    self.chunk_bytes = param.value() * 1024
+
                 elif param.name() in putils.iter_children(self.settings.child('compression_options'), []):
                     compression = self.settings.child('compression_options', 'h5comp_library').value()
                     compression_opts = self.settings.child('compression_options', 'h5comp_level').value()
@@ -997,37 +1133,43 @@ class H5Logger(AbstractLogger):
 
     def add_datas(self, datas):
         det_name = datas['name']
-        det_group = self.h5saver.get_group_by_title(self.h5saver.raw_group, det_name)
-        time_array = self.h5saver.get_node(det_group, 'Logger_time_axis')
-        time_array.append(np.array([datas['acq_time_s']]))
-
         data_types = ['data0D', 'data1D']
         if self.settings.child(('save_2D')).value():
             data_types.extend(['data2D', 'dataND'])
 
-        for data_type in data_types:
-            if data_type in datas.keys() and len(datas[data_type]) != 0:
-                if not self.h5saver.is_node_in_group(det_group, data_type):
-                    data_group = self.h5saver.add_data_group(det_group, data_type, metadata=dict(type='scan'))
-                else:
-                    data_group = self.h5saver.get_node(det_group, utils.capitalize(data_type))
-                for ind_channel, channel in enumerate(datas[data_type]):
-                    channel_group = self.h5saver.get_group_by_title(data_group, channel)
-                    if channel_group is None:
-                        channel_group = self.h5saver.add_CH_group(data_group, title=channel)
-                        data_array = self.h5saver.add_data(channel_group, datas[data_type][channel],
-                                                           scan_type='scan1D', enlargeable=True)
-                    else:
-                        data_array = self.h5saver.get_node(channel_group, 'Data')
-                    if data_type == 'data0D':
-                        data_array.append(np.array([datas[data_type][channel]['data']]))
+        with self.h5saver.h5_lock:
+            det_group = self.h5saver.get_group_by_title(self.h5saver.raw_group, det_name)
+            time_array = self.h5saver.get_node(det_group, 'Logger_time_axis')
+            arrays_datas = [(time_array, np.array([datas['acq_time_s']]))]
+
+            for data_type in data_types:
+                if data_type in datas.keys() and len(datas[data_type]) != 0:
+                    if not self.h5saver.is_node_in_group(det_group, data_type):
+                        data_group = self.h5saver.add_data_group(det_group, data_type, metadata=dict(type='scan'))
                     else:
-                        data_array.append(datas[data_type][channel]['data'])
-        self.h5saver.flush()
+                        data_group = self.h5saver.get_node(det_group, utils.capitalize(data_type))
+                    for ind_channel, channel in enumerate(datas[data_type]):
+                        channel_group = self.h5saver.get_group_by_title(data_group, channel)
+                        if channel_group is None:
+                            channel_group = self.h5saver.add_CH_group(data_group, title=channel)
+                            data_array = self.h5saver.add_data(channel_group, datas[data_type][channel],
+                                                               scan_type='scan1D', enlargeable=True)
+                        else:
+                            data_array = self.h5saver.get_node(channel_group, 'Data')
+                        if data_type == 'data0D':
+                            arrays_datas.append((data_array, np.array([datas[data_type][channel]['data']])))
+                        else:
+                            arrays_datas.append((data_array, datas[data_type][channel]['data']))
+
+        for data_array, data in arrays_datas:
+            self.h5saver.write_data(data_array, data)
+        if self.h5saver.writer is None:  # otherwise flushes are done by the writer
+            self.h5saver.flush()
         self.settings.child(('N_saved')).setValue(
             self.settings.child(('N_saved')).value() + 1)
 
     def stop_logger(self):
+        self.h5saver.stop_writer()
         self.h5saver.flush()
 
 
@@ -115,7 +115,7 @@ def get_h5_data_from_node(node: Node) -> (np.ndarray, Dict[str, Axis], List[Axis
                 else:
                     data_dim = node.attrs['data_dimension']
                 if 'scan_subtype' in node.attrs.attrs_name:
-                    if node.attrs['scan_subtype'].lower() == 'adaptive':
+                    if node.attrs['scan_subtype'].lower() in ['adaptive', 'fly']:
                         is_spread = True
                 tmp_axes = ['x_axis', 'y_axis']
                 for ax in tmp_axes:
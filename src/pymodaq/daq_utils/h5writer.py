@@ -0,0 +1,177 @@
+# Standard imports
+import queue
+import threading
+import time
+from collections import namedtuple
+
+# 3rd party imports
+import numpy as np
+
+# project imports
+from pymodaq.daq_utils.h5backend import EARRAY, VLARRAY
+from pymodaq.daq_utils.daq_utils import set_logger, get_module_name
+
+logger = set_logger(get_module_name(__file__))
+
+WriteJob = namedtuple('WriteJob', ['array', 'data', 'index'])  # index is None for an append
+
+
+class H5Writer:
+    """Background thread executing the writes into hdf5 arrays queued by an acquisition thread
+
+    Write jobs are either the setting of an item of an array (CARRAY, as in DAQ_Scan) or an append to an enlargeable
+    array (EARRAY, as for continuous saving or logging). Consecutive appends to the same array are coalesced into a
+    single append of several rows. The file is flushed every *flush_period* ms or every *flush_size* executed jobs,
+    whichever comes first.
+
+    The queue is bounded: if the disk cannot keep up, `put` blocks until some room is available (backpressure). The
+    number of times and the total time it blocked are reported by `stats`.
+
+    A write or flush failing in the background thread is raised (as an IOError) by the next call to `put`, `join` or
+    `stop`.
+
+    As hdf5 libraries are not thread safe, every other access to the file should be done holding *lock* while the
+    writer is running.
+
+    Parameters
+    ----------
+    lock: (threading.RLock) lock held by the writer while it accesses the file
+    flush: (callable) method flushing the file (called holding the lock)
+    queue_size: (int) maximum number of jobs in the queue
+    flush_period: (int) maximum time in ms between two flushes (if some data have been written)
+    flush_size: (int) maximum number of jobs executed between two flushes
+    """
+
+    def __init__(self, lock, flush, queue_size=100, flush_period=1000, flush_size=100):
+        self.lock = lock
+        self._flush = flush
+        self.flush_period = flush_period / 1000
+        self.flush_size = flush_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+
+        self.max_depth = 0
+        self.Nblocked = 0
+        self.blocked_time = 0.
+        self.Nwritten = 0
+        self.last_error = None
+        self._Nunflushed = 0
+        self._last_flush = time.perf_counter()
+
+    @property
+    def depth(self):
+        """int: the current number of jobs in the queue"""
+        return self._queue.qsize()
+
+    @property
+    def stats(self):
+        """dict: queue depth and backpressure report"""
+        return dict(depth=self.depth, max_depth=self.max_depth, Nblocked=self.Nblocked,
+                    blocked_time=self.blocked_time, Nwritten=self.Nwritten)
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if not self.is_running():
+            self._thread = threading.Thread(target=self._run, name='H5Writer', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Execute all the queued jobs, flush the file and stop the thread"""
+        if self.is_running():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+        self.check_error()
+
+    def join(self):
+        """Block until all the queued jobs have been executed"""
+        if self.is_running():
+            self._queue.join()
+        self.check_error()
+
+    def check_error(self):
+        """Raise the error of a write or flush that failed in the background thread (only once)"""
+        if self.last_error is not None:
+            error, self.last_error = self.last_error, None
+            raise IOError(f'Asynchronous hdf5 writing failed: {str(error)}') from error
+
+    def put(self, array, data, index=None):
+        """Queue a write job, blocking if the queue is full
+
+        Parameters
+        ----------
+        array: (CARRAY or EARRAY) the array to write into
+        data: (ndarray or scalar) the data to write. It is copied so that the caller may reuse its buffer
+        index: (tuple or None) where to write data in a CARRAY, None to append it to an EARRAY
+        """
+        self.check_error()
+        job = WriteJob(array, np.array(data), index)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self.Nblocked += 1
+            tstart = time.perf_counter()
+            self._queue.put(job)
+            self.blocked_time += time.perf_counter() - tstart
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def _run(self):
+        running = True
+        while running:
+            if self._Nunflushed > 0:  # wake up in time to flush
+                timeout = max(0., self.flush_period - (time.perf_counter() - self._last_flush))
+            else:
+                timeout = None
+            try:
+                jobs = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                jobs = []
+            while len(jobs) < self.flush_size:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in jobs:  # stop sentinel
+                running = False
+            write_jobs = [job for job in jobs if job is not None]
+
+            with self.lock:
+                try:
+                    self.write(write_jobs)
+                    self._Nunflushed += len(write_jobs)
+                    if self._Nunflushed > 0 and (not running or self._Nunflushed >= self.flush_size or
+                                                 time.perf_counter() - self._last_flush >= self.flush_period):
+                        self._flush()
+                        self._Nunflushed = 0
+                        self._last_flush = time.perf_counter()
+                except Exception as e:
+                    if self.last_error is None:  # the first error is the relevant one
+                        self.last_error = e
+                    logger.exception(str(e))
+            for job in jobs:
+                self._queue.task_done()
+
+    def write(self, jobs):
+        """Execute a list of write jobs, coalescing consecutive appends to the same enlargeable array"""
+        ind = 0
+        while ind < len(jobs):
+            job = jobs[ind]
+            if job.index is not None:
+                job.array[job.index] = job.data
+                Njobs = 1
+            elif isinstance(job.array, EARRAY) and not isinstance(job.array, VLARRAY):
+                rows = []
+                for next_job in jobs[ind:]:
+                    if next_job.array is not job.array or next_job.index is not None:
+                        break
+                    rows.append(next_job.data if next_job.data.shape == (1,) else next_job.data[np.newaxis])
+                job.array.append_rows(np.concatenate(rows))
+                Njobs = len(rows)
+            else:
+                job.array.append(job.data)
+                Njobs = 1
+            ind += Njobs
+            self.Nwritten += Njobs
@@ -1,8 +1,11 @@
 from typing import List
 from collections import OrderedDict
-from qtpy.QtCore import QObject, Signal, Slot, QThread
+from functools import partial
+from time import perf_counter
+
+import numpy as np
+from qtpy.QtCore import QObject, Signal, Slot, QThread, QEventLoop, QTimer
 from qtpy import QtWidgets
-import time
 from pymodaq.daq_utils import daq_utils as utils
 
 from pyqtgraph.parametertree import Parameter, ParameterTree
@@ -16,6 +19,9 @@ class ModulesManager(QObject):
     det_done_signal = Signal(OrderedDict)
     move_done_signal = Signal(OrderedDict)
     timeout_signal = Signal(bool)
+    all_det_done_signal = Signal()
+    all_move_done_signal = Signal()
+    all_trajectory_loaded_signal = Signal()
 
     params = [
         {'title': 'Actuators/Detectors Selection', 'name': 'modules', 'type': 'group', 'children': [
@@ -53,6 +59,9 @@ class ModulesManager(QObject):
         self.det_done_flag = False
         self.move_done_positions = OrderedDict()
         self.move_done_flag = False
+        self.move_pending = False  # True if a move has been started without waiting for its completion
+        self.trajectory_loaded_status = OrderedDict()  # actuator's name: True if its controller stores the trajectory
+        self._wait_loop = None
 
         self.settings = Parameter.create(name='Settings', type='group', children=self.params)
         self.settings_tree = ParameterTree()
@@ -230,23 +239,70 @@ class ModulesManager(QObject):
         self.det_done_datas = OrderedDict()
         self.det_done_flag = False
         self.settings.child(('det_done')).setValue(self.det_done_flag)
-        tzero = time.perf_counter()
 
+        self.all_det_done_signal.connect(self._wait_loop_quit)
         for sig in [mod.command_detector for mod in self.detectors]:
             sig.emit(utils.ThreadCommand("single", [1, kwargs]))
 
-        while not self.det_done_flag:
-            # wait for grab done signals to end
-
-            QtWidgets.QApplication.processEvents()
-            if time.perf_counter() - tzero > self.timeout:
-                self.timeout_signal.emit(True)
-                logger.error('Timeout Fired during waiting for data to be acquired')
-                break
+        # wait for grab done signals to end
+        self.wait_for(self.all_det_done_signal, lambda: self.det_done_flag,
+                      'Timeout Fired during waiting for data to be acquired')
 
         self.det_done_signal.emit(self.det_done_datas)
         return self.det_done_datas
 
+    def start_continuous_grab(self):
+        """Start the continuous grab of the selected detectors
+
+        Each grabbed frame is emitted by the detectors' grab_done_signal, with its acquisition time as the 'acq_time_s'
+        key, until stop_continuous_grab is called
+        """
+        for sig in [mod.command_detector for mod in self.detectors]:
+            sig.emit(utils.ThreadCommand("grab", [1]))
+
+    def stop_continuous_grab(self):
+        for sig in [mod.command_detector for mod in self.detectors]:
+            sig.emit(utils.ThreadCommand("stop_grab"))
+
+    def _wait_loop_quit(self):
+        if self._wait_loop is not None:
+            self._wait_loop.quit()
+
+    def wait_for(self, done_signal, is_done, timeout_message='', timeout=None):
+        """Process events until done_signal is emitted (or is_done returns True) or until timeout
+
+        A local QEventLoop is executed (instead of polling) and quits as soon as done_signal is emitted, from whatever
+        thread, or after the timeout.
+
+        Parameters
+        ----------
+        done_signal: (Signal) emitted when the awaited modules are all done. It should have been connected to
+                     self._wait_loop_quit before the modules were triggered (in order not to miss the emission)
+        is_done: (callable) returns True if the awaited modules are all done
+        timeout_message: (str) message logged in case of timeout
+        timeout: (int) timeout in ms, self.timeout if None
+
+        Returns
+        -------
+        bool: False if the timeout fired
+        """
+        self._wait_loop = QEventLoop()
+        timer = QTimer()
+        timer.setSingleShot(True)
+        timer.timeout.connect(self._wait_loop.quit)
+        timer.start(self.timeout if timeout is None else int(timeout))
+        if not is_done():
+            self._wait_loop.exec_()
+        timer.stop()
+        self._wait_loop = None
+        done_signal.disconnect(self._wait_loop_quit)
+
+        if not is_done():
+            self.timeout_signal.emit(True)
+            logger.error(timeout_message)
+            return False
+        return True
+
     def connect_actuators(self, connect=True, slot=None):
         if slot is None:
             slot = self.move_done
@@ -311,7 +367,7 @@ class ModulesManager(QObject):
 
         self.connect_actuators(False)
 
-    def move_actuators(self, positions, mode='abs', polling=True):
+    def move_actuators(self, positions, mode='abs', polling=True, wait=True, timeout=None):
         """will apply positions to each currently selected actuators. By Default the mode is absolute but can be
 
         Parameters
@@ -321,18 +377,21 @@ class ModulesManager(QObject):
         poll: (bool) if True will wait for the selected actuators to reach their target positions (they have to be
         connected to a method checking for the position and letting the programm know the move is done (default
         connection is this object `move_done` method)
+        wait: (bool) if False (and polling is True) returns as soon as the move commands are sent. The caller then
+              has to call `wait_move_done` to get the reached positions (used to overlap moves with other tasks)
+        timeout: (int) timeout in ms of the wait for the moves completion, self.timeout if None (for instance for
+                 long moves at low velocity)
 
         Returns
         -------
-        (OrderedDict) with the selected actuators's name as key and current actuators's value as value
+        (OrderedDict) with the selected actuators's name as key and current actuators's value as value (empty if
+        wait is False)
 
         See Also
         --------
-        move_done
+        move_done, wait_move_done
         """
-        self.move_done_positions = OrderedDict()
-        self.move_done_flag = False
-        self.settings.child(('move_done')).setValue(self.move_done_flag)
+        self.reset_move_done()
 
         if mode == 'abs':
             command = 'move_Abs'
@@ -347,32 +406,163 @@ class ModulesManager(QObject):
 
         if len(positions) == self.Nactuators:
             if isinstance(positions, dict):
+                commands = []
                 for k in positions:
                     act = self.get_mod_from_name(k, 'act')
                     if act is not None:
-                        act.command_stage.emit(utils.ThreadCommand(command=command, attributes=[positions[k], polling]))
+                        commands.append((act, utils.ThreadCommand(command=command,
+                                                                  attributes=[positions[k], polling])))
             else:
-                for ind, act in enumerate(self.actuators):
-                    act.command_stage.emit(utils.ThreadCommand(command=command, attributes=[positions[ind], polling]))
-
+                commands = [(act, utils.ThreadCommand(command=command, attributes=[positions[ind], polling]))
+                            for ind, act in enumerate(self.actuators)]
         else:
             logger.error('Invalid number of positions compared to selected actuators')
             return self.move_done_positions
 
-        tzero = time.perf_counter()
+        return self.send_move_commands(commands, polling, wait, timeout)
+
+    def set_actuators_velocity(self, velocities):
+        """Set the velocity of the next moves of some of the selected actuators (see DAQ_Move_base.set_velocity)
+
+        Parameters
+        ----------
+        velocities: (dict) actuator's name: velocity in actuator's units/s, None restoring its default velocity
+        """
+        for name in velocities:
+            act = self.get_mod_from_name(name, 'act')
+            if act is not None:
+                act.command_stage.emit(utils.ThreadCommand(command='set_velocity', attributes=[velocities[name]]))
+
+    @property
+    def supports_trajectory(self):
+        """bool: True if all the selected actuators can store a list of positions (see load_trajectory)"""
+        return self.Nactuators != 0 and all([getattr(act, 'supports_trajectory', False) for act in self.actuators])
+
+    def load_trajectory(self, positions, ind_start=0, timeout=None):
+        """Send to each selected actuator the list of positions it will step through using move_trajectory_step and
+        wait for their 'trajectory_loaded' status
+
+        The actuators whose plugin can store a list of positions (hardware buffer, PVT trajectory...) upload them
+        into their controller, the others will execute absolute moves. Long trajectories are sent by chunks: ind_start
+        is the index of the first of the positions within the whole trajectory, 0 starting a new trajectory.
+
+        Parameters
+        ----------
+        positions: (ndarray) positions of shape (Npoints, Nactuators) or (Npoints,)
+        ind_start: (int) index within the trajectory of the first of the positions
+        timeout: (int) timeout in ms, self.timeout if None
+
+        Returns
+        -------
+        bool: True if the controllers of all the selected actuators store the positions. False if the number of axes
+              of positions does not match the number of selected actuators, if one of them could not load them or in
+              case of timeout
+        """
+        positions = np.asarray(positions)
+        if len(positions.shape) == 1:
+            positions = np.expand_dims(positions, 1)
+        if positions.shape[1] != self.Nactuators:
+            logger.error('Invalid number of positions compared to selected actuators')
+            return False
+
+        self.trajectory_loaded_status = OrderedDict()
+        for act in self.actuators:
+            act.trajectory_loaded_signal.connect(self.trajectory_loaded)
+        self.all_trajectory_loaded_signal.connect(self._wait_loop_quit)
+        for ind, act in enumerate(self.actuators):
+            act.command_stage.emit(utils.ThreadCommand(command='load_trajectory',
+                                                       attributes=[positions[:, ind], ind_start]))
+
+        done = self.wait_for(self.all_trajectory_loaded_signal,
+                             lambda: len(self.trajectory_loaded_status) == len(self.actuators),
+                             'Timeout Fired during waiting for actuators to load their trajectory', timeout)
+        for act in self.actuators:
+            act.trajectory_loaded_signal.disconnect(self.trajectory_loaded)
+        return done and all(self.trajectory_loaded_status.values())
+
+    @Slot(str, bool)
+    def trajectory_loaded(self, name, loaded):
+        try:
+            self.trajectory_loaded_status[name] = loaded
+            if len(self.trajectory_loaded_status) == len(self.actuators):
+                self.all_trajectory_loaded_signal.emit()
+        except Exception as e:
+            logger.exception(str(e))
+
+    def move_trajectory_step(self, index, polling=True, wait=True):
+        """Move each selected actuator to the point of its loaded trajectory at the given index
+
+        Parameters
+        ----------
+        index: (int) index of the point within the positions given to load_trajectory
+        polling: (bool) see move_actuators
+        wait: (bool) see move_actuators
+
+        Returns
+        -------
+        (OrderedDict) with the selected actuators's name as key and current actuators's value as value (empty if
+        wait is False)
+
+        See Also
+        --------
+        load_trajectory, move_actuators
+        """
+        self.reset_move_done()
+        commands = [(act, utils.ThreadCommand(command='move_trajectory_step', attributes=[index, polling]))
+                    for act in self.actuators]
+        return self.send_move_commands(commands, polling, wait)
+
+    def reset_move_done(self):
+        self.move_done_positions = OrderedDict()
+        self.move_done_flag = False
+        self.settings.child(('move_done')).setValue(self.move_done_flag)
+
+    def send_move_commands(self, commands, polling=True, wait=True, timeout=None):
+        """Send move commands to actuators and wait for their completion (see move_actuators)
+
+        Parameters
+        ----------
+        commands: (list of tuple) (actuator, ThreadCommand) to be emitted
+        polling: (bool) if True will wait for the actuators to reach their target positions
+        wait: (bool) if False (and polling is True) returns as soon as the move commands are sent
+        timeout: (int) timeout in ms of the wait, self.timeout if None
+
+        Returns
+        -------
+        (OrderedDict) with the selected actuators's name as key and current actuators's value as value
+        """
         if polling:
-            while not self.move_done_flag:  # polling move done
+            self.all_move_done_signal.connect(self._wait_loop_quit)
+        for act, command in commands:
+            act.command_stage.emit(command)
 
-                QtWidgets.QApplication.processEvents()
-                if time.perf_counter() - tzero > self.timeout:
-                    self.timeout_signal.emit(True)
-                    logger.error('Timeout Fired during waiting for data to be acquired')
-                    break
-                QThread.msleep(20)
+        if polling:
+            self.move_pending = True
+            if not wait:
+                return self.move_done_positions
+            return self.wait_move_done(timeout)
 
         self.move_done_signal.emit(self.move_done_positions)
         return self.move_done_positions
 
+    def wait_move_done(self, timeout=None):
+        """Wait for the completion of the moves started with `move_actuators(..., wait=False)`
+
+        Parameters
+        ----------
+        timeout: (int) timeout in ms, self.timeout if None
+
+        Returns
+        -------
+        (OrderedDict) with the selected actuators's name as key and current actuators's value as value
+        """
+        if self.move_pending:
+            self.move_pending = False
+            self.wait_for(self.all_move_done_signal, lambda: self.move_done_flag,
+                          'Timeout Fired during waiting for actuators to reach their positions', timeout)
+            self.move_done_signal.emit(self.move_done_positions)
+        return self.move_done_positions
+
     def order_positions(self, positions_as_dict):
         actuators = self.selected_actuators_name
         pos = []
@@ -392,6 +582,7 @@ class ModulesManager(QObject):
             if len(self.move_done_positions.items()) == len(self.actuators):
                 self.move_done_flag = True
                 self.settings.child('move_done').setValue(self.move_done_flag)
+                self.all_move_done_signal.emit()
         except Exception as e:
             logger.exception(str(e))
 
@@ -403,10 +594,133 @@ class ModulesManager(QObject):
             if len(self.det_done_datas.items()) == len(self.detectors):
                 self.det_done_flag = True
                 self.settings.child(('det_done')).setValue(self.det_done_flag)
+                self.all_det_done_signal.emit()
         except Exception as e:
             logger.exception(str(e))
 
 
+class ModulesInitializer(QObject):
+    """Initialize modules (actuators or detectors) following their init_signal instead of polling their state
+
+    The modules are given as chains of modules sharing the same controller: the first module of a chain (the
+    master) is initialized first, then the other ones (the slaves) are given the controller of the master and are
+    initialized one after the other. In concurrent mode, all the chains are initialized at the same time (each module
+    initializes within its own thread), otherwise one chain after the other.
+
+    A module whose init raises or which did not report its initialization within the timeout is counted as not
+    initialized and the initialization goes on with the following modules.
+
+    Parameters
+    ----------
+    chains: (list of list of DAQ_Move or DAQ_Viewer) the modules to initialize, grouped by controller
+    concurrent: (bool) if True, the chains are initialized concurrently
+    timeout: (int) time in ms after which the modules being initialized are counted as not initialized if none of
+             them reported its initialization
+    """
+    module_initialized = Signal(str, bool, float)  # title, initialized state and init duration (s) of a module
+
+    def __init__(self, chains, concurrent=True, timeout=60000):
+        super().__init__()
+        self.chains = [list(chain) for chain in chains if len(chain) != 0]
+        self.concurrent = concurrent
+        self.timeout = timeout
+        self.init_times = OrderedDict()  # title: init duration in s
+        self.init_states = OrderedDict()  # title: initialized state
+        self.duration = 0.
+        self._Nchains_started = 0
+        self._Nchains_done = 0
+        self._slots = dict([])
+        self._tstarts = dict([])
+        self._wait_loop = None
+        self._watchdog = None
+
+    @staticmethod
+    def trigger_init(module):
+        if hasattr(module, 'init_det'):
+            module.init_det()
+        else:
+            module.init()
+
+    @property
+    def done(self):
+        return self._Nchains_done == len(self.chains)
+
+    def run(self):
+        """Initialize all the modules, processing the events until all reported their initialization or timed out
+
+        Returns
+        -------
+        bool: True if all the modules have been initialized
+        """
+        tstart = perf_counter()
+        self._wait_loop = QEventLoop()
+        self._watchdog = QTimer()
+        self._watchdog.setSingleShot(True)
+        self._watchdog.timeout.connect(self._timeout)
+        self._watchdog.start(self.timeout)
+
+        Nchains = len(self.chains) if self.concurrent else min(1, len(self.chains))
+        for ind_chain in range(Nchains):
+            self._start_chain()
+        if not self.done:
+            self._wait_loop.exec_()
+        self._watchdog.stop()
+        self._watchdog = None
+        self._wait_loop = None
+        self.duration = perf_counter() - tstart
+
+        return all(self.init_states.values()) and \
+            len(self.init_states) == sum([len(chain) for chain in self.chains])
+
+    def _start_chain(self):
+        self._Nchains_started += 1
+        self._init_module(self._Nchains_started - 1, 0)
+
+    def _init_module(self, ind_chain, ind_module):
+        module = self.chains[ind_chain][ind_module]
+        if ind_module != 0:
+            module.controller = self.chains[ind_chain][0].controller
+        slot = partial(self._module_initialized, ind_chain, ind_module)
+        self._slots[(ind_chain, ind_module)] = slot
+        module.init_signal.connect(slot)
+        self._tstarts[(ind_chain, ind_module)] = perf_counter()
+        try:
+            self.trigger_init(module)
+        except Exception as e:
+            logger.exception(f'The initialization of {module.title} failed: {str(e)}')
+            self._module_initialized(ind_chain, ind_module, False)
+
+    def _timeout(self):
+        """Count the modules being initialized as not initialized and go on with the following ones"""
+        for ind_chain, ind_module in list(self._slots.keys()):  # the following modules are started meanwhile
+            logger.error(f'Timeout while initializing {self.chains[ind_chain][ind_module].title}')
+            self._module_initialized(ind_chain, ind_module, False)
+
+    def _module_initialized(self, ind_chain, ind_module, status):
+        duration = perf_counter() - self._tstarts[(ind_chain, ind_module)]
+        chain = self.chains[ind_chain]
+        module = chain[ind_module]
+        module.init_signal.disconnect(self._slots.pop((ind_chain, ind_module)))
+        self.init_times[module.title] = duration
+        self.init_states[module.title] = status
+        self.module_initialized.emit(module.title, status, duration)
+        if self._watchdog is not None:
+            self._watchdog.start(self.timeout)
+
+        if ind_module == 0 and not status and len(chain) > 1:
+            logger.error(f'The master module {module.title} could not be initialized, its slaves '
+                         f'{[mod.title for mod in chain[1:]]} are not initialized')
+        elif ind_module < len(chain) - 1:
+            self._init_module(ind_chain, ind_module + 1)
+            return
+
+        self._Nchains_done += 1
+        if not self.concurrent and self._Nchains_started < len(self.chains):
+            self._start_chain()
+        elif self.done and self._wait_loop is not None:
+            self._wait_loop.quit()
+
+
 if __name__ == '__main__':
     import sys
 
@@ -395,6 +395,173 @@ def ift2(x, dim=(-2, -1)):
     return out
 
 
+class RunningAverager:
+    """Running average of a list of arrays (the channels of a detector) updated in place
+
+    The averages (and the running variances if asked for) are stored in preallocated float64 accumulators, one per
+    channel, updated in place for each new sample: once allocated, averaging frames does not allocate any new array.
+
+    Averaging modes:
+
+    * cumulative: mean of all the samples added since the last reset
+    * exponential: exponential moving average, the weight of a new sample being *alpha*
+    * windowed: mean of the last *window* samples (stored in a preallocated window buffer)
+
+    Variances are computed using Welford's algorithm (and its exponential and windowed counterparts)
+
+    Parameters
+    ----------
+    mode: (str) one of MODES
+    alpha: (float) weight of a new sample in the exponential mode (0 < alpha <= 1)
+    window: (int) number of samples averaged in the windowed mode
+    variance: (bool) if True compute also the running variance of each channel
+    """
+    MODES = ('cumulative', 'exponential', 'windowed')
+
+    def __init__(self, mode='cumulative', alpha=0.1, window=10, variance=False):
+        if mode not in self.MODES:
+            raise ValueError(f'Invalid averaging mode: {mode}, possible ones are {self.MODES}')
+        if not 0 < alpha <= 1:
+            raise ValueError('alpha should be in the ]0, 1] interval')
+        if window < 1:
+            raise ValueError('window should be a strictly positive integer')
+        self.mode = mode
+        self.alpha = alpha
+        self.window = int(window)
+        self.compute_variance = variance
+
+        self._means = []
+        self._m2s = []
+        self._scratches = []
+        self._windows = []
+        self._count = 0
+
+    @property
+    def Nadded(self):
+        """int: the number of samples added since the last reset"""
+        return self._count
+
+    @property
+    def Nsamples(self):
+        """int: the number of samples contributing to the current averages"""
+        if self.mode == 'windowed':
+            return min(self._count, self.window)
+        return self._count
+
+    @property
+    def means(self):
+        """list of ndarray: the current averages (the accumulators themselves, updated in place)"""
+        return self._means
+
+    @property
+    def variances(self):
+        """list of ndarray or None: the current variances (None if not computed)"""
+        if not self.compute_variance or self._count == 0:
+            return None
+        if self.mode == 'exponential':
+            return [m2.copy() for m2 in self._m2s]
+        elif self.Nsamples < 2:
+            return [np.zeros_like(m2) for m2 in self._m2s]
+        return [np.maximum(m2 / (self.Nsamples - 1), 0.) for m2 in self._m2s]
+
+    @property
+    def stds(self):
+        """list of ndarray or None: the current standard deviations (None if not computed)"""
+        variances = self.variances
+        if variances is None:
+            return None
+        return [np.sqrt(variance) for variance in variances]
+
+    def reset(self):
+        """Start a new average
+
+        The accumulators are released (a consumer may still hold them) and new ones will be allocated at the next
+        add. The scratch and window buffers are kept.
+        """
+        self._means = []
+        self._m2s = []
+        self._count = 0
+
+    def _allocate(self, arrays):
+        shapes = [np.shape(array) for array in arrays]
+        if [scratch[0].shape for scratch in self._scratches] != shapes or \
+                (self.mode == 'windowed' and (len(self._windows) != len(shapes) or
+                                              any(len(window) != self.window for window in self._windows))):
+            self._scratches = [(np.empty(shape), np.empty(shape)) for shape in shapes]
+            self._windows = [np.empty((self.window,) + shape) for shape in shapes] if self.mode == 'windowed' else []
+        self._means = [np.empty(shape) for shape in shapes]
+        self._m2s = [np.zeros(shape) for shape in shapes] if self.compute_variance else []
+        self._count = 0
+
+    def add(self, arrays):
+        """Add a sample to the averages
+
+        Parameters
+        ----------
+        arrays: (list of ndarray) one array per channel. The averages are reset if their number or shapes changed
+
+        Returns
+        -------
+        list of ndarray: the current averages (the accumulators, updated in place at the next add)
+        """
+        if self._count == 0 or len(arrays) != len(self._means) or \
+                any(np.shape(array) != mean.shape for array, mean in zip(arrays, self._means)):
+            self._allocate(arrays)
+
+        self._count += 1
+        for ind, array in enumerate(arrays):
+            if self._count == 1:
+                np.copyto(self._means[ind], array)
+            elif self.mode == 'windowed' and self._count > self.window:
+                self._replace(ind, array)
+            elif self.mode == 'exponential' and self._count > 1:
+                self._add_exponential(ind, array)
+            else:
+                self._add_cumulative(ind, array)
+            if self.mode == 'windowed':
+                np.copyto(self._windows[ind][(self._count - 1) % self.window], array)
+        return self._means
+
+    def _add_cumulative(self, ind, array):
+        mean = self._means[ind]
+        delta, tmp = self._scratches[ind]
+        np.subtract(array, mean, out=delta)
+        np.multiply(delta, 1 / self._count, out=tmp)
+        mean += tmp
+        if self.compute_variance:
+            np.subtract(array, mean, out=tmp)
+            tmp *= delta
+            self._m2s[ind] += tmp
+
+    def _add_exponential(self, ind, array):
+        mean = self._means[ind]
+        delta, tmp = self._scratches[ind]
+        np.subtract(array, mean, out=delta)
+        np.multiply(delta, self.alpha, out=tmp)
+        mean += tmp
+        if self.compute_variance:
+            m2 = self._m2s[ind]
+            tmp *= delta
+            m2 += tmp
+            m2 *= 1 - self.alpha
+
+    def _replace(self, ind, array):
+        """the window is full: the oldest sample is replaced by the new one"""
+        mean = self._means[ind]
+        delta, tmp = self._scratches[ind]
+        old = self._windows[ind][(self._count - 1) % self.window]
+        np.subtract(array, old, out=delta)
+        if self.compute_variance:
+            np.add(array, old, out=tmp)
+            tmp -= mean
+        np.multiply(delta, 1 / self.window, out=old)  # old sample not needed anymore
+        mean += old
+        if self.compute_variance:
+            tmp -= mean
+            tmp *= delta
+            self._m2s[ind] += tmp
+
+
 class FourierFilterer(QObject):
     filter_changed = Signal(dict)
 
@@ -3,6 +3,7 @@ from qtpy.QtCore import QObject, Slot, Signal
 import sys
 import pymodaq.daq_utils.daq_utils as utils
 from pymodaq.daq_utils.plotting.data_viewers.viewer0D_GUI import Ui_Form
+from pymodaq.daq_utils.plotting.utils.plot_utils import Data0DWithHistory
 
 import numpy as np
 from collections import OrderedDict
@@ -43,10 +44,7 @@ class Viewer0D(QtWidgets.QWidget, QObject):
         self.plot_channels = None
         self.plot_colors = utils.plot_colors
 
-        self.Nsamples = self.ui.Nhistory_sb.value()
-
-        self.x_axis = np.linspace(0, self.Nsamples - 1, self.Nsamples)
-        self.datas = []  # datas on each channel. list of 1D arrays
+        self.history = Data0DWithHistory(self.ui.Nhistory_sb.value())  # the last Nsamples values of each channel
         self.legend = self.ui.Graph1D.plotItem.addLegend()
         self.data_to_export = None
         self.list_items = None
@@ -58,14 +56,32 @@ class Viewer0D(QtWidgets.QWidget, QObject):
 
         self.show_data_list(False)
 
+    @property
+    def Nsamples(self):
+        return self.history.Nsamples
+
+    @Nsamples.setter
+    def Nsamples(self, Nsamples):
+        self.history.Nsamples = Nsamples
+
+    @property
+    def datas(self):
+        """list of 1D arrays: the history of each channel (views valid until the next sample)"""
+        return list(self.history.datas.values())
+
+    @property
+    def x_axis(self):
+        return self.history.xaxis
+
+    @x_axis.setter
+    def x_axis(self, x_axis):
+        pass  # the x axis of the history is the sample index, axes sent to all the viewers are ignored
+
     def clear_data(self):
-        N = len(self.datas)
-        self.datas = []
-        for ind in range(N):
-            self.datas.append(np.array([]))
-        self.x_axis = np.array([])
-        for ind_plot, data in enumerate(self.datas):
-            self.plot_channels[ind_plot].setData(x=self.x_axis, y=data)
+        self.history.clear_data()
+        if self.plot_channels is not None:
+            for channel in self.plot_channels:
+                channel.setData(x=np.array([]), y=np.array([]))
 
     @Slot(list)
     def show_data(self, datas):
@@ -89,12 +105,11 @@ class Viewer0D(QtWidgets.QWidget, QObject):
                     self._labels = ["CH{}".format(ind) for ind in range(len(datas))]
 
                 self.plot_channels = []
-                self.datas = []
+                self.history.clear_data()
                 self.ui.values_list.clear()
                 self.ui.values_list.addItems(['{:.06e}'.format(data[0]) for data in datas])
                 self.list_items = [self.ui.values_list.item(ind) for ind in range(self.ui.values_list.count())]
                 for ind in range(len(datas)):
-                    self.datas.append(np.array([]))
                     # channel=self.ui.Graph1D.plot(np.array([]))
                     # channel=self.ui.Graph1D.plot(y=np.array([]), name=self._labels[ind])
                     channel = self.ui.Graph1D.plot(y=np.array([]))
@@ -124,26 +139,13 @@ class Viewer0D(QtWidgets.QWidget, QObject):
 
     def update_Graph1D(self, datas):
         try:
-            data_tot = []
-            L = len(self.datas[0]) + 1
-            if L > self.Nsamples:
-                self.x_axis += 1
-            else:
-                self.x_axis = np.linspace(0, L - 1, L)
-            for ind_plot, data in enumerate(datas):
-                data_tmp = self.datas[ind_plot]
-                data_tmp = np.append(data_tmp, data)
-
-                if len(data_tmp) > self.Nsamples:
-                    data_tmp = data_tmp[L - self.Nsamples:]
-
-                data_tot.append(data_tmp)
-
-                self.plot_channels[ind_plot].setData(x=self.x_axis, y=data_tmp)
+            self.history.add_datas(OrderedDict([('CH{:03d}'.format(ind), data[0]) for ind, data in enumerate(datas)]))
+            x_axis = self.x_axis
+            for ind_plot, data_history in enumerate(self.datas):
+                self.plot_channels[ind_plot].setData(x=x_axis, y=data_history)
                 self.data_to_export['data0D']['CH{:03d}'.format(ind_plot)] = utils.DataToExport(name=self.title,
-                                                                                                data=data[0],
+                                                                                                data=datas[ind_plot][0],
                                                                                                 source='raw')
-            self.datas = data_tot
 
             self.data_to_export['acq_time_s'] = datetime.datetime.now().timestamp()
             self.data_to_export_signal.emit(self.data_to_export)
@@ -175,7 +177,6 @@ class Viewer0D(QtWidgets.QWidget, QObject):
 
     def update_x_axis(self, Nhistory):
         self.Nsamples = Nhistory
-        self.x_axis = np.linspace(0, self.Nsamples - 1, self.Nsamples)
 
     @property
     def labels(self):
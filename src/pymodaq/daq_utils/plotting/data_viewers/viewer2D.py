@@ -861,8 +861,11 @@ class Viewer2D(ViewerBase):
     def set_image_transform(self):
         """
         Deactivate some tool buttons if data type is "spread" then apply transform_image
+
+        Only the container is copied: the transformed images are views of the raw ones (no copy of the data)
         """
-        data = copy.deepcopy(self._raw_datas)
+        data = copy.copy(self._raw_datas)
+        data['data'] = list(data['data'])
         self.view.set_action_visible('flip_ud', data['distribution'] != 'spread')
         self.view.set_action_visible('flip_lr', data['distribution'] != 'spread')
         self.view.set_action_visible('rotate', data['distribution'] != 'spread')
@@ -253,12 +253,42 @@ def makePolygons(tri):
 
 
 class Data0DWithHistory:
+    """Keep the history of the last Nsamples values of a set of 0D channels
+
+    Values are stored in a preallocated circular buffer (a single 2D array with the sample index as first row and
+    one row per channel) of length 2 * Nsamples: each sample is written twice, at index i and i + Nsamples, so that
+    the last Nsamples values are always a contiguous slice of the buffer. Adding a sample does not allocate memory
+    and xaxis/datas are views (valid until the next call to add_datas)
+    """
     def __init__(self, Nsamples=200):
         super().__init__()
-        self._datas = dict([])
-        self.Nsamples = Nsamples
-        self._xaxis = None
-        self._data_length = 0
+        self._Nsamples = Nsamples
+        self._keys = []
+        self._buffer = np.zeros((1, 2 * Nsamples))
+        self._data_length = 0  # total number of added samples
+        self._Nwritten = 0  # number of samples written in the current buffer
+
+    @property
+    def Nsamples(self):
+        return self._Nsamples
+
+    @Nsamples.setter
+    def Nsamples(self, Nsamples):
+        """Resize the history keeping the most recent values"""
+        last_values = self._buffer[:, self._slice()].copy()
+        self._Nsamples = Nsamples
+        self._buffer = np.zeros((len(self._keys) + 1, 2 * Nsamples))
+        last_values = last_values[:, max(0, last_values.shape[1] - Nsamples):]
+        Nlast = last_values.shape[1]
+        self._Nwritten = Nlast
+        self._buffer[:, :Nlast] = last_values
+        self._buffer[:, Nsamples:Nsamples + Nlast] = last_values
+
+    def _slice(self):
+        if self._Nwritten <= self._Nsamples:
+            return slice(0, self._Nwritten)
+        start = self._Nwritten % self._Nsamples
+        return slice(start, start + self._Nsamples)
 
     @dispatch(list)
     def add_datas(self, datas: list):
@@ -279,40 +309,92 @@ class Data0DWithHistory:
         ----------
         datas: (dict) dictionaary of floats or np.array(float)
         """
-        if len(datas) != len(self._datas):
+        if len(datas) != len(self._keys) or list(datas.keys()) != self._keys:
             self.clear_data()
-
+            self._keys = list(datas.keys())
+            self._buffer = np.zeros((len(self._keys) + 1, 2 * self._Nsamples))
+
+        index = self._Nwritten % self._Nsamples
+        self._buffer[0, index] = self._data_length
+        for ind, data in enumerate(datas.values()):
+            if isinstance(data, np.ndarray) and data.ndim > 0:
+                data = data[0]
+            self._buffer[ind + 1, index] = data
+        self._buffer[:, index + self._Nsamples] = self._buffer[:, index]
+        self._Nwritten += 1
         self._data_length += 1
 
-        if self._data_length > self.Nsamples:
-            self._xaxis += 1
-        else:
-            self._xaxis = np.linspace(0, self._data_length, self._data_length, endpoint=False)
-
-        for data_key, data in datas.items():
-            if not isinstance(data, np.ndarray):
-                data = np.array([data])
-
-            if self._data_length == 1:
-                self._datas[data_key] = data
-            else:
-                self._datas[data_key] = np.concatenate((self._datas[data_key], data))
-
-            if self._data_length > self.Nsamples:
-                self._datas[data_key] = self._datas[data_key][1:]
-
     @property
     def datas(self):
-        return self._datas
+        history = self._buffer[1:, self._slice()]
+        return {key: history[ind] for ind, key in enumerate(self._keys)}
 
     @property
     def xaxis(self):
-        return self._xaxis
+        return self._buffer[0, self._slice()]
 
     def clear_data(self):
-        self._datas = dict([])
+        self._keys = []
+        self._buffer = np.zeros((1, 2 * self._Nsamples))
         self._data_length = 0
-        self._xaxis = np.array([])
+        self._Nwritten = 0
+
+
+class GrowingArray:
+    """Array growing along its first axis, used to accumulate the rows of live data whose number is not known
+
+    Rows are written in a preallocated buffer whose capacity is doubled when full, so that appending N rows costs
+    O(N) (instead of O(N^2) when concatenating arrays). The valid rows are given by the length cursor and `data` is
+    a view of them (valid until the next reallocation)
+
+    Parameters
+    ----------
+    shape: (tuple of int) shape of a row
+    capacity: (int) initial number of rows of the buffer, for instance the number of steps of a scan when known
+    dtype: (numpy dtype) type of the data
+    fill_value: (float) value of the rows not written yet
+    """
+    def __init__(self, shape=(), capacity=16, dtype=float, fill_value=np.nan):
+        self._fill_value = fill_value
+        self._buffer = np.full((max(1, int(capacity)),) + tuple(shape), fill_value, dtype=dtype)
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, item):
+        return self.data[item]
+
+    @property
+    def capacity(self):
+        return self._buffer.shape[0]
+
+    @property
+    def shape(self):
+        return (self._length,) + self._buffer.shape[1:]
+
+    @property
+    def data(self):
+        """ndarray: view of the valid rows"""
+        return self._buffer[:self._length]
+
+    def append(self, row):
+        """Append a row (an array of the row shape or anything broadcastable to it)"""
+        if self._length == self.capacity:
+            self.reserve(2 * self.capacity)
+        self._buffer[self._length] = row
+        self._length += 1
+
+    def reserve(self, capacity):
+        """Make sure the buffer can hold at least capacity rows without reallocation"""
+        if capacity > self.capacity:
+            buffer = np.full((capacity,) + self._buffer.shape[1:], self._fill_value, dtype=self._buffer.dtype)
+            buffer[:self._length] = self._buffer[:self._length]
+            self._buffer = buffer
+
+    def clear(self):
+        self._length = 0
+        self._buffer[...] = self._fill_value
 
 
 class AxisInfosExtractor:
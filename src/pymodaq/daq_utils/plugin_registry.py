@@ -0,0 +1,350 @@
+"""Discovery of the installed pymodaq plugins, PID models and extensions
+
+The entry points of the installed distributions are scanned without importing any plugin module: the plugins are
+listed from the files found in the plugin packages, whose source is parsed to check they define the plugin class (or
+a PIDModelGeneric subclass for the models), and their modules are imported only once a plugin is actually used. A
+plugin whose module cannot be imported then is dropped from the lists. The result of the scan is cached in the local
+pymodaq folder and is reused as long as the distributions exposing pymodaq entry points (names, versions) and the
+scanned folders and files (modification times) did not change.
+"""
+import ast
+import importlib
+import importlib.util
+import json
+import os
+import pkgutil
+from pathlib import Path
+
+from pymodaq.daq_utils.config import get_set_local_dir
+from pymodaq.daq_utils.daq_utils import set_logger, get_module_name, metadata, elt_as_first_element_dicts, \
+    find_dict_in_list_from_key_val
+
+logger = set_logger(get_module_name(__file__))
+
+CACHE_VERSION = 2
+entry_point_groups = ['pymodaq.plugins', 'pymodaq.pid_models', 'pymodaq.extensions']
+plugin_types = ['daq_move', 'daq_0Dviewer', 'daq_1Dviewer', 'daq_2Dviewer', 'daq_NDviewer']
+
+
+def get_plugins_package(package, plugin_type):
+    """Get the name of the subpackage of a plugin package containing the plugins of a given type"""
+    if plugin_type == 'daq_move':
+        return f'{package}.daq_move_plugins'
+    else:
+        return f'{package}.daq_viewer_plugins.plugins_{plugin_type[4:6]}'
+
+
+def get_package_dir(package):
+    """Get the folder of a (sub)package without importing it (nor its parents but the top level one)
+
+    Returns
+    -------
+    Path or None: None if the top level package cannot be found
+    """
+    parts = package.split('.')
+    spec = importlib.util.find_spec(parts[0])
+    if spec is None or spec.submodule_search_locations is None:
+        return None
+    return Path(list(spec.submodule_search_locations)[0]).joinpath(*parts[1:])
+
+
+def get_plugin_class_name(plugin_type, name):
+    """Get the name of the class a plugin module should define, eg DAQ_Move_Mock or DAQ_0DViewer_Mock"""
+    if plugin_type == 'daq_move':
+        return f'DAQ_Move_{name}'
+    else:
+        return f'DAQ_{plugin_type[4:6]}Viewer_{name}'
+
+
+def get_classes(path):
+    """Get the classes defined in a module by parsing its source instead of importing it
+
+    Returns
+    -------
+    dict: the name of the bases of each class (the last part of dotted names), empty if the source cannot be parsed
+    """
+    try:
+        tree = ast.parse(Path(path).read_text(encoding='utf-8'))
+    except Exception as e:
+        logger.warning(f'Impossible to parse {path}: {str(e)}')
+        return dict([])
+    classes = dict([])
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            classes[node.name] = [base.attr if isinstance(base, ast.Attribute) else getattr(base, 'id', None)
+                                  for base in node.bases]
+    return classes
+
+
+def get_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def get_nice_name(module_name):
+    """Get the NICE_NAME attribute of a module by parsing its source instead of importing it"""
+    try:
+        spec = importlib.util.find_spec(module_name)
+        tree = ast.parse(Path(spec.origin).read_text())
+        for node in tree.body:
+            if isinstance(node, ast.Assign) and any([isinstance(target, ast.Name) and target.id == 'NICE_NAME'
+                                                     for target in node.targets]):
+                return ast.literal_eval(node.value)
+    except Exception as e:
+        logger.warning(f'Impossible to get the name of the {module_name} extension: {str(e)}')
+    return module_name
+
+
+class PluginEntry(dict):
+    """dict describing a discovered plugin, PID model or extension, whose module is imported on first access
+
+    Holds the keys of the dicts returned by get_plugins, get_models and get_extensions (name, module and for models
+    class) but the lazy ones (module and class) are resolved by calling loader the first time they are accessed.
+
+    Parameters
+    ----------
+    loader: (callable) returning a dict with the values of the lazy keys, raising if the module cannot be imported
+    lazy_keys: (tuple of str) the keys resolved by the loader
+    kwargs: the other (static) keys, at least name
+    """
+
+    def __init__(self, loader, lazy_keys=('module',), **kwargs):
+        super().__init__(**kwargs)
+        for key in lazy_keys:
+            super().__setitem__(key, None)
+        self._loader = loader
+        self._lazy_keys = lazy_keys
+        self.loaded = False
+        self.on_error = None  # called with this entry if its module cannot be imported, see PluginRegistry.bind
+
+    def load(self):
+        if not self.loaded:
+            try:
+                self.update(self._loader())
+            except Exception as e:
+                logger.warning(f"{super().__getitem__('name')} cannot be imported and is dropped: {str(e)}")
+                if self.on_error is not None:
+                    self.on_error(self)
+                raise ImportError(f"{super().__getitem__('name')} cannot be imported: {str(e)}") from e
+            self.loaded = True
+
+    def __getitem__(self, key):
+        if key in self._lazy_keys:
+            self.load()
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+
+def load_plugin(package, module_name):
+    """Import the module of a plugin and return its parent package (holding the plugin module as attribute)"""
+    importlib.import_module(f'{package}.{module_name}')
+    return dict(module=importlib.import_module(package))
+
+
+def load_model(package, module_name):
+    from pymodaq.pid.utils import PIDModelGeneric
+    model_module = importlib.import_module(f'{package}.{module_name}')
+    for name, klass in vars(model_module).items():
+        if isinstance(klass, type) and klass.__base__ is PIDModelGeneric:
+            return dict(module=model_module, **{'class': klass})
+    raise ImportError(f'No PID model found in {model_module.__name__}')
+
+
+def load_extension(package):
+    return dict(module=importlib.import_module(package))
+
+
+class PluginRegistry:
+    """Registry of the pymodaq plugins, PID models and extensions installed
+
+    Parameters
+    ----------
+    cache_path: (Path or str or None) the json file where the scan is cached, default: plugins_cache.json in the
+        pymodaq local folder
+    path: (list of str or None) where to look for installed distributions, default: sys.path
+    """
+
+    def __init__(self, cache_path=None, path=None):
+        if cache_path is None:
+            cache_path = get_set_local_dir().joinpath('plugins_cache.json')
+        self.cache_path = Path(cache_path)
+        self.path = path
+        self.from_cache = False
+        self._registry = None
+
+    @property
+    def registry(self):
+        if self._registry is None:
+            self.load()
+        return self._registry
+
+    def get_entry_points(self):
+        """Get the pymodaq entry points of the installed distributions
+
+        Returns
+        -------
+        list of list: sorted [distribution name, distribution version, group, entry point name, entry point value]
+        """
+        kwargs = dict(path=self.path) if self.path is not None else dict([])
+        entry_points = set([])
+        for dist in metadata.distributions(**kwargs):
+            for entry_point in dist.entry_points:
+                if entry_point.group in entry_point_groups:
+                    entry_points.add((dist.metadata['Name'], dist.version, entry_point.group, entry_point.name,
+                                      entry_point.value))
+        return sorted([list(entry_point) for entry_point in entry_points])
+
+    def load(self):
+        """Load the registry from the cache if still valid, otherwise scan the entry points and update the cache"""
+        entry_points = self.get_entry_points()
+        registry = self.read_cache()
+        self.from_cache = registry is not None and registry['entry_points'] == entry_points and \
+            all([get_mtime(path) == mtime for path, mtime in registry['mtimes'].items()])
+        if not self.from_cache:
+            registry = self.scan(entry_points)
+            self.write_cache(registry)
+        self._registry = registry
+
+    def reload(self):
+        """Force a new scan of the entry points"""
+        self._registry = self.scan(self.get_entry_points())
+        self.from_cache = False
+        self.write_cache(self._registry)
+
+    def read_cache(self):
+        try:
+            if self.cache_path.is_file():
+                registry = json.loads(self.cache_path.read_text())
+                if registry.get('version', None) == CACHE_VERSION:
+                    return registry
+        except Exception as e:
+            logger.warning(f'Invalid plugins cache {self.cache_path}: {str(e)}')
+        return None
+
+    def write_cache(self, registry):
+        try:
+            self.cache_path.write_text(json.dumps(registry))
+        except Exception as e:
+            logger.warning(f'Impossible to write the plugins cache {self.cache_path}: {str(e)}')
+
+    def scan(self, entry_points):
+        """List the plugins, models and extensions exposed by the entry points, without importing them
+
+        Returns
+        -------
+        dict: the registry with keys: version, entry_points, mtimes (the modification time of each scanned folder or
+            file), plugins (dict with a list of dict(name, package) per plugin type), models (list of dict(name,
+            package)) and extensions (list of dict(name, package))
+        """
+        registry = dict(version=CACHE_VERSION, entry_points=entry_points, mtimes=dict([]),
+                        plugins={plugin_type: [] for plugin_type in plugin_types}, models=[], extensions=[])
+        for dist_name, dist_version, group, name, value in entry_points:
+            try:
+                if group == 'pymodaq.plugins':
+                    for plugin_type in plugin_types:
+                        package = get_plugins_package(value, plugin_type)
+                        for module_name, path in self.iter_modules(package, registry['mtimes']):
+                            if module_name.startswith(f'{plugin_type}_'):
+                                plugin_name = module_name[len(plugin_type) + 1:]
+                                if get_plugin_class_name(plugin_type, plugin_name) in get_classes(path):
+                                    registry['plugins'][plugin_type].append(dict(name=plugin_name, package=package))
+                                else:
+                                    logger.warning(f'{package}.{module_name} does not define the'
+                                                   f' {get_plugin_class_name(plugin_type, plugin_name)} class')
+
+                elif group == 'pymodaq.pid_models':
+                    package = f'{value}.models'
+                    for module_name, path in self.iter_modules(package, registry['mtimes']):
+                        if any(['PIDModelGeneric' in bases for bases in get_classes(path).values()]):
+                            registry['models'].append(dict(name=module_name, package=package))
+
+                else:
+                    registry['extensions'].append(dict(name=get_nice_name(value), package=value))
+                    origin = importlib.util.find_spec(value).origin
+                    registry['mtimes'][origin] = get_mtime(origin)
+
+            except Exception as e:  # pragma: no cover
+                logger.warning(f'Impossible to scan the {value} entry point of {dist_name}: {str(e)}')
+        return registry
+
+    @staticmethod
+    def iter_modules(package, mtimes):
+        """List the modules of a package from its folder, recording the modification time of the folder and of the
+        module files in mtimes
+
+        Returns
+        -------
+        list of tuple: the name and the source file of each module
+        """
+        package_dir = get_package_dir(package)
+        if package_dir is None:
+            return []
+        mtimes[str(package_dir)] = get_mtime(package_dir)
+        if not package_dir.is_dir():
+            return []
+        modules = []
+        for mod in pkgutil.iter_modules([str(package_dir)]):
+            if mod.ispkg:
+                path = package_dir.joinpath(mod.name, '__init__.py')
+            else:
+                path = package_dir.joinpath(f'{mod.name}.py')
+            mtimes[str(path)] = get_mtime(path)
+            modules.append((mod.name, path))
+        return modules
+
+    @staticmethod
+    def bind(entries, records):
+        """Set the entries so that an entry whose module cannot be imported is removed from entries and its record
+        (if any) from records (the registry in memory)"""
+        def drop(entry, record):
+            entries[:] = [other for other in entries if other is not entry]
+            if record is not None:
+                records[:] = [other for other in records if other is not record]
+
+        for entry, record in entries:
+            entry.on_error = lambda entry, record=record: drop(entry, record)
+        entries[:] = [entry for entry, record in entries]
+        return entries
+
+    def get_plugins(self, plugin_type='daq_0Dviewer'):
+        """Get the plugins of a given type, see daq_utils.get_plugins"""
+        plugins = [(PluginEntry(lambda plugin=plugin: load_plugin(plugin['package'],
+                                                                  f"{plugin_type}_{plugin['name']}"),
+                                name=plugin['name']), plugin) for plugin in self.registry['plugins'][plugin_type]]
+        if plugin_type == 'daq_move':  # utility plugin for PID
+            plugins.append((PluginEntry(lambda: load_plugin('pymodaq.pid', 'daq_move_PID'), name='PID'), None))
+        plugins = self.bind(plugins, self.registry['plugins'][plugin_type])
+        plugins[:] = elt_as_first_element_dicts(plugins, match_word='Mock', key='name')  # the list bound to entries
+        return plugins
+
+    def get_models(self, model_name=None):
+        """Get the PID models, see daq_utils.get_models"""
+        models = self.bind([(PluginEntry(lambda model=model: load_model(model['package'], model['name']),
+                                         lazy_keys=('module', 'class'), name=model['name']), model)
+                            for model in self.registry['models']], self.registry['models'])
+        if model_name is None:
+            return models
+        else:
+            return find_dict_in_list_from_key_val(models, 'name', model_name)
+
+    def get_extensions(self):
+        """Get the extensions, see daq_utils.get_extensions"""
+        return [PluginEntry(lambda extension=extension: load_extension(extension['package']),
+                            name=extension['name']) for extension in self.registry['extensions']]
+
+
+_registry = None
+
+
+def get_registry():
+    """Get the registry shared by the application (created, and loaded, on first call)"""
+    global _registry
+    if _registry is None:
+        _registry = PluginRegistry()
+    return _registry
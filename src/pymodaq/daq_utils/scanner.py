@@ -1,13 +1,14 @@
 import sys
 from collections import OrderedDict
 import numpy as np
+from scipy.spatial import cKDTree
 from pymodaq.daq_utils.config import Config
 from qtpy import QtWidgets, QtCore
 from qtpy.QtCore import QObject, Signal, Slot
 
 from pymodaq.daq_utils.parameter import ioxml
 
-from pymodaq.daq_utils.daq_utils import linspace_step, odd_even, greater2n
+from pymodaq.daq_utils.daq_utils import linspace_step, greater2n
 from pymodaq.daq_utils.plotting.scan_selector import ScanSelector
 import pymodaq.daq_utils.daq_utils as utils
 import pymodaq.daq_utils.gui_utils as gutils
@@ -28,29 +29,33 @@ SCAN_SUBTYPES = dict(Scan1D=dict(subpath=('scan1D_settings', 'scan1D_type'),
                      Scan2D=dict(subpath=('scan2D_settings', 'scan2D_type'),
                                  limits=['Spiral', 'Linear', 'Adaptive', 'Back&Forth', 'Random']),
                      Sequential=dict(subpath=('seq_settings', 'scanseq_type'),
-                                     limits=['Linear']),
+                                     limits=['Linear', 'Adaptive']),
                      Tabular=dict(subpath=('tabular_settings', 'tabular_subtype'),
                                   limits=['Linear', 'Adaptive']))
+FLY_SCAN_SUBTYPES = dict(Scan1D=['Linear'], Scan2D=['Linear', 'Back&Forth'])  # scans made of lines (see get_scan_lines)
 
 try:
     import adaptive
     from adaptive.learner import learner1D
     from adaptive.learner import learner2D
+    from adaptive.learner import learnerND
     adaptive_losses = dict(
         loss1D=['default', 'curvature', 'uniform'],
-        loss2D=['default', 'resolution', 'uniform', 'triangle'])
+        loss2D=['default', 'resolution', 'uniform', 'triangle'],
+        lossND=['default', 'curvature', 'uniform'])
 
 except Exception:
     SCAN_SUBTYPES['Scan1D']['limits'].pop(SCAN_SUBTYPES['Scan1D']['limits'].index('Adaptive'))
     SCAN_SUBTYPES['Scan2D']['limits'].pop(SCAN_SUBTYPES['Scan2D']['limits'].index('Adaptive'))
     SCAN_SUBTYPES['Tabular']['limits'].pop(SCAN_SUBTYPES['Tabular']['limits'].index('Adaptive'))
+    SCAN_SUBTYPES['Sequential']['limits'].pop(SCAN_SUBTYPES['Sequential']['limits'].index('Adaptive'))
     adaptive_losses = None
     adaptive = None
     logger.info('adaptive module is not present, no adaptive scan possible')
 
 
 class ScanInfo:
-    def __init__(self, Nsteps=0, positions=None, axes_indexes=None, axes_unique=None, **kwargs):
+    def __init__(self, Nsteps=0, positions=None, axes_indexes=None, axes_unique=None, lazy_scan=None, **kwargs):
         """
 
         Parameters
@@ -60,28 +65,241 @@ class ScanInfo:
         positions_indexes: (ndarray) multidimensional array of Nsteps 0th dimension length where each element is the index
          of the corresponding positions within the axis_unique
         axes_unique: (list of ndarray) list of sorted (and with unique values) 1D arrays of unique positions of each defined axes
+        lazy_scan: (LazyScan) if not None, positions and axes_indexes are computed from it only when accessed
         """
         self.Nsteps = Nsteps
-        self.positions = positions
-        self.axes_indexes = axes_indexes
+        self.lazy_scan = lazy_scan
+        self._positions = positions
+        self._axes_indexes = axes_indexes
         self.axes_unique = axes_unique
         for k in kwargs:
             setattr(self, k, kwargs[k])
 
+    @property
+    def positions(self):
+        if self._positions is None and self.lazy_scan is not None:
+            self._positions = self.lazy_scan.get_positions()
+        return self._positions
+
+    @positions.setter
+    def positions(self, positions):
+        self._positions = positions
+
+    @property
+    def axes_indexes(self):
+        if self._axes_indexes is None and self.lazy_scan is not None:
+            self._axes_indexes = self.lazy_scan.get_axes_indexes()
+        return self._axes_indexes
+
+    @axes_indexes.setter
+    def axes_indexes(self, axes_indexes):
+        self._axes_indexes = axes_indexes
+
+    def get_step(self, index):
+        """Get the positions and the axes indexes of the step of a given index
+
+        Returns
+        -------
+        tuple of ndarray: the positions and axes indexes of each axis
+        """
+        if self._positions is None and self.lazy_scan is not None:
+            return self.lazy_scan[index]
+        return self.positions[index], self.axes_indexes[index]
+
+    def get_steps(self, ind_start, ind_stop):
+        """Get the positions and the axes indexes of the steps from ind_start to ind_stop (excluded)
+
+        Returns
+        -------
+        tuple of ndarray: the positions and axes indexes of each step, of shape (ind_stop - ind_start, Naxes)
+        """
+        if self._positions is None and self.lazy_scan is not None:
+            return self.lazy_scan.get_steps(np.arange(ind_start, min(ind_stop, self.Nsteps)))
+        return self.positions[ind_start:ind_stop], self.axes_indexes[ind_start:ind_stop]
+
+    def get_axis_positions(self, ind_axis):
+        """Get the positions of one axis for all the steps"""
+        if self._positions is None and self.lazy_scan is not None:
+            return self.lazy_scan.get_axis_positions(ind_axis)
+        return self.positions[:, ind_axis]
+
     def __repr__(self):
-        if self.positions is not None:
+        if self._positions is None and self.lazy_scan is not None:
+            return f'[ScanInfo with {self.Nsteps} positions of shape {(self.Nsteps, self.lazy_scan.Naxes)})'
+        elif self.positions is not None:
             return f'[ScanInfo with {self.Nsteps} positions of shape {self.positions.shape})'
         else:
             return '[ScanInfo with position is None)'
 
 
+class LazyScan:
+    """Description of the steps of a scan computing the positions and axes indexes of any step on demand
+
+    Only the unique positions of each axis are stored: the positions and axes indexes of a given step are computed
+    analytically from its index (constant time random access) so that scans with a huge number of steps do not have
+    to be materialized in memory. Iterating over it yields a tuple (positions, axes_indexes) for each step.
+
+    Should be subclassed, implementing get_indexes
+
+    Parameters
+    ----------
+    axes_unique: (list of ndarray) sorted 1D arrays of the unique positions of each axis
+    Nsteps: (int) number of steps of the scan
+    """
+    chunk_size = 4096  # number of steps computed at once when iterating
+
+    def __init__(self, axes_unique, Nsteps):
+        self.axes_unique = axes_unique
+        self.Nsteps = Nsteps
+
+    @property
+    def Naxes(self):
+        return len(self.axes_unique)
+
+    def __len__(self):
+        return self.Nsteps
+
+    def __repr__(self):
+        return f'[{self.__class__.__name__} with {self.Nsteps} steps over {self.Naxes} axes]'
+
+    def get_indexes(self, indexes):
+        """Get the axes indexes (within axes_unique) of some steps
+
+        Parameters
+        ----------
+        indexes: (ndarray of int) indexes of the steps
+
+        Returns
+        -------
+        ndarray of int of shape (len(indexes), Naxes)
+        """
+        raise NotImplementedError
+
+    def get_steps(self, indexes):
+        """Get the positions and axes indexes of some steps
+
+        Parameters
+        ----------
+        indexes: (ndarray of int) indexes of the steps
+
+        Returns
+        -------
+        positions: (ndarray of shape (len(indexes), Naxes))
+        axes_indexes: (ndarray of int of shape (len(indexes), Naxes))
+        """
+        axes_indexes = self.get_indexes(np.asarray(indexes, dtype=np.int64))
+        positions = np.stack([axis[axes_indexes[:, ind]] for ind, axis in enumerate(self.axes_unique)], axis=1)
+        return positions, axes_indexes
+
+    def __getitem__(self, index):
+        if not -self.Nsteps <= index < self.Nsteps:
+            raise IndexError(f'The scan has only {self.Nsteps} steps')
+        positions, axes_indexes = self.get_steps([index % self.Nsteps])
+        return positions[0], axes_indexes[0]
+
+    def __iter__(self):
+        return self.iter_steps()
+
+    def iter_steps(self, ind_start=0):
+        """Iterate over the steps of the scan starting from the step of index ind_start
+
+        Yields
+        ------
+        tuple: (positions, axes_indexes) of each step
+        """
+        for ind_chunk in range(ind_start, self.Nsteps, self.chunk_size):
+            positions, axes_indexes = self.get_steps(np.arange(ind_chunk, min(ind_chunk + self.chunk_size,
+                                                                              self.Nsteps)))
+            for ind in range(len(positions)):
+                yield positions[ind], axes_indexes[ind]
+
+    def get_axis_positions(self, ind_axis):
+        """Get the positions of one axis for all the steps (without materializing the other axes)"""
+        axis_positions = np.empty((self.Nsteps,), dtype=self.axes_unique[ind_axis].dtype)
+        for ind_start in range(0, self.Nsteps, self.chunk_size):
+            ind_stop = min(ind_start + self.chunk_size, self.Nsteps)
+            axis_positions[ind_start:ind_stop] = \
+                self.axes_unique[ind_axis][self.get_indexes(np.arange(ind_start, ind_stop))[:, ind_axis]]
+        return axis_positions
+
+    def get_positions(self):
+        """Materialize the positions of all the steps"""
+        return self.get_steps(np.arange(self.Nsteps))[0]
+
+    def get_axes_indexes(self):
+        """Materialize the axes indexes of all the steps"""
+        return self.get_indexes(np.arange(self.Nsteps))
+
+
+class LazyScanProduct(LazyScan):
+    """Scan over all the combinations of the positions of each axis, the last axis being the fastest one
+
+    Used for linear (1D, 2D and sequential) scans
+
+    Parameters
+    ----------
+    axes_positions: (list of ndarray) monotonic 1D arrays of the positions of each axis in the scan order
+    back_and_forth: (bool) if True the last axis is scanned backward every other time (snake scan)
+    """
+
+    def __init__(self, axes_positions, back_and_forth=False):
+        axes_positions = [np.atleast_1d(np.asarray(positions)) for positions in axes_positions]
+        self._shape = tuple(len(positions) for positions in axes_positions)
+        self._reversed = [len(positions) > 1 and positions[-1] < positions[0] for positions in axes_positions]
+        self.back_and_forth = back_and_forth
+        super().__init__([positions[::-1] if reverse else positions
+                          for positions, reverse in zip(axes_positions, self._reversed)],
+                         int(np.prod(self._shape, dtype=object)))
+
+    def get_indexes(self, indexes):
+        axes_indexes = np.stack(np.unravel_index(indexes, self._shape), axis=1)
+        if self.back_and_forth and len(self._shape) > 1:
+            # the last axis is reversed when the step is on an odd row of the previous axes
+            odd_rows = (indexes // self._shape[-1]) % 2 == 1
+            axes_indexes[odd_rows, -1] = self._shape[-1] - 1 - axes_indexes[odd_rows, -1]
+        for ind, reverse in enumerate(self._reversed):
+            if reverse:
+                axes_indexes[:, ind] = self._shape[ind] - 1 - axes_indexes[:, ind]
+        return axes_indexes
+
+
+class LazyScanSpiral(LazyScan):
+    """Square spiral scan starting from its center (see set_scan_spiral)
+
+    Parameters
+    ----------
+    starts: (ndarray) the center positions of both axes
+    rsteps: (ndarray) the step sizes of both axes
+    Npts: (int) the number of steps
+    """
+
+    def __init__(self, starts, rsteps, Npts):
+        self.starts = np.asarray(starts)[:2]
+        self.rsteps = np.asarray(rsteps)[:2]
+        # the extreme positions are reached at the ends of the legs of the spiral (or at the last step)
+        Nlegs = int(np.ceil(np.sqrt(Npts))) + 1
+        leg_ends = np.cumsum(np.repeat(np.arange(1, Nlegs + 1), 2))
+        extremes = get_spiral_coordinates(np.concatenate(([0, Npts - 1], leg_ends[leg_ends < Npts])))
+        self._mins = np.min(extremes, axis=0)
+        self._maxs = np.max(extremes, axis=0)
+        axes_unique = []
+        for ind in range(2):
+            axis = np.arange(self._mins[ind], self._maxs[ind] + 1) * self.rsteps[ind] + self.starts[ind]
+            axes_unique.append(axis if self.rsteps[ind] > 0 else axis[::-1])
+        super().__init__(axes_unique, Npts)
+
+    def get_indexes(self, indexes):
+        coordinates = get_spiral_coordinates(indexes)
+        return np.where(self.rsteps > 0, coordinates - self._mins, self._maxs - coordinates)
+
+
 class ScanParameters:
     """
     Utility class to define and store information about scans to be done
     """
 
     def __init__(self, Naxes=1, scan_type='Scan1D', scan_subtype='Linear', starts=None, stops=None, steps=None,
-                 positions=None, adaptive_loss=None):
+                 positions=None, adaptive_loss=None, optimize_order=False, velocities=None):
         """
 
         Parameters
@@ -94,6 +312,9 @@ class ScanParameters:
         steps: (list of floats) list of steps position of each axis
         positions: (ndarray) containing the positions already calculated from some method. If not None, this is used to
                 define the scan_info (otherwise one use the starts, stops and steps)
+        optimize_order: (bool) if True, the positions of Scan2D and Tabular scans are reordered to minimize the travel
+                time of the actuators (see optimize_scan_order)
+        velocities: (list of floats) velocity of each axis used to estimate the travel time
 
         See Also
         --------
@@ -110,6 +331,8 @@ class ScanParameters:
         self.scan_type = scan_type
         self.scan_subtype = scan_subtype
         self.adaptive_loss = adaptive_loss
+        self.optimize_order = optimize_order
+        self.velocities = velocities
         self.vectors = None
 
         # if positions is not None:
@@ -145,22 +368,60 @@ class ScanParameters:
             if len(positions.shape) == 1:
                 positions = np.expand_dims(positions, 1)
             axes_unique = []
-            for ax in positions.T:
-                axes_unique.append(np.unique(ax))
             axes_indexes = np.zeros_like(positions, dtype=int)
-            for ind in range(positions.shape[0]):
-                for ind_pos, pos in enumerate(positions[ind]):
-                    axes_indexes[ind, ind_pos] = mutils.find_index(axes_unique[ind_pos], pos)[0][0]
+            for ind_ax, ax in enumerate(positions.T):
+                ax_unique, axes_indexes[:, ind_ax] = np.unique(ax, return_inverse=True)
+                axes_unique.append(ax_unique)
 
             return ScanInfo(Nsteps=positions.shape[0], axes_unique=axes_unique,
                             axes_indexes=axes_indexes, positions=positions, adaptive_loss=self.adaptive_loss)
         else:
             return ScanInfo()
 
+    def get_info_from_lazy_scan(self, lazy_scan):
+        """Get a ScanInfo whose positions and axes_indexes are only computed if accessed
+
+        Use get_step to get the positions and axes indexes of a given step without materializing the whole scan
+        """
+        return ScanInfo(Nsteps=lazy_scan.Nsteps, axes_unique=lazy_scan.axes_unique, lazy_scan=lazy_scan,
+                        adaptive_loss=self.adaptive_loss)
+
+    def get_step(self, index):
+        """Get the positions and the axes indexes of the step of a given index (see ScanInfo.get_step)"""
+        return self.scan_info.get_step(index)
+
+    def get_steps(self, ind_start, ind_stop):
+        """Get the positions and the axes indexes of a range of steps (see ScanInfo.get_steps)"""
+        return self.scan_info.get_steps(ind_start, ind_stop)
+
+    def get_axis_positions(self, ind_axis):
+        """Get the positions of one axis for all the steps (see ScanInfo.get_axis_positions)"""
+        return self.scan_info.get_axis_positions(ind_axis)
+
+    def __iter__(self):
+        """Iterate over the steps of the scan yielding a tuple (positions, axes_indexes)"""
+        return self.iter_steps()
+
+    def iter_steps(self, ind_start=0):
+        """Iterate over the steps of the scan from the step of index ind_start (for instance to resume a scan),
+        yielding a tuple (positions, axes_indexes) without materializing the positions of lazy scans"""
+        if self.scan_info.lazy_scan is not None and self.scan_info._positions is None:
+            return self.scan_info.lazy_scan.iter_steps(ind_start)
+        return zip(self.positions[ind_start:], self.axes_indexes[ind_start:])
+
+    def is_lazy(self):
+        """Check if the positions of the scan are computed by chunks when needed (see LazyScan) rather than all at
+        once: linear, back and forth and spiral 2D scans and linear sequential scans, unless their order is optimized"""
+        if self.optimize_order and self.scan_type == 'Scan2D':
+            return False
+        return (self.scan_type == 'Scan2D' and self.scan_subtype in ('Linear', 'Back&Forth', 'Spiral')) or \
+            (self.scan_type == 'Sequential' and self.scan_subtype == 'Linear')
+
     def set_scan(self):
         steps_limit = config('scan', 'steps_limit')
         Nsteps = self.evaluate_Nsteps()
-        if Nsteps > steps_limit:
+        # the limit protects the memory from materialized positions, lazy scans never hold all their positions
+        if Nsteps > steps_limit and not self.is_lazy():
             self.scan_info = ScanInfo(Nsteps=Nsteps)
             return self.scan_info
 
@@ -190,21 +451,24 @@ class ScanParameters:
                 raise ScannerException(f'The chosen scan_subtype: {str(self.scan_subtype)} is not known')
 
         elif self.scan_type == "Scan2D":
-            if self.scan_subtype != 'Adaptive':
+            if self.scan_subtype != 'Adaptive' and not self.is_lazy():
                 if np.abs((self.stops[0]-self.starts[0]) / self.steps[0]) > steps_limit:
                     return ScanInfo()
 
             if self.scan_subtype == 'Spiral':
-                positions = set_scan_spiral(self.starts, self.stops, self.steps)
-                self.scan_info = self.get_info_from_positions(positions)
+                starts, rsteps, Npts = get_spiral_parameters(self.starts, self.stops, self.steps)
+                if Npts == 1:
+                    self.scan_info = self.get_info_from_lazy_scan(LazyScanProduct(starts[:2, np.newaxis]))
+                else:
+                    self.scan_info = self.get_info_from_lazy_scan(LazyScanSpiral(starts, rsteps, Npts))
 
             elif self.scan_subtype == 'Back&Forth':
-                positions = set_scan_linear(self.starts, self.stops, self.steps, back_and_force=True)
-                self.scan_info = self.get_info_from_positions(positions)
+                self.scan_info = self.get_info_from_lazy_scan(
+                    LazyScanProduct(get_linear_axes(self.starts, self.stops, self.steps), back_and_forth=True))
 
             elif self.scan_subtype == 'Linear':
-                positions = set_scan_linear(self.starts, self.stops, self.steps, back_and_force=False)
-                self.scan_info = self.get_info_from_positions(positions)
+                self.scan_info = self.get_info_from_lazy_scan(
+                    LazyScanProduct(get_linear_axes(self.starts, self.stops, self.steps)))
 
             elif self.scan_subtype == 'Random':
                 positions = set_scan_random(self.starts, self.stops, self.steps)
@@ -219,8 +483,13 @@ class ScanParameters:
 
         elif self.scan_type == "Sequential":
             if self.scan_subtype == 'Linear':
-                positions = set_scan_sequential(self.starts, self.stops, self.steps)
-                self.scan_info = self.get_info_from_positions(positions)
+                self.scan_info = self.get_info_from_lazy_scan(
+                    LazyScanProduct([get_sequential_axis(start, stop, step)
+                                     for start, stop, step in zip(self.starts, self.stops, self.steps)]))
+            elif self.scan_subtype == 'Adaptive':
+                # return an "empty" ScanInfo as positions will be "set" during the scan
+                self.scan_info = ScanInfo(Nsteps=0, positions=np.zeros([0, self.Naxes]), axes_unique=[np.array([])],
+                                          axes_indexes=np.array([]), adaptive_loss=self.adaptive_loss)
             else:
                 raise ScannerException(f'The chosen scan_subtype: {str(self.scan_subtype)} is not known')
 
@@ -246,8 +515,26 @@ class ScanParameters:
                                           adaptive_loss=self.adaptive_loss)
             else:
                 raise ScannerException(f'The chosen scan_subtype: {str(self.scan_subtype)} is not known')
+
+        if self.optimize_order and self.scan_type in ('Scan2D', 'Tabular') and self.scan_subtype != 'Adaptive':
+            self.set_optimized_order()
         return self.scan_info
 
+    def set_optimized_order(self):
+        """Reorder the positions to minimize the travel time of the actuators
+
+        The axes indexes are recomputed from the reordered positions. The estimated travel times before and after
+        the optimization are stored as the travel_time and travel_time_optimized attributes of the scan_info
+        """
+        positions = self.scan_info.positions
+        if positions is None:
+            return
+        order = optimize_scan_order(positions, self.velocities)
+        travel_time = get_travel_time(positions, self.velocities)
+        self.scan_info = self.get_info_from_positions(positions[order])
+        self.scan_info.travel_time = travel_time
+        self.scan_info.travel_time_optimized = get_travel_time(self.scan_info.positions, self.velocities)
+
     def evaluate_Nsteps(self):
         Nsteps = 1
         if self.starts is not None:
@@ -278,6 +565,16 @@ class Scanner(QObject):
     params = [#{'title': 'Scanner settings', 'name': 'scan_options', 'type': 'group', 'children': [
         {'title': 'Calculate positions:', 'name': 'calculate_positions', 'type': 'action'},
         {'title': 'N steps:', 'name': 'Nsteps', 'type': 'int', 'value': 0, 'readonly': True},
+        {'title': 'Travel optimization', 'name': 'travel_settings', 'type': 'group', 'expanded': False, 'children': [
+            {'title': 'Optimize order:', 'name': 'optimize_order', 'type': 'bool', 'value': False,
+             'tip': 'Reorder the positions of Scan2D and Tabular scans to minimize the travel time of the actuators'},
+            {'title': 'Travel time (s):', 'name': 'travel_time', 'type': 'float', 'value': 0., 'readonly': True,
+             'tip': 'Estimated travel time of the actuators before the optimization'},
+            {'title': 'Optimized time (s):', 'name': 'travel_time_optimized', 'type': 'float', 'value': 0.,
+             'readonly': True, 'tip': 'Estimated travel time of the actuators after the optimization'},
+            {'title': 'Velocities:', 'name': 'velocities', 'type': 'group', 'children': [],
+             'tip': 'Velocity of each actuator (in units/s) used to estimate the travel times'},
+        ]},
 
         {'title': 'Scan type:', 'name': 'scan_type', 'type': 'list', 'limits': SCAN_TYPES,
          'value': config('scan', 'default')},
@@ -324,7 +621,10 @@ class Scanner(QObject):
         ]},
         {'title': 'Sequential settings', 'name': 'seq_settings', 'type': 'group', 'visible': False, 'children': [
             {'title': 'Scan subtype:', 'name': 'scanseq_type', 'type': 'list',
-             'limits': SCAN_SUBTYPES['Sequential']['limits'], 'value': SCAN_SUBTYPES['Sequential']['limits'][0], },
+             'limits': SCAN_SUBTYPES['Sequential']['limits'], 'value': SCAN_SUBTYPES['Sequential']['limits'][0],
+             'tip': 'For adaptive, an algo will determine the positions to check within the scan bounds.'},
+            {'title': 'Loss type', 'name': 'seq_loss', 'type': 'list',
+             'limits': [], 'tip': 'Type of loss used by the algo. to determine next points'},
             {'title': 'Sequences', 'name': 'seq_table', 'type': 'table_view',
              'delegate': gutils.SpinBoxDelegate},
         ]},
@@ -385,6 +685,9 @@ class Scanner(QObject):
             if 'loss2D' in adaptive_losses:
                 self.settings.child('scan2D_settings', 'scan2D_loss').setOpts(
                     limits=adaptive_losses['loss2D'], visible=False)
+            if 'lossND' in adaptive_losses:
+                self.settings.child('seq_settings', 'seq_loss').setOpts(
+                    limits=adaptive_losses['lossND'], visible=False)
 
         self.actuators = actuators
         # if actuators != []:
@@ -406,15 +709,23 @@ class Scanner(QObject):
     def load_xml(self):
         fname = gutils.select_file(start_path=None, save=False, ext='xml')
         if fname is not None and fname != '':
-            par = ioxml.XML_file_to_parameter(fname)
-            self.settings.restoreState(Parameter.create(name='settings', type='group', children=par).saveState())
-            self.update_model()
-            scan_type = self.settings.child('scan_type').value()
-            if scan_type == 'Sequential':
-                self.table_model = self.settings.child('seq_settings', 'seq_table').value()
-            elif scan_type == 'Tabular':
-                self.table_model = self.settings.child('tabular_settings', 'tabular_table').value()
-            self.set_scan()
+            self.restore_settings(ioxml.XML_file_to_parameter(fname))
+
+    def restore_settings(self, par):
+        """Restore the scanner settings (and set the scan) from a list of parameter dicts
+
+        Parameters
+        ----------
+        par: (list of dict) for instance as returned by ioxml.XML_string_to_parameter
+        """
+        self.settings.restoreState(Parameter.create(name='settings', type='group', children=par).saveState())
+        self.update_model()
+        scan_type = self.settings.child('scan_type').value()
+        if scan_type == 'Sequential':
+            self.table_model = self.settings.child('seq_settings', 'seq_table').value()
+        elif scan_type == 'Tabular':
+            self.table_model = self.settings.child('tabular_settings', 'tabular_table').value()
+        self.set_scan()
 
     def save_xml(self):
         """
@@ -474,8 +785,20 @@ class Scanner(QObject):
             self.settings.child('scan2D_settings', 'stop_2d_axis2').setOpts(tip=tip)
             self.settings.child('scan2D_settings', 'step_2d_axis2').setOpts(tip=tip)
 
+        velocities = self.settings.child('travel_settings', 'velocities')
+        values = [child.value() for child in velocities.children()]
+        velocities.clearChildren()
+        for ind, act in enumerate(act_list):
+            velocities.addChild({'title': f'{act}:', 'name': f'velocity_{ind:02d}', 'type': 'float',
+                                 'value': values[ind] if ind < len(values) else 1., 'min': 1e-12})
+
         self.update_model()
 
+    def get_velocities(self, Naxes):
+        """Get the velocity of each axis from the settings (1 if not defined)"""
+        velocities = [child.value() for child in self.settings.child('travel_settings', 'velocities').children()]
+        return (velocities + [1.] * Naxes)[:Naxes]
+
     def update_model(self, init_data=None):
         try:
             scan_type = self.settings.child('scan_type').value()
@@ -617,6 +940,10 @@ class Scanner(QObject):
                     status = 'adaptive' in param.value().lower()
                     self.settings.child('scan1D_settings', 'scan1D_loss').show(status)
 
+                elif param.name() == 'scanseq_type':
+                    status = 'adaptive' in param.value().lower()
+                    self.settings.child('seq_settings', 'seq_loss').show(status)
+
                 elif param.name() == 'tabular_subtype':
                     isadaptive = 'adaptive' in self.settings.child('tabular_settings',
                                                                    'tabular_subtype').value().lower()
@@ -663,7 +990,7 @@ class Scanner(QObject):
                     self.update_scan2D_type(param)
                     self.set_scan()
 
-                elif param.name() == 'Nsteps':
+                elif param.name() in ['Nsteps', 'travel_time', 'travel_time_optimized']:
                     pass  # just do nothing (otherwise set_scan will be fired, see below)
 
                 else:
@@ -714,7 +1041,10 @@ class Scanner(QObject):
                                                                                    'scan2D_type').value(),
                                                   starts=starts, stops=stops, steps=steps,
                                                   adaptive_loss=self.settings.child('scan2D_settings',
-                                                                                    'scan2D_loss').value())
+                                                                                    'scan2D_loss').value(),
+                                                  optimize_order=self.settings.child('travel_settings',
+                                                                                     'optimize_order').value(),
+                                                  velocities=self.get_velocities(2))
 
         elif scan_type == "Sequential":
             starts = [self.table_model.get_data(ind, 1) for ind in range(self.table_model.rowCount(None))]
@@ -723,7 +1053,9 @@ class Scanner(QObject):
             self.scan_parameters = ScanParameters(Naxes=len(starts), scan_type="Sequential",
                                                   scan_subtype=self.settings.child('seq_settings',
                                                                                    'scanseq_type').value(),
-                                                  starts=starts, stops=stops, steps=steps)
+                                                  starts=starts, stops=stops, steps=steps,
+                                                  adaptive_loss=self.settings.child('seq_settings',
+                                                                                    'seq_loss').value())
 
         elif scan_type == 'Tabular':
             positions = np.array(self.table_model.get_data_all())
@@ -743,9 +1075,16 @@ class Scanner(QObject):
                                                                                    'tabular_subtype').value(),
                                                   starts=starts, stops=stops, steps=steps, positions=positions,
                                                   adaptive_loss=self.settings.child('tabular_settings',
-                                                                                    'tabular_loss').value())
+                                                                                    'tabular_loss').value(),
+                                                  optimize_order=self.settings.child('travel_settings',
+                                                                                     'optimize_order').value(),
+                                                  velocities=self.get_velocities(Naxes))
 
         self.settings.child('Nsteps').setValue(self.scan_parameters.Nsteps)
+        self.settings.child('travel_settings', 'travel_time').setValue(
+            getattr(self.scan_parameters.scan_info, 'travel_time', 0.))
+        self.settings.child('travel_settings', 'travel_time_optimized').setValue(
+            getattr(self.scan_parameters.scan_info, 'travel_time_optimized', 0.))
         self.scan_params_signal.emit(self.scan_parameters)
         return self.scan_parameters
 
@@ -1035,6 +1374,21 @@ def set_scan_linear(starts, stops, steps, back_and_force=False, oversteps=10000)
     --------
     ScanParameters
     """
+    axis_1_unique, axis_2_unique = get_linear_axes(starts, stops, steps, oversteps)
+    if len(axis_1_unique) == 1 and len(axis_2_unique) == 1:
+        return np.array([starts])
+    axes_indexes = get_linear_indexes(len(axis_1_unique), len(axis_2_unique), back_and_forth=back_and_force)
+    return np.stack((axis_1_unique[axes_indexes[:, 0]], axis_2_unique[axes_indexes[:, 1]]), axis=1)
+
+
+def get_linear_axes(starts, stops, steps, oversteps=10000):
+    """Get the positions along both axes of a 2D linear scan (see set_scan_linear)
+
+    Returns
+    -------
+    list of two ndarray: the positions of each axis in the scan order. Both contain only the starts if the scan is
+        not properly defined
+    """
     starts = np.array(starts)
     stops = np.array(stops)
     steps = np.array(steps)
@@ -1042,32 +1396,84 @@ def set_scan_linear(starts, stops, steps, back_and_force=False, oversteps=10000)
     if np.any(np.abs(steps) < 1e-12) or \
             np.any(np.sign(stops - starts) != np.sign(steps)) or \
             np.any(starts == stops):
-        return np.array([starts])
+        return [starts[0:1], starts[1:2]]
 
-    else:
-        axis_1_unique = linspace_step(starts[0], stops[0], steps[0])
-        len1 = len(axis_1_unique)
-
-        axis_2_unique = linspace_step(starts[1], stops[1], steps[1])
-        len2 = len(axis_2_unique)
-        # if number of steps is over oversteps, reduce both axis in the same ratio
-        if len1 * len2 > oversteps:
-            axis_1_unique = axis_1_unique[:int(np.ceil(np.sqrt(oversteps * len1 / len2)))]
-            axis_2_unique = axis_2_unique[:int(np.ceil(np.sqrt(oversteps * len2 / len1)))]
-
-        positions = []
-        for ind_x, pos1 in enumerate(axis_1_unique):
-            if back_and_force:
-                for ind_y, pos2 in enumerate(axis_2_unique):
-                    if not odd_even(ind_x):
-                        positions.append([pos1, pos2])
-                    else:
-                        positions.append([pos1, axis_2_unique[len(axis_2_unique) - ind_y - 1]])
-            else:
-                for ind_y, pos2 in enumerate(axis_2_unique):
-                    positions.append([pos1, pos2])
+    axis_1_unique = linspace_step(starts[0], stops[0], steps[0])
+    len1 = len(axis_1_unique)
 
-        return np.array(positions)
+    axis_2_unique = linspace_step(starts[1], stops[1], steps[1])
+    len2 = len(axis_2_unique)
+    # if number of steps is over oversteps, reduce both axis in the same ratio
+    if len1 * len2 > oversteps:
+        axis_1_unique = axis_1_unique[:int(np.ceil(np.sqrt(oversteps * len1 / len2)))]
+        axis_2_unique = axis_2_unique[:int(np.ceil(np.sqrt(oversteps * len2 / len1)))]
+    return [axis_1_unique, axis_2_unique]
+
+
+def get_linear_indexes(len1, len2, back_and_forth=False):
+    """Get the indexes of the axes for a 2D linear scan, the second axis being the fast one
+
+    Parameters
+    ----------
+    len1: (int) number of positions along the first (slow) axis
+    len2: (int) number of positions along the second (fast) axis
+    back_and_forth: (bool) if True the second axis is scanned backward for odd indexes of the first axis (snake)
+
+    Returns
+    -------
+    ndarray of int of shape (len1 * len2, 2)
+    """
+    indexes_1 = np.repeat(np.arange(len1), len2)
+    indexes_2 = np.tile(np.arange(len2), len1)
+    if back_and_forth:
+        indexes_2 = np.where(indexes_1 % 2 == 1, len2 - 1 - indexes_2, indexes_2)
+    return np.stack((indexes_1, indexes_2), axis=1)
+
+
+def get_spiral_indexes(Npts):
+    """Get the (signed) indexes of the Npts first positions of a square spiral starting from (0, 0)
+
+    The spiral is made of legs of increasing length: 1 step along the first axis then 1 along the second, then 2 steps
+    backward along each, then 3 forward...
+
+    Parameters
+    ----------
+    Npts: (int) number of positions
+
+    Returns
+    -------
+    ndarray of int of shape (Npts, 2)
+    """
+    return get_spiral_coordinates(np.arange(Npts))
+
+
+def get_spiral_coordinates(indexes):
+    """Get the (signed) indexes along both axes of the positions of given indexes along a square spiral
+
+    Computed analytically: the spiral position of any index is obtained in constant time (see get_spiral_indexes)
+
+    Parameters
+    ----------
+    indexes: (ndarray of int) indexes of the positions along the spiral (0 being its center)
+
+    Returns
+    -------
+    ndarray of int of shape (len(indexes), 2)
+    """
+    indexes = np.asarray(indexes, dtype=np.int64)
+    # the pair of legs number m (of length m each) ends at index m * (m + 1)
+    pairs = np.ceil((np.sqrt(1 + 4 * indexes.astype(float)) - 1) / 2).astype(np.int64)
+    pairs += pairs * (pairs + 1) < indexes  # correct possible rounding errors
+    pairs -= (pairs > 0) & ((pairs - 1) * pairs >= indexes)
+    # position at the end of the previous pair of legs
+    previous = pairs - 1
+    corner = np.where(previous % 2 == 1, (previous + 1) // 2, -(previous // 2))
+    signs = np.where(pairs % 2 == 1, 1, -1)
+    in_pair = indexes - previous * pairs  # number of steps done within the current pair of legs
+    coordinates = np.empty(indexes.shape + (2,), dtype=np.int64)
+    coordinates[..., 0] = corner + signs * np.minimum(in_pair, pairs)
+    coordinates[..., 1] = corner + signs * np.maximum(in_pair - pairs, 0)
+    return coordinates
 
 
 def set_scan_random(starts, stops, steps, oversteps=10000):
@@ -1109,6 +1515,21 @@ def set_scan_spiral(starts, rmaxs, rsteps, nsteps=None, oversteps=10000):
     --------
     ScanParameters
     """
+    starts, rsteps, Npts = get_spiral_parameters(starts, rmaxs, rsteps, nsteps, oversteps)
+    if Npts == 1:
+        return np.array([starts])
+    return get_spiral_indexes(Npts) * rsteps[:2] + starts[:2]
+
+
+def get_spiral_parameters(starts, rmaxs, rsteps, nsteps=None, oversteps=10000):
+    """Get the center, the steps and the number of positions of a spiral scan (see set_scan_spiral)
+
+    Returns
+    -------
+    starts: (ndarray) the center positions
+    rsteps: (ndarray) the step sizes
+    Npts: (int) the number of positions, 1 if the scan is not properly defined
+    """
     if np.isscalar(rmaxs):
         rmaxs = np.ones(starts.shape) * rmaxs
     else:
@@ -1124,11 +1545,8 @@ def set_scan_spiral(starts, rmaxs, rsteps, nsteps=None, oversteps=10000):
         rmaxs = np.rint(nsteps / 2) * rsteps
 
     if np.any(np.array(rmaxs) == 0) or np.any(np.abs(rmaxs) < 1e-12) or np.any(np.abs(rsteps) < 1e-12):
-        positions = np.array([starts])
-        return positions
+        return starts, rsteps, 1
 
-    ind = 0
-    flag = True
     oversteps = greater2n(oversteps)  # make sure the position matrix is still a square
 
     Nlin = np.trunc(rmaxs / rsteps)
@@ -1137,37 +1555,248 @@ def set_scan_spiral(starts, rmaxs, rsteps, nsteps=None, oversteps=10000):
     else:
         Nlin = Nlin[0]
 
-    axis_1_indexes = [0]
-    axis_2_indexes = [0]
-    while flag:
-        if odd_even(ind):
-            step = 1
+    return starts, rsteps, int(min((2 * Nlin + 1) ** 2, oversteps))
+
+
+def get_travel_times(positions, velocities=None):
+    """Get the time needed by the actuators to go from each position to the next one
+
+    The actuators are moving concurrently: the travel time of a move is the one of its slowest axis
+
+    Parameters
+    ----------
+    positions: (ndarray) positions of shape (Nsteps, Naxes) or (Nsteps,)
+    velocities: (sequence like) velocity of each axis (default to 1 for all axes)
+
+    Returns
+    -------
+    ndarray of shape (Nsteps - 1,)
+    """
+    positions = np.asarray(positions, dtype=float)
+    if len(positions.shape) == 1:
+        positions = np.expand_dims(positions, 1)
+    velocities = np.ones(positions.shape[1]) if velocities is None else np.asarray(velocities, dtype=float)
+    return np.max(np.abs(np.diff(positions, axis=0)) / velocities, axis=1)
+
+
+def get_travel_time(positions, velocities=None):
+    """Get the total time needed by the actuators to go through all the positions (see get_travel_times)"""
+    return float(np.sum(get_travel_times(positions, velocities)))
+
+
+def get_strips_order(scaled):
+    """Get a boustrophedon order of positions: the range of the first axis is cut into strips, travelled along the
+    second axis in alternating directions
+
+    Parameters
+    ----------
+    scaled: (ndarray) positions of shape (Npts, Naxes)
+
+    Returns
+    -------
+    ndarray of int: the indexes of the positions in the strips order
+    """
+    Npts, Naxes = scaled.shape
+    if Naxes == 1:
+        return np.argsort(scaled[:, 0], kind='stable')
+    Nstrips = max(1, int(np.sqrt(Npts / 2)))
+    span = np.ptp(scaled[:, 0])
+    if span == 0:
+        strips = np.zeros((Npts,), dtype=int)
+    else:
+        strips = np.minimum(((scaled[:, 0] - np.min(scaled[:, 0])) / span * Nstrips).astype(int), Nstrips - 1)
+    along = np.where(strips % 2 == 0, scaled[:, 1], -scaled[:, 1])
+    return np.lexsort((along, strips))
+
+
+def reverse_segments(route, starts, stops):
+    """Reverse in one go non-overlapping segments of a route, the segment i spanning route[starts[i]:stops[i] + 1]"""
+    lengths = stops - starts + 1
+    offsets = np.arange(np.sum(lengths)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    segment_indexes = np.repeat(starts, lengths) + offsets
+    permutation = np.arange(len(route))
+    permutation[segment_indexes] = np.repeat(starts + stops, lengths) - segment_indexes
+    return route[permutation]
+
+
+def optimize_scan_order(positions, velocities=None, Nneighbours=10, max_passes=100):
+    """Get an order of the positions minimizing the travel time of the actuators (travelling salesman problem)
+
+    The path starts from the first position, then follows a boustrophedon order (see get_strips_order) and is
+    improved by 2-opt moves, the candidate moves being limited to the Nneighbours closest positions found using a
+    kd-tree. Each pass evaluates the candidate moves of all the positions at once and applies the best non-overlapping
+    ones. As the actuators are moving concurrently, the travel time between two positions is the Chebyshev distance of
+    the positions scaled by the velocities (see get_travel_times)
+
+    Parameters
+    ----------
+    positions: (ndarray) positions of shape (Nsteps, Naxes) or (Nsteps,)
+    velocities: (sequence like) velocity of each axis (default to 1 for all axes)
+    Nneighbours: (int) number of closest positions considered for each 2-opt move
+    max_passes: (int) maximum number of passes of 2-opt moves over the whole path
+
+    Returns
+    -------
+    ndarray of int: the indexes of the positions in the optimized order, the initial order if it is not improved
+    """
+    positions = np.asarray(positions, dtype=float)
+    if len(positions.shape) == 1:
+        positions = np.expand_dims(positions, 1)
+    Npts = positions.shape[0]
+    if Npts < 4:
+        return np.arange(Npts)
+    velocities = np.ones(positions.shape[1]) if velocities is None else np.asarray(velocities, dtype=float)
+    scaled = positions / velocities
+
+    order = get_strips_order(scaled)
+    route = np.concatenate(([0], order[order != 0]))
+
+    def travel(ind_from, ind_to):
+        return np.max(np.abs(scaled[ind_from] - scaled[ind_to]), axis=-1)
+
+    # 2-opt moves: the edges (a, b) and (c, d) are replaced by (a, c) and (b, d), reversing the path from b to c
+    neighbours = cKDTree(scaled).query(scaled, k=min(Nneighbours + 1, Npts), p=np.inf)[1][:, 1:]
+    inds = np.arange(Npts - 2)
+    for ind_pass in range(max_passes):
+        route_indexes = np.empty((Npts,), dtype=int)
+        route_indexes[route] = np.arange(Npts)
+        edges = np.append(travel(route[:-1], route[1:]), 0.)  # travel time from each position of the route to the next
+        a, b = route[inds], route[inds + 1]
+        inds_c = route_indexes[neighbours[a]]
+        c = route[inds_c]
+        d = route[np.minimum(inds_c + 1, Npts - 1)]
+        new_edges_bd = np.where(inds_c < Npts - 1, travel(b[:, None], d), 0.)
+        gains = edges[inds][:, None] + edges[inds_c] - travel(a[:, None], c) - new_edges_bd
+        gains[inds_c <= inds[:, None] + 1] = 0.
+        best = np.argmax(gains, axis=1)
+        best_gains = gains[inds, best]
+        improving = np.flatnonzero(best_gains > 1e-12 * np.maximum(edges[inds], 1e-300))
+        if len(improving) == 0:
+            break
+        # the moves spanning positions starts..stops of the route are independent if they do not overlap: they are
+        # picked by decreasing gain among the improving ones
+        improving = improving[np.argsort(-best_gains[improving])]
+        starts = improving
+        stops = inds_c[improving, best[improving]] + 1
+        taken = np.zeros((Npts + 1,), dtype=bool)  # stop is Npts when the move reverses the end of the route
+        kept = np.zeros((len(improving),), dtype=bool)
+        for ind_move, (start, stop) in enumerate(zip(starts, stops)):
+            if not np.any(taken[start:stop + 1]):
+                taken[start:stop + 1] = True
+                kept[ind_move] = True
+        route = reverse_segments(route, starts[kept] + 1, stops[kept] - 1)
+
+    if get_travel_time(positions[route], velocities) < get_travel_time(positions, velocities):
+        return route
+    else:
+        return np.arange(Npts)
+
+
+def is_fly_scan_possible(scan_type, scan_subtype):
+    """Check if a scan is made of lines along which an actuator can move continuously (see FLY_SCAN_SUBTYPES)"""
+    return scan_subtype in FLY_SCAN_SUBTYPES.get(scan_type, [])
+
+
+def get_scan_lines(positions, axis=None):
+    """Split the positions of a scan into lines along which a single axis moves monotonically
+
+    Parameters
+    ----------
+    positions: (ndarray) positions of shape (Nsteps, Naxes) or (Nsteps,)
+    axis: (int) the axis moving along the lines. If None, the axis moving between the two first positions
+
+    Returns
+    -------
+    list of tuple: the indexes (start, stop) of the first and last positions of each line. Positions reached by a
+        move of other axes and not followed by a move along axis are lines of a single position (start == stop)
+    """
+    positions = np.asarray(positions)
+    if len(positions.shape) == 1:
+        positions = np.expand_dims(positions, 1)
+    Npts = positions.shape[0]
+    if Npts < 2:
+        return [(0, 0)] if Npts == 1 else []
+    diffs = np.diff(positions, axis=0)
+    moving = diffs != 0
+    if axis is None:
+        axis = int(np.argmax(moving[0]))
+    # direction of each move along axis only, 0 if other axes are moving
+    directions = np.where(np.count_nonzero(moving, axis=1) == 1,
+                          np.sign(diffs[:, axis]), 0).astype(int)
+
+    run_starts = np.flatnonzero(np.concatenate(([True], directions[1:] != directions[:-1])))
+    run_stops = np.append(run_starts[1:], len(directions))
+    lines = []
+    ind_next = 0  # first position not yet in a line
+    for run_start, run_stop in zip(run_starts, run_stops):
+        if directions[run_start] == 0:
+            continue
+        start = max(run_start, ind_next)
+        lines.extend([(ind, ind) for ind in range(ind_next, start)])
+        lines.append((int(start), int(run_stop)))
+        ind_next = int(run_stop) + 1
+    lines.extend([(ind, ind) for ind in range(ind_next, Npts)])
+    return lines
+
+
+def iter_scan_lines(get_steps, Nsteps, axis=None, chunk_size=None):
+    """Iterate over the lines of a scan (see get_scan_lines) computing its positions chunk by chunk, so that the
+    positions of a lazy scan are never all held in memory
+
+    Parameters
+    ----------
+    get_steps: (callable) returning the positions and axes indexes of the steps from ind_start to ind_stop (excluded),
+        for instance ScanParameters.get_steps
+    Nsteps: (int) the number of steps of the scan
+    axis: (int) the axis moving along the lines. If None, the axis moving between the two first positions
+    chunk_size: (int) the number of steps computed at once, default: LazyScan.chunk_size. A chunk is enlarged if a
+        line doesn't fit in it
+
+    Yields
+    ------
+    tuple: the indexes (start, stop) of the first and last positions of a line, then these two positions
+    """
+    if chunk_size is None:
+        chunk_size = LazyScan.chunk_size
+    ind_start = 0
+    ind_stop = min(chunk_size, Nsteps)
+    while ind_start < Nsteps:
+        positions = get_steps(ind_start, ind_stop)[0]
+        if axis is None and len(positions) > 1:
+            axis = int(np.argmax(np.diff(positions[:2], axis=0)[0] != 0))
+        lines = get_scan_lines(positions, axis)
+        if ind_stop < Nsteps:  # the last line may go on in the next chunk
+            if lines[-1][0] == 0:  # a line longer than the chunk
+                ind_stop = min(ind_start + 2 * (ind_stop - ind_start), Nsteps)
+                continue
+            ind_next = ind_start + lines[-1][0]
+            lines = lines[:-1]
         else:
-            step = -1
-        if flag:
+            ind_next = Nsteps
+        for start, stop in lines:
+            yield ind_start + start, ind_start + stop, positions[start], positions[stop]
+        ind_start = ind_next
+        ind_stop = min(ind_start + chunk_size, Nsteps)
 
-            for ind_step in range(ind):
-                axis_1_indexes.append(axis_1_indexes[-1] + step)
-                axis_2_indexes.append(axis_2_indexes[-1])
-                if len(axis_1_indexes) >= (2 * Nlin + 1) ** 2 or len(axis_1_indexes) >= oversteps:
-                    flag = False
-                    break
-        if flag:
-            for ind_step in range(ind):
 
-                axis_1_indexes.append(axis_1_indexes[-1])
-                axis_2_indexes.append(axis_2_indexes[-1] + step)
-                if len(axis_1_indexes) >= (2 * Nlin + 1) ** 2 or len(axis_1_indexes) >= oversteps:
-                    flag = False
-                    break
-        ind += 1
+def get_fly_positions(times, readback_times, readback_positions):
+    """Interpolate the positions of actuators at given times from timestamped readbacks of their positions
 
-    positions = []
-    for ind in range(len(axis_1_indexes)):
-        positions.append(np.array([axis_1_indexes[ind] * rsteps[0] + starts[0],
-                                   axis_2_indexes[ind] * rsteps[1] + starts[1]]))
+    Parameters
+    ----------
+    times: (ndarray) 1D array of the times (for instance the acquisition times of frames)
+    readback_times: (ndarray) 1D array of the increasing times of the readbacks
+    readback_positions: (ndarray) readback positions of shape (Nreadbacks, Naxes) or (Nreadbacks,)
 
-    return np.array(positions)
+    Returns
+    -------
+    ndarray: the interpolated positions of shape (Ntimes, Naxes), clipped to the first and last readbacks
+    """
+    readback_positions = np.asarray(readback_positions, dtype=float)
+    if len(readback_positions.shape) == 1:
+        readback_positions = np.expand_dims(readback_positions, 1)
+    return np.stack([np.interp(times, readback_times, axis_positions) for axis_positions in readback_positions.T],
+                    axis=1)
 
 
 def pos_above_stops(positions, steps, stops):
@@ -1180,6 +1809,20 @@ def pos_above_stops(positions, steps, stops):
     return state
 
 
+def get_sequential_axis(start, stop, step):
+    """Get the positions of one axis of a sequential scan (see set_scan_sequential)
+
+    The positions are obtained by successive additions of step from start until going over stop
+    """
+    if np.abs(step) < 1e-12:
+        return np.array([start])
+    Npts = int(np.floor((stop - start) / step)) + 2  # enough positions to go over stop
+    positions = np.cumsum(np.concatenate(([start], np.full((max(Npts, 1),), step))))
+    in_scan = np.logical_not(pos_above_stops([positions], [step], [stop])[0])
+    in_scan[0] = True  # the start is always part of the scan
+    return positions[in_scan]
+
+
 def set_scan_sequential(starts, stops, steps):
     """
     Create a list of positions (one for each actuator == one for each element in starts list) that are sequential
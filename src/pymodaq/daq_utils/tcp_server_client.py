@@ -5,12 +5,14 @@ Created on Fri Aug 30 12:21:56 2019
 @author: Weber
 """
 from abc import ABCMeta, abstractmethod
+from enum import IntEnum
+from time import perf_counter
 
-
-from qtpy.QtCore import QObject, Signal, Slot, QThread
+from qtpy.QtCore import QObject, Signal, Slot, QThread, QSocketNotifier
 from qtpy import QtWidgets
 import socket
 import select
+import struct
 import numpy as np
 
 import pymodaq.daq_utils.parameter.ioxml
@@ -25,19 +27,117 @@ from typing import List
 
 config = Config()
 
+IOV_MAX = 1024  # maximum number of buffers sent in one call of socket.sendmsg
+
+LEGACY_PROTOCOL = 0  # length prefixed strings only, strict request/response
+PROTOCOL_VERSION = 1  # binary header with message ID, type tag and payload length
+PROTOCOL_REQUEST = 'Protocol_v'  # handshake message, followed by the protocol version, eg: Protocol_v1
+
+# replies and the requests they answer, used to match a reply with its request ID
+message_replies = {'move_done': ['move_abs', 'move_rel', 'move_home', 'stop_motion'],
+                   'position_is': ['get_actuator_value'],
+                   'Done': ['Send Data 0D', 'Send Data 1D', 'Send Data 2D', 'Send Data ND'],
+                   }
+message_requests = [request for requests in message_replies.values() for request in requests]
+
 tcp_parameters = [
     {'title': 'Port:', 'name': 'port_id', 'type': 'int', 'value': config('network', 'tcp-server', 'port'), },
     {'title': 'IP:', 'name': 'socket_ip', 'type': 'str', 'value': config('network', 'tcp-server', 'ip'), },
+    {'title': 'Server engine:', 'name': 'server_engine', 'type': 'list', 'limits': ['Polling', 'Event driven'],
+     'value': 'Polling',
+     'tip': 'Polling: sockets are checked every 100ms. Event driven: messages are processed as soon as they arrive'},
+    {'title': 'Reuse receive buffers:', 'name': 'buffer_pool', 'type': 'bool', 'value': False,
+     'tip': 'Received arrays are written into a pool of preallocated arrays (one per shape and dtype)'
+            ' instead of allocating a new one for each frame'},
     {'title': 'Settings PyMoDAQ Client:', 'name': 'settings_client', 'type': 'group', 'children': []},
     {'title': 'Infos Client:', 'name': 'infos', 'type': 'group', 'children': []},
     {'title': 'Connected clients:', 'name': 'conn_clients', 'type': 'table',
      'value': dict(), 'header': ['Type', 'adress']}, ]
 
 
+class MessageType(IntEnum):
+    COMMAND = 1
+    REPLY = 2
+
+
+class MessageHeader:
+    """Fixed size header preceding each message when the binary protocol is used
+
+    The header is packed in big endian as: protocol version (uint8), message type (uint8), reserved (uint16),
+    message ID (uint32) and payload length in bytes (uint32). The payload is the command as a string followed by its
+    arguments, encoded as in the legacy protocol.
+    """
+    header_struct = struct.Struct('>BBHII')
+    size = header_struct.size
+
+    def __init__(self, message_type=MessageType.COMMAND, message_id=0, length=0, version=PROTOCOL_VERSION):
+        self.version = version
+        self.message_type = MessageType(message_type)
+        self.message_id = message_id
+        self.length = length
+
+    def __repr__(self):
+        return f'MessageHeader({self.message_type.name}, id: {self.message_id}, length: {self.length})'
+
+    def to_bytes(self):
+        return self.header_struct.pack(self.version, self.message_type, 0, self.message_id, self.length)
+
+    @classmethod
+    def from_bytes(cls, header_bytes):
+        version, message_type, reserved, message_id, length = cls.header_struct.unpack(header_bytes)
+        return cls(message_type, message_id, length, version)
+
+
+class ArrayBufferPool:
+    """Round-robin pool of preallocated ndarrays reused across received frames of same shape and dtype
+
+    An array obtained from the pool is overwritten after `depth` other requests with the same shape and dtype, a
+    consumer keeping a frame longer than that should copy it.
+
+    Parameters
+    ----------
+    depth: (int) number of arrays kept for each (shape, dtype) key
+    """
+
+    def __init__(self, depth=2):
+        if not isinstance(depth, int) or depth < 1:
+            raise ValueError(f'The pool depth should be a strictly positive integer, not {depth}')
+        self.depth = depth
+        self._buffers = dict([])
+        self._indexes = dict([])
+
+    def __len__(self):
+        return sum([len(buffers) for buffers in self._buffers.values()])
+
+    def get(self, shape, dtype):
+        """Get an array of given shape and dtype, allocating it only the first `depth` times"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        if key not in self._buffers:
+            self._buffers[key] = []
+            self._indexes[key] = 0
+        buffers = self._buffers[key]
+        index = self._indexes[key]
+        if index == len(buffers):
+            buffers.append(np.empty(key[0], dtype=key[1]))
+        self._indexes[key] = (index + 1) % self.depth
+        return buffers[index]
+
+    def clear(self):
+        self._buffers = dict([])
+        self._indexes = dict([])
+
+
 class Socket:
-    def __init__(self, socket=None):
+    def __init__(self, socket=None, buffer_pool: ArrayBufferPool = None):
         super().__init__()
         self._socket = socket
+        self.buffer_pool = buffer_pool
+        self.protocol = LEGACY_PROTOCOL
+        self._message_id = 0
+        self.received_length = 0  # total number of bytes received, used to skip the unread payload of a message
+        self.message_end = None  # value of received_length at the end of the last message (binary protocol only)
+        self.pending_requests = OrderedDict([])  # ID of the requests sent through this socket and waiting for a reply
+        self.queued_commands = []  # commands waiting to be sent with the next request, see TCPServer.queue_command
 
     def __eq__(self, other_obj):
         if isinstance(other_obj, Socket):
@@ -73,6 +173,9 @@ class Socket:
     def recv(self, *args, **kwargs):
         return self.socket.recv(*args, **kwargs)
 
+    def recv_into(self, *args, **kwargs):
+        return self.socket.recv_into(*args, **kwargs)
+
     def close(self):
         return self.socket.close()
 
@@ -120,12 +223,118 @@ class Socket:
         -------
 
         """
-        if not isinstance(data_bytes, bytes):
+        if not isinstance(data_bytes, (bytes, memoryview)):
             raise TypeError(f'{data_bytes} should be an bytes string, not a {type(data_bytes)}')
         sended = 0
         while sended < len(data_bytes):
             sended += self.socket.send(data_bytes[sended:])
-        # print(data_bytes)
+
+    def check_sended_buffers(self, buffers):
+        """
+        Make sure all buffers are sent through the socket, using as few system calls as possible
+
+        Consecutive small buffers (headers) are merged, then all buffers are sent at once using the socket sendmsg
+        method (scatter/gather io). If sendmsg is not available (Windows), buffers are sent one after the other.
+        Parameters
+        ----------
+        buffers: (list of bytes or memoryview) as returned by the `*_to_buffers` methods
+
+        """
+        buffers = self._merge_buffers(buffers)
+        if not hasattr(self.socket, 'sendmsg'):
+            for buffer in buffers:
+                self.check_sended(buffer)
+            return
+
+        ind_buffer = 0
+        while ind_buffer < len(buffers):
+            sended = self.socket.sendmsg(buffers[ind_buffer:ind_buffer + IOV_MAX])
+            while ind_buffer < len(buffers) and sended >= len(buffers[ind_buffer]):
+                sended -= len(buffers[ind_buffer])
+                ind_buffer += 1
+            if sended > 0:
+                buffers[ind_buffer] = memoryview(buffers[ind_buffer])[sended:]
+
+    @staticmethod
+    def _merge_buffers(buffers):
+        """Merge consecutive bytes strings, keeping memoryviews (array data) as they are, and drop empty buffers"""
+        merged = []
+        headers = []
+        for buffer in buffers:
+            if isinstance(buffer, bytes):
+                headers.append(buffer)
+            else:
+                if len(headers) != 0:
+                    merged.append(b''.join(headers))
+                    headers = []
+                merged.append(buffer)
+        if len(headers) != 0:
+            merged.append(b''.join(headers))
+        return [buffer for buffer in merged if len(buffer) != 0]
+
+    @classmethod
+    def string_to_buffers(cls, string):
+        """Get the buffers to send a string: its length as a 4 bytes integer then the string as bytes"""
+        cmd_bytes, cmd_length_bytes = cls.message_to_bytes(string)
+        return [cmd_length_bytes, cmd_bytes]
+
+    @classmethod
+    def scalar_to_buffers(cls, data):
+        """Get the buffers to send a scalar: its data type as a string, the data_bytes length and the data_bytes"""
+        if not (isinstance(data, int) or isinstance(data, float)):
+            raise TypeError(f'{data} should be an integer or a float, not a {type(data)}')
+        data = np.array([data])
+        data_type = data.dtype.descr[0][1]
+        data_bytes = data.tobytes()
+        return cls.string_to_buffers(data_type) + [cls.int_to_bytes(len(data_bytes)), data_bytes]
+
+    @classmethod
+    def array_to_buffers(cls, data_array):
+        """Get the buffers to send a ndarray
+
+        The data type as a string, the data length, the data shape length and all values of the shape are packed in
+        a header, the data itself is a memoryview on the array memory (no copy if the array is C contiguous)
+        """
+        if not isinstance(data_array, np.ndarray):
+            raise TypeError(f'{data_array} should be an numpy array, not a {type(data_array)}')
+        data_type = data_array.dtype.descr[0][1]
+        data_shape = data_array.shape
+
+        data = np.ascontiguousarray(data_array).reshape(-1)
+        data_view = memoryview(data.view(np.uint8))
+
+        header = cls.string_to_buffers(data_type)
+        header.append(cls.int_to_bytes(len(data_view)))
+        header.append(cls.int_to_bytes(len(data_shape)))
+        for Nxxx in data_shape:
+            header.append(cls.int_to_bytes(Nxxx))
+        return header + [data_view]
+
+    @classmethod
+    def list_to_buffers(cls, data_list):
+        """Get the buffers to send a list of arrays, strings or scalars: the list length then each element preceded
+        by its type as a string"""
+        if not isinstance(data_list, list):
+            raise TypeError(f'{data_list} should be a list, not a {type(data_list)}')
+        buffers = [cls.int_to_bytes(len(data_list))]
+        for data in data_list:
+
+            if isinstance(data, np.ndarray):
+                buffers.extend(cls.string_to_buffers('array'))
+                buffers.extend(cls.array_to_buffers(data))
+
+            elif isinstance(data, str):
+                buffers.extend(cls.string_to_buffers('string'))
+                buffers.extend(cls.string_to_buffers(data))
+
+            elif isinstance(data, int) or isinstance(data, float):
+                buffers.extend(cls.string_to_buffers('scalar'))
+                buffers.extend(cls.scalar_to_buffers(data))
+
+            else:
+                raise TypeError(f'the element {data} type is cannot be sent by TCP/IP, only numpy arrays'
+                                f', strings, or scalars (int or float)')
+        return buffers
 
     def check_received_length(self, length):
         """
@@ -143,16 +352,56 @@ class Socket:
             raise TypeError(f'{length} should be an integer, not a {type(length)}')
 
         mess_length = 0
-        data_bytes = b''
+        chunks = []
         while mess_length < length:
             if mess_length < length - 4096:
                 data_bytes_tmp = self.socket.recv(4096)
             else:
                 data_bytes_tmp = self.socket.recv(length - mess_length)
+            if len(data_bytes_tmp) == 0:
+                raise ConnectionError('The socket connection has been closed while receiving data')
             mess_length += len(data_bytes_tmp)
-            data_bytes += data_bytes_tmp
-        # print(data_bytes)
-        return data_bytes
+            chunks.append(data_bytes_tmp)
+        self.received_length += mess_length
+        return b''.join(chunks)
+
+    def check_received_into(self, buffer):
+        """
+        Fill a preallocated buffer with bytes received through the socket, without any intermediate copy
+        Parameters
+        ----------
+        buffer: (bytearray or contiguous ndarray) the buffer to fill, its length in bytes is the number of bytes to
+                receive
+
+        Returns
+        -------
+        the filled buffer
+        """
+        if isinstance(buffer, np.ndarray):
+            if not buffer.flags['C_CONTIGUOUS']:
+                raise TypeError('Only C contiguous arrays can be used to receive data')
+            view = memoryview(buffer.reshape(-1).view(np.uint8))
+        elif isinstance(buffer, bytearray):
+            view = memoryview(buffer)
+        else:
+            raise TypeError(f'{buffer} should be a bytearray or a numpy array, not a {type(buffer)}')
+
+        length = len(view)
+        mess_length = 0
+        while mess_length < length:
+            nbytes = self.socket.recv_into(view[mess_length:], length - mess_length)
+            if nbytes == 0:
+                raise ConnectionError('The socket connection has been closed while receiving data')
+            mess_length += nbytes
+        self.received_length += mess_length
+        return buffer
+
+    def skip_received(self, length):
+        """
+        Receive and discard length bytes, for instance the payload of a message that has not been read
+        """
+        while length > 0:
+            length -= len(self.check_received_length(min(length, 4096)))
 
     def send_string(self, string):
         """
@@ -166,9 +415,101 @@ class Socket:
         -------
 
         """
-        cmd_bytes, cmd_length_bytes = self.message_to_bytes(string)
-        self.check_sended(cmd_length_bytes)
-        self.check_sended(cmd_bytes)
+        self.check_sended_buffers(self.string_to_buffers(string))
+
+    def _message_buffers(self, command, buffers=None, message_id=None):
+        if buffers is None:
+            buffers = []
+        buffers = self.string_to_buffers(command) + list(buffers)
+        if self.protocol == LEGACY_PROTOCOL:
+            return None, buffers
+        if message_id is None:
+            self._message_id = (self._message_id + 1) % 2 ** 32
+            message_type = MessageType.COMMAND
+            message_id = self._message_id
+        else:
+            message_type = MessageType.REPLY
+        header = MessageHeader(message_type, message_id, sum([len(buffer) for buffer in buffers]), self.protocol)
+        return message_id, [header.to_bytes()] + buffers
+
+    def send_message(self, command, buffers=None, message_id=None):
+        """
+        Send a command and its arguments in a single call
+
+        With the legacy protocol this is the same as sending the command string then its arguments. With the binary
+        protocol, the message is preceded by a MessageHeader.
+        Parameters
+        ----------
+        command: (str) the command
+        buffers: (list) the arguments of the command as returned by the `*_to_buffers` methods
+        message_id: (int) if not None, the message is a reply to the request with this ID, otherwise it is a command
+                    and a new ID is attributed to it
+
+        Returns
+        -------
+        int: the ID of the message, None with the legacy protocol
+        """
+        message_id, buffers = self._message_buffers(command, buffers, message_id)
+        self.check_sended_buffers(buffers)
+        return message_id
+
+    def send_messages(self, messages):
+        """
+        Send several commands in a single call, without waiting for any reply (pipelining)
+        Parameters
+        ----------
+        messages: (list of tuple) each tuple is the command string and the list of its argument buffers
+
+        Returns
+        -------
+        list of int: the IDs of the messages
+        """
+        message_ids = []
+        all_buffers = []
+        for command, buffers in messages:
+            message_id, buffers = self._message_buffers(command, buffers)
+            message_ids.append(message_id)
+            all_buffers.extend(buffers)
+        self.check_sended_buffers(all_buffers)
+        return message_ids
+
+    def get_message(self):
+        """
+        Get the next message command. With the binary protocol its header is read first. The command arguments are
+        left in the socket and should be read with the relevant get methods.
+
+        Returns
+        -------
+        str: the command
+        MessageHeader or None: None with the legacy protocol
+        """
+        header = None
+        if self.protocol != LEGACY_PROTOCOL:
+            header = MessageHeader.from_bytes(self.check_received_length(MessageHeader.size))
+            if header.version != self.protocol:
+                raise ConnectionError(f'Invalid message protocol version: {header.version}, expected:'
+                                      f' {self.protocol}')
+            self.message_end = self.received_length + header.length
+        return self.get_string(), header
+
+    def skip_message(self):
+        """
+        Receive and discard what has not been read from the last message got with get_message, for instance the
+        arguments of an unknown command, so that the next message is read from its header. Only possible with the
+        binary protocol where the length of each message is known.
+
+        Returns
+        -------
+        int: the number of skipped bytes
+        """
+        if self.message_end is None:
+            return 0
+        unread = self.message_end - self.received_length
+        self.message_end = None
+        if unread < 0:
+            raise ConnectionError(f'{-unread} bytes have been read beyond the end of the message')
+        self.skip_received(unread)
+        return unread
 
     def get_string(self):
         string_len = self.get_int()
@@ -190,14 +531,7 @@ class Socket:
         -------
 
         """
-        if not (isinstance(data, int) or isinstance(data, float)):
-            raise TypeError(f'{data} should be an integer or a float, not a {type(data)}')
-        data = np.array([data])
-        data_type = data.dtype.descr[0][1]
-        data_bytes = data.tobytes()
-        self.send_string(data_type)
-        self.check_sended(self.int_to_bytes(len(data_bytes)))
-        self.check_sended(data_bytes)
+        self.check_sended_buffers(self.scalar_to_buffers(data))
 
     def get_scalar(self):
         """
@@ -218,16 +552,25 @@ class Socket:
         return data
 
     def get_array(self):
-        """get 1D or 2D arrays"""
-        data_type = self.get_string()
+        """get 1D or 2D arrays
+
+        The data bytes are received directly into the memory of the returned array. If a buffer_pool is set on this
+        Socket, the array is taken from the pool (hence reused across frames of same shape and dtype) otherwise it is
+        freshly allocated.
+        """
+        data_type = np.dtype(self.get_string())
         data_len = self.get_int()
         shape_len = self.get_int()
         shape = []
         for ind in range(shape_len):
             shape.append(self.get_int())
-        data_bytes = self.check_received_length(data_len)
-        data = np.frombuffer(data_bytes, dtype=data_type)
-        data = data.reshape(tuple(shape))
+        shape = tuple(shape)
+
+        if self.buffer_pool is not None and int(np.prod(shape)) * data_type.itemsize == data_len:
+            data = self.check_received_into(self.buffer_pool.get(shape, data_type))
+        else:
+            data = self.check_received_into(np.empty((data_len,), dtype=np.uint8)).view(data_type)
+            data = data.reshape(shape)
         data = np.squeeze(data)
         return data
 
@@ -236,27 +579,15 @@ class Socket:
 
         get data type as a string
         reshape array as 1D array and get the array dimensionality (len of array's shape)
-        convert Data array as bytes
         send data type
         send data length
         send data shape length
         send all values of the shape as integers converted to bytes
-        send data as bytes
-        """
-        if not isinstance(data_array, np.ndarray):
-            raise TypeError(f'{data_array} should be an numpy array, not a {type(data_array)}')
-        data_type = data_array.dtype.descr[0][1]
-        data_shape = data_array.shape
+        send data bytes directly from the array memory
 
-        data = data_array.reshape(np.prod(data_shape))
-        data_bytes = data.tobytes()
-
-        self.send_string(data_type)
-        self.check_sended(self.int_to_bytes(len(data_bytes)))
-        self.check_sended(self.int_to_bytes(len(data_shape)))
-        for Nxxx in data_shape:
-            self.check_sended(self.int_to_bytes(Nxxx))
-        self.check_sended(data_bytes)
+        The header is sent together with the data in a single call, see check_sended_buffers
+        """
+        self.check_sended_buffers(self.array_to_buffers(data_array))
 
     def send_list(self, data_list):
         """
@@ -270,26 +601,7 @@ class Socket:
         -------
 
         """
-        if not isinstance(data_list, list):
-            raise TypeError(f'{data_list} should be a list, not a {type(data_list)}')
-        self.check_sended(self.int_to_bytes(len(data_list)))
-        for data in data_list:
-
-            if isinstance(data, np.ndarray):
-                self.send_string('array')
-                self.send_array(data)
-
-            elif isinstance(data, str):
-                self.send_string('string')
-                self.send_string(data)
-
-            elif isinstance(data, int) or isinstance(data, float):
-                self.send_string('scalar')
-                self.send_scalar(data)
-
-            else:
-                raise TypeError(f'the element {data} type is cannot be sent by TCP/IP, only numpy arrays'
-                                f', strings, or scalars (int or float)')
+        self.check_sended_buffers(self.list_to_buffers(data_list))
 
     def get_list(self):
         """
@@ -436,7 +748,8 @@ class TCPClient(TCPClientTemplate, QObject):
     cmd_signal = Signal(ThreadCommand)  # signal to connect with a module slot in order to start communication back
     params = []
 
-    def __init__(self, ipaddress="192.168.1.62", port=6341, params_state=None, client_type="GRABBER"):
+    def __init__(self, ipaddress="192.168.1.62", port=6341, params_state=None, client_type="GRABBER",
+                 protocol_version=LEGACY_PROTOCOL):
         """Create a socket client particularly fit to be used with PyMoDAQ's TCPServer
 
         Parameters
@@ -448,28 +761,73 @@ class TCPClient(TCPClientTemplate, QObject):
                             instance of Parameter object, see pyqtgraph.parametertree::Parameter
         client_type: (str) should be one of the accepted client_type by the TCPServer instance (within pymodaq it is
                             either 'GRABBER' or 'ACTUATOR'
+        protocol_version: (int) if not LEGACY_PROTOCOL, ask the server to switch to this version of the binary protocol
+                            once connected. The legacy protocol is kept if the server doesn't support it.
         """
         QObject.__init__(self)
         TCPClientTemplate.__init__(self, ipaddress, port, params_state, client_type)
+        self.protocol_version = protocol_version
+
+    @property
+    def pending_requests(self):
+        """ID of the requests received from the server through the current socket and waiting for a reply"""
+        if self.socket is None:
+            return OrderedDict([])
+        return self.socket.pending_requests
+
+    def get_reply_id(self, reply):
+        """Get (and forget) the ID of the oldest received request answered by reply, None if there is no such
+        request"""
+        for message_id, request in self.pending_requests.items():
+            if request in message_replies.get(reply, []):
+                del self.pending_requests[message_id]
+                return message_id
+        return None
+
+    def send_message(self, command, buffers=None):
+        """Send a command with its arguments, as a reply of a pending request if there is one"""
+        if self.socket is not None:
+            self.socket.send_message(command, buffers, message_id=self.get_reply_id(command))
+
+    def negotiate_protocol(self, timeout=1.):
+        """Ask the server to switch to the binary protocol, the legacy protocol is kept if the server doesn't
+        answer within timeout (in seconds)
+
+        The commands sent by the server before its answer (still with the legacy protocol) are read while waiting and
+        processed once the protocol is settled.
+        """
+        self.socket.send_string(f'{PROTOCOL_REQUEST}{self.protocol_version}')
+        queued_commands = []
+        deadline = perf_counter() + timeout
+        while True:
+            ready_to_read, ready_to_write, in_error = select.select([self.socket.socket], [], [],
+                                                                    max(0., deadline - perf_counter()))
+            if len(ready_to_read) == 0:  # a server ignoring the handshake
+                break
+            message = self.socket.get_string()
+            if message.startswith(PROTOCOL_REQUEST):
+                self.socket.protocol = int(message[len(PROTOCOL_REQUEST):])
+                break
+            queued_commands.append(self.read_command(message))
+        for command in queued_commands:
+            self.cmd_signal.emit(command)
 
     def send_data(self, data_list):
         # first send 'Done' and then send the length of the list
         if self.socket is not None and isinstance(data_list, list):
-            self.socket.send_string('Done')
-            self.socket.send_list(data_list)
+            self.send_message('Done', self.socket.list_to_buffers(data_list))
 
     def send_infos_xml(self, infos):
         if self.socket is not None:
-            self.socket.send_string('Infos')
-            self.socket.send_string(infos)
+            self.send_message('Infos', self.socket.string_to_buffers(infos))
 
     def send_info_string(self, info_to_display, value_as_string):
         if self.socket is not None:
-            self.socket.send_string('Info')  # the command
-            self.socket.send_string(info_to_display)  # the actual info to display as a string
             if not isinstance(value_as_string, str):
                 value_as_string = str(value_as_string)
-            self.socket.send_string(value_as_string)
+            # the command, the actual info to display as a string then its value
+            self.send_message('Info', self.socket.string_to_buffers(info_to_display) +
+                              self.socket.string_to_buffers(value_as_string))
 
     @Slot(ThreadCommand)
     def queue_command(self, command=ThreadCommand()):
@@ -501,48 +859,41 @@ class TCPClient(TCPClientTemplate, QObject):
                 path = command.attributes['path']
                 param = command.attributes['param']
 
-                self.socket.send_string('Info_xml')
-                self.socket.send_list(path)
-
-                # send value
+                # send path then value
                 data = pymodaq.daq_utils.parameter.ioxml.parameter_to_xml_string(param)
-                self.socket.send_string(data)
+                self.send_message('Info_xml', self.socket.list_to_buffers(path) + self.socket.string_to_buffers(data))
 
         elif command.command == 'position_is':
             if self.socket is not None:
-                self.socket.send_string('position_is')
-                self.socket.send_scalar(command.attributes[0])
+                self.send_message('position_is', self.socket.scalar_to_buffers(command.attributes[0]))
 
         elif command.command == 'move_done':
             if self.socket is not None:
-                self.socket.send_string('move_done')
-                self.socket.send_scalar(command.attributes[0])
+                self.send_message('move_done', self.socket.scalar_to_buffers(command.attributes[0]))
 
         elif command.command == 'x_axis':
             if self.socket is not None:
-                self.socket.send_string('x_axis')
                 x_axis = dict(label='', units='')
                 if isinstance(command.attributes[0], np.ndarray):
                     x_axis['data'] = command.attributes[0]
                 elif isinstance(command.attributes[0], dict):
                     x_axis.update(command.attributes[0].copy())
 
-                self.socket.send_array(x_axis['data'])
-                self.socket.send_string(x_axis['label'])
-                self.socket.send_string(x_axis['units'])
+                self.send_message('x_axis', self.socket.array_to_buffers(x_axis['data']) +
+                                  self.socket.string_to_buffers(x_axis['label']) +
+                                  self.socket.string_to_buffers(x_axis['units']))
 
         elif command.command == 'y_axis':
             if self.socket is not None:
-                self.socket.send_string('y_axis')
                 y_axis = dict(label='', units='')
                 if isinstance(command.attributes[0], np.ndarray):
                     y_axis['data'] = command.attributes[0]
                 elif isinstance(command.attributes[0], dict):
                     y_axis.update(command.attributes[0].copy())
 
-                self.socket.send_array(y_axis['data'])
-                self.socket.send_string(y_axis['label'])
-                self.socket.send_string(y_axis['units'])
+                self.send_message('y_axis', self.socket.array_to_buffers(y_axis['data']) +
+                                  self.socket.string_to_buffers(y_axis['label']) +
+                                  self.socket.string_to_buffers(y_axis['units']))
 
         else:
             raise IOError('Unknown TCP client command')
@@ -553,8 +904,15 @@ class TCPClient(TCPClientTemplate, QObject):
         self.cmd_signal.emit(ThreadCommand('Update_Status', [getLineInfo() + str(e), 'log']))
 
     def ready_to_read(self):
-        message = self.socket.get_string()
+        message, header = self.socket.get_message()
+        if header is not None and header.message_type == MessageType.COMMAND:
+            if message in message_requests:
+                self.pending_requests[header.message_id] = message
         self.get_data(message)
+        skipped = self.socket.skip_message()  # arguments of a command unknown to this client
+        if skipped > 0:
+            self.cmd_signal.emit(ThreadCommand('Update_Status',
+                                               [f'{skipped} bytes of the {message} message have been skipped', 'log']))
 
     def ready_to_write(self):
         pass
@@ -577,38 +935,43 @@ class TCPClient(TCPClientTemplate, QObject):
         self.socket.send_string(self.client_type)
 
         self.send_infos_xml(pymodaq.daq_utils.parameter.ioxml.parameter_to_xml_string(self.settings))
+        if self.protocol_version != LEGACY_PROTOCOL:
+            self.negotiate_protocol()
         for command in extra_commands:
             if isinstance(command, ThreadCommand):
                 self.cmd_signal.emit(command)
 
-    def get_data(self, message):
-        """
+    def read_command(self, message):
+        """Read the arguments of a command received from the server
 
         Parameters
         ----------
-        message
+        message: (str) the command
 
         Returns
         -------
-
+        ThreadCommand: the command with its arguments as attributes
         """
-        if self.socket is not None:
-            messg = ThreadCommand(message)
+        messg = ThreadCommand(message)
 
-            if message == 'set_info':
-                path = self.socket.get_list()
-                param_xml = self.socket.get_string()
-                messg.attributes = [path, param_xml]
+        if message == 'set_info':
+            path = self.socket.get_list()
+            param_xml = self.socket.get_string()
+            messg.attributes = [path, param_xml]
 
-            elif message == 'move_abs':
-                position = self.socket.get_scalar()
-                messg.attributes = [position]
+        elif message == 'move_abs':
+            position = self.socket.get_scalar()
+            messg.attributes = [position]
 
-            elif message == 'move_rel':
-                position = self.socket.get_scalar()
-                messg.attributes = [position]
+        elif message == 'move_rel':
+            position = self.socket.get_scalar()
+            messg.attributes = [position]
+        return messg
 
-            self.cmd_signal.emit(messg)
+    def get_data(self, message):
+        """Read the arguments of a command received from the server and send it to the module, see read_command"""
+        if self.socket is not None:
+            self.cmd_signal.emit(self.read_command(message))
 
     @Slot(list)
     def data_ready(self, datas):
@@ -626,6 +989,11 @@ class TCPServer(QObject):
         self.connected_clients = []
         self.listening = True
         self.processing = False
+        self.use_buffer_pool = False
+        self.server_engine = 'Polling'
+        self.socket_notifiers = dict([])
+        self.message_header = None
+        self.message_request = None
         self.client_type = client_type
 
     def close_server(self):
@@ -639,6 +1007,8 @@ class TCPServer(QObject):
         """
         server_socket = self.find_socket_within_connected_clients('server')
         self.remove_client(server_socket)
+        for client in self.connected_clients:
+            self.remove_socket_notifier(client['socket'])
 
     def init_server(self):
         self.emit_status(ThreadCommand("Update_Status", [
@@ -659,11 +1029,15 @@ class TCPServer(QObject):
             raise ConnectionError('Bind failed. Error Code : ' + str(msg.errno) + ' Message ' + msg.strerror)
 
         self.serversocket.listen(1)
+        self.use_buffer_pool = self.settings.child(('buffer_pool')).value()
+        self.server_engine = self.settings.child(('server_engine')).value()
         self.connected_clients.append(dict(socket=self.serversocket, type='server'))
         self.settings.child(('conn_clients')).setValue(self.set_connected_clients_table())
 
-        self.timer = self.startTimer(100)  # Timer event fired every 100ms
-        # self.listen_client()
+        if self.server_engine == 'Event driven':
+            self.add_socket_notifier(self.serversocket)
+        else:
+            self.timer = self.startTimer(100)  # Timer event fired every 100ms
 
     def timerEvent(self, event):
         """
@@ -748,9 +1122,40 @@ class TCPServer(QObject):
         """
         print(status)
 
+    def add_socket_notifier(self, sock):
+        """Process incoming messages on sock as soon as they arrive, using the event loop of the thread this server
+        lives in (event driven engine)"""
+        notifier = QSocketNotifier(sock.socket.fileno(), QSocketNotifier.Read, self)
+        notifier.activated.connect(lambda *args, sock=sock: self.socket_activated(sock))
+        self.socket_notifiers[sock.socket] = notifier
+
+    def remove_socket_notifier(self, sock):
+        notifier = self.socket_notifiers.pop(sock.socket, None)
+        if notifier is not None:
+            notifier.setEnabled(False)
+            notifier.deleteLater()
+
+    def socket_activated(self, sock):
+        """
+            Called by the socket notifier of sock when something is ready to be read.
+            The notifier is disabled while the message is processed so that it is not activated again by the data of
+            this message.
+        """
+        notifier = self.socket_notifiers.get(sock.socket, None)
+        if notifier is None:
+            return
+        notifier.setEnabled(False)
+        try:
+            self.read_client_socket(sock)
+        except Exception as e:
+            self.emit_status(ThreadCommand("Update_Status", [str(e), 'log']))
+        if sock.socket in self.socket_notifiers:
+            notifier.setEnabled(True)
+
     def remove_client(self, sock):
         sock_type = self.find_socket_type_within_connected_clients(sock)
         if sock_type is not None:
+            self.remove_socket_notifier(sock)
             self.connected_clients.remove(dict(socket=sock, type=sock_type))
             self.settings.child(('conn_clients')).setValue(self.set_connected_clients_table())
             try:
@@ -783,8 +1188,11 @@ class TCPServer(QObject):
                                                                    [sock.socket for sock in xlist],
                                                                    timeout)
 
-        return ([Socket(sock) for sock in read_sockets], [Socket(sock) for sock in write_sockets],
-                [Socket(sock) for sock in error_sockets])
+        sockets = dict([(client['socket'].socket, client['socket']) for client in self.connected_clients
+                        if isinstance(client['socket'], Socket)])
+        return ([sockets.get(sock, Socket(sock)) for sock in read_sockets],
+                [sockets.get(sock, Socket(sock)) for sock in write_sockets],
+                [sockets.get(sock, Socket(sock)) for sock in error_sockets])
 
     def listen_client(self):
         """
@@ -803,43 +1211,86 @@ class TCPServer(QObject):
 
             for sock in read_sockets:
                 QThread.msleep(100)
-                if sock == self.serversocket:  # New connection
-                    # means a new socket (client) try to reach the server
-                    (client_socket, address) = self.serversocket.accept()
-                    DAQ_type = client_socket.get_string()
-                    if DAQ_type not in self.socket_types:
-                        self.emit_status(ThreadCommand("Update_Status", [DAQ_type + ' is not a valid type', 'log']))
-                        client_socket.close()
-                        break
-
-                    self.connected_clients.append(dict(socket=client_socket, type=DAQ_type))
-                    self.settings.child(('conn_clients')).setValue(self.set_connected_clients_table())
-                    self.emit_status(ThreadCommand("Update_Status",
-                                                   [DAQ_type + ' connected with ' + address[0] + ':' + str(address[1]),
-                                                    'log']))
-                    QtWidgets.QApplication.processEvents()
-
-                else:  # Some incoming message from a client
-                    # Data received from client, process it
-                    try:
-                        message = sock.get_string()
-                        if message in ['Done', 'Info', 'Infos', 'Info_xml', 'position_is', 'move_done']:
-                            self.process_cmds(message, command_sock=None)
-                        elif message == 'Quit':
-                            raise Exception("socket disconnect by user")
-                        else:
-                            self.process_cmds(message, command_sock=sock)
-
-                    # client disconnected, so remove from socket list
-                    except Exception as e:
-                        self.remove_client(sock)
+                if not self.read_client_socket(sock):
+                    break
 
             self.processing = False
 
         except Exception as e:
             self.emit_status(ThreadCommand("Update_Status", [str(e), 'log']))
 
-    def send_command(self, sock, command="move_at"):
+    def read_client_socket(self, sock):
+        """
+            Accept a new connection if sock is the server socket, otherwise read and process the incoming message
+            from the client.
+
+            Returns
+            -------
+            bool: False if a new connection has been refused
+        """
+        if sock == self.serversocket:  # New connection
+            # means a new socket (client) try to reach the server
+            (client_socket, address) = self.serversocket.accept()
+            if self.use_buffer_pool:
+                client_socket.buffer_pool = ArrayBufferPool()
+            DAQ_type = client_socket.get_string()
+            if DAQ_type not in self.socket_types:
+                self.emit_status(ThreadCommand("Update_Status", [DAQ_type + ' is not a valid type', 'log']))
+                client_socket.close()
+                return False
+
+            self.connected_clients.append(dict(socket=client_socket, type=DAQ_type))
+            self.settings.child(('conn_clients')).setValue(self.set_connected_clients_table())
+            self.emit_status(ThreadCommand("Update_Status",
+                                           [DAQ_type + ' connected with ' + address[0] + ':' + str(address[1]),
+                                            'log']))
+            if self.server_engine == 'Event driven':
+                self.add_socket_notifier(client_socket)
+            else:
+                QtWidgets.QApplication.processEvents()
+
+        else:  # Some incoming message from a client
+            # Data received from client, process it
+            try:
+                message, self.message_header = sock.get_message()
+                self.message_request = None
+                if self.message_header is not None and self.message_header.message_type == MessageType.REPLY:
+                    self.message_request = sock.pending_requests.pop(self.message_header.message_id, None)
+
+                if message.startswith(PROTOCOL_REQUEST):
+                    self.set_client_protocol(sock, int(message[len(PROTOCOL_REQUEST):]))
+                elif message in ['Done', 'Info', 'Infos', 'Info_xml', 'position_is', 'move_done']:
+                    self.process_cmds(message, command_sock=None)
+                elif message == 'Quit':
+                    raise Exception("socket disconnect by user")
+                else:
+                    self.process_cmds(message, command_sock=sock)
+
+                skipped = sock.skip_message()  # unknown or unexpected message, keep the stream in sync
+                if skipped > 0:
+                    self.emit_status(ThreadCommand("Update_Status",
+                                                   [f'{skipped} bytes of the {message} message have been skipped',
+                                                    'log']))
+                if len(sock.pending_requests) == 0 and len(sock.queued_commands) != 0:
+                    self.send_commands(sock, [])  # the client answered all requests, send what has been queued
+
+            # client disconnected, so remove from socket list
+            except Exception as e:
+                self.remove_client(sock)
+        return True
+
+    def set_client_protocol(self, sock, version):
+        """Answer the protocol handshake of a client: the binary protocol is used from now on with this client if its
+        version is supported, otherwise the legacy protocol is kept"""
+        if version != PROTOCOL_VERSION:
+            version = LEGACY_PROTOCOL
+        sock.send_string(f'{PROTOCOL_REQUEST}{version}')
+        sock.protocol = version
+        sock_type = self.find_socket_type_within_connected_clients(sock)
+        self.emit_status(ThreadCommand("Update_Status", [f'Client {sock_type} uses protocol version {version}',
+                                                         'log']))
+
+    def send_command(self, sock, command="move_at", buffers=None):
         """
             Send one of the message contained in self.message_list toward a socket with identity socket_type.
             First send the length of the command with 4bytes.
@@ -848,20 +1299,78 @@ class TCPServer(QObject):
             **Parameters**    **Type**    **Description**
             *sock*             ???        The current socket
             *command*         string      The command as a string
+            *buffers*         list        The arguments of the command as returned by Socket.*_to_buffers methods
             =============== =========== ==========================
 
             See Also
             --------
             utility_classes.DAQ_Viewer_base.emit_status, daq_utils.ThreadCommand, message_to_bytes
         """
+        if buffers is None:
+            buffers = []
+        message_ids = self.send_commands(sock, [(command, buffers)])
+        return message_ids[-1] if len(message_ids) != 0 else None
+
+    def send_commands(self, sock, commands):
+        """
+            Send several commands in a single call without waiting for their replies, preceded by the commands queued
+            on this socket (see queue_command). With the binary protocol, the ID of the commands expecting a reply
+            are stored in the pending_requests of the socket until the reply is received.
+
+            =============== ============ ==========================================================
+            **Parameters**    **Type**    **Description**
+            *sock*             Socket      The current socket
+            *commands*         list        list of tuple: (command as a string, list of buffers)
+            =============== ============ ==========================================================
+
+            Returns
+            -------
+            list: the IDs of the sent commands (None with the legacy protocol)
+        """
+        for command, buffers in commands:
+            if command not in self.message_list:
+                self.emit_status(
+                    ThreadCommand("Update_Status",
+                                  [f'Command: {command} is not in the specified list: {self.message_list}', 'log']))
+                return []
+
+        if sock is None:
+            return []
+        commands = sock.queued_commands + list(commands)
+        sock.queued_commands = []
+        message_ids = sock.send_messages(commands)
+        for message_id, (command, buffers) in zip(message_ids, commands):
+            if message_id is not None and command in message_requests:
+                sock.pending_requests[message_id] = command
+        return message_ids
+
+    def queue_command(self, sock, command, buffers=None):
+        """
+            Send a command that doesn't expect any reply, for instance a settings update. While the client is busy
+            with requests (binary protocol), the command is only queued and it is sent in the same call as the next
+            request or as soon as the client replied to all requests (pipelining). The client would process it after
+            these requests anyway.
+
+            =============== =========== ==========================
+            **Parameters**    **Type**    **Description**
+            *sock*            Socket      The current socket
+            *command*         string      The command as a string
+            *buffers*         list        The arguments of the command as returned by Socket.*_to_buffers methods
+            =============== =========== ==========================
+        """
+        if buffers is None:
+            buffers = []
         if command not in self.message_list:
             self.emit_status(
-                ThreadCommand("Update_Status", [f'Command: {command} is not in the specified list: {self.message_list}',
-                                                'log']))
+                ThreadCommand("Update_Status",
+                              [f'Command: {command} is not in the specified list: {self.message_list}', 'log']))
             return
-
-        if sock is not None:
-            sock.send_string(command)
+        if sock is None:
+            return
+        if len(sock.pending_requests) == 0:
+            self.send_commands(sock, [(command, buffers)])
+        else:
+            sock.queued_commands.append((command, buffers))
 
     def emit_status(self, status):
         print(status)
@@ -14,7 +14,6 @@ import sys
 from typing import List
 import pymodaq.daq_utils.scanner
 from pymodaq.daq_viewer.daq_gui_settings import Ui_Form
-import copy
 
 from pymodaq.daq_utils.plotting.data_viewers.viewer0D import Viewer0D
 from pymodaq.daq_utils.plotting.data_viewers.viewer1D import Viewer1D
@@ -22,11 +21,12 @@ from pymodaq.daq_utils.plotting.data_viewers.viewer2D import Viewer2D
 from pymodaq.daq_utils.plotting.data_viewers.viewerND import ViewerND
 from pymodaq.daq_utils.scanner import Scanner
 from pymodaq.daq_utils.plotting.navigator import Navigator
-from pymodaq.daq_utils.tcp_server_client import TCPClient
+from pymodaq.daq_utils.tcp_server_client import TCPClient, PROTOCOL_VERSION, LEGACY_PROTOCOL
 from pymodaq.daq_utils.gui_utils.widgets.lcd import LCD
 from pymodaq.daq_utils.config import Config, get_set_local_dir
 from pymodaq.daq_utils import gui_utils as gutils
 from pymodaq.daq_utils.h5modules import browse_data
+from pymodaq.daq_utils.math_utils import RunningAverager
 from pymodaq.daq_utils.daq_utils import ThreadCommand, get_plugins
 from pymodaq.daq_utils.exceptions import DetectorError
 
@@ -84,6 +84,7 @@ class DAQ_Viewer(QObject):
         *wait_time*                int
         *save_file_pathname*       string
         *ind_continuous_grab*      int
+        *live_averager*            RunningAverager
         *initialized_state*        boolean
         *snapshot_pathname*        string
         *x_axis*                   1D numpy array
@@ -147,6 +148,7 @@ class DAQ_Viewer(QObject):
 
         self.save_file_pathname = None  # to store last active path, will be an Path object
         self.ind_continuous_grab = 0
+        self.live_averager = RunningAverager()
 
         self.initialized_state = False
         self.measurement_module = None
@@ -704,7 +706,7 @@ class DAQ_Viewer(QObject):
                 self.is_continuous_initialized = True
 
             dt = np.array([time.perf_counter() - self.ini_time])
-            self.time_array.append(dt)
+            self.h5saver_continuous.write_data(self.time_array, dt)
 
             data_dims = ['data0D', 'data1D']
             if self.h5saver_continuous.settings.child('save_2D').value():
@@ -716,9 +718,11 @@ class DAQ_Viewer(QObject):
                         if isinstance(datas[data_dim][channel]['data'], float) or isinstance(
                                 datas[data_dim][channel]['data'], int):
                             datas[data_dim][channel]['data'] = np.array([datas[data_dim][channel]['data']])
-                        self.channel_arrays[data_dim][channel].append(datas[data_dim][channel]['data'])
+                        self.h5saver_continuous.write_data(self.channel_arrays[data_dim][channel],
+                                                           datas[data_dim][channel]['data'])
 
-            self.h5saver_continuous.h5_file.flush()
+            if self.h5saver_continuous.writer is None:  # otherwise flushes are done by the writer
+                self.h5saver_continuous.flush()
             self.h5saver_continuous.settings.child('N_saved').setValue(
                 self.h5saver_continuous.settings.child('N_saved').value() + 1)
 
@@ -1000,7 +1004,7 @@ class DAQ_Viewer(QObject):
         for ind_data, data in enumerate(datas):
             if 'external_h5' in data.keys():
                 container['external_h5'] = data.pop('external_h5')
-            data_tmp = copy.deepcopy(data)
+            data_tmp = OrderedDict(data)  # shallow copy: metadata and arrays are shared, not copied
             data_dim = data_tmp['dim']
             if data_dim.lower() != 'datand':
                 self.set_xy_axis(data_tmp, ind_data)
@@ -1010,7 +1014,7 @@ class DAQ_Viewer(QObject):
             for ind_sub_data, dat in enumerate(data_arrays):
                 if 'labels' in data_tmp:
                     data_tmp.pop('labels')
-                subdata_tmp = utils.DataToExport(name=self.title, data=dat, **data_tmp)
+                subdata_tmp = utils.DataToExport(name=self.title, data=utils.read_only_view(dat), **data_tmp)
                 sub_name = f'{self.title}_{name}_CH{ind_sub_data:03}'
                 if data_dim.lower() == 'data0d':
                     subdata_tmp['data'] = subdata_tmp['data'][0]
@@ -1045,6 +1049,10 @@ class DAQ_Viewer(QObject):
 
         """
         try:
+            # time stamped in the detector thread, see DAQ_Detector.data_ready
+            acq_times = [data.pop('acq_time_s') for data in datas if 'acq_time_s' in data]
+            acq_time = acq_times[0] if len(acq_times) != 0 else datetime.datetime.now().timestamp()
+
             if self.settings.child('main_settings', 'tcpip', 'tcp_connected').value() and self.send_to_tcpip:
                 self.command_tcpip.emit(ThreadCommand('data_ready', datas))
 
@@ -1052,35 +1060,41 @@ class DAQ_Viewer(QObject):
             self.init_show_data(datas)
 
             if self.settings.child('main_settings', 'live_averaging').value():
-                self.settings.child('main_settings', 'N_live_averaging').setValue(self.ind_continuous_grab)
-                # #self.ui.current_Naverage.setValue(self.ind_continuous_grab)
                 self.ind_continuous_grab += 1
-                if self.ind_continuous_grab > 1:
-                    try:
-                        for ind, dic in enumerate(datas):
-                            dic['data'] = [((self.ind_continuous_grab - 1) * self.current_datas[ind]['data'][
-                                ind_channel] + dic['data'][ind_channel]) / self.ind_continuous_grab for ind_channel in
-                                range(len(dic['data']))]
-                    except Exception as e:
-                        self.logger.exception(str(e))
+                try:
+                    # the averages are the accumulators of the averager, updated in place at each grab: the frame
+                    # passed downstream (viewers, savers) gets its own copy of them
+                    means = self.live_averager.add([channel for dic in datas for channel in dic['data']])
+                    ind_channel = 0
+                    for dic in datas:
+                        dic['data'] = [np.array(mean) for mean in means[ind_channel:ind_channel + len(dic['data'])]]
+                        ind_channel += len(dic['data'])
+                except Exception as e:
+                    self.logger.exception(str(e))
+                self.settings.child('main_settings', 'N_live_averaging').setValue(self.live_averager.Nsamples)
 
             # store raw data for further processing
             Ndatas = len(datas)
-            acq_time = datetime.datetime.now().timestamp()
             name = self.title
             self.data_to_save_export = OrderedDict(Ndatas=Ndatas, acq_time_s=acq_time, name=name)
 
             self.process_data(datas, self.data_to_save_export)
+            if self.settings.child('main_settings', 'live_averaging').value():
+                self.export_live_std(datas, self.data_to_save_export)
 
             if self.ui.take_bkg_cb.isChecked():
                 self.ui.take_bkg_cb.setChecked(False)
-                self.bkg = copy.deepcopy(datas)
+                # only the arrays are copied as the plugin may reuse its buffers for the next grabs
+                self.bkg = [OrderedDict(data, data=[np.array(channel) for channel in data['data']])
+                            for data in datas]
             # process bkg if needed
             if self.is_bkg and self.bkg is not None:
                 try:
                     for ind_channels, channels in enumerate(datas):
-                        for ind_channel, channel in enumerate(channels['data']):
-                            datas[ind_channels]['data'][ind_channel] -= self.bkg[ind_channels]['data'][ind_channel]
+                        # copy-on-write: the raw arrays are shared with data_to_save_export so they are not modified
+                        # in place, the corrected data are new arrays
+                        channels['data'] = [channel - self.bkg[ind_channels]['data'][ind_channel]
+                                            for ind_channel, channel in enumerate(channels['data'])]
                 except Exception as e:
                     self.logger.exception(str(e))
 
@@ -1255,12 +1269,15 @@ class DAQ_Viewer(QObject):
 
                 elif param.name() == 'live_averaging':
                     self.settings.child('main_settings', 'show_averaging').setValue(False)
+                    for child in ['N_live_averaging', 'live_averaging_mode', 'live_averaging_alpha',
+                                  'live_averaging_window', 'live_averaging_std']:
+                        self.settings.child('main_settings', child).show(param.value())
                     if param.value():
-                        self.settings.child('main_settings', 'N_live_averaging').show()
-                        self.ind_continuous_grab = 0
-                        self.settings.child('main_settings', 'N_live_averaging').setValue(0)
-                    else:
-                        self.settings.child('main_settings', 'N_live_averaging').hide()
+                        self.set_live_averager()
+
+                elif param.name() in ['live_averaging_mode', 'live_averaging_alpha', 'live_averaging_window',
+                                      'live_averaging_std']:
+                    self.set_live_averager()
                 elif param.name() in putils.iter_children(self.settings.child('main_settings', 'axes'), []):
                     if self.DAQ_type == "DAQ2D":
                         if param.name() == 'use_calib':
@@ -1500,6 +1517,36 @@ class DAQ_Viewer(QObject):
             if self.settings.child('main_settings', 'tcpip', 'tcp_connected').value():
                 self.command_tcpip.emit(ThreadCommand('y_axis', [data['y_axis']]))
 
+    def export_live_std(self, datas, container):
+        """Add the running standard deviations of the live averaging (if computed) to the exported data
+
+        Each one is exported next to the average of its channel, with the same name suffixed by _std
+        """
+        stds = self.live_averager.stds
+        if stds is None:
+            return
+        ind_channel = 0
+        for data in datas:
+            data_key = f"data{data['dim'][4:]}"
+            for ind_sub_data in range(len(data['data'])):
+                sub_name = f"{self.title}_{data['name']}_CH{ind_sub_data:03}"
+                if data_key in container and sub_name in container[data_key]:
+                    std_data = utils.DataToExport(**container[data_key][sub_name])
+                    std = stds[ind_channel]
+                    std_data['data'] = std[0] if data_key == 'data0D' else utils.read_only_view(std)
+                    container[data_key][f'{sub_name}_std'] = std_data
+                ind_channel += 1
+
+    def set_live_averager(self):
+        """Restart the live averaging using the averaging options from the settings"""
+        self.live_averager = RunningAverager(
+            mode=self.settings.child('main_settings', 'live_averaging_mode').value(),
+            alpha=self.settings.child('main_settings', 'live_averaging_alpha').value(),
+            window=self.settings.child('main_settings', 'live_averaging_window').value(),
+            variance=self.settings.child('main_settings', 'live_averaging_std').value())
+        self.ind_continuous_grab = 0
+        self.settings.child('main_settings', 'N_live_averaging').setValue(0)
+
     def show_settings(self):
         """
             Set the settings tree visible if the corresponding button is checked.
@@ -1811,7 +1858,10 @@ class DAQ_Viewer(QObject):
 
             tcpclient = TCPClient(self.settings.child('main_settings', 'tcpip', 'ip_address').value(),
                                   self.settings.child('main_settings', 'tcpip', 'port').value(),
-                                  self.settings.child(('detector_settings')))
+                                  self.settings.child(('detector_settings')),
+                                  protocol_version=PROTOCOL_VERSION if
+                                  self.settings.child('main_settings', 'tcpip', 'binary_protocol').value()
+                                  else LEGACY_PROTOCOL)
             tcpclient.moveToThread(self.tcpclient_thread)
             self.tcpclient_thread.tcpclient = tcpclient
             tcpclient.cmd_signal.connect(self.process_tcpip_cmds)
@@ -1869,6 +1919,7 @@ class DAQ_Detector(QObject):
         *average_done*              boolean
         *hardware_averaging*        boolean
         *show_averaging*            boolean
+        *averager*                  RunningAverager
         *wait_time*                 int
         *DAQ_type*                  string
         ========================= ==========================
@@ -1893,6 +1944,7 @@ class DAQ_Detector(QObject):
         self.average_done = False
         self.hardware_averaging = False
         self.show_averaging = False
+        self.averager = RunningAverager()
         self.wait_time = settings_parameter.child('main_settings', 'wait_time').value()
         self.DAQ_type = settings_parameter.child('main_settings', 'DAQ_type').value()
 
@@ -2082,26 +2134,33 @@ class DAQ_Detector(QObject):
         """
 
         # datas validation check for backcompatibility with plugins not exporting new DataFromPlugins list of objects
-
+        # the acquisition time is taken when the data are received from the plugin (and not by the UI thread), it is
+        # popped in DAQ_Viewer.show_data
+        acq_time = datetime.datetime.now().timestamp()
         for dat in datas:
             if not isinstance(dat, utils.DataFromPlugins):
                 if 'type' in dat:
                     dat['dim'] = dat['type']
                     dat['type'] = 'raw'
+            dat['acq_time_s'] = acq_time
 
         if not self.hardware_averaging:  # to execute if the averaging has to be done software wise
             self.ind_average += 1
             if self.ind_average == 1:
                 self.datas = datas
-            else:
+                self.averager.reset()
+            if self.Naverage is not None and self.Naverage > 1:
                 try:
-                    for indpannel, dic in enumerate(datas):
-                        self.datas[indpannel]['data'] = \
-                            [((self.ind_average - 1) * self.datas[indpannel]['data'][ind] + datas[indpannel]['data'][
-                                ind]) / self.ind_average for ind in range(len(datas[indpannel]['data']))]
+                    means = self.averager.add([channel for dic in datas for channel in dic['data']])
+                    ind_channel = 0
+                    for dic in self.datas:
+                        dic['data'] = means[ind_channel:ind_channel + len(dic['data'])]
+                        ind_channel += len(dic['data'])
 
-                    if self.show_averaging:
-                        self.emit_temp_data(self.datas)
+                    if self.show_averaging and self.ind_average > 1:
+                        # the averages are updated in place within this thread, the viewers get a snapshot
+                        self.emit_temp_data([OrderedDict(dic, data=[np.array(channel) for channel in dic['data']])
+                                             for dic in self.datas])
 
                 except Exception as e:
                     self.logger.exception(str(e))
@@ -2109,6 +2168,7 @@ class DAQ_Detector(QObject):
             if self.ind_average == self.Naverage:
                 self.average_done = True
                 self.data_detector_sig.emit(self.datas)
+                self.averager.reset()  # the emitted averages are not modified anymore
                 self.ind_average = 0
         else:
             self.data_detector_sig.emit(datas)
@@ -12,6 +12,7 @@ from pymodaq.daq_utils.daq_utils import gauss1D, gauss2D
 from pymodaq.daq_utils.daq_utils import ThreadCommand, getLineInfo
 from pymodaq.daq_utils.config import Config, get_set_local_dir
 from pymodaq.daq_utils.scanner import ScanParameters
+from pymodaq.daq_utils.math_utils import RunningAverager
 from pymodaq.daq_utils.tcp_server_client import TCPServer, tcp_parameters, Socket
 
 comon_parameters = [{'title': 'Controller Status:', 'name': 'controller_status', 'type': 'list', 'value': 'Master',
@@ -42,6 +43,15 @@ params = [
         {'title': 'Live averaging:', 'name': 'live_averaging', 'type': 'bool', 'default': False, 'value': False},
         {'title': 'N Live aver.:', 'name': 'N_live_averaging', 'type': 'int', 'default': 0, 'value': 0,
          'visible': False},
+        {'title': 'Live aver. mode:', 'name': 'live_averaging_mode', 'type': 'list', 'limits': list(RunningAverager.MODES),
+         'visible': False,
+         'tip': 'Mean of all the grabs, exponential moving average or mean of the last grabs (window)'},
+        {'title': 'Live aver. weight:', 'name': 'live_averaging_alpha', 'type': 'float', 'value': 0.1, 'min': 0.001,
+         'max': 1., 'visible': False, 'tip': 'Weight of a new grab in the exponential moving average'},
+        {'title': 'Live aver. window:', 'name': 'live_averaging_window', 'type': 'int', 'value': 10, 'min': 1,
+         'visible': False, 'tip': 'Number of grabs averaged in the window mode'},
+        {'title': 'Live aver. std:', 'name': 'live_averaging_std', 'type': 'bool', 'value': False, 'visible': False,
+         'tip': 'Compute also the running standard deviation of the data, exported (and saved) as *_std channels'},
         {'title': 'Wait time (ms):', 'name': 'wait_time', 'type': 'int', 'default': 0, 'value': 00, 'min': 0},
         {'title': 'Continuous saving:', 'name': 'continuous_saving_opt', 'type': 'bool', 'default': False,
          'value': False},
@@ -52,6 +62,9 @@ params = [
             {'title': 'IP address:', 'name': 'ip_address', 'type': 'str',
              'value': config('network', 'tcp-server', 'ip')},
             {'title': 'Port:', 'name': 'port', 'type': 'int', 'value': config('network', 'tcp-server', 'port')},
+            {'title': 'Binary protocol:', 'name': 'binary_protocol', 'type': 'bool', 'value': False,
+             'tip': 'Use the binary protocol (message IDs, pipelining), the server should support it otherwise the'
+                    ' connection is delayed by the handshake timeout'},
         ]},
         {'title': 'Overshoot options:', 'name': 'overshoot', 'type': 'group', 'visible': True, 'expanded': False,
          'children': [
@@ -402,7 +415,7 @@ class DAQ_Viewer_TCP_server(DAQ_Viewer_base, TCPServer):
     message_list = ["Quit", "Send Data 0D", "Send Data 1D", "Send Data 2D", "Send Data ND", "Status", "Done",
                     "Server Closed", "Info",
                     "Infos",
-                    "Info_xml", 'x_axis', 'y_axis']
+                    "Info_xml", 'x_axis', 'y_axis', 'set_info']
     socket_types = ["GRABBER"]
     params = comon_parameters + tcp_parameters
 
@@ -472,9 +485,7 @@ class DAQ_Viewer_TCP_server(DAQ_Viewer_base, TCPServer):
             --------
             send_command, check_send_data
         """
-        self.send_command(sock, 'Done')
-
-        sock.send_array(data)
+        self.send_command(sock, 'Done', Socket.array_to_buffers(data))
         # if len(data.shape) == 0:
         #     Nrow = 1
         #     Ncol = 0
@@ -534,7 +545,10 @@ class DAQ_Viewer_TCP_server(DAQ_Viewer_base, TCPServer):
             else:
                 data = self.data_mock
 
-            if command_sock is None:
+            if sock is not None and self.message_header is not None and self.message_request is None:
+                # binary protocol: these data don't answer any grab request of this server (see read_client_socket)
+                self.emit_status(ThreadCommand("Update_Status", ['Data received without request are ignored', 'log']))
+            elif command_sock is None:
                 # self.data_grabed_signal.emit([OrderedDict(data=[data],name='TCP GRABBER', type='Data2D')]) #to be directly send to a viewer
                 self.data_ready(data)
                 # print(data)
@@ -549,14 +563,13 @@ class DAQ_Viewer_TCP_server(DAQ_Viewer_base, TCPServer):
         if param.name() in iter_children(self.settings.child(('settings_client')), []):
             grabber_socket = \
                 [client['socket'] for client in self.connected_clients if client['type'] == self.client_type][0]
-            grabber_socket.send_string('set_info')
 
             path = get_param_path(param)[2:]  # get the path of this param as a list starting at parent 'infos'
-            grabber_socket.send_list(path)
 
-            # send value
+            # send path then value
             data = ioxml.parameter_to_xml_string(param)
-            grabber_socket.send_string(data)
+            self.queue_command(grabber_socket, 'set_info',
+                               Socket.list_to_buffers(path) + Socket.string_to_buffers(data))
 
     def ini_detector(self, controller=None):
         """
@@ -12,7 +12,6 @@ from packaging import version as version_mod
 from pyqtgraph.parametertree import Parameter, ParameterTree
 from qtpy import QtGui, QtWidgets, QtCore
 from qtpy.QtCore import Qt, QObject, Slot, QThread, Signal, QLocale
-from time import perf_counter
 
 from pymodaq.daq_utils.gui_utils import DockArea, Dock, select_file
 import pymodaq.daq_utils.gui_utils.layout as layout_mod
@@ -20,7 +19,7 @@ from pymodaq.daq_utils.messenger import messagebox
 from pymodaq.daq_utils.parameter import utils as putils
 import pymodaq.daq_utils.parameter.pymodaq_ptypes as ptypes  # to be placed after importing Parameter
 from pymodaq.daq_utils import daq_utils as utils
-from pymodaq.daq_utils.managers.modules_manager import ModulesManager
+from pymodaq.daq_utils.managers.modules_manager import ModulesManager, ModulesInitializer
 from pymodaq.daq_utils.daq_utils import get_version
 from pymodaq.daq_utils.managers.preset_manager import PresetManager
 from pymodaq.daq_utils.managers.overshoot_manager import OvershootManager
@@ -108,6 +107,7 @@ class DashBoard(QObject):
         self.preset_file = None
         self.actuators_modules = []
         self.detector_modules = []
+        self.init_times = dict([])  # title: init duration (s) of the modules initialized with the preset
         self.setupUI()
 
         logger.info('Dashboard Initialized')
@@ -631,15 +631,14 @@ class DashBoard(QObject):
 
                     model_class = utils.get_models(
                         self.preset_manager.preset_params.child('pid_models').value())['class']
+                    pid_chains = []
                     for setp in model_class.setpoints_names:
                         self.add_move(setp, None, 'PID', move_docks, move_forms, actuators_modules)
                         actuators_modules[-1].controller = dict(curr_point=self.pid_module.curr_points_signal,
                                                            setpoint=self.pid_module.setpoints_signal,
                                                            emit_curr_points=self.pid_module.emit_curr_points_sig)
-                        actuators_modules[-1].ui.IniStage_pb.click()
-                        QtWidgets.QApplication.processEvents()
-                        self.poll_init(actuators_modules[-1])
-                        QtWidgets.QApplication.processEvents()
+                        pid_chains.append([actuators_modules[-1]])
+                    self.init_modules(pid_chains)
 
             except Exception as e:
                 logger.exception(str(e))
@@ -678,7 +677,9 @@ class DashBoard(QObject):
             #######################
 
             ind_det = -1
+            init_chains = []  # modules to be initialized, grouped by controller ID
             for plug_IDs in plugins_sorted:
+                init_chains.append([])
                 for ind_plugin, plugin in enumerate(plug_IDs):
                     plug_name = plugin['value'].child('name').value()
                     plug_init = plugin['value'].child('init').value()
@@ -694,21 +695,11 @@ class DashBoard(QObject):
                             if ind_plugin == 0:  # should be a master type plugin
                                 if plugin['status'] != "Master":
                                     logger.error('error in the master/slave type for plugin {}'.format(plug_name))
-                                if plug_init:
-                                    actuators_modules[-1].ui.IniStage_pb.click()
-                                    QtWidgets.QApplication.processEvents()
-                                    self.poll_init(actuators_modules[-1])
-                                    QtWidgets.QApplication.processEvents()
-                                    master_controller = actuators_modules[-1].controller
                             else:
                                 if plugin['status'] != "Slave":
                                     logger.error('error in the master/slave type for plugin {}'.format(plug_name))
-                                if plug_init:
-                                    actuators_modules[-1].controller = master_controller
-                                    actuators_modules[-1].ui.IniStage_pb.click()
-                                    QtWidgets.QApplication.processEvents()
-                                    self.poll_init(actuators_modules[-1])
-                                    QtWidgets.QApplication.processEvents()
+                            if plug_init:
+                                init_chains[-1].append(actuators_modules[-1])
                         except ActuatorError as e:
                             self.splash_sc.close()
                             messagebox(text=f'{str(e)}\nQuitting the application...', title='Incompatibility')
@@ -746,27 +737,14 @@ class DashBoard(QObject):
 
                             QtWidgets.QApplication.processEvents()
 
-                            try:
-                                if ind_plugin == 0:  # should be a master type plugin
-                                    if plugin['status'] != "Master":
-                                        logger.error('error in the master/slave type for plugin {}'.format(plug_name))
-                                    if plug_init:
-                                        detector_modules[-1].ui.IniDet_pb.click()
-                                        QtWidgets.QApplication.processEvents()
-                                        self.poll_init(detector_modules[-1])
-                                        QtWidgets.QApplication.processEvents()
-                                        master_controller = detector_modules[-1].controller
-                                else:
-                                    if plugin['status'] != "Slave":
-                                        logger.error('error in the master/slave type for plugin {}'.format(plug_name))
-                                    if plug_init:
-                                        detector_modules[-1].controller = master_controller
-                                        detector_modules[-1].ui.IniDet_pb.click()
-                                        QtWidgets.QApplication.processEvents()
-                                        self.poll_init(detector_modules[-1])
-                                        QtWidgets.QApplication.processEvents()
-                            except Exception as e:
-                                logger.exception(str(e))
+                            if ind_plugin == 0:  # should be a master type plugin
+                                if plugin['status'] != "Master":
+                                    logger.error('error in the master/slave type for plugin {}'.format(plug_name))
+                            else:
+                                if plugin['status'] != "Slave":
+                                    logger.error('error in the master/slave type for plugin {}'.format(plug_name))
+                            if plug_init:
+                                init_chains[-1].append(detector_modules[-1])
 
                             detector_modules[-1].settings.child('main_settings', 'overshoot').show()
                             detector_modules[-1].overshoot_signal[bool].connect(self.stop_moves)
@@ -777,6 +755,7 @@ class DashBoard(QObject):
                             self.quit_fun()
                             return
             QtWidgets.QApplication.processEvents()
+            self.init_modules(init_chains)
             # restore dock state if saved
 
             self.title = self.preset_file.stem
@@ -792,16 +771,43 @@ class DashBoard(QObject):
             logger.error('Invalid file selected')
             return actuators_modules, detector_modules
 
-    def poll_init(self, module):
-        is_init = False
-        tstart = perf_counter()
-        while not is_init:
-            QThread.msleep(1000)
-            QtWidgets.QApplication.processEvents()
-            is_init = module.initialized_state
-            if perf_counter() - tstart > 60:  # timeout of 60sec
-                break
-        return is_init
+    def init_modules(self, chains):
+        """Initialize the modules of a preset, concurrently if set so in the configuration
+
+        Parameters
+        ----------
+        chains: (list of list of DAQ_Move or DAQ_Viewer) the modules to initialize grouped by controller ID, the
+            master module first (the slaves are initialized with its controller once it is initialized)
+
+        Returns
+        -------
+        bool: True if all the modules have been initialized
+
+        See Also
+        --------
+        ModulesInitializer
+        """
+        concurrent = config('presets', 'concurrent_init')
+        initializer = ModulesInitializer(chains, concurrent=concurrent,
+                                         timeout=config('presets', 'init_timeout_s') * 1000)
+        if len(initializer.chains) == 0:
+            return True
+        self.splash_sc.showMessage(f"Initializing {sum([len(chain) for chain in initializer.chains])} modules"
+                                   f"{' concurrently' if concurrent else ''}", color=Qt.white)
+        initializer.module_initialized.connect(self.module_initialized)
+        status = initializer.run()
+        self.init_times.update(initializer.init_times)
+        logger.info(f'{len(initializer.init_times)} modules initialized in {initializer.duration:.3f} s (sum of the'
+                    f' init durations: {sum(initializer.init_times.values()):.3f} s)')
+        return status
+
+    def module_initialized(self, title, status, duration):
+        if status:
+            message = f'{title} initialized in {duration:.3f} s'
+        else:
+            message = f'{title} could not be initialized ({duration:.3f} s)'
+        self.splash_sc.showMessage(message, color=Qt.white)
+        logger.info(message)
 
     def set_roi_configuration(self, filename):
         if not isinstance(filename, Path):
@@ -1055,7 +1061,8 @@ class DashBoard(QObject):
                 self.actuators_modules = actuators_modules
                 self.detector_modules = detector_modules
 
-                self.modules_manager = ModulesManager(self.detector_modules, self.actuators_modules)
+                self.modules_manager = ModulesManager(self.detector_modules, self.actuators_modules,
+                                                      timeout=config('scan', 'timeflow', 'timeout'))
                 #
                 if self.pid_module is not None:
                     self.pid_module.ini_model_action.click()
@@ -12,9 +12,13 @@ from pyqtgraph.parametertree import Parameter, ParameterTree
 from pymodaq.daq_utils.plotting.data_viewers.viewer0D import Viewer0D
 from pymodaq.daq_utils.gui_utils.widgets import QLED
 from pymodaq.pid.utils import OutputToActuator, InputFromDetector
+from pymodaq.pid.scheduler import LoopScheduler
+from pymodaq.pid.telemetry import PIDTelemetry, save_telemetry
+from pymodaq.daq_utils.h5modules import H5Saver
 from pymodaq.daq_utils.gui_utils.dock import DockArea, Dock
 from simple_pid import PID
 import time
+import datetime
 
 logger = set_logger(get_module_name(__file__))
 
@@ -53,8 +57,23 @@ class DAQ_PID(QObject):
             {'title': 'epsilon', 'name': 'epsilon', 'type': 'float', 'value': 0.01,
              'tooltip': 'Precision at which move is considered as done'},
             {'title': 'PID controls:', 'name': 'pid_controls', 'type': 'group', 'children': [
-                {'title': 'Sample time (ms):', 'name': 'sample_time', 'type': 'int', 'value': 10},
+                {'title': 'Sample time (ms):', 'name': 'sample_time', 'type': 'int', 'value': 10,
+                 'tip': 'Period of the PID loop, compensating for the time spent grabbing and moving'},
+                {'title': 'Free running:', 'name': 'free_running', 'type': 'bool', 'value': False,
+                 'tip': 'The loop is not paced: its cadence is the data rate of the (triggered) detectors'},
                 {'title': 'Refresh plot time (ms):', 'name': 'refresh_plot_time', 'type': 'int', 'value': 200},
+                {'title': 'Loop timing:', 'name': 'loop_timing', 'type': 'group', 'expanded': False, 'children': [
+                    {'title': 'Rate (Hz):', 'name': 'rate', 'type': 'float', 'value': 0., 'readonly': True},
+                    {'title': 'Jitter (ms):', 'name': 'jitter', 'type': 'float', 'value': 0., 'readonly': True,
+                     'tip': 'Mean delay of the start of the iterations with respect to their schedule (deviation of'
+                            ' the period from its mean in free running mode)'},
+                    {'title': 'Jitter std (ms):', 'name': 'jitter_std', 'type': 'float', 'value': 0.,
+                     'readonly': True},
+                    {'title': 'Jitter max (ms):', 'name': 'jitter_max', 'type': 'float', 'value': 0.,
+                     'readonly': True},
+                    {'title': 'Overruns:', 'name': 'overruns', 'type': 'int', 'value': 0, 'readonly': True,
+                     'tip': 'Number of iterations that lasted longer than the sample time'},
+                ]},
                 {'title': 'Output limits:', 'name': 'output_limits', 'expanded': True, 'type': 'group', 'children': [
                     {'title': 'Output limit (min):', 'name': 'output_limit_min_enabled', 'type': 'bool',
                      'value': False},
@@ -63,6 +82,18 @@ class DAQ_PID(QObject):
                      'value': False},
                     {'title': 'Output limit (max:', 'name': 'output_limit_max', 'type': 'float', 'value': 100},
                 ]},
+                {'title': 'Telemetry:', 'name': 'telemetry', 'type': 'group', 'expanded': False, 'children': [
+                    {'title': 'Buffer size:', 'name': 'buffer_size', 'type': 'int', 'value': 10000, 'min': 1,
+                     'tip': 'Number of loop iterations kept in memory'},
+                    {'title': 'Trigger on error:', 'name': 'trigger_enabled', 'type': 'bool', 'value': False,
+                     'tip': 'Save the buffer when the error of a channel exceeds the threshold (lock loss)'},
+                    {'title': 'Error threshold:', 'name': 'trigger_threshold', 'type': 'float', 'value': 1., 'min': 0},
+                    {'title': 'Post trigger iterations:', 'name': 'post_trigger', 'type': 'int', 'value': 1000,
+                     'min': 0},
+                    {'title': 'Save snapshot:', 'name': 'snapshot', 'type': 'action'},
+                    {'title': 'Telemetry file:', 'name': 'telemetry_file', 'type': 'str', 'value': '',
+                     'readonly': True},
+                ]},
                 {'title': 'Auto mode:', 'name': 'auto_mode', 'type': 'bool', 'value': False, 'readonly': True},
                 {'title': 'Prop. on measurement:', 'name': 'proportional_on_measurement', 'type': 'bool',
                  'value': False},
@@ -90,6 +121,7 @@ class DAQ_PID(QObject):
         self._setpoints = dict([])
 
         self.modules_manager = None
+        self.h5saver = None
 
         self.dock_area = dockarea
         self.check_moving = False
@@ -102,7 +134,8 @@ class DAQ_PID(QObject):
         self.emit_curr_points_sig.connect(self.emit_curr_points)
 
     def set_module_manager(self, detector_modules, actuator_modules):
-        self.modules_manager = ModulesManager(detector_modules, actuator_modules)
+        self.modules_manager = ModulesManager(detector_modules, actuator_modules,
+                                              timeout=self.settings.child('main_settings', 'timeout').value())
 
     def ini_PID(self):
 
@@ -129,11 +162,15 @@ class DAQ_PID(QObject):
                                                                                'sample_time').value() / 1000,
                                                output_limits=output_limits,
                                                auto_mode=False),
+                                   free_running=self.settings.child('main_settings', 'pid_controls',
+                                                                    'free_running').value(),
+                                   telemetry_options=self.get_telemetry_options(),
                                    )
 
             self.PIDThread.pid_runner = pid_runner
             pid_runner.pid_output_signal.connect(self.process_output)
             pid_runner.status_sig.connect(self.thread_status)
+            pid_runner.telemetry_signal.connect(self.save_telemetry)
             self.command_pid.connect(pid_runner.queue_command)
 
             pid_runner.moveToThread(self.PIDThread)
@@ -158,6 +195,38 @@ class DAQ_PID(QObject):
         self.output_viewer.show_data([[dat] for dat in datas['output']])
         self.input_viewer.show_data([[dat] for dat in datas['input']])
         self.curr_points = datas['input']
+        if 'timing' in datas:
+            timing = datas['timing']
+            timing_param = self.settings.child('main_settings', 'pid_controls', 'loop_timing')
+            timing_param.child('rate').setValue(timing['rate'])
+            timing_param.child('jitter').setValue(timing['jitter_mean'] * 1000)
+            timing_param.child('jitter_std').setValue(timing['jitter_std'] * 1000)
+            timing_param.child('jitter_max').setValue(timing['jitter_max'] * 1000)
+            timing_param.child('overruns').setValue(timing['overruns'])
+
+    def get_telemetry_options(self):
+        telemetry_param = self.settings.child('main_settings', 'pid_controls', 'telemetry')
+        threshold = None
+        if telemetry_param.child('trigger_enabled').value():
+            threshold = telemetry_param.child('trigger_threshold').value()
+        return dict(Nsamples=telemetry_param.child('buffer_size').value(), threshold=threshold,
+                    Npost_trigger=telemetry_param.child('post_trigger').value())
+
+    def save_telemetry(self, snapshot):
+        """Save a telemetry snapshot emitted by the PID loop in the telemetry file (created on the first snapshot)"""
+        try:
+            if self.h5saver is None:
+                self.h5saver = H5Saver(save_type='custom')
+                self.h5saver.settings.child('base_name').setValue('PID_telemetry')
+                self.h5saver.init_file(update_h5=True)
+                self.settings.child('main_settings', 'pid_controls', 'telemetry', 'telemetry_file').setValue(
+                    self.h5saver.settings.child('current_h5_file').value())
+            save_telemetry(self.h5saver, snapshot, channels_names=self.model_class.setpoints_names,
+                           title=f"PID telemetry ({snapshot['reason']})", settings=self.settings,
+                           metadata=dict(reason=snapshot['reason'], start_time=snapshot['start_time']))
+            logger.info(f"PID telemetry ({snapshot['reason']}) saved in {self.h5saver.h5_file_name}")
+        except Exception as e:
+            logger.exception(str(e))
 
     def enable_controls_pid(self, enable=False):
         self.ini_PID_action.setEnabled(enable)
@@ -261,6 +330,8 @@ class DAQ_PID(QObject):
         # connecting from tree
         self.settings.sigTreeStateChanged.connect(
             self.parameter_tree_changed)  # any changes on the settings will update accordingly the detector
+        self.settings.child('main_settings', 'pid_controls', 'telemetry', 'snapshot').sigActivated.connect(
+            lambda: self.command_pid.emit(ThreadCommand('telemetry_snapshot')))
         self.dock_pid.addWidget(widget)
 
     def get_set_model_params(self, model_name):
@@ -406,6 +477,9 @@ class DAQ_PID(QObject):
                 QThread.msleep(1000)
                 QtWidgets.QApplication.processEvents()
 
+            if self.h5saver is not None:
+                self.h5saver.close_file()
+
             self.dock_area.parent().close()
 
         except Exception as e:
@@ -439,10 +513,15 @@ class DAQ_PID(QObject):
 
                 elif param.name() == 'refresh_plot_time' or param.name() == 'timeout':
                     self.command_pid.emit(ThreadCommand('update_timer', [param.name(), param.value()]))
+                    if param.name() == 'timeout' and self.modules_manager is not None:
+                        self.modules_manager.timeout = param.value()
 
                 elif param.name() == 'sample_time':
                     self.command_pid.emit(ThreadCommand('update_options', dict(sample_time=param.value())))
 
+                elif param.name() == 'free_running':
+                    self.command_pid.emit(ThreadCommand('update_options', dict(free_running=param.value())))
+
                 elif param.name() in putils.iter_children(
                         self.settings.child('main_settings', 'pid_controls', 'output_limits'), []):
 
@@ -459,6 +538,9 @@ class DAQ_PID(QObject):
 
                     self.command_pid.emit(ThreadCommand('update_options', dict(output_limits=output_limits)))
 
+                elif param.name() in ['buffer_size', 'trigger_enabled', 'trigger_threshold', 'post_trigger']:
+                    self.command_pid.emit(ThreadCommand('update_telemetry', self.get_telemetry_options()))
+
                 elif param.name() in putils.iter_children(
                         self.settings.child('main_settings', 'pid_controls', 'pid_constants'), []):
                     Kp = self.settings.child('main_settings', 'pid_controls', 'pid_constants', 'kp').value()
@@ -490,8 +572,10 @@ class DAQ_PID(QObject):
 class PIDRunner(QObject):
     status_sig = Signal(list)
     pid_output_signal = Signal(dict)
+    telemetry_signal = Signal(dict)
 
-    def __init__(self, model_class, module_manager, setpoints=[], params=dict([])):
+    def __init__(self, model_class, module_manager, setpoints=[], params=dict([]), free_running=False,
+                 telemetry_options=dict([])):
         """
         Init the PID instance with params as initial conditions
 
@@ -500,6 +584,9 @@ class PIDRunner(QObject):
         params: (dict) Kp=1.0, Ki=0.0, Kd=0.0,setpoints=[0], sample_time=0.01, output_limits=(None, None),
                  auto_mode=True,
                  proportional_on_measurement=False)
+        free_running: (bool) if True the loop is not paced at sample_time but runs at the data rate of the detectors
+        telemetry_options: (dict) Nsamples, threshold and Npost_trigger arguments of the PIDTelemetry recording each
+            iteration of the loop
         """
         super().__init__()
         self.model_class = model_class
@@ -518,6 +605,10 @@ class PIDRunner(QObject):
         self.pids = [PID(setpoint=setpoints[0], **params) for ind in range(Nsetpoints)]  # #PID(object):
         for pid in self.pids:
             pid.set_auto_mode(False)
+            pid.sample_time = None  # the loop is paced by the scheduler, the pids update at each iteration
+        self.scheduler = LoopScheduler(self.sample_time, free_running=free_running, idle=self.idle)
+        self.telemetry = PIDTelemetry(Nsetpoints, **telemetry_options)
+        self.start_time = datetime.datetime.now()
         self.refreshing_ouput_time = 200
         self.running = True
         self.timer = self.startTimer(self.refreshing_ouput_time)
@@ -531,7 +622,18 @@ class PIDRunner(QObject):
     #
     def timerEvent(self, event):
         self.pid_output_signal.emit(dict(output=self.outputs_to_actuators.values,
-                                             input=self.inputs_from_dets.values))
+                                         input=self.inputs_from_dets.values,
+                                         timing=self.scheduler.statistics()))
+
+    @staticmethod
+    def idle(remaining, margin=0.0005):
+        """Sleep until the next iteration of the loop
+
+        The sleep stops margin seconds before the deadline (to absorb the oversleeping of the OS), the scheduler then
+        polling its clock until the start of the iteration. The events are processed once per iteration by the loop.
+        """
+        if remaining > margin:
+            time.sleep(remaining - margin)
 
     @Slot(ThreadCommand)
     def queue_command(self, command=ThreadCommand()):
@@ -558,6 +660,12 @@ class PIDRunner(QObject):
         elif command.command == 'input':
             self.update_input(*command.attributes)
 
+        elif command.command == 'update_telemetry':
+            self.update_telemetry(**command.attributes)
+
+        elif command.command == 'telemetry_snapshot':
+            self.emit_telemetry('snapshot')
+
         elif command.command == 'update_timer':
             if command.attributes[0] == 'refresh_plot_time':
                 self.killTimer(self.timer)
@@ -569,6 +677,24 @@ class PIDRunner(QObject):
     def update_input(self, measurements):
         self.inputs_from_dets = self.model_class.convert_input(measurements)
 
+    def update_telemetry(self, Nsamples=None, threshold=None, Npost_trigger=0):
+        self.telemetry.threshold = threshold
+        self.telemetry.Npost_trigger = Npost_trigger
+        self.telemetry.clear_trigger()
+        if Nsamples is not None and Nsamples != self.telemetry.Nsamples:
+            self.telemetry.resize(Nsamples)
+
+    def emit_telemetry(self, reason='snapshot'):
+        """Emit a copy of the telemetry buffer to be saved
+
+        Parameters
+        ----------
+        reason: (str) either 'snapshot' (on demand) or 'trigger'
+        """
+        snapshot = self.telemetry.snapshot()
+        snapshot.update(reason=reason, start_time=self.start_time.isoformat())
+        self.telemetry_signal.emit(snapshot)
+
     def start_PID(self, sync_detectors=True, sync_acts=False):
         """Start the pid controller loop
 
@@ -588,7 +714,15 @@ class PIDRunner(QObject):
 
             self.current_time = time.perf_counter()
             logger.info('PID loop starting')
+            self.scheduler.start()
+            self.telemetry.reset()
+            self.start_time = datetime.datetime.now()
             while self.running:
+                # # WAIT FOR THE SCHEDULED START OF THE ITERATION (compensating for the time spent below)
+                dt = self.scheduler.wait()
+                if not self.running:
+                    break
+
                 # print('input: {}'.format(self.input))
                 # # GRAB DATA FIRST AND WAIT ALL DETECTORS RETURNED
 
@@ -599,7 +733,15 @@ class PIDRunner(QObject):
                 # # EXECUTE THE PID
                 self.outputs = []
                 for ind, pid in enumerate(self.pids):
-                    self.outputs.append(pid(self.inputs_from_dets.values[ind]))
+                    self.outputs.append(pid(self.inputs_from_dets.values[ind], dt=dt))
+
+                # # RECORD THE ITERATION
+                self.telemetry.record(self.scheduler.last_start - self.scheduler.t0, self.inputs_from_dets.values,
+                                      [pid.setpoint for pid in self.pids], [pid.components for pid in self.pids],
+                                      self.outputs)
+                if self.telemetry.triggered:
+                    self.emit_telemetry('trigger')
+                    self.telemetry.clear_trigger()
 
                 # # APPLY THE PID OUTPUT TO THE ACTUATORS
                 if self.outputs is None:
@@ -614,10 +756,12 @@ class PIDRunner(QObject):
                                                         polling=False)
 
                 self.current_time = time.perf_counter()
-                QtWidgets.QApplication.processEvents()
-                QThread.msleep(int(self.sample_time * 1000))
+                QtWidgets.QApplication.processEvents()  # the commands (stop, pause, setpoints...) and timers
 
-            logger.info('PID loop exiting')
+            stats = self.scheduler.statistics()
+            logger.info(f"PID loop exiting after {stats['iterations']} iterations at {stats['rate']:.1f} Hz, jitter"
+                        f" {1000 * stats['jitter_mean']:.3f} ms (std {1000 * stats['jitter_std']:.3f} ms, max"
+                        f" {1000 * stats['jitter_max']:.3f} ms), {stats['overruns']} overruns")
             self.modules_manager.connect_actuators(False)
             self.modules_manager.connect_detectors(False)
 
@@ -629,13 +773,16 @@ class PIDRunner(QObject):
             pid.setpoint = setpoints[ind]
 
     def set_option(self, **option):
+        if 'sample_time' in option:  # the loop period, in ms
+            self.sample_time = option.pop('sample_time') / 1000
+            self.scheduler.period = self.sample_time
+        if 'free_running' in option:
+            self.scheduler.free_running = option.pop('free_running')
+            self.scheduler.start()
         for pid in self.pids:
             for key in option:
                     if hasattr(pid, key):
-                        if key == 'sample_time':
-                            setattr(pid, key, option[key] / 1000)
-                        else:
-                            setattr(pid, key, option[key])
+                        setattr(pid, key, option[key])
 
     def run_PID(self, last_values):
         logger.info('Stabilization started')
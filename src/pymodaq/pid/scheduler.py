@@ -0,0 +1,109 @@
+from collections import deque
+import time
+
+import numpy as np
+
+
+class LoopScheduler:
+    """Pace the iterations of a loop at an absolute period on a monotonic clock
+
+    The start of the iteration k is scheduled at t0 + k * period whatever the time spent working within the
+    iterations, so that the loop period does not drift with the work time. An iteration whose work lasts longer
+    than the period is an overrun: the missed starts are skipped and the loop resumes at the next scheduled one
+    (keeping its phase) instead of running a burst of iterations to catch up.
+
+    In free running mode, no wait is done between the iterations: the cadence is set by the work itself, for instance
+    a triggered detector whose grab returns when data are available.
+
+    The jitter of an iteration is the delay of its start with respect to its scheduled start (or, in free running mode,
+    the deviation of its period from the mean period). Statistics are computed over the last Nstats iterations.
+
+    Parameters
+    ----------
+    period: (float) the loop period in seconds
+    free_running: (bool) if True, the iterations are not paced
+    idle: (callable) called with the remaining time (in s) before the next start while waiting, should return
+          before that time (for instance sleeping a fraction of it while processing events). Default: time.sleep
+    clock: (callable) monotonic clock returning a time in seconds
+    Nstats: (int) number of iterations over which the statistics are computed
+
+    Examples
+    --------
+    >>> scheduler = LoopScheduler(0.01)
+    >>> scheduler.start()
+    >>> while running:
+    ...     scheduler.wait()  # returns at the scheduled start of the iteration
+    ...     do_work()
+    """
+
+    def __init__(self, period=0.01, free_running=False, idle=time.sleep, clock=time.perf_counter, Nstats=1000):
+        self.period = period
+        self.free_running = free_running
+        self.idle = idle
+        self.clock = clock
+        self._periods = deque(maxlen=Nstats)
+        self._jitters = deque(maxlen=Nstats)
+        self.start()
+
+    def start(self):
+        """(Re)start the schedule: the first iteration starts now and the statistics are reset"""
+        self.t0 = self.clock()
+        self.next_time = self.t0
+        self.last_start = None
+        self.dt = None  # actual period of the last iteration
+        self.Niterations = 0
+        self.Noverruns = 0
+        self._periods.clear()
+        self._jitters.clear()
+
+    def wait(self):
+        """Wait for the scheduled start of the next iteration and record its timing
+
+        Returns
+        -------
+        float or None: the time elapsed since the start of the previous iteration (None for the first one)
+        """
+        overrun = False
+        if not self.free_running:
+            remaining = self.next_time - self.clock()
+            overrun = remaining < 0 and self.Niterations > 0  # the previous iteration ended after this start
+            while remaining > 0:
+                self.idle(remaining)
+                remaining = self.next_time - self.clock()
+        now = self.clock()
+
+        if self.last_start is not None:
+            self.dt = now - self.last_start
+            self._periods.append(self.dt)
+        if not self.free_running:
+            self._jitters.append(now - self.next_time)
+            if overrun:
+                self.Noverruns += 1
+            self.next_time += self.period
+            if self.next_time <= now:  # skip the starts missed by an overrun
+                self.next_time += (np.floor((now - self.next_time) / self.period) + 1) * self.period
+        elif self.dt is not None:
+            self._jitters.append(self.dt - np.mean(self._periods))
+        self.last_start = now
+        self.Niterations += 1
+        return self.dt
+
+    def statistics(self):
+        """Get the timing statistics of the last iterations
+
+        Returns
+        -------
+        dict: with keys rate (achieved rate in Hz), period, jitter_mean, jitter_std and jitter_max (in s), overruns (the
+              number of iterations whose work ended after the scheduled start of the next one) and iterations
+        """
+        stats = dict(rate=0., period=0., jitter_mean=0., jitter_std=0., jitter_max=0., overruns=self.Noverruns,
+                     iterations=self.Niterations)
+        if len(self._periods) != 0:
+            stats['period'] = float(np.mean(self._periods))
+            stats['rate'] = 1 / stats['period'] if stats['period'] > 0 else 0.
+        if len(self._jitters) != 0:
+            jitters = np.array(self._jitters)
+            stats['jitter_mean'] = float(np.mean(jitters))
+            stats['jitter_std'] = float(np.std(jitters))
+            stats['jitter_max'] = float(np.max(np.abs(jitters)))
+        return stats
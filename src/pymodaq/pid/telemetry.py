@@ -0,0 +1,155 @@
+import numpy as np
+
+from pymodaq.daq_utils.parameter import ioxml
+
+
+class PIDTelemetry:
+    """Record the state of the PID loop at each of its iterations into a preallocated ring buffer
+
+    At each iteration, the time, the inputs, the setpoints, the proportional, integral and derivative terms and the
+    outputs of all the PID channels are written element by element into arrays allocated once: recording costs the
+    same whatever the buffer size and creates no array, so that it can be done within a loop running at 1kHz. Once the
+    buffer is full, the oldest iterations are overwritten.
+
+    A trigger can be set on the error (the distance between an input and its setpoint): once the error of any
+    channel exceeds the threshold (for instance on a lock loss), Npost_trigger more iterations are recorded and the
+    trigger is then `triggered` so that the buffer can be dumped (see `snapshot` and `save_telemetry`). The trigger is
+    re-armed once the error has gone back below the threshold.
+
+    Parameters
+    ----------
+    Nchannels: (int) the number of PID channels (setpoints)
+    Nsamples: (int) the number of iterations kept in the buffer
+    threshold: (float or None) the error above which the trigger fires, None to disable the trigger
+    Npost_trigger: (int) the number of iterations recorded after the one that fired the trigger
+    """
+    quantities = ['input', 'setpoint', 'proportional', 'integral', 'derivative', 'output']
+
+    def __init__(self, Nchannels=1, Nsamples=10000, threshold=None, Npost_trigger=0):
+        self.Nchannels = Nchannels
+        self.threshold = threshold
+        self.Npost_trigger = Npost_trigger
+        self.resize(Nsamples)
+
+    def resize(self, Nsamples):
+        """Allocate a new buffer holding Nsamples iterations, the recorded iterations are lost"""
+        self.Nsamples = Nsamples
+        self._time = np.zeros((Nsamples,))
+        self._data = np.zeros((Nsamples, len(self.quantities), self.Nchannels))
+        self.reset()
+
+    def reset(self):
+        """Forget the recorded iterations and re-arm the trigger"""
+        self.Nrecorded = 0
+        self.trigger_index = None
+        self.armed = True
+
+    def record(self, time, inputs, setpoints, components, outputs):
+        """Record one iteration of the loop
+
+        Parameters
+        ----------
+        time: (float) the time of the iteration in seconds
+        inputs: (list of float) the input of each channel
+        setpoints: (list of float) the setpoint of each channel
+        components: (list of tuple) the (P, I, D) terms of each channel, see simple_pid.PID.components
+        outputs: (list of float or None) the output of each channel (None when not computed)
+        """
+        ind = self.Nrecorded % self.Nsamples
+        self._time[ind] = time
+        data = self._data
+        exceeded = False
+        for ind_channel in range(self.Nchannels):
+            data[ind, 0, ind_channel] = inputs[ind_channel]
+            data[ind, 1, ind_channel] = setpoints[ind_channel]
+            for ind_component in range(3):
+                data[ind, 2 + ind_component, ind_channel] = components[ind_channel][ind_component]
+            output = outputs[ind_channel]
+            data[ind, 5, ind_channel] = np.nan if output is None else output
+            if self.threshold is not None and abs(inputs[ind_channel] - setpoints[ind_channel]) > self.threshold:
+                exceeded = True
+
+        if self.threshold is not None and self.trigger_index is None:
+            if self.armed and exceeded:
+                self.trigger_index = self.Nrecorded
+                self.armed = False
+            elif not exceeded:
+                self.armed = True
+        self.Nrecorded += 1
+
+    @property
+    def triggered(self):
+        """bool: True if the trigger fired and the post trigger iterations have been recorded"""
+        return self.trigger_index is not None and \
+            self.Nrecorded - self.trigger_index > min(self.Npost_trigger, self.Nsamples - 1)
+
+    def clear_trigger(self):
+        """Wait for the next trigger, only once the error has gone back below the threshold"""
+        self.trigger_index = None
+
+    def snapshot(self):
+        """Copy the recorded iterations
+
+        Returns
+        -------
+        dict: with keys time (ndarray of shape (N,)), the quantities (ndarrays of shape (N, Nchannels)) where N is the
+              number of iterations kept in the buffer in chronological order, and trigger_time (the time of the
+              iteration that fired the trigger or None)
+        """
+        ind = self.Nrecorded % self.Nsamples
+        if self.Nrecorded <= self.Nsamples:
+            time = self._time[:self.Nrecorded].copy()
+            data = self._data[:self.Nrecorded].copy()
+        else:
+            time = np.concatenate((self._time[ind:], self._time[:ind]))
+            data = np.concatenate((self._data[ind:], self._data[:ind]))
+
+        snapshot = dict(time=time)
+        for ind_quantity, quantity in enumerate(self.quantities):
+            snapshot[quantity] = data[:, ind_quantity, :]
+        trigger_time = None
+        if self.trigger_index is not None and self.Nrecorded - self.trigger_index <= self.Nsamples:
+            trigger_time = float(self._time[self.trigger_index % self.Nsamples])
+        snapshot['trigger_time'] = trigger_time
+        return snapshot
+
+
+def save_telemetry(h5saver, snapshot, channels_names=None, title='PID telemetry', settings=None, metadata=dict([])):
+    """Save a telemetry snapshot in a new detector group of an initialized h5 file
+
+    Each quantity of each channel is saved as a 1D data with the iterations time as x_axis
+
+    Parameters
+    ----------
+    h5saver: (H5Saver) with an opened file
+    snapshot: (dict) as returned by PIDTelemetry.snapshot
+    channels_names: (list of str) the names of the PID channels (the setpoints names of the model)
+    title: (str) the title of the detector group
+    settings: (Parameter or None) settings saved as the XML metadata of the group
+    metadata: (dict) extra metadata saved as attributes of the detector group
+
+    Returns
+    -------
+    group node: the created detector group
+    """
+    Nchannels = snapshot['input'].shape[1]
+    if channels_names is None:
+        channels_names = ['' for ind in range(Nchannels)]
+    channels_names = [name if name != '' else f'CH{ind:02d}' for ind, name in enumerate(channels_names)]
+    settings_str = b''
+    if settings is not None:
+        settings_str = b'<All_settings>' + ioxml.parameter_to_xml_string(settings) + b'</All_settings>'
+    metadata = dict(metadata)
+    if snapshot['trigger_time'] is not None:
+        metadata['trigger_time'] = snapshot['trigger_time']
+
+    det_group = h5saver.add_det_group(h5saver.raw_group, title, settings_str, metadata=metadata)
+    data_group = h5saver.add_data_group(det_group, 'data1D', metadata=dict([]))
+    for quantity in PIDTelemetry.quantities:
+        for ind, name in enumerate(channels_names):
+            channel = h5saver.add_CH_group(data_group, title=f'{name} {quantity}', metadata=dict([]))
+            h5saver.add_data(channel, dict(data=snapshot[quantity][:, ind],
+                                           x_axis=dict(data=snapshot['time'], units='s', label='Time')),
+                             scan_type='', metadata=dict([]))
+    h5saver.flush()
+    return det_group
@@ -0,0 +1,119 @@
+import threading
+
+import numpy as np
+import pytest
+
+from pymodaq.daq_utils import adaptive_engine
+from pymodaq.daq_utils import h5modules
+from pymodaq.daq_utils import scanner
+
+
+class GridLearner:
+    """Minimal learner probing the points of a 1D grid from the left, recording the thread of its calls"""
+    def __init__(self, points):
+        self.remaining = list(points)
+        self.data = dict([])
+        self.pending_points = set([])
+        self.threads = set([])
+
+    def ask(self, n, tell_pending=True):
+        self.threads.add(threading.current_thread().name)
+        points = self.remaining[:n]
+        self.remaining = self.remaining[n:]
+        self.pending_points.update(points)
+        return points, [1. for point in points]
+
+    def tell(self, point, value):
+        self.threads.add(threading.current_thread().name)
+        self.pending_points.discard(point)
+        self.data[point] = value
+
+    def tell_many(self, points, values):
+        for point, value in zip(points, values):
+            self.tell(point, value)
+
+    def loss(self):
+        return float(len(self.remaining))
+
+
+def test_get_learner_dimension():
+    scan_param = scanner.ScanParameters(Naxes=3, scan_type='Sequential', scan_subtype='Linear',
+                                        starts=[0, 0, 0], stops=[1, 1, 1], steps=[0.5, 0.5, 0.5])
+    assert adaptive_engine.get_learner_dimension(scan_param) == 3
+    scan_param = scanner.ScanParameters(Naxes=2, scan_type='Tabular', scan_subtype='Linear',
+                                        positions=np.array([[0, 0], [1, 1]]))
+    assert adaptive_engine.get_learner_dimension(scan_param) == 1
+
+
+def test_order_points_by_travel():
+    points = np.array([[10, 0], [1, 0], [5, 0], [3, 0], [8, 0]])
+    order = adaptive_engine.order_points_by_travel(points, start=np.array([0, 0]))
+    assert np.all(points[order, 0] == np.array([1, 3, 5, 8, 10]))
+    order = adaptive_engine.order_points_by_travel(points, start=np.array([11, 0]))
+    assert np.all(points[order, 0] == np.array([10, 8, 5, 3, 1]))
+    order = adaptive_engine.order_points_by_travel([4., 2.], start=0.)
+    assert np.all(order == np.array([1, 0]))
+
+
+class TestAdaptiveEngine:
+    def test_batches(self):
+        learner = GridLearner([9., 1., 5., 3., 7., 2., 8.])
+        engine = adaptive_engine.AdaptiveEngine(learner, batch_size=3)
+        batch = engine.ask(0.)
+        assert batch == [1., 5., 9.]  # ordered from the start position
+        for point in batch:
+            engine.tell(point, point ** 2)
+        engine.prefetch(9.)
+        assert engine.ask() == [7., 3., 2.]  # the prefetched batch is returned
+        assert engine.ask(2.) == [8.]
+        assert engine.ask() == []
+        engine.wait()
+        assert learner.data == {1.: 1., 5.: 25., 9.: 81.}
+        assert all([name.startswith('AdaptiveEngine') for name in learner.threads])
+        assert engine.loss() == 0.
+        engine.close()
+
+    def test_state(self):
+        engine = adaptive_engine.AdaptiveEngine(GridLearner([]))
+        engine.tell((0., 1.), np.array([2., 3.]))
+        engine.tell((1., 1.), np.array([4., 5.]))
+        points, values = engine.get_state()
+        assert np.all(points == np.array([[0., 1.], [1., 1.]]))
+        assert np.all(values == np.array([[2., 3.], [4., 5.]]))
+
+        learner = GridLearner([])
+        restored = adaptive_engine.AdaptiveEngine(learner)
+        restored.tell_many(points, values)
+        restored.close()
+        assert list(learner.data.keys()) == [(0., 1.), (1., 1.)]
+        assert np.all(learner.data[(1., 1.)] == np.array([4., 5.]))
+
+        learner = GridLearner([])
+        restored = adaptive_engine.AdaptiveEngine(learner)
+        restored.tell_many(np.array([[0.5], [1.5]]), np.array([[2.], [4.]]))
+        restored.close()
+        assert learner.data == {0.5: 2., 1.5: 4.}
+        engine.close()
+
+
+@pytest.mark.parametrize('backend', ['tables', 'h5py'])
+def test_get_adaptive_state(backend, tmp_path, qtbot):
+    h5saver = h5modules.H5Saver(save_type='scan', backend=backend)
+    h5saver.init_file(update_h5=True, addhoc_file_path=tmp_path.joinpath('adaptive.h5'))
+    scan_group = h5saver.add_scan_group()
+    assert adaptive_engine.get_adaptive_state(h5saver, scan_group) is None
+
+    points = h5saver.add_array(scan_group, 'adaptive_points', 'adaptive_state', data_shape=(2,),
+                               data_dimension='1D', array_type=float, enlargeable=True)
+    values = h5saver.add_array(scan_group, 'adaptive_values', 'adaptive_state', data_shape=(1,),
+                               data_dimension='0D', array_type=float, enlargeable=True)
+    for ind in range(3):
+        h5saver.write_data(points, np.array([ind, 2 * ind], dtype=float))
+        h5saver.write_data(values, np.array([ind ** 2], dtype=float))
+    h5saver.write_data(points, np.array([5, 5], dtype=float))  # interrupted before the value is written
+    h5saver.flush()
+
+    state_points, state_values = adaptive_engine.get_adaptive_state(h5saver, scan_group)
+    assert np.all(state_points == np.array([[0, 0], [1, 2], [2, 4]]))
+    assert np.all(state_values == np.array([[0], [1], [4]]))
+    h5saver.close_file()
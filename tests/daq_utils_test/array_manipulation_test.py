@@ -12,6 +12,11 @@ def test_random_step():
     neg_array = array.random_step(0, -10, -1)
     for value in neg_array:
         assert -10 <= value <= 0
+
+    pos_array = array.random_step(0, 10000, 1)
+    assert pos_array[0] == 0
+    assert np.all(0.5 <= np.diff(pos_array)) and np.all(np.diff(pos_array) <= 1.5)
+    assert 10000 - 1.5 < pos_array[-1] <= 10000
     
     with pytest.raises(ValueError):
         array.random_step(1, 10, 0)
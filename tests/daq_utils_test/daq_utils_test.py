@@ -281,6 +281,17 @@ class TestData:
             utils.DataToExport(data="data")
 
 
+def test_read_only_view():
+    data = np.linspace(0, 9, 10)
+    view = utils.read_only_view(data)
+    assert np.shares_memory(view, data)
+    assert not view.flags.writeable
+    assert data.flags.writeable
+    with pytest.raises(ValueError):
+        view[0] = 1
+    assert utils.read_only_view(1.) == 1.
+
+
 def test_ScaledAxis():
     scaled_axis = utils.ScaledAxis()
     assert isinstance(scaled_axis, utils.ScaledAxis)
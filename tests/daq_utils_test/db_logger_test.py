@@ -0,0 +1,207 @@
+import time
+from collections import OrderedDict
+from unittest import mock
+
+import numpy as np
+import pytest
+
+pytest.importorskip('sqlalchemy_utils')
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Connection
+
+from pymodaq.daq_utils.conftests import benchmark_skip
+from pymodaq.daq_utils.db.db_logger.db_logger import DbLogger, encode_array, decode_array
+from pymodaq.daq_utils.db.db_logger.db_logger_models import Data0D, Data1D, Data2D, Detector
+
+
+def get_datas(ind, name='det'):
+    return dict(name=name, acq_time_s=ind,
+                data0D=OrderedDict(CH00=dict(name=name, data=float(ind)), CH01=dict(name=name, data=-float(ind))),
+                data1D=OrderedDict(CH00=dict(name=name, data=ind * np.linspace(0, 1, 5))),
+                data2D=OrderedDict(CH00=dict(name=name, data=ind * np.ones((3, 4)))))
+
+
+def count(dblogger, model):
+    with dblogger.session_scope() as session:
+        return session.query(model).count()
+
+
+@pytest.fixture
+def dblogger(tmp_path):
+    dblogger = DbLogger('test', url=f"sqlite:///{tmp_path.joinpath('test.db')}")
+    assert dblogger.connect_db()
+    yield dblogger
+    dblogger.close()
+
+
+def test_encode_array():
+    array = np.random.rand(3, 4)
+    assert np.all(decode_array(encode_array(array)) == array)
+
+
+class TestDbLogger:
+    def test_unbuffered(self, dblogger):
+        dblogger.add_detectors([dict(name='det', xml_settings='<settings/>')])
+        for ind in range(3):
+            dblogger.add_datas(get_datas(ind))
+        assert dblogger.Npending == 0
+        assert count(dblogger, Data0D) == 6
+        assert count(dblogger, Data1D) == 3
+        assert count(dblogger, Data2D) == 0  # save2D is False
+        assert count(dblogger, Detector) == 1
+        with dblogger.session_scope() as session:
+            data = session.query(Data1D).filter_by(timestamp=2).one()
+            assert data.channel == 'det:CH00'
+            assert data.value == pytest.approx(2 * np.linspace(0, 1, 5))
+            assert data.detectors.name == 'det'
+
+    def test_detector_id(self, dblogger):
+        dblogger.add_datas(get_datas(0, name='unknown'))
+        assert count(dblogger, Detector) == 1
+        det_id = dblogger._detectors_id['unknown']
+        dblogger.add_datas(get_datas(1, name='unknown'))
+        assert dblogger.get_detector_id('unknown') == det_id
+        assert count(dblogger, Detector) == 1
+
+    def test_flush_size(self, dblogger):
+        dblogger.buffered = True
+        dblogger.flush_period = 100.
+        dblogger.flush_size = 15  # 3 rows per sample
+        for ind in range(4):
+            dblogger.add_datas(get_datas(ind))
+        assert dblogger.Npending == 12
+        assert count(dblogger, Data0D) == 0
+        dblogger.add_datas(get_datas(4))
+        assert dblogger.Npending == 0
+        assert count(dblogger, Data0D) == 10
+        assert count(dblogger, Data1D) == 5
+
+    def test_flush_period(self, dblogger):
+        dblogger.buffered = True
+        dblogger.flush_period = 0.05
+        dblogger.add_datas(get_datas(0))
+        assert count(dblogger, Data0D) == 0
+        time.sleep(0.1)
+        dblogger.add_datas(get_datas(1))
+        assert count(dblogger, Data0D) >= 2  # flushed at the latest when the second sample is added
+
+    def test_flush_timer(self, dblogger):
+        dblogger.buffered = True
+        dblogger.flush_period = 0.05
+        dblogger.add_datas(get_datas(0))
+        time.sleep(0.3)  # no other sample: flushed by the timer
+        assert dblogger.Npending == 0
+        assert count(dblogger, Data0D) == 2
+
+    def test_flush_failure(self, dblogger):
+        dblogger.buffered = True
+        dblogger.flush_period = 100.
+        dblogger.add_datas(get_datas(0))
+        Data1D.__table__.drop(dblogger.engine)
+        assert not dblogger.flush()
+        assert dblogger.Npending == 3  # the rows are kept
+        assert count(dblogger, Data0D) == 0  # nothing inserted by the failed transaction
+        dblogger.create_table()
+        assert dblogger.flush()
+        assert count(dblogger, Data0D) == 2
+        assert count(dblogger, Data1D) == 1
+
+    def test_max_pending(self, dblogger):
+        dblogger.buffered = True
+        dblogger.flush_period = 100.
+        dblogger.max_pending = 5
+        Data1D.__table__.drop(dblogger.engine)
+        for ind in range(4):
+            dblogger.add_datas(get_datas(ind))
+        assert dblogger.Npending == 6  # the first 2 samples, the others are dropped
+        dblogger.create_table()
+        assert dblogger.flush()
+        dblogger.add_datas(get_datas(4))  # not dropped anymore
+        assert dblogger.flush()
+        assert count(dblogger, Data0D) == 6
+
+    def test_binary_failure(self, dblogger):
+        """Rows pending in both modes are inserted together"""
+        dblogger.buffered = True
+        dblogger.flush_period = 100.
+        Data2D.__table__.drop(dblogger.engine)
+        dblogger.save2D = True
+        dblogger.add_datas(get_datas(0))
+        dblogger.binary = True
+        dblogger.add_datas(get_datas(1))
+        assert not dblogger.flush()
+        dblogger.create_table()
+        assert dblogger.flush()
+        with dblogger.session_scope() as session:
+            assert session.query(Data1D).filter_by(timestamp=0).one().value_npy is None
+            data1D = session.query(Data1D).filter_by(timestamp=1).one()
+            assert np.all(decode_array(data1D.value_npy) == np.linspace(0, 1, 5))
+            assert count(dblogger, Data2D) == 2
+
+    def test_close(self, dblogger):
+        dblogger.buffered = True
+        dblogger.flush_period = 100.
+        dblogger.add_datas(get_datas(0))
+        dblogger.close()
+        assert count(dblogger, Data0D) == 2
+
+    def test_binary(self, dblogger):
+        dblogger.save2D = True
+        dblogger.binary = True
+        dblogger.add_datas(get_datas(2))
+        with dblogger.session_scope() as session:
+            data1D = session.query(Data1D).one()
+            assert data1D.value is None
+            assert np.all(decode_array(data1D.value_npy) == 2 * np.linspace(0, 1, 5))
+            data2D = session.query(Data2D).one()
+            assert np.all(decode_array(data2D.value_npy) == 2 * np.ones((3, 4)))
+
+    def test_missing_column(self, tmp_path):
+        """The value_npy column is added to the tables created before the binary mode"""
+        url = f"sqlite:///{tmp_path.joinpath('old.db')}"
+        engine = create_engine(url)
+        with engine.begin() as connection:
+            connection.execute(text('CREATE TABLE "datas1D" (id INTEGER PRIMARY KEY, timestamp INTEGER NOT NULL, '
+                                    'detector_id INTEGER, channel VARCHAR(128), value JSON)'))
+        engine.dispose()
+
+        dblogger = DbLogger('test', url=url, binary=True)
+        assert dblogger.connect_db()
+        assert 'value_npy' in [column['name'] for column in inspect(dblogger.engine).get_columns('datas1D')]
+        dblogger.add_datas(get_datas(2))
+        with dblogger.session_scope() as session:
+            assert np.all(decode_array(session.query(Data1D).one().value_npy) == 2 * np.linspace(0, 1, 5))
+        dblogger.close()
+
+    def test_bulk_insert(self, dblogger):
+        """Buffered rows are inserted with one executemany per table instead of one per sample"""
+        Nsamples = 20
+        dblogger.get_detector_id('det')  # the detector id is cached
+        with mock.patch.object(Connection, 'execute', autospec=True, side_effect=Connection.execute) as execute:
+            for ind in range(Nsamples):
+                dblogger.add_datas(get_datas(ind))
+            assert execute.call_count == 2 * Nsamples  # Data0D and Data1D
+
+            execute.reset_mock()
+            dblogger.buffered = True
+            dblogger.flush_period = 100.
+            for ind in range(Nsamples):
+                dblogger.add_datas(get_datas(ind))
+            dblogger.flush()
+            assert execute.call_count == 2
+        assert count(dblogger, Data0D) == 4 * Nsamples
+
+
+@pytest.mark.skipif(benchmark_skip, reason='benchmark only reporting timings')
+def test_throughput(dblogger):
+    """Report the duration of logging samples, flushed one by one or in bulk"""
+    Nsamples = 200
+    for buffered in [False, True]:
+        dblogger.buffered = buffered
+        dblogger.flush_period = 100.
+        start = time.perf_counter()
+        for ind in range(Nsamples):
+            dblogger.add_datas(get_datas(ind))
+        dblogger.flush()
+        print(f'\n{Nsamples} samples (buffered: {buffered}): {(time.perf_counter() - start) * 1000:.1f} ms')
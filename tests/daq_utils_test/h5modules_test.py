@@ -75,6 +75,29 @@ def test_check_mandatory_attrs():
     assert result == f'test'
 
 
+def test_get_chunk_shape():
+    # small data: the whole array fits in a chunk
+    assert h5backend.get_chunk_shape((10, 3), 8, chunk_bytes=2 ** 20) == (10, 3)
+    # 1D spectra logged in an enlargeable array: many rows per chunk
+    assert h5backend.get_chunk_shape((100000, 1024), 8, Nnav=1, chunk_bytes=2 ** 20) == (128, 1024)
+    # the room is filled along the fastest scan dimension first
+    assert h5backend.get_chunk_shape((50, 20, 256), 4, Nnav=2, chunk_bytes=2 ** 14) == (1, 16, 256)
+    # large images are split
+    chunk = h5backend.get_chunk_shape((10, 2048, 2048), 8, Nnav=1, chunk_bytes=2 ** 20)
+    assert chunk == (1, 256, 512)
+    assert np.prod(chunk) * 8 <= 2 ** 20
+    # empty dimensions (enlargeable arrays) are treated as of length 1
+    assert h5backend.get_chunk_shape((0, 5), 8, Nnav=1) == (1, 5)
+
+
+@pytest.mark.parametrize('backend', tested_backend)
+def test_compression_libraries(backend):
+    libraries = h5backend.compression_libraries(backend)
+    assert libraries[:2] == ['zlib', 'gzip']
+    if backend == 'tables':
+        assert 'blosc:lz4' in libraries
+
+
 class TestNode:
     def test_init(self):
         node_dict = {'NAME': 'Node', 'TITLE': 'test'}
@@ -194,6 +217,33 @@ class TestH5Backend:
 
         bck.close_file()
 
+    def test_node_index(self, get_backend, tmp_path):
+        bck = get_backend
+        g1 = bck.get_set_group(bck.root(), 'g1', 'title g1')
+        bck.get_set_group(g1, 'g11', 'title g11')
+        assert bck.get_group_by_title(g1, 'title g11') == bck.get_node('/g1/g11')
+        assert bck.get_group_by_title(g1, 'title g12') is None
+        assert bck.get_node('/g1', 'g11') is bck.get_node(g1, 'g11')  # cached
+
+        # nodes created after the index has been built are indexed
+        g12 = bck.get_set_group(g1, 'g12', 'title g12')
+        array = bck.create_carray(g1, 'array', np.array([1, 2, 3]))
+        assert bck.get_group_by_title(g1, 'title g12') == g12
+        assert list(bck.get_children(g1)) == ['g11', 'g12', 'array']
+        assert bck.get_node(g1, 'array') is array
+        children = bck.get_children(g1)
+        children.pop('array')
+        assert bck.is_node_in_group(g1, 'array')
+
+        # the index is invalidated when opening another file
+        file_path = bck.file_path
+        bck.close_file()
+        bck.open_file(file_path, 'a')
+        assert bck._nodes_index == dict([])
+        assert bck.get_group_by_title('/g1', 'title g12').path == '/g1/g12'
+        assert bck.get_node('/g1/array').read()[1] == 2
+        bck.close_file()
+
     def test_walk_groups(self, get_backend):
         bck = get_backend
         g1 = bck.get_set_group(bck.root(), 'g1')
@@ -284,6 +334,48 @@ class TestH5Backend:
         utils.check_vals_in_iterable(array1.attrs['shape'], expected_shape)
         bck.close_file()
 
+    @pytest.mark.parametrize('compression', ['blosc:lz4', 'blosc:zstd', 'lzf'])
+    def test_fast_compression(self, get_backend, compression):
+        bck = get_backend
+        if compression not in h5backend.compression_libraries(bck.backend):
+            pytest.skip(f'{compression} not available with {bck.backend}')
+        g1 = bck.get_set_group(bck.root(), 'g1')
+        bck.define_compression(compression, 5)
+        data = generate_random_data((20, 100))
+        array = bck.create_carray(g1, 'carray', obj=data, Nnav=1)
+        assert np.all(array[:] == pytest.approx(data))
+        earray = bck.create_earray(g1, 'earray', dtype=float, data_shape=(100,), expected_rows=10000)
+        earray.append_rows(data)
+        assert np.all(earray[:] == pytest.approx(data))
+        bck.close_file()
+
+    def test_chunk_shape(self, get_backend):
+        bck = get_backend
+        g1 = bck.get_set_group(bck.root(), 'g1')
+        bck.chunk_bytes = 2 ** 16
+        earray = bck.create_earray(g1, 'earray', dtype=np.float64, data_shape=(1024,), expected_rows=100000)
+        carray = bck.create_carray(g1, 'carray', obj=np.zeros((50, 20, 256), dtype=np.float32), Nnav=2)
+        if bck.backend == 'tables':
+            chunks = earray.array.chunkshape, carray.array.chunkshape
+        else:
+            chunks = earray.array.chunks, carray.array.chunks
+        assert chunks == ((8, 1024), (3, 20, 256))
+        bck.close_file()
+
+    def test_earray_append_rows(self, get_backend):
+        bck = get_backend
+        g1 = bck.get_set_group(bck.root(), 'g1')
+        array_shape = (10, 3)
+        dtype = np.uint32
+        array = bck.create_earray(g1, 'array', dtype=dtype, data_shape=array_shape)
+        data = generate_random_data((4, *array_shape), dtype)
+        array.append_rows(data)
+        array.append_rows(data[:1])
+        utils.check_vals_in_iterable(array.attrs['shape'], [5, *array_shape])
+        assert np.all(array[:4] == data)
+        assert np.all(array[-1] == data[0])
+        bck.close_file()
+
     @pytest.mark.parametrize('compression', ['gzip', 'zlib'])
     @pytest.mark.parametrize('comp_level', list(range(0, 10, 3)))
     def test_earray_comp(self, get_backend, compression, comp_level):
@@ -816,4 +908,91 @@ class TestH5Saver:
         assert array.attrs['CLASS'] == 'EARRAY'
         array.append(np.random.rand(*dshape))
         array.append(np.random.rand(*dshape))
-        assert np.all(h5saver.read(array).shape == (2, 10))
\ No newline at end of file
+        assert np.all(h5saver.read(array).shape == (2, 10))
+    def test_write_data_async(self, get_h5saver_scan, tmp_path):
+        h5saver = get_h5saver_scan
+        h5saver.settings.child(('base_path')).setValue(tmp_path)
+        h5saver.settings.child('writer', 'async_write').setValue(True)
+        h5saver.settings.child('writer', 'queue_size').setValue(5)
+        h5saver.init_file(update_h5=True)
+        scan_group = h5saver.add_scan_group()
+        det_group = h5saver.add_det_group(scan_group)
+        data_group = h5saver.add_data_group(det_group, 'data1D')
+        CH_group = h5saver.add_CH_group(data_group)
+        dshape = (10,)
+        earray = h5saver.add_array(CH_group, 'earray', data_type='data', data_shape=dshape, data_dimension='1D',
+                                   enlargeable=True)
+        earray0D = h5saver.add_array(CH_group, 'earray0D', data_type='data', data_shape=(1,),
+                                     data_dimension='0D', enlargeable=True)
+        carray = h5saver.add_array(CH_group, 'carray', data_type='data', data_shape=dshape, data_dimension='1D',
+                                   scan_type='scan1D', scan_shape=(20,), add_scan_dim=True)
+        data = np.random.rand(20, *dshape)
+        buffer = np.zeros(dshape)
+        for ind in range(20):
+            buffer[:] = data[ind]  # the writer must have copied the data it got
+            h5saver.write_data(earray, buffer)
+            h5saver.write_data(earray0D, np.array([ind]))
+            h5saver.write_data(carray, buffer, (ind,))
+
+        assert h5saver.writer.is_running()
+        assert h5saver.writer.max_depth <= 5
+        h5saver.flush()
+        assert h5saver.writer.depth == 0
+        assert h5saver.writer.Nwritten == 60
+        assert np.all(h5saver.read(earray) == pytest.approx(data))
+        assert np.all(h5saver.read(earray0D) == pytest.approx(np.arange(20)))
+        utils.check_vals_in_iterable(earray.attrs['shape'], (20, 10))
+        assert np.all(h5saver.read(carray) == pytest.approx(data))
+        h5saver.close_file()
+        assert h5saver.writer is None
+
+    def test_write_data_async_error(self, get_h5saver_scan, tmp_path):
+        h5saver = get_h5saver_scan
+        h5saver.settings.child(('base_path')).setValue(tmp_path)
+        h5saver.settings.child('writer', 'async_write').setValue(True)
+        h5saver.init_file(update_h5=True)
+        scan_group = h5saver.add_scan_group()
+        carray = h5saver.add_array(scan_group, 'carray', data_type='data', data_shape=(10,), data_dimension='1D',
+                                   scan_type='scan1D', scan_shape=(2,), add_scan_dim=True)
+        h5saver.write_data(carray, np.ones((3,)), (0,))  # fails in the background thread
+        with pytest.raises(IOError):
+            h5saver.flush()
+        assert h5saver.settings.child('writer', 'queue_depth').value() == 0  # status updated when flushing
+        h5saver.write_data(carray, np.ones((10,)), (1,))  # the error is raised only once
+        h5saver.write_data(carray, np.ones((3,)), (0,))
+        with pytest.raises(IOError):
+            h5saver.close_file()
+        assert h5saver.writer is None
+        assert not h5saver.isopen()
+
+    def test_checkpoint(self, get_h5saver_scan, tmp_path):
+        h5saver = get_h5saver_scan
+        h5saver.settings.child(('base_path')).setValue(tmp_path)
+        h5saver.settings.child('writer', 'async_write').setValue(True)
+        h5saver.init_file(update_h5=True)
+        scan_group = h5saver.add_scan_group()
+        assert h5saver.get_checkpoint(scan_group) is None
+
+        earray = h5saver.add_array(scan_group, 'earray', data_type='data', data_shape=(1,), data_dimension='0D',
+                                   enlargeable=True)
+        for ind in range(5):
+            h5saver.write_data(earray, np.array([ind]))
+        h5saver.set_checkpoint(scan_group, 4, 0, settings=dict(scanner_settings=b'<xml/>'))
+        assert h5saver.writer.depth == 0  # all the data up to the checkpoint are written
+        assert np.all(h5saver.read(earray) == pytest.approx(np.arange(5)))
+        checkpoint = h5saver.get_checkpoint(scan_group)
+        assert checkpoint['ind_scan'] == 4
+        assert checkpoint['ind_average'] == 0
+        assert checkpoint['completed'] is False
+        assert checkpoint['scanner_settings'] == b'<xml/>'
+
+        h5saver.set_checkpoint(scan_group, 9, 1, completed=True)
+        file_path = h5saver.settings.child(('current_h5_file')).value()
+        h5saver.close_file()
+
+        h5saver.current_scan_group = None
+        h5saver.init_file(update_h5=False, addhoc_file_path=file_path)
+        checkpoint = h5saver.get_checkpoint(h5saver.current_scan_group)
+        assert (checkpoint['ind_scan'], checkpoint['ind_average'], checkpoint['completed']) == (9, 1, True)
+        assert checkpoint['scanner_settings'] == b'<xml/>'
+        h5saver.close_file()
@@ -0,0 +1,276 @@
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+from qtpy.QtCore import QObject, Signal, QTimer
+
+from pymodaq.daq_utils import daq_utils as utils
+import pymodaq.daq_utils.parameter.pymodaq_ptypes
+from pymodaq.daq_utils.managers.modules_manager import ModulesManager, ModulesInitializer
+
+
+class MockDetector(QObject):
+    command_detector = Signal(utils.ThreadCommand)
+    grab_done_signal = Signal(OrderedDict)
+
+    def __init__(self, title, delay=10):
+        super().__init__()
+        self.title = title
+        self.delay = delay  # ms, negative means never done
+        self.command_detector.connect(self.grab)
+
+    def grab(self, command):
+        if self.delay >= 0:
+            QTimer.singleShot(self.delay, self.done)
+
+    def done(self):
+        self.grab_done_signal.emit(OrderedDict(name=self.title, data0D=OrderedDict(CH0=np.array([1.]))))
+
+
+class MockActuator(QObject):
+    command_stage = Signal(utils.ThreadCommand)
+    move_done_signal = Signal(str, float)
+
+    def __init__(self, title, delay=10):
+        super().__init__()
+        self.title = title
+        self.delay = delay
+        self.velocity = None
+        self.command_stage.connect(self.move)
+
+    def move(self, command):
+        if command.command == 'set_velocity':
+            self.velocity = command.attributes[0]
+            return
+        position = command.attributes[0]
+        QTimer.singleShot(self.delay, lambda: self.move_done_signal.emit(self.title, position))
+
+
+class MockTrajectoryActuator(MockActuator):
+    supports_trajectory = True
+    trajectory_loaded_signal = Signal(str, bool)
+
+    def __init__(self, title, delay=10, loaded=True):
+        super().__init__(title, delay)
+        self.trajectory = OrderedDict()
+        self.loaded = loaded  # None means the trajectory_loaded status is never sent
+        self.Nmoves = 0
+
+    def move(self, command):
+        if command.command == 'load_trajectory':
+            positions, ind_start = command.attributes
+            self.trajectory[ind_start] = positions
+            if self.loaded is not None:
+                QTimer.singleShot(self.delay, lambda: self.trajectory_loaded_signal.emit(self.title, self.loaded))
+        else:
+            index = command.attributes[0]
+            ind_start = max([ind for ind in self.trajectory if ind <= index])
+            position = self.trajectory[ind_start][index - ind_start]
+            self.Nmoves += 1
+            QTimer.singleShot(self.delay, lambda: self.move_done_signal.emit(self.title, position))
+
+
+class MockInitModule(QObject):
+    init_signal = Signal(bool)
+
+    def __init__(self, title, delay=50, status=True, log=None):
+        super().__init__()
+        self.title = title
+        self.delay = delay
+        self.status = status
+        self.controller = None
+        self.log = log if log is not None else []
+
+    def init(self):
+        self.log.append(('start', self.title))
+        if self.delay is None:
+            raise IOError(f'{self.title} is not connected')
+        elif self.delay >= 0:  # negative means never initialized
+            QTimer.singleShot(self.delay, self.done)
+
+    def done(self):
+        if self.status and self.controller is None:
+            self.controller = f'controller of {self.title}'
+        self.log.append(('done', self.title))
+        self.init_signal.emit(self.status)
+
+
+@pytest.fixture
+def manager(qtbot):
+    detectors = [MockDetector('det0', 10), MockDetector('det1', 30)]
+    actuators = [MockActuator('act0', 10), MockActuator('act1', 30)]
+    manager = ModulesManager(detectors, actuators, detectors, actuators, timeout=500)
+    return manager
+
+
+def test_grab_datas(manager):
+    manager.connect_detectors()
+    tzero = time.perf_counter()
+    datas = manager.grab_datas()
+    assert time.perf_counter() - tzero < 0.4
+    assert list(datas.keys()) == ['det0', 'det1']
+    assert manager.det_done_flag
+    manager.connect_detectors(False)
+
+
+def test_grab_datas_timeout(manager, qtbot):
+    manager.detectors_all[1].delay = -1
+    manager.connect_detectors()
+    with qtbot.waitSignal(manager.timeout_signal, timeout=1000):
+        datas = manager.grab_datas()
+    assert list(datas.keys()) == ['det0']
+    assert not manager.det_done_flag
+    manager.connect_detectors(False)
+
+
+def test_slow_module(qtbot):
+    """A grab longer than the default timeout succeeds once the timeout is set from the settings (in ms)"""
+    detectors = [MockDetector('det0', 300)]
+    manager = ModulesManager(detectors, [], detectors, [], timeout=100)
+    manager.connect_detectors()
+    with qtbot.waitSignal(manager.timeout_signal, timeout=1000):
+        assert manager.grab_datas() == OrderedDict()
+    manager.timeout = 2000  # as done by DAQ_Scan from its time_flow/timeout setting
+    with qtbot.assertNotEmitted(manager.timeout_signal, wait=0):
+        assert list(manager.grab_datas().keys()) == ['det0']
+    manager.connect_detectors(False)
+
+
+def test_continuous_grab(manager, qtbot):
+    with qtbot.waitSignals([det.grab_done_signal for det in manager.detectors], timeout=1000):
+        manager.start_continuous_grab()
+    manager.stop_continuous_grab()
+
+
+def test_move_actuators(manager):
+    manager.connect_actuators()
+    tzero = time.perf_counter()
+    positions = manager.move_actuators([1., 2.])
+    assert time.perf_counter() - tzero < 0.4
+    assert positions == OrderedDict(act0=1., act1=2.)
+    assert manager.move_done_flag
+
+    positions = manager.move_actuators(dict(act1=-1., act0=3.))
+    assert positions == OrderedDict(act0=3., act1=-1.)
+
+    assert manager.move_actuators([1.]) == OrderedDict()
+    manager.connect_actuators(False)
+
+
+def test_move_actuators_no_wait(manager):
+    manager.connect_actuators()
+    positions = manager.move_actuators([1., 2.], wait=False)
+    assert positions == OrderedDict()
+    assert manager.move_pending
+    positions = manager.wait_move_done()
+    assert positions == OrderedDict(act0=1., act1=2.)
+    assert not manager.move_pending
+    assert manager.wait_move_done() == positions
+    manager.connect_actuators(False)
+
+
+def test_move_timeout(manager, qtbot):
+    manager.connect_actuators()
+    with qtbot.waitSignal(manager.timeout_signal, timeout=1000):
+        positions = manager.move_actuators([1., 2.], timeout=20)  # act1 takes 30ms
+    assert positions == OrderedDict(act0=1.)
+    assert manager.wait_move_done() == positions  # nothing pending anymore
+    manager.connect_actuators(False)
+
+
+def test_set_actuators_velocity(manager):
+    manager.set_actuators_velocity(OrderedDict(act1=2.5, unknown=1.))
+    assert [act.velocity for act in manager.actuators] == [None, 2.5]
+    manager.set_actuators_velocity(dict(act1=None))
+    assert manager.actuators[1].velocity is None
+
+
+def test_move_trajectory_step(qtbot):
+    actuators = [MockTrajectoryActuator('act0', 10), MockTrajectoryActuator('act1', 30)]
+    manager = ModulesManager([], actuators, [], actuators, timeout=500)
+    assert manager.supports_trajectory
+    assert not manager.load_trajectory(np.zeros((5, 3)))
+
+    positions = np.array([[0., 1.], [2., 3.], [4., 5.]])
+    manager.connect_actuators()
+    assert manager.load_trajectory(positions[:2])
+    assert manager.load_trajectory(positions[2:], ind_start=2)
+    assert np.array_equal(actuators[1].trajectory[0], [1., 3.])
+    assert manager.trajectory_loaded_status == OrderedDict(act0=True, act1=True)
+    assert manager.move_trajectory_step(1) == OrderedDict(act0=2., act1=3.)
+    assert manager.move_trajectory_step(2, wait=False) == OrderedDict()
+    assert manager.wait_move_done() == OrderedDict(act0=4., act1=5.)
+    assert actuators[0].Nmoves == 2
+    manager.connect_actuators(False)
+
+    actuators[1].loaded = False  # the controller could not store the positions
+    assert not manager.load_trajectory(positions)
+    actuators[1].loaded = None
+    with qtbot.waitSignal(manager.timeout_signal, timeout=1000):
+        assert not manager.load_trajectory(positions, timeout=100)
+
+    actuators = [MockActuator('act2'), actuators[0]]
+    manager = ModulesManager([], actuators, [], actuators)
+    assert not manager.supports_trajectory
+
+
+class TestModulesInitializer:
+    def get_chains(self, log, status=True):
+        return [[MockInitModule('master0', 100, status, log), MockInitModule('slave0', 50, log=log)],
+                [MockInitModule('master1', 100, log=log)],
+                [MockInitModule('master2', 100, log=log)]]
+
+    def test_concurrent(self, qtbot):
+        log = []
+        chains = self.get_chains(log)
+        initializer = ModulesInitializer(chains, concurrent=True)
+        assert initializer.run()
+        assert log[:3] == [('start', 'master0'), ('start', 'master1'), ('start', 'master2')]
+        assert log.index(('start', 'slave0')) > log.index(('done', 'master0'))
+        assert log[-1] == ('done', 'slave0')  # the other chains did not wait for the first one
+        assert chains[0][1].controller == 'controller of master0'
+        assert list(initializer.init_times.keys()) == ['master0', 'master1', 'master2', 'slave0']
+
+    def test_sequential(self, qtbot):
+        log = []
+        chains = self.get_chains(log)
+        initializer = ModulesInitializer(chains, concurrent=False)
+        assert initializer.run()
+        assert log == [(step, title) for title in ['master0', 'slave0', 'master1', 'master2']
+                       for step in ['start', 'done']]
+        assert chains[0][1].controller == 'controller of master0'
+
+    def test_master_failure(self, qtbot):
+        log = []
+        chains = self.get_chains(log, status=False)
+        initializer = ModulesInitializer(chains, concurrent=True)
+        assert not initializer.run()
+        assert ('start', 'slave0') not in log
+        assert initializer.init_states == dict(master0=False, master1=True, master2=True)
+
+    def test_timeout(self, qtbot):
+        chains = [[MockInitModule('master0', 50)], [MockInitModule('master1', 1000)]]
+        initializer = ModulesInitializer(chains, concurrent=True, timeout=200)
+        assert not initializer.run()
+        assert initializer.init_states == dict(master0=True, master1=False)
+
+    @pytest.mark.parametrize('concurrent', [True, False])
+    def test_init_failure(self, qtbot, concurrent):
+        log = []
+        chains = [[MockInitModule('master0', None, log=log), MockInitModule('slave0', 10, log=log)],
+                  [MockInitModule('master1', -1, log=log), MockInitModule('slave1', 10, log=log)],
+                  [MockInitModule('master2', 10, log=log)]]
+        initializer = ModulesInitializer(chains, concurrent=concurrent, timeout=200)
+        timeout = initializer._timeout
+
+        def logged_timeout():
+            log.append(('timeout', None))
+            timeout()
+        initializer._timeout = logged_timeout
+        assert not initializer.run()
+        assert log.count(('timeout', None)) == 1  # only master1 timed out
+        # the raising init does not wait for the timeout before going on with the next chain
+        assert log.index(('start', 'master1')) < log.index(('timeout', None))
+        assert initializer.init_states == dict(master0=False, master1=False, master2=True)
+        assert ('start', 'slave0') not in log and ('start', 'slave1') not in log
@@ -187,4 +187,74 @@ class TestMath:
         with pytest.raises(TypeError):
             mutils.ift2(x, dim=(1.1, 1.2))
         with pytest.raises(TypeError):
-            mutils.ift2(x, dim=1.1)
\ No newline at end of file
+            mutils.ift2(x, dim=1.1)
+
+class TestRunningAverager:
+    def test_init(self):
+        with pytest.raises(ValueError):
+            mutils.RunningAverager('median')
+        with pytest.raises(ValueError):
+            mutils.RunningAverager('exponential', alpha=0)
+        with pytest.raises(ValueError):
+            mutils.RunningAverager('windowed', window=0)
+
+    def test_cumulative(self):
+        frames = np.random.normal(size=(20, 10, 5))
+        averager = mutils.RunningAverager('cumulative', variance=True)
+        for frame in frames:
+            means = averager.add([frame, frame[0]])
+        assert averager.Nsamples == 20
+        assert means[0] == pytest.approx(np.mean(frames, axis=0))
+        assert means[1] == pytest.approx(np.mean(frames[:, 0], axis=0))
+        assert averager.variances[0] == pytest.approx(np.var(frames, axis=0, ddof=1))
+        assert averager.stds[1] == pytest.approx(np.std(frames[:, 0], axis=0, ddof=1))
+
+    def test_exponential(self):
+        alpha = 0.3
+        frames = np.random.normal(size=(20, 10))
+        averager = mutils.RunningAverager('exponential', alpha=alpha, variance=True)
+        for frame in frames:
+            means = averager.add([frame])
+        mean = frames[0]
+        variance = np.zeros(frames[0].shape)
+        for frame in frames[1:]:
+            delta = frame - mean
+            mean = mean + alpha * delta
+            variance = (1 - alpha) * (variance + alpha * delta ** 2)
+        assert means[0] == pytest.approx(mean)
+        assert averager.variances[0] == pytest.approx(variance)
+
+    def test_windowed(self):
+        frames = np.random.normal(size=(23, 10))
+        averager = mutils.RunningAverager('windowed', window=5, variance=True)
+        for ind, frame in enumerate(frames):
+            means = averager.add([frame])
+            assert averager.Nsamples == min(ind + 1, 5)
+            assert means[0] == pytest.approx(np.mean(frames[max(0, ind - 4):ind + 1], axis=0))
+        assert averager.variances[0] == pytest.approx(np.var(frames[-5:], axis=0, ddof=1))
+
+    def test_reset(self):
+        averager = mutils.RunningAverager()
+        assert averager.variances is None
+        means = averager.add([np.ones((5,))])
+        averager.reset()
+        assert averager.Nadded == 0
+        new_means = averager.add([np.zeros((5,))])
+        assert new_means[0] is not means[0]  # released accumulators are not modified anymore
+        assert np.all(means[0] == 1)
+        new_means = averager.add([np.zeros((3,))])  # channel shape changed: restart
+        assert averager.Nadded == 1
+        assert new_means[0].shape == (3,)
+
+    def test_no_allocation(self):
+        import tracemalloc
+        frame = np.ones((500, 500), dtype=np.uint16)
+        averager = mutils.RunningAverager('windowed', window=3, variance=True)
+        for ind in range(4):
+            averager.add([frame])
+        tracemalloc.start()
+        for ind in range(10):
+            averager.add([frame])
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert peak < frame.nbytes
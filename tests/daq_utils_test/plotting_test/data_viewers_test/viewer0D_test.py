@@ -105,11 +105,9 @@ class TestViewer0D:
     def test_update_Graph1D(self, init_prog):
         prog, qtbot = init_prog
 
-        datas = np.linspace(np.linspace(1, 10, 10), np.linspace(11, 20, 10), 2)
+        datas = np.linspace(np.linspace(1, 25, 25), np.linspace(11, 35, 25), 2)
 
-        prog.datas = datas
         prog.Nsamples = 10
-        prog.x_axis = np.linspace(1, 19, 19)
 
         prog.plot_channels = []
         for i in range(2):
@@ -119,18 +117,20 @@ class TestViewer0D:
 
         prog.data_to_export = OrderedDict(data0D={})
 
-        prog.update_Graph1D(datas)
+        prog.update_Graph1D([[datas[0, 0]], [datas[1, 0]]])  # allocates the history of the channels
+        buffer = prog.history._buffer
+        for ind in range(1, datas.shape[1]):
+            prog.update_Graph1D([[datas[0, ind]], [datas[1, ind]]])
+        assert prog.history._buffer is buffer  # the history is not reallocated
 
-        assert np.array_equal(prog.plot_channels[0].getData(), np.array((np.array(prog.x_axis),
-                                                                         np.append(datas[0], datas[0])[1:])))
-        assert np.array_equal(prog.plot_channels[1].getData(), np.array((np.array(prog.x_axis),
-                                                                         np.append(datas[1], datas[1])[1:])))
+        assert np.array_equal(prog.x_axis, np.linspace(15, 24, 10))
+        for ind in range(2):
+            assert np.array_equal(prog.plot_channels[ind].getData(), np.array((prog.x_axis, datas[ind, 15:])))
 
-        assert prog.data_to_export['data0D']['CH000']
-        assert prog.data_to_export['data0D']['CH001']
+        assert prog.data_to_export['data0D']['CH000']['data'] == datas[0, -1]
+        assert prog.data_to_export['data0D']['CH001']['data'] == datas[1, -1]
 
-        data_tot = np.array([np.append(datas[0], datas[0])[1:], np.append(datas[1], datas[1])[1:]])
-        assert np.array_equal(np.array(prog.datas), data_tot)
+        assert np.array_equal(np.array(prog.datas), datas[:, 15:])
 
     def test_update_channels(self, init_prog):
         prog, qtbot = init_prog
@@ -171,11 +171,15 @@ class TestViewer0D:
     def test_update_x_axis(self, init_prog):
         prog, qtbot = init_prog
         
+        for ind in range(100):
+            prog.show_data([[float(ind)], [-float(ind)]])
+
         Nhistory = 50
         prog.update_x_axis(Nhistory=Nhistory)
         
         assert prog.Nsamples == Nhistory
-        assert np.array_equal(prog.x_axis, np.linspace(0, Nhistory - 1, Nhistory))
+        assert np.array_equal(prog.x_axis, np.linspace(50, 99, Nhistory))  # the most recent samples are kept
+        assert np.array_equal(prog.datas[1], -np.linspace(50, 99, Nhistory))
 
     def test_labels(self, init_prog):
         prog, qtbot = init_prog
@@ -144,6 +144,41 @@ class TestData0DWithHistory:
             assert 'CH0' in data_histo.datas
             assert 'CH1' in data_histo.datas
 
+    def test_ring_buffer(self, init_qt):
+        Nsamples = 5
+        data_histo = pymodaq.daq_utils.plotting.utils.plot_utils.Data0DWithHistory(Nsamples)
+        data_histo.add_datas(dict(CH0=0., CH1=0.))
+        buffer = data_histo._buffer
+        for ind in range(1, 13):
+            data_histo.add_datas(dict(CH0=float(ind), CH1=np.array([-ind])))
+        assert data_histo._buffer is buffer  # no reallocation
+        assert np.shares_memory(data_histo.xaxis, buffer)
+        assert np.shares_memory(data_histo.datas['CH0'], buffer)
+        assert data_histo.xaxis == approx(np.arange(8, 13))
+        assert data_histo.datas['CH0'] == approx(np.arange(8, 13))
+        assert data_histo.datas['CH1'] == approx(-np.arange(8, 13))
+
+        data_histo.Nsamples = 3
+        assert data_histo.xaxis == approx(np.arange(10, 13))
+        data_histo.add_datas(dict(CH0=13., CH1=-13.))
+        assert data_histo.xaxis == approx(np.arange(11, 14))
+        assert data_histo.datas['CH0'] == approx(np.arange(11, 14))
+        data_histo.Nsamples = 10
+        data_histo.add_datas(dict(CH0=14., CH1=-14.))
+        assert data_histo.datas['CH1'] == approx(-np.arange(11, 15))
+
+    def test_large_history(self, init_qt):
+        Nsamples = 10 ** 6
+        data_histo = pymodaq.daq_utils.plotting.utils.plot_utils.Data0DWithHistory(Nsamples)
+        data_histo.add_datas([0, 0])
+        buffer = data_histo._buffer
+        for ind in range(1, 1000):
+            data_histo.add_datas([ind, 2 * ind])
+        assert data_histo._buffer is buffer
+        assert data_histo.datas['data_00'].size == 1000
+        assert data_histo.datas['data_01'][-1] == 2 * 999
+        assert data_histo.xaxis[-1] == 999
+
     def test_add_datas_and_clear(self, init_qt):
         data_histo = pymodaq.daq_utils.plotting.utils.plot_utils.Data0DWithHistory()
         dat = [dict(CH0=1, CH1=2.), dict(CH0=np.array([1]), CH1=2.), dict(CH0=1, CH1=2.), dict(CH0=1, CH1=2.)]
@@ -155,6 +190,37 @@ class TestData0DWithHistory:
         assert data_histo._data_length == 0
 
 
+class TestGrowingArray:
+    def test_append(self):
+        array = pymodaq.daq_utils.plotting.utils.plot_utils.GrowingArray((3,), capacity=2)
+        assert array.shape == (0, 3)
+        for ind in range(5):
+            array.append(np.array([ind, 2 * ind, 3 * ind]))
+        assert len(array) == 5
+        assert array.capacity == 8  # doubled twice
+        assert array.shape == (5, 3)
+        assert array.data[:, 1] == approx(2 * np.arange(5))
+        assert array[-1] == approx(np.array([4, 8, 12]))
+
+        array.clear()
+        assert len(array) == 0
+        array.append(-1)
+        assert array.data == approx(-np.ones((1, 3)))
+
+    def test_preallocation(self):
+        Nsteps = 1000
+        array = pymodaq.daq_utils.plotting.utils.plot_utils.GrowingArray(capacity=Nsteps)
+        buffer = array.data.base
+        for ind in range(Nsteps):
+            array.append(ind)
+        assert array.capacity == Nsteps
+        assert array.data.base is buffer  # no reallocation
+        assert array.data == approx(np.arange(Nsteps))
+        array.reserve(2 * Nsteps)
+        assert array.capacity == 2 * Nsteps
+        assert array.data == approx(np.arange(Nsteps))
+
+
 class TestExtractAxis:
     def test_info_data_is_None(self):
         axis = utils.Axis(label='mylabel', units='myunits')
@@ -882,6 +948,24 @@ class TestModifyImages:
         for ind, data_to_show in enumerate(blocker.args[0]['data']):
             assert np.any(data_to_show == approx(data['data'][ind]))
 
+    def test_no_copy(self, init_prog):
+        import tracemalloc
+        prog, qtbot = init_prog
+        data_red, data_green, data_blue, data_spread = init_data()
+        data = utils.DataFromPlugins(distribution='uniform', data=[data_red, data_green])
+        prog.show_data(data)
+        prog.view.get_action('flip_ud').trigger()
+        prog.view.get_action('rotate').trigger()
+
+        tracemalloc.start()
+        datas = prog.set_image_transform()
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert peak < data_red.nbytes  # not a single image has been copied
+        for ind, data_to_show in enumerate(datas['data']):
+            assert np.shares_memory(data_to_show, data['data'][ind])
+            assert data_to_show == approx(np.flipud(np.transpose(np.flipud(data['data'][ind]))))
+
 
 class TestMiscellanous:
     def test_double_clicked(self, init_prog):
@@ -0,0 +1,155 @@
+import importlib
+import os
+import sys
+import time
+
+import pytest
+
+from pymodaq.daq_utils.conftests import benchmark_skip
+from pymodaq.daq_utils.plugin_registry import PluginRegistry
+
+Nplugins = 10
+import_duration = 0.02  # s, mimics the import of a vendor SDK by each plugin module
+
+
+@pytest.fixture
+def fake_plugins(tmp_path, monkeypatch):
+    """Install a fake distribution exposing pymodaq plugins, a PID model and an extension"""
+    site = tmp_path.joinpath('site')
+    dist_info = site.joinpath('pymodaq_plugins_fake-1.0.dist-info')
+    dist_info.mkdir(parents=True)
+    dist_info.joinpath('METADATA').write_text('Metadata-Version: 2.1\nName: pymodaq_plugins_fake\nVersion: 1.0\n')
+    dist_info.joinpath('entry_points.txt').write_text('[pymodaq.plugins]\nfake = pymodaq_plugins_fake\n\n'
+                                                      '[pymodaq.pid_models]\nfake = pymodaq_plugins_fake\n\n'
+                                                      '[pymodaq.extensions]\n'
+                                                      'fake = pymodaq_plugins_fake.extensions\n')
+    package = site.joinpath('pymodaq_plugins_fake')
+    move_package = package.joinpath('daq_move_plugins')
+    viewer_package = package.joinpath('daq_viewer_plugins', 'plugins_0D')
+    models_package = package.joinpath('models')
+    extensions_package = package.joinpath('extensions')
+    for folder in [package, move_package, viewer_package.parent, viewer_package, models_package,
+                   extensions_package]:
+        folder.mkdir(parents=True, exist_ok=True)
+        folder.joinpath('__init__.py').write_text('')
+    for ind in range(Nplugins):
+        move_package.joinpath(f'daq_move_Fake{ind}.py').write_text(
+            f'import time\ntime.sleep({import_duration})\n\n\nclass DAQ_Move_Fake{ind}:\n    pass\n')
+    move_package.joinpath('daq_move_Broken.py').write_text(
+        'import a_missing_vendor_sdk\n\n\nclass DAQ_Move_Broken:\n    pass\n')
+    move_package.joinpath('daq_move_helpers.py').write_text('def a_helper():\n    pass\n')
+    viewer_package.joinpath('daq_0Dviewer_Fake.py').write_text('class DAQ_0DViewer_Fake:\n    pass\n')
+    models_package.joinpath('PIDModelFake.py').write_text(
+        'from pymodaq.pid.utils import PIDModelGeneric\n\n\nclass PIDModelFake(PIDModelGeneric):\n    pass\n')
+    models_package.joinpath('model_utils.py').write_text('class NotAModel:\n    pass\n')
+    extensions_package.joinpath('__init__.py').write_text("NICE_NAME = 'Fake extension'\n")
+
+    monkeypatch.syspath_prepend(str(site))
+    importlib.invalidate_caches()
+    yield site
+    for module_name in list(sys.modules.keys()):
+        if module_name.startswith('pymodaq_plugins_fake'):
+            sys.modules.pop(module_name)
+
+
+def get_registry(fake_plugins, tmp_path):
+    return PluginRegistry(cache_path=tmp_path.joinpath('plugins_cache.json'), path=[str(fake_plugins)])
+
+
+class TestPluginRegistry:
+    def test_discovery(self, fake_plugins, tmp_path):
+        registry = get_registry(fake_plugins, tmp_path)
+        plugins = registry.get_plugins('daq_move')
+        assert sorted([plugin['name'] for plugin in plugins]) == sorted([f'Fake{ind}' for ind in range(Nplugins)] +
+                                                                        ['Broken', 'PID'])
+        assert [plugin['name'] for plugin in registry.get_plugins('daq_0Dviewer')] == ['Fake']
+        assert registry.get_plugins('daq_2Dviewer') == []
+        assert [model['name'] for model in registry.get_models()] == ['PIDModelFake']
+        assert [extension['name'] for extension in registry.get_extensions()] == ['Fake extension']
+        assert not any([module_name.startswith('pymodaq_plugins_fake.') for module_name in sys.modules])
+
+    def test_lazy_import(self, fake_plugins, tmp_path):
+        registry = get_registry(fake_plugins, tmp_path)
+        plugin = [plugin for plugin in registry.get_plugins('daq_move') if plugin['name'] == 'Fake3'][0]
+        assert 'pymodaq_plugins_fake.daq_move_plugins.daq_move_Fake3' not in sys.modules
+        assert hasattr(getattr(plugin['module'], 'daq_move_Fake3'), 'DAQ_Move_Fake3')
+        assert 'pymodaq_plugins_fake.daq_move_plugins.daq_move_Fake4' not in sys.modules
+
+        model = registry.get_models('PIDModelFake')
+        assert model['class'].__name__ == 'PIDModelFake'
+        assert registry.get_extensions()[0]['module'].NICE_NAME == 'Fake extension'
+
+    def test_import_error(self, fake_plugins, tmp_path):
+        registry = get_registry(fake_plugins, tmp_path)
+        plugins = registry.get_plugins('daq_move')
+        plugin = [plugin for plugin in plugins if plugin['name'] == 'Broken'][0]
+        with pytest.raises(ImportError):
+            plugin['module']
+        assert 'Broken' not in [plugin['name'] for plugin in plugins]
+        assert 'Broken' not in [plugin['name'] for plugin in registry.get_plugins('daq_move')]
+        assert len(registry.get_plugins('daq_move')) == Nplugins + 1
+
+    def test_cache(self, fake_plugins, tmp_path):
+        registry = get_registry(fake_plugins, tmp_path)
+        registry.load()
+        assert not registry.from_cache
+        assert tmp_path.joinpath('plugins_cache.json').is_file()
+
+        registry = get_registry(fake_plugins, tmp_path)
+        registry.load()
+        assert registry.from_cache
+        assert len(registry.get_plugins('daq_move')) == Nplugins + 2
+
+        move_package = fake_plugins.joinpath('pymodaq_plugins_fake', 'daq_move_plugins')
+        move_package.joinpath('daq_move_New.py').write_text('class DAQ_Move_New:\n    pass\n')
+        os.utime(move_package, (time.time() + 10, time.time() + 10))
+        registry = get_registry(fake_plugins, tmp_path)
+        registry.load()
+        assert not registry.from_cache
+        assert 'New' in [plugin['name'] for plugin in registry.get_plugins('daq_move')]
+
+        # a module modified in place (the folder is unchanged)
+        move_package.joinpath('daq_move_helpers.py').write_text('class DAQ_Move_helpers:\n    pass\n')
+        os.utime(move_package.joinpath('daq_move_helpers.py'), (time.time() + 20, time.time() + 20))
+        registry = get_registry(fake_plugins, tmp_path)
+        registry.load()
+        assert not registry.from_cache
+        assert 'helpers' in [plugin['name'] for plugin in registry.get_plugins('daq_move')]
+
+    def test_no_import(self, fake_plugins, tmp_path, monkeypatch):
+        """The discovery (cold and cached) doesn't import any plugin module, unlike before the registry"""
+        imported = []
+        import_module = importlib.import_module
+        monkeypatch.setattr(importlib, 'import_module',
+                            lambda name, *args: imported.append(name) or import_module(name, *args))
+        get_registry(fake_plugins, tmp_path).get_plugins('daq_move')
+        registry = get_registry(fake_plugins, tmp_path)
+        plugins = registry.get_plugins('daq_move')
+        assert registry.from_cache
+        registry.get_models()
+        assert imported == []
+
+        [plugin for plugin in plugins if plugin['name'] == 'Fake3'][0]['module']
+        assert imported == ['pymodaq_plugins_fake.daq_move_plugins.daq_move_Fake3',
+                            'pymodaq_plugins_fake.daq_move_plugins']
+
+    @pytest.mark.skipif(benchmark_skip, reason='benchmark only reporting timings')
+    def test_startup_benchmark(self, fake_plugins, tmp_path):
+        """Compare the discovery (cold and cached) with importing all the plugins as done before the registry"""
+        start = time.perf_counter()
+        get_registry(fake_plugins, tmp_path).get_plugins('daq_move')
+        duration_scan = time.perf_counter() - start
+
+        start = time.perf_counter()
+        registry = get_registry(fake_plugins, tmp_path)
+        registry.get_plugins('daq_move')
+        duration_cached = time.perf_counter() - start
+        assert registry.from_cache
+
+        start = time.perf_counter()
+        for ind in range(Nplugins):
+            importlib.import_module(f'pymodaq_plugins_fake.daq_move_plugins.daq_move_Fake{ind}')
+        duration_import = time.perf_counter() - start
+
+        print(f'\nDiscovery of {Nplugins} plugins: {duration_scan * 1000:.1f} ms, from the cache:'
+              f' {duration_cached * 1000:.1f} ms, importing them: {duration_import * 1000:.1f} ms')
@@ -1,7 +1,9 @@
 import numpy as np
 import pytest
+from time import perf_counter
 
 import pymodaq.daq_utils
+from pymodaq.daq_utils.conftests import benchmark_skip
 from pymodaq.daq_utils import scanner
 from pymodaq.daq_utils import exceptions as exceptions
 
@@ -139,6 +141,82 @@ class TestScanParameters:
         positions = scanner.set_scan_linear(np.array([0, 0]), np.array([0, 21]), np.array([0.1, 0.3]))
         assert positions.shape == (1, 2)
 
+    def test_lazy_scan(self):
+        scan_param = scanner.ScanParameters(Naxes=2, scan_type='Scan2D', scan_subtype='Back&Forth', starts=[0, 1],
+                                            stops=[1, -1], steps=[0.1, -0.5])
+        assert isinstance(scan_param.scan_info.lazy_scan, scanner.LazyScanProduct)
+        assert scan_param.scan_info._positions is None  # nothing materialized yet
+        positions = scanner.set_scan_linear(np.array([0, 1]), np.array([1, -1]), np.array([0.1, -0.5]), True)
+        info = scan_param.get_info_from_positions(positions)
+        assert scan_param.Nsteps == len(positions)
+        for ind_ax in range(2):
+            assert np.array_equal(scan_param.axes_unique[ind_ax], info.axes_unique[ind_ax])
+            assert np.array_equal(scan_param.get_axis_positions(ind_ax), positions[:, ind_ax])
+        for ind, (step_positions, step_indexes) in enumerate(scan_param):
+            assert np.array_equal(step_positions, positions[ind])
+            assert np.array_equal(step_indexes, info.axes_indexes[ind])
+        ind_start = len(positions) - 7
+        for ind, (step_positions, step_indexes) in enumerate(scan_param.iter_steps(ind_start)):
+            assert np.array_equal(step_positions, positions[ind_start + ind])
+        assert ind == 6
+        step_positions, step_indexes = scan_param.get_steps(ind_start, len(positions) + 3)
+        assert np.array_equal(step_positions, positions[ind_start:])
+        assert np.array_equal(step_indexes, info.axes_indexes[ind_start:])
+        assert scan_param.scan_info._positions is None
+        assert np.array_equal(scan_param.get_step(-1)[0], positions[-1])
+        with pytest.raises(IndexError):
+            scan_param.get_step(len(positions))
+        assert np.array_equal(scan_param.positions, positions)
+        assert np.array_equal(scan_param.axes_indexes, info.axes_indexes)
+
+        scan_param = scanner.ScanParameters(Naxes=2, scan_type='Scan2D', scan_subtype='Spiral', starts=[1, 2],
+                                            stops=[0.5, -0.5], steps=[0.1, -0.1])
+        positions = scanner.set_scan_spiral(np.array([1, 2]), [0.5, -0.5], [0.1, -0.1])
+        info = scan_param.get_info_from_positions(positions)
+        assert scan_param.Nsteps == len(positions) == 121
+        assert np.array_equal(scan_param.axes_unique[1], info.axes_unique[1])
+        assert np.array_equal(scan_param.positions, positions)
+        assert np.array_equal(scan_param.axes_indexes, info.axes_indexes)
+
+    def test_lazy_sequential(self, monkeypatch):
+        starts = [0, 1, 2]
+        stops = [1, 3, 2.5]
+        steps = [0.1, 0.5, 0.1]
+        scan_param = scanner.ScanParameters(Naxes=3, scan_type='Sequential', starts=starts, stops=stops, steps=steps)
+        positions = scanner.set_scan_sequential(list(starts), stops, steps)
+        assert scan_param.Nsteps == len(positions)
+        assert np.array_equal(scan_param.positions, positions)
+
+        monkeypatch.setitem(scanner.config['scan'], 'steps_limit', 1000)  # lazy scans are not limited
+        scan_param = scanner.ScanParameters(Naxes=5, scan_type='Sequential', starts=[0] * 5, stops=[29] * 5,
+                                            steps=[1] * 5)
+        assert scan_param.Nsteps == 30 ** 5
+        assert [len(axis) for axis in scan_param.axes_unique] == [30] * 5
+        index = 30 ** 5 - 30 ** 3 - 2
+        assert np.array_equal(scan_param.get_step(index)[0], np.unravel_index(index, [30] * 5))
+        assert scan_param.scan_info._positions is None
+
+    def test_get_spiral_coordinates(self):
+        indexes = np.arange(30 ** 2)
+        assert np.array_equal(scanner.get_spiral_coordinates(indexes), scanner.get_spiral_indexes(30 ** 2))
+        assert np.array_equal(scanner.get_spiral_coordinates([10 ** 12, 4 * 10 ** 12 + 3]),
+                              [[-500000, 500000], [-1000000, 999997]])
+
+    def test_get_linear_indexes(self):
+        indexes = scanner.get_linear_indexes(3, 2)
+        assert np.array_equal(indexes, [[0, 0], [0, 1], [1, 0], [1, 1], [2, 0], [2, 1]])
+        indexes = scanner.get_linear_indexes(3, 2, back_and_forth=True)
+        assert np.array_equal(indexes, [[0, 0], [0, 1], [1, 1], [1, 0], [2, 0], [2, 1]])
+
+    def test_get_spiral_indexes(self):
+        indexes = scanner.get_spiral_indexes(9)
+        assert np.array_equal(indexes, [[0, 0], [1, 0], [1, 1], [0, 1], [-1, 1], [-1, 0], [-1, -1], [0, -1],
+                                        [1, -1]])
+        indexes = scanner.get_spiral_indexes(25 ** 2)
+        assert np.all(np.sum(np.abs(np.diff(indexes, axis=0)), axis=1) == 1)  # one step at a time
+        assert len(np.unique(indexes, axis=0)) == 25 ** 2  # never twice at the same position
+        assert np.all(np.abs(indexes) <= 12)  # a full square
+
     def test_set_scan_random(self):
         positions = scanner.set_scan_linear(np.array([0, 0]), np.array([1, -21]), np.array([0.1, -0.3]))
         positions_r = scanner.set_scan_random(np.array([0, 0]), np.array([1, -21]), np.array([0.1, -0.3]))
@@ -146,3 +224,210 @@ class TestScanParameters:
         assert positions_r.shape == positions.shape
         for pos in positions_r:
             assert pos in positions
+
+    def test_get_travel_times(self):
+        positions = np.array([[0., 0.], [1., 0.], [1., 2.], [4., 4.]])
+        assert np.allclose(scanner.get_travel_times(positions), [1, 2, 3])
+        assert np.allclose(scanner.get_travel_times(positions, [1., 2.]), [1, 1, 3])
+        assert scanner.get_travel_time(positions, [1., 2.]) == pytest.approx(5)
+
+    def test_optimize_scan_order(self):
+        np.random.seed(0)
+        positions = np.random.rand(500, 2)
+        order = scanner.optimize_scan_order(positions)
+        assert order[0] == 0
+        assert np.array_equal(np.sort(order), np.arange(500))
+        assert scanner.get_travel_time(positions[order]) < scanner.get_travel_time(positions) / 5
+
+        positions = scanner.set_scan_linear(np.array([0., 0.]), np.array([1., 1.]), np.array([0.1, 0.1]), True)
+        order = scanner.optimize_scan_order(positions)
+        assert scanner.get_travel_time(positions[order]) <= scanner.get_travel_time(positions)
+
+    def test_reverse_segments(self):
+        route = np.arange(10)
+        assert np.array_equal(scanner.reverse_segments(route, np.array([1, 5]), np.array([3, 9])),
+                              [0, 3, 2, 1, 4, 9, 8, 7, 6, 5])
+
+    def test_get_strips_order(self):
+        positions = np.array([[0., 0.], [0., 1.], [0.1, 0.5], [0.2, 0.2], [1., 0.], [1., 1.], [0.9, 0.5], [0.8, 0.8]])
+        order = scanner.get_strips_order(positions)  # two strips, the second one travelled backward
+        assert np.array_equal(order, [0, 3, 2, 1, 5, 7, 6, 4])
+
+    def test_optimize_order(self):
+        np.random.seed(0)
+        positions = np.random.rand(200, 3)
+        scan_param = scanner.ScanParameters(Naxes=3, scan_type='Tabular', scan_subtype='Linear',
+                                            positions=positions, optimize_order=True, velocities=[1., 2., 3.])
+        assert scan_param.Nsteps == 200
+        assert scan_param.scan_info.travel_time_optimized < scan_param.scan_info.travel_time
+        assert np.array_equal(np.sort(scan_param.positions, axis=0), np.sort(positions, axis=0))
+        for ind, pos in enumerate(scan_param.positions):
+            for ind_ax in range(3):
+                assert scan_param.axes_unique[ind_ax][scan_param.axes_indexes[ind, ind_ax]] == pos[ind_ax]
+
+        scan_param = scanner.ScanParameters(Naxes=2, scan_type='Scan2D', scan_subtype='Random',
+                                            starts=[0, 0], stops=[1, 1], steps=[0.1, 0.1], optimize_order=True)
+        assert scan_param.scan_info.travel_time_optimized < scan_param.scan_info.travel_time
+
+    def test_get_scan_lines(self):
+        scan_param = scanner.ScanParameters(Naxes=2, scan_type='Scan2D', scan_subtype='Back&Forth',
+                                            starts=[0, 0], stops=[2, 1], steps=[1, 0.5])
+        assert scanner.get_scan_lines(scan_param.positions) == [(0, 2), (3, 5), (6, 8)]
+        positions = np.array([[0., 0.], [1., 0.], [2., 0.]])
+        assert scanner.get_scan_lines(positions, axis=1) == [(0, 0), (1, 1), (2, 2)]
+        assert scanner.get_scan_lines(positions) == [(0, 2)]
+        assert scanner.get_scan_lines(np.array([0., 1., 2., 3.])) == [(0, 3)]
+        assert scanner.get_scan_lines(np.array([0., 1., 2., 0.])) == [(0, 2), (3, 3)]
+        assert scanner.get_scan_lines(np.array([1.])) == [(0, 0)]
+
+    @pytest.mark.parametrize('scan_subtype', ['Linear', 'Back&Forth'])
+    def test_iter_scan_lines(self, scan_subtype):
+        scan_param = scanner.ScanParameters(Naxes=2, scan_type='Scan2D', scan_subtype=scan_subtype,
+                                            starts=[0, 0], stops=[2, 1], steps=[0.25, 0.1])
+        lines = scanner.get_scan_lines(scan_param.positions)
+        for chunk_size in [3, 7, 11, 4096]:  # lines longer than, across and within the chunks
+            lines_chunks = list(scanner.iter_scan_lines(scan_param.get_steps, scan_param.Nsteps,
+                                                        chunk_size=chunk_size))
+            assert [(start, stop) for start, stop, start_pos, stop_pos in lines_chunks] == lines
+            for start, stop, start_pos, stop_pos in lines_chunks:
+                assert np.array_equal(start_pos, scan_param.positions[start])
+                assert np.array_equal(stop_pos, scan_param.positions[stop])
+
+        positions = np.array([[0., 1., 2., 0., 0., 1.]]).T
+        assert list(scanner.iter_scan_lines(lambda start, stop: (positions[start:stop], None), 6, chunk_size=2)) == \
+            [(0, 2, 0., 2.), (3, 3, 0., 0.), (4, 5, 0., 1.)]
+
+    def test_steps_limit(self, monkeypatch):
+        monkeypatch.setitem(scanner.config['scan'], 'steps_limit', 100)
+        scan_param = scanner.ScanParameters(Naxes=2, scan_type='Scan2D', scan_subtype='Linear',
+                                            starts=[0, 0], stops=[99, 49], steps=[1, 1])
+        assert scan_param.is_lazy()
+        assert scan_param.Nsteps == 100 * 50
+        assert scan_param.scan_info._positions is None
+
+        scan_param = scanner.ScanParameters(Naxes=2, scan_type='Scan2D', scan_subtype='Random',
+                                            starts=[0, 0], stops=[99, 49], steps=[1, 1])
+        assert not scan_param.is_lazy()
+        assert scan_param.positions is None
+
+    def test_fly_scan(self):
+        assert scanner.is_fly_scan_possible('Scan2D', 'Back&Forth')
+        assert not scanner.is_fly_scan_possible('Scan2D', 'Spiral')
+        assert not scanner.is_fly_scan_possible('Tabular', 'Linear')
+
+        positions = scanner.get_fly_positions(np.array([-1., 0.5, 1.5, 3.]), np.array([0., 1., 2.]),
+                                              np.array([[0., 0.], [1., 2.], [2., 2.]]))
+        assert np.allclose(positions, [[0., 0.], [0.5, 1.], [1.5, 2.], [2., 2.]])
+        assert scanner.get_fly_positions([0.25], [0., 1.], [0., 4.]).shape == (1, 1)
+
+
+def set_scan_linear_loops(starts, stops, steps, back_and_force=False, oversteps=10000):
+    """reference implementation of scanner.set_scan_linear using python loops"""
+    axis_1_unique = pymodaq.daq_utils.math_utils.linspace_step(starts[0], stops[0], steps[0])
+    len1 = len(axis_1_unique)
+    axis_2_unique = pymodaq.daq_utils.math_utils.linspace_step(starts[1], stops[1], steps[1])
+    len2 = len(axis_2_unique)
+    if len1 * len2 > oversteps:
+        axis_1_unique = axis_1_unique[:int(np.ceil(np.sqrt(oversteps * len1 / len2)))]
+        axis_2_unique = axis_2_unique[:int(np.ceil(np.sqrt(oversteps * len2 / len1)))]
+
+    positions = []
+    for ind_x, pos1 in enumerate(axis_1_unique):
+        for ind_y, pos2 in enumerate(axis_2_unique):
+            if back_and_force and ind_x % 2 == 1:
+                positions.append([pos1, axis_2_unique[len(axis_2_unique) - ind_y - 1]])
+            else:
+                positions.append([pos1, pos2])
+    return np.array(positions)
+
+
+def set_scan_spiral_loops(starts, rsteps, Npts):
+    """reference implementation of scanner.set_scan_spiral using python loops"""
+    axis_1_indexes = [0]
+    axis_2_indexes = [0]
+    ind = 0
+    while len(axis_1_indexes) < Npts:
+        step = 1 if ind % 2 == 1 else -1
+        for ind_step in range(ind):
+            if len(axis_1_indexes) < Npts:
+                axis_1_indexes.append(axis_1_indexes[-1] + step)
+                axis_2_indexes.append(axis_2_indexes[-1])
+        for ind_step in range(ind):
+            if len(axis_1_indexes) < Npts:
+                axis_1_indexes.append(axis_1_indexes[-1])
+                axis_2_indexes.append(axis_2_indexes[-1] + step)
+        ind += 1
+    return np.array([[axis_1_indexes[ind] * rsteps[0] + starts[0], axis_2_indexes[ind] * rsteps[1] + starts[1]]
+                     for ind in range(len(axis_1_indexes))])
+
+
+def get_axes_indexes_loops(positions, axes_unique):
+    """reference implementation of the axes indexes in ScanParameters.get_info_from_positions"""
+    axes_indexes = np.zeros_like(positions, dtype=int)
+    for ind in range(positions.shape[0]):
+        for ind_pos, pos in enumerate(positions[ind]):
+            axes_indexes[ind, ind_pos] = pymodaq.daq_utils.math_utils.find_index(axes_unique[ind_pos], pos)[0][0]
+    return axes_indexes
+
+
+class TestLoopsEquivalence:
+    """Compare the vectorized scan generators with python loops implementations"""
+    @pytest.mark.parametrize('back_and_forth', [False, True])
+    def test_linear(self, back_and_forth):
+        args = (np.array([0, 0]), np.array([1, -3]), np.array([0.002, -0.01]), back_and_forth, 10 ** 6)
+        positions = scanner.set_scan_linear(*args)
+        positions_loops = set_scan_linear_loops(*args)
+        assert positions.shape == (501 * 301, 2)
+        assert np.array_equal(positions, positions_loops)
+
+    def test_spiral(self):
+        starts = np.array([10.1, -5.87])
+        rsteps = np.array([0.12, 1])
+        positions = scanner.set_scan_spiral(starts, 200 * rsteps, rsteps, None, 10 ** 6)
+        positions_loops = set_scan_spiral_loops(starts, rsteps, 401 ** 2)
+        assert positions.shape == (401 ** 2, 2)
+        assert np.array_equal(positions, positions_loops)
+
+    def test_axes_indexes(self):
+        positions = scanner.set_scan_linear(np.array([0, 0]), np.array([1, -3]), np.array([0.005, -0.01]), True,
+                                            10 ** 6)
+        scan_param = scanner.ScanParameters(starts=[0, 0], stops=[1, -3], steps=[0.005, -0.01], scan_type='Scan2D')
+        scan_info = scan_param.get_info_from_positions(positions)
+        axes_indexes = get_axes_indexes_loops(positions, scan_info.axes_unique)
+        assert np.array_equal(scan_info.axes_indexes, axes_indexes)
+        assert np.array_equal(scan_info.axes_unique[1], np.unique(positions[:, 1]))
+
+
+@pytest.mark.skipif(benchmark_skip, reason='benchmark only reporting timings')
+class TestBenchmark:
+    """Report the timings of the vectorized scan generators against the python loops implementations"""
+    @staticmethod
+    def report(name, function, function_loops):
+        start = perf_counter()
+        function()
+        duration = perf_counter() - start
+        start = perf_counter()
+        function_loops()
+        duration_loops = perf_counter() - start
+        print(f'\n{name}: {duration * 1000:.1f} ms, with loops: {duration_loops * 1000:.1f} ms'
+              f' ({duration_loops / duration:.0f}x)')
+
+    @pytest.mark.parametrize('back_and_forth', [False, True])
+    def test_linear(self, back_and_forth):
+        args = (np.array([0, 0]), np.array([1, -3]), np.array([0.002, -0.01]), back_and_forth, 10 ** 6)
+        self.report(f'set_scan_linear (back and forth: {back_and_forth})', lambda: scanner.set_scan_linear(*args),
+                    lambda: set_scan_linear_loops(*args))
+
+    def test_spiral(self):
+        starts = np.array([10.1, -5.87])
+        rsteps = np.array([0.12, 1])
+        self.report('set_scan_spiral', lambda: scanner.set_scan_spiral(starts, 200 * rsteps, rsteps, None, 10 ** 6),
+                    lambda: set_scan_spiral_loops(starts, rsteps, 401 ** 2))
+
+    def test_axes_indexes(self):
+        positions = scanner.set_scan_linear(np.array([0, 0]), np.array([1, -3]), np.array([0.005, -0.01]), True,
+                                            10 ** 6)
+        scan_param = scanner.ScanParameters(starts=[0, 0], stops=[1, -3], steps=[0.005, -0.01], scan_type='Scan2D')
+        axes_unique = scan_param.get_info_from_positions(positions).axes_unique
+        self.report('axes indexes', lambda: scan_param.get_info_from_positions(positions),
+                    lambda: get_axes_indexes_loops(positions, axes_unique))
@@ -4,7 +4,8 @@ import socket
 
 from unittest import mock
 from pymodaq.daq_utils.daq_utils import ThreadCommand
-from pymodaq.daq_utils.tcp_server_client import MockServer, TCPClient, TCPServer, Socket
+from pymodaq.daq_utils.tcp_server_client import MockServer, TCPClient, TCPServer, Socket, ArrayBufferPool, \
+    MessageHeader, MessageType, PROTOCOL_VERSION, LEGACY_PROTOCOL
 from pyqtgraph.parametertree import Parameter
 from pyqtgraph import SRTTransform
 from collections import OrderedDict
@@ -48,14 +49,30 @@ class MockPythonSocket:  # pragma: no cover
 
     def send(self, *args, **kwargs):
         self._send.append(args[0])
-        return len(str(self._send[-1]))
+        return len(args[0])
 
     def sendall(self, *args, **kwargs):
         self._sendall.append(args[0])
 
-    def recv(self, *args, **kwargs):
+    def recv(self, nbytes=0, *args, **kwargs):
         if len(self._send) > 0:
-            return self._send.pop(0)
+            chunk = self._send.pop(0)
+            if 0 < nbytes < len(chunk):
+                self._send.insert(0, chunk[nbytes:])
+                chunk = chunk[:nbytes]
+            return chunk
+
+    def recv_into(self, buffer, nbytes=0, *args, **kwargs):
+        if len(self._send) > 0:
+            chunk = self._send.pop(0)
+            if nbytes == 0:
+                nbytes = len(buffer)
+            if len(chunk) > nbytes:
+                self._send.insert(0, chunk[nbytes:])
+                chunk = chunk[:nbytes]
+            buffer[:len(chunk)] = chunk
+            return len(chunk)
+        return 0
 
     def close(self):
         self._closed = True
@@ -155,12 +172,34 @@ class TestSocket:
         with pytest.raises(TypeError):
             test_Socket.check_received_length(1.5)
 
+    def test_check_received_into(self):
+        test_Socket = Socket(MockPythonSocket())
+        for i in range(3):
+            test_Socket.send(b'test')
+        buffer = bytearray(12)
+        assert test_Socket.check_received_into(buffer) is buffer
+        assert buffer == b'testtesttest'
+        assert not test_Socket.socket._send
+
+        array = np.array([1.5, 2.5])
+        test_Socket.send(array.tobytes())
+        buffer = np.zeros((2,))
+        test_Socket.check_received_into(buffer)
+        assert np.array_equal(array, buffer)
+
+        with pytest.raises(TypeError):
+            test_Socket.check_received_into(b'test')
+        with pytest.raises(TypeError):
+            test_Socket.check_received_into(np.zeros((4, 4))[:, 0])
+        with pytest.raises(ConnectionError):
+            test_Socket.check_received_into(bytearray(4))
+
     def test_send_string(self):
         test_Socket = Socket(MockPythonSocket())
         test_Socket.send_string('test')
-        assert b'test' in test_Socket.socket._send
-        assert test_Socket.recv() == b'\x00\x00\x00\x04'
-        assert test_Socket.recv() == b'test'
+        assert test_Socket.socket._send == [b'\x00\x00\x00\x04test']
+        assert test_Socket.recv(4) == b'\x00\x00\x00\x04'
+        assert test_Socket.recv(4) == b'test'
 
     def test_get_string(self):
         test_Socket = Socket(MockPythonSocket())
@@ -182,10 +221,10 @@ class TestSocket:
         data_type = data.dtype.descr[0][1]
         cmd_bytes, cmd_length_bytes = test_Socket.message_to_bytes(data_type)
 
-        assert test_Socket.recv() == cmd_length_bytes
-        assert test_Socket.recv() == cmd_bytes
-        assert test_Socket.recv() == test_Socket.int_to_bytes(len(data_bytes))
-        assert test_Socket.recv() == data_bytes
+        assert test_Socket.recv(4) == cmd_length_bytes
+        assert test_Socket.recv(len(cmd_bytes)) == cmd_bytes
+        assert test_Socket.recv(4) == test_Socket.int_to_bytes(len(data_bytes))
+        assert test_Socket.recv(len(data_bytes)) == data_bytes
         assert not test_Socket.socket._send
 
         with pytest.raises(TypeError):
@@ -206,13 +245,13 @@ class TestSocket:
         data_type = data.dtype.descr[0][1]
         cmd_bytes, cmd_length_bytes = test_Socket.message_to_bytes(data_type)
 
-        assert test_Socket.recv() == cmd_length_bytes
-        assert test_Socket.recv() == cmd_bytes
-        assert test_Socket.recv() == test_Socket.int_to_bytes(len(data_bytes))
-        assert test_Socket.recv() == test_Socket.int_to_bytes(len(data.shape))
+        assert test_Socket.recv(4) == cmd_length_bytes
+        assert test_Socket.recv(len(cmd_bytes)) == cmd_bytes
+        assert test_Socket.recv(4) == test_Socket.int_to_bytes(len(data_bytes))
+        assert test_Socket.recv(4) == test_Socket.int_to_bytes(len(data.shape))
         for i in range(len(data.shape)):
-            assert test_Socket.recv() == test_Socket.int_to_bytes(data.shape[i])
-        assert test_Socket.recv() == data_bytes
+            assert test_Socket.recv(4) == test_Socket.int_to_bytes(data.shape[i])
+        assert test_Socket.recv(len(data_bytes)) == data_bytes
         assert not test_Socket.socket._send
 
         data = np.array([[1, 2], [2, 3]])
@@ -222,31 +261,86 @@ class TestSocket:
         data_type = data.dtype.descr[0][1]
         cmd_bytes, cmd_length_bytes = test_Socket.message_to_bytes(data_type)
 
-        assert test_Socket.recv() == cmd_length_bytes
-        assert test_Socket.recv() == cmd_bytes
-        assert test_Socket.recv() == test_Socket.int_to_bytes(len(data_bytes))
-        assert test_Socket.recv() == test_Socket.int_to_bytes(len(data.shape))
+        assert test_Socket.recv(4) == cmd_length_bytes
+        assert test_Socket.recv(len(cmd_bytes)) == cmd_bytes
+        assert test_Socket.recv(4) == test_Socket.int_to_bytes(len(data_bytes))
+        assert test_Socket.recv(4) == test_Socket.int_to_bytes(len(data.shape))
         for i in range(len(data.shape)):
-            assert test_Socket.recv() == test_Socket.int_to_bytes(data.shape[i])
-        assert test_Socket.recv() == data_bytes
+            assert test_Socket.recv(4) == test_Socket.int_to_bytes(data.shape[i])
+        assert test_Socket.recv(len(data_bytes)) == data_bytes
         assert not test_Socket.socket._send
 
         with pytest.raises(TypeError):
             test_Socket.send_array(10)
 
+    def test_array_to_buffers(self):
+        data = np.random.rand(10, 5)
+        buffers = Socket.array_to_buffers(data)
+        assert np.shares_memory(np.asarray(buffers[-1]), data)
+
+        data_bytes = data.tobytes()
+        cmd_bytes, cmd_length_bytes = Socket.message_to_bytes(data.dtype.descr[0][1])
+        legacy = cmd_length_bytes + cmd_bytes + Socket.int_to_bytes(len(data_bytes)) + Socket.int_to_bytes(2) + \
+            Socket.int_to_bytes(10) + Socket.int_to_bytes(5) + data_bytes
+        assert b''.join([bytes(buffer) for buffer in buffers]) == legacy
+
+        data = np.asfortranarray(data)
+        assert b''.join([bytes(buffer) for buffer in Socket.array_to_buffers(data)]) == legacy
+
+        with pytest.raises(TypeError):
+            Socket.array_to_buffers([1, 2])
+
+    def test_check_sended_buffers(self):
+        sock_a, sock_b = socket.socketpair()
+        sender = Socket(sock_a)
+        receiver = Socket(sock_b)
+        data_list = [np.random.rand(2000), 'test', 47, np.arange(12).reshape((3, 4))]
+        sender.check_sended_buffers(Socket.string_to_buffers('Done') + Socket.list_to_buffers(data_list))
+        assert receiver.get_string() == 'Done'
+        result = receiver.get_list()
+        for elem1, elem2 in zip(data_list, result):
+            if isinstance(elem1, np.ndarray):
+                assert np.array_equal(elem1, elem2)
+            else:
+                assert elem1 == elem2
+        sender.close()
+        receiver.close()
+
+        test_Socket = Socket(MockPythonSocket())
+        test_Socket.check_sended_buffers([b'ab', b'cd', memoryview(b'ef'), b'', b'gh'])
+        assert test_Socket.socket._send == [b'abcd', b'ef', b'gh']
+
     def test_get_array(self):
         test_Socket = Socket(MockPythonSocket())
         array = np.array([1, 2.1, 3.0])
         test_Socket.send_array(array)
         result = test_Socket.get_array()
         assert np.array_equal(array, result)
+        assert result.flags['WRITEABLE']
         assert not test_Socket.socket._send
 
+    def test_get_array_buffer_pool(self):
+        test_Socket = Socket(MockPythonSocket(), buffer_pool=ArrayBufferPool(depth=2))
+        arrays = [np.random.rand(5, 3) for ind in range(3)]
+        results = []
+        for array in arrays:
+            test_Socket.send_array(array)
+            results.append(test_Socket.get_array())
+            assert np.array_equal(array, results[-1])
+        assert len(test_Socket.buffer_pool) == 2
+        assert results[2].base is results[0].base or results[2] is results[0]
+        assert np.array_equal(results[0], arrays[2])
+
+        test_Socket.send_array(np.array([1, 2, 3], dtype='>i4'))
+        assert np.array_equal(test_Socket.get_array(), np.array([1, 2, 3]))
+        assert len(test_Socket.buffer_pool) == 3
+
+
     def test_send_list(self):
         test_Socket = Socket(MockPythonSocket())
         data_list = [np.array([1, 2]), 'test', 47]
         test_Socket.send_list(data_list)
-        assert test_Socket.recv() == b'\x00\x00\x00\x03'
+        assert test_Socket.recv(4) == b'\x00\x00\x00\x03'
         assert test_Socket.get_string() == 'array'
         assert np.array_equal(test_Socket.get_array(), data_list[0])
         assert test_Socket.get_string() == 'string'
@@ -273,6 +367,80 @@ class TestSocket:
         assert not test_Socket.socket._send
 
 
+class TestMessageHeader:
+    def test_bytes(self):
+        header = MessageHeader(MessageType.REPLY, 12, 1024)
+        header_bytes = header.to_bytes()
+        assert len(header_bytes) == MessageHeader.size == 12
+        header_back = MessageHeader.from_bytes(header_bytes)
+        assert header_back.version == PROTOCOL_VERSION
+        assert header_back.message_type == MessageType.REPLY
+        assert header_back.message_id == 12
+        assert header_back.length == 1024
+
+    def test_send_messages(self):
+        test_Socket = Socket(MockPythonSocket())
+        assert test_Socket.send_messages([('move_abs', Socket.scalar_to_buffers(1.5)), ('grab', [])]) == \
+            [None, None]
+        assert test_Socket.get_string() == 'move_abs'
+        assert test_Socket.get_scalar() == 1.5
+        assert test_Socket.get_message() == ('grab', None)
+
+        test_Socket.protocol = PROTOCOL_VERSION
+        message_ids = test_Socket.send_messages([('move_abs', Socket.scalar_to_buffers(1.5)), ('grab', [])])
+        assert message_ids == [1, 2]
+        assert test_Socket.send_message('Done', Socket.list_to_buffers([np.array([1, 2])]), message_id=2) == 2
+
+        message, header = test_Socket.get_message()
+        assert message == 'move_abs'
+        assert header.message_type == MessageType.COMMAND
+        assert header.message_id == 1
+        assert header.length == len(b''.join(Socket.string_to_buffers('move_abs') + Socket.scalar_to_buffers(1.5)))
+        assert test_Socket.get_scalar() == 1.5
+        message, header = test_Socket.get_message()
+        assert (message, header.message_id) == ('grab', 2)
+        message, header = test_Socket.get_message()
+        assert (message, header.message_type, header.message_id) == ('Done', MessageType.REPLY, 2)
+        assert np.array_equal(test_Socket.get_list()[0], np.array([1, 2]))
+        assert not test_Socket.socket._send
+
+        test_Socket.check_sended(MessageHeader(version=2).to_bytes())
+        with pytest.raises(ConnectionError):
+            test_Socket.get_message()
+
+    def test_skip_message(self):
+        test_Socket = Socket(MockPythonSocket())
+        test_Socket.protocol = PROTOCOL_VERSION
+        test_Socket.send_messages([('unknown', Socket.array_to_buffers(np.ones((10, 10)))),
+                                   ('move_abs', Socket.scalar_to_buffers(1.5))])
+        assert test_Socket.get_message()[0] == 'unknown'
+        assert test_Socket.skip_message() == len(b''.join(Socket.array_to_buffers(np.ones((10, 10)))))
+        assert test_Socket.get_message()[0] == 'move_abs'
+        assert test_Socket.get_scalar() == 1.5
+        assert test_Socket.skip_message() == 0
+        assert not test_Socket.socket._send
+
+        test_Socket.protocol = LEGACY_PROTOCOL
+        test_Socket.send_string('unknown')
+        assert test_Socket.get_message() == ('unknown', None)
+        assert test_Socket.skip_message() == 0
+
+
+class TestArrayBufferPool:
+    def test_get(self):
+        pool = ArrayBufferPool(depth=3)
+        buffers = [pool.get((10, 4), np.float64) for ind in range(4)]
+        assert buffers[0] is buffers[3]
+        assert buffers[0] is not buffers[1]
+        assert buffers[0].shape == (10, 4)
+        assert len(pool) == 3
+        assert pool.get((10, 4), np.uint16) is not buffers[0]
+        pool.clear()
+        assert len(pool) == 0
+
+        with pytest.raises(ValueError):
+            ArrayBufferPool(depth=0)
+
 class TestTCPClient:
     def test_init(self):
         params_state = {'Name': 'test_params', 'value': None}
@@ -315,6 +483,47 @@ class TestTCPClient:
         # with pytest.raises(TypeError):
         #     test_TCP_Client.send_data(10)
 
+    def test_get_reply_id(self):
+        test_TCP_Client = TCPClient(protocol_version=PROTOCOL_VERSION)
+        test_TCP_Client.socket = Socket(MockPythonSocket())
+        test_TCP_Client.socket.protocol = PROTOCOL_VERSION
+        test_TCP_Client.socket.send_message('move_abs', Socket.scalar_to_buffers(0.))
+        test_TCP_Client.socket.send_message('get_axis')
+        test_TCP_Client.socket.send_message('move_rel', Socket.scalar_to_buffers(0.))
+        for ind in range(3):
+            test_TCP_Client.ready_to_read()
+        assert not test_TCP_Client.socket.socket._send
+        assert list(test_TCP_Client.pending_requests.values()) == ['move_abs', 'move_rel']
+        assert test_TCP_Client.get_reply_id('position_is') is None
+        assert test_TCP_Client.get_reply_id('move_done') == 1
+        assert test_TCP_Client.get_reply_id('move_done') == 3
+        assert test_TCP_Client.get_reply_id('move_done') is None
+
+    def test_negotiate_protocol(self):
+        client_socket, server_socket = socket.socketpair()
+        server_socket = Socket(server_socket)
+        test_TCP_Client = TCPClient(protocol_version=PROTOCOL_VERSION)
+        test_TCP_Client.socket = Socket(client_socket)
+        cmd_signal = mock.Mock()
+        test_TCP_Client.cmd_signal.connect(cmd_signal)
+
+        # commands sent by the server before it answers the handshake
+        server_socket.send_message('move_abs', Socket.scalar_to_buffers(1.5))
+        server_socket.send_message('get_axis')
+        server_socket.send_string(f'Protocol_v{PROTOCOL_VERSION}')
+        test_TCP_Client.negotiate_protocol()
+        assert server_socket.get_string() == f'Protocol_v{PROTOCOL_VERSION}'
+        assert test_TCP_Client.socket.protocol == PROTOCOL_VERSION
+        commands = [call[0][0] for call in cmd_signal.call_args_list]
+        assert [command.command for command in commands] == ['move_abs', 'get_axis']
+        assert commands[0].attributes == [1.5]
+
+        test_TCP_Client.socket.protocol = LEGACY_PROTOCOL
+        test_TCP_Client.negotiate_protocol(timeout=0.05)  # the server ignores the handshake
+        assert test_TCP_Client.socket.protocol == LEGACY_PROTOCOL
+        test_TCP_Client.socket.close()
+        server_socket.close()
+
     def test_send_infos_xml(self):
         test_TCP_Client = TCPClient()
         test_TCP_Client.socket = Socket(MockPythonSocket())
@@ -535,6 +744,8 @@ class TestTCPServer:
 
         params = [{'name': 'socket_ip', 'value': '0.0.0.0'},
                   {'name': 'port_id', 'value': 4455},
+                  {'name': 'buffer_pool', 'value': False},
+                  {'name': 'server_engine', 'value': 'Polling'},
                   {'name': 'conn_clients', 'value': None}]
 
         test_TCP_Server.settings = Parameter.create(name='Settings', type='group', children=params)
@@ -863,3 +1074,100 @@ class TestMockServer:
     def test_init(self):
         test_MockServer = MockServer()
         assert isinstance(test_MockServer, MockServer)
+
+    def test_event_driven_engine(self, qtbot):
+        server = MockServer()
+        server.socket_types = ['GRABBER']
+        server.message_list = ['Done', 'Quit']
+        server.command_done = mock.Mock()
+        server.settings.child('socket_ip').setValue('localhost')
+        server.settings.child('port_id').setValue(6398)
+        server.settings.child('server_engine').setValue('Event driven')
+        server.init_server()
+        assert server.serversocket.socket in server.socket_notifiers
+
+        clients = []
+        for ind in range(3):
+            client = Socket(socket.socket(socket.AF_INET, socket.SOCK_STREAM))
+            client.connect(('localhost', 6398))
+            client.send_string('GRABBER')
+            clients.append(client)
+            qtbot.waitUntil(lambda: len(server.connected_clients) == ind + 2, timeout=2000)
+        assert len(server.socket_notifiers) == 4
+
+        for client in clients:
+            client.send_string('Done')
+        qtbot.waitUntil(lambda: server.command_done.call_count == 3, timeout=2000)
+
+        clients[0].send_string('Quit')
+        qtbot.waitUntil(lambda: len(server.connected_clients) == 3, timeout=2000)
+        assert len(server.socket_notifiers) == 3
+
+        server.close_server()
+        assert len(server.socket_notifiers) == 0
+        for client in clients:
+            client.close()
+
+    def test_binary_protocol(self, qtbot):
+        server = MockServer()
+        server.socket_types = ['ACTUATOR']
+        server.message_list = ['move_abs', 'move_done', 'set_info', 'Quit']
+        server.command_to_from_client = mock.Mock()
+        server.settings.child('socket_ip').setValue('localhost')
+        server.settings.child('port_id').setValue(6397)
+        server.settings.child('server_engine').setValue('Event driven')
+        server.init_server()
+
+        client = Socket(socket.socket(socket.AF_INET, socket.SOCK_STREAM))
+        client.connect(('localhost', 6397))
+        client.send_string('ACTUATOR')
+        qtbot.waitUntil(lambda: len(server.connected_clients) == 2, timeout=2000)
+        client.send_string(f'Protocol_v{PROTOCOL_VERSION}')
+        qtbot.waitUntil(lambda: server.connected_clients[1]['socket'].protocol == PROTOCOL_VERSION, timeout=2000)
+        assert client.get_string() == f'Protocol_v{PROTOCOL_VERSION}'
+        client.protocol = PROTOCOL_VERSION
+
+        server_socket = server.connected_clients[1]['socket']
+        server.send_commands(server_socket, [('move_abs', Socket.scalar_to_buffers(float(ind))) for ind in range(3)])
+        assert list(server_socket.pending_requests.values()) == ['move_abs', 'move_abs', 'move_abs']
+        requests = []
+        for ind in range(3):
+            message, header = client.get_message()
+            assert message == 'move_abs'
+            assert client.get_scalar() == ind
+            requests.append(header.message_id)
+
+        client.send_message('move_done', Socket.scalar_to_buffers(2.), message_id=requests[2])
+        qtbot.waitUntil(lambda: server.command_to_from_client.call_count == 1, timeout=2000)
+        assert server.message_header.message_id == requests[2]
+        assert server.message_request == 'move_abs'
+        assert list(server_socket.pending_requests.keys()) == requests[:2]
+
+        # commands without reply are queued while the client is busy then sent with the next request
+        server.queue_command(server_socket, 'set_info', Socket.string_to_buffers('a_setting'))
+        assert server_socket.queued_commands == [('set_info', Socket.string_to_buffers('a_setting'))]
+        message_id = server.send_command(server_socket, 'move_abs', Socket.scalar_to_buffers(3.))
+        assert server_socket.queued_commands == []
+        assert client.get_message()[0] == 'set_info'
+        assert client.get_string() == 'a_setting'
+        message, header = client.get_message()
+        assert (message, header.message_id) == ('move_abs', message_id)
+        assert client.get_scalar() == 3.
+
+        # the arguments of an unexpected message are skipped and the next message is read
+        client.send_messages([('unknown', Socket.array_to_buffers(np.ones((100, 100)))),
+                              ('move_done', Socket.scalar_to_buffers(3.))])
+        qtbot.waitUntil(lambda: server.command_to_from_client.call_count == 2, timeout=2000)
+        assert server.command_to_from_client.call_args[0][0] == 'move_done'
+        assert server.message_request is None
+
+        # or as soon as the client replied to all the requests
+        server.queue_command(server_socket, 'set_info', Socket.string_to_buffers('another_setting'))
+        for message_id in list(server_socket.pending_requests.keys()):
+            client.send_message('move_done', Socket.scalar_to_buffers(3.), message_id=message_id)
+        qtbot.waitUntil(lambda: len(server_socket.queued_commands) == 0, timeout=2000)
+        assert client.get_message()[0] == 'set_info'
+        assert client.get_string() == 'another_setting'
+
+        server.close_server()
+        client.close()
@@ -1,4 +1,9 @@
+import tracemalloc
+
+import numpy as np
 from pymodaq.daq_viewer import daq_viewer_main as daqvm
+from pymodaq.daq_utils import daq_utils as utils
+from pymodaq.daq_utils.gui_utils.dock import DockArea
 import pytest
 from pytest import fixture
 from pymodaq.daq_utils.conftests import qtbotskip, main_modules_skip
@@ -34,3 +39,57 @@ class TestGeneral:
         win.close()
 
 
+
+
+@fixture
+def init_viewer(qtbot):
+    area = DockArea()
+    qtbot.addWidget(area)
+    viewer = daqvm.DAQ_Viewer(area, title='test', DAQ_type='DAQ2D')
+    viewer.settings.child('main_settings', 'show_data').setValue(False)
+    yield viewer
+    area.close()
+
+
+def get_frame(Nx=512, Ny=512):
+    return [utils.DataFromPlugins(name='Mock', data=[np.random.rand(Ny, Nx)], dim='Data2D')]
+
+
+class TestDataPath:
+    def test_allocations_per_grab(self, init_viewer):
+        """The acquired arrays are passed down to the exported data without being copied"""
+        viewer = init_viewer
+        datas = get_frame()
+        frame_size = datas[0]['data'][0].nbytes
+        viewer.show_data(get_frame())  # allocations done once (viewers...)
+
+        Ngrabs = 20
+        tracemalloc.start()
+        try:
+            for ind in range(Ngrabs):
+                viewer.show_data([utils.DataFromPlugins(name='Mock', data=datas[0]['data'], dim='Data2D')])
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak < frame_size / 10
+        exported = viewer.data_to_save_export['data2D']['test_Mock_CH000']['data']
+        assert np.shares_memory(exported, datas[0]['data'][0])
+        assert not exported.flags.writeable
+
+    def test_live_averaging(self, init_viewer):
+        viewer = init_viewer
+        viewer.settings.child('main_settings', 'live_averaging').setValue(True)
+        viewer.settings.child('main_settings', 'live_averaging_std').setValue(True)
+        frames = [np.full((4, 5), float(ind)) for ind in range(3)]
+
+        viewer.show_data([utils.DataFromPlugins(name='Mock', data=[frames[0]], dim='Data2D')])
+        first_average = viewer.data_to_save_export['data2D']['test_Mock_CH000']['data']
+        for frame in frames[1:]:
+            viewer.show_data([utils.DataFromPlugins(name='Mock', data=[frame], dim='Data2D')])
+        assert np.all(first_average == 0.)  # the emitted averages are not the accumulators of the averager
+        assert not first_average.flags.writeable
+
+        exported = viewer.data_to_save_export['data2D']
+        assert list(exported.keys()) == ['test_Mock_CH000', 'test_Mock_CH000_std']
+        assert np.allclose(exported['test_Mock_CH000']['data'], 1.)
+        assert np.allclose(exported['test_Mock_CH000_std']['data'], 1.)
@@ -0,0 +1,62 @@
+import pytest
+
+from pymodaq.pid.scheduler import LoopScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 0.
+
+    def __call__(self):
+        return self.time
+
+    def sleep(self, duration):
+        self.time += duration
+
+
+class TestLoopScheduler:
+    def test_deadlines(self):
+        clock = FakeClock()
+        scheduler = LoopScheduler(0.01, idle=clock.sleep, clock=clock)
+        starts = []
+        assert scheduler.wait() is None
+        starts.append(clock())
+        for ind in range(9):
+            clock.sleep(0.003)  # some work within the iteration
+            dt = scheduler.wait()
+            assert dt == pytest.approx(0.01)
+            starts.append(clock())
+        assert starts == pytest.approx([0.01 * ind for ind in range(10)])
+        stats = scheduler.statistics()
+        assert stats['rate'] == pytest.approx(100)
+        assert stats['jitter_max'] == pytest.approx(0)
+        assert stats['overruns'] == 0
+        assert stats['iterations'] == 10
+
+    def test_overrun(self):
+        clock = FakeClock()
+        scheduler = LoopScheduler(0.01, idle=clock.sleep, clock=clock)
+        scheduler.wait()
+        clock.sleep(0.025)  # misses the starts at 0.01 and 0.02
+        scheduler.wait()
+        assert clock() == pytest.approx(0.025)
+        assert scheduler.next_time == pytest.approx(0.03)  # keeps the phase
+        scheduler.wait()
+        assert clock() == pytest.approx(0.03)
+        stats = scheduler.statistics()
+        assert stats['overruns'] == 1
+        assert stats['jitter_max'] == pytest.approx(0.015)
+
+    def test_free_running(self):
+        clock = FakeClock()
+        scheduler = LoopScheduler(0.01, free_running=True, idle=clock.sleep, clock=clock)
+        scheduler.wait()
+        for duration in [0.002, 0.004, 0.002, 0.004]:
+            clock.sleep(duration)
+            scheduler.wait()
+        assert clock() == pytest.approx(0.012)
+        stats = scheduler.statistics()
+        assert stats['period'] == pytest.approx(0.003)
+        assert stats['rate'] == pytest.approx(1 / 0.003)
+        assert stats['overruns'] == 0
+        assert stats['iterations'] == 5
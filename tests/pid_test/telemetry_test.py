@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from pymodaq.daq_utils.h5modules import H5Saver
+from pymodaq.pid.telemetry import PIDTelemetry, save_telemetry
+
+
+def record(telemetry, ind, error=0.):
+    telemetry.record(0.001 * ind, [ind + error, -ind], [ind, -ind], [(ind, 2 * ind, 3 * ind), (0., 0., 0.)],
+                     [10 * ind, None])
+
+
+class TestPIDTelemetry:
+    def test_record(self):
+        telemetry = PIDTelemetry(Nchannels=2, Nsamples=10)
+        for ind in range(4):
+            record(telemetry, ind)
+        snapshot = telemetry.snapshot()
+        assert np.all(snapshot['time'] == pytest.approx(0.001 * np.arange(4)))
+        assert snapshot['input'].shape == (4, 2)
+        assert np.all(snapshot['input'][:, 0] == np.arange(4))
+        assert np.all(snapshot['setpoint'][:, 1] == -np.arange(4))
+        assert np.all(snapshot['integral'][:, 0] == 2 * np.arange(4))
+        assert np.all(snapshot['output'][:, 0] == 10 * np.arange(4))
+        assert np.all(np.isnan(snapshot['output'][:, 1]))
+        assert snapshot['trigger_time'] is None
+
+    def test_ring_buffer(self):
+        telemetry = PIDTelemetry(Nchannels=2, Nsamples=10)
+        data_id = id(telemetry._data)
+        for ind in range(25):
+            record(telemetry, ind)
+        assert id(telemetry._data) == data_id
+        snapshot = telemetry.snapshot()
+        assert np.all(snapshot['input'][:, 0] == np.arange(15, 25))
+        assert np.all(snapshot['time'] == pytest.approx(0.001 * np.arange(15, 25)))
+
+    def test_no_allocation(self):
+        import tracemalloc
+        telemetry = PIDTelemetry(Nchannels=2, Nsamples=10, threshold=0.5)
+        for ind in range(10):
+            record(telemetry, ind)
+        inputs, setpoints, components, outputs = [1., 2.], [1., 2.], [(1., 2., 3.), (0., 0., 0.)], [10., None]
+        tracemalloc.start()
+        for ind in range(1000):
+            telemetry.record(0.001 * ind, inputs, setpoints, components, outputs)
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert peak < 1000  # not even the memory of a single row array per iteration
+
+    def test_trigger(self):
+        telemetry = PIDTelemetry(Nchannels=2, Nsamples=10, threshold=0.5, Npost_trigger=3)
+        for ind in range(5):
+            record(telemetry, ind)
+        record(telemetry, 5, error=1.)
+        assert not telemetry.triggered
+        for ind in range(6, 9):
+            record(telemetry, ind, error=1.)
+        assert telemetry.triggered
+        snapshot = telemetry.snapshot()
+        assert snapshot['trigger_time'] == pytest.approx(0.005)
+        assert np.all(snapshot['input'][:, 0] == np.arange(9) + np.array([0] * 5 + [1] * 4))
+
+        telemetry.clear_trigger()
+        record(telemetry, 9, error=1.)
+        assert telemetry.trigger_index is None  # not re-armed while the error is still above the threshold
+        record(telemetry, 10)
+        record(telemetry, 11, error=1.)
+        assert telemetry.trigger_index == 11
+
+
+def test_save_telemetry(qtbot, tmp_path):
+    telemetry = PIDTelemetry(Nchannels=2, Nsamples=10)
+    for ind in range(4):
+        record(telemetry, ind)
+    snapshot = telemetry.snapshot()
+
+    h5saver = H5Saver(save_type='custom')
+    h5saver.init_file(update_h5=True, addhoc_file_path=tmp_path.joinpath('telemetry.h5'))
+    det_group = save_telemetry(h5saver, snapshot, channels_names=['x', ''], metadata=dict(reason='snapshot'))
+    assert h5saver.get_attr(det_group, 'reason') == 'snapshot'
+    data_group = h5saver.get_node(det_group, 'Data1D')
+    channels = list(h5saver.get_children(data_group))
+    assert len(channels) == 2 * len(PIDTelemetry.quantities)
+    assert h5saver.get_node(data_group, channels[1]).attrs['TITLE'] == 'CH01 input'
+    data = h5saver.get_node(data_group, f'{channels[0]}/Data').read()
+    assert np.all(data == np.arange(4))
+    h5saver.close_file()